@@ -15,9 +15,10 @@ import shutil
 
 from config.settings import settings
 from config.version import VERSION as __version__, get_version_info
-from app.models.database import get_db, init_db
+from app.models.database import get_db, init_db, SessionLocal
 from app.services.data_processor import DataProcessor
 from app.services.ai_analyzer import AIAnalyzer
+from app.services.import_jobs import fail_stale_imports
 from app.api import routes
 from app.api import report_routes
 from app.api import database_routes
@@ -144,6 +145,16 @@ async def startup_event():
     except Exception as e:
         logger.error(f"Failed to initialize database: {e}")
     
+    # Imports interrupted by a restart will never finish
+    try:
+        db = SessionLocal()
+        try:
+            fail_stale_imports(db)
+        finally:
+            db.close()
+    except Exception as e:
+        logger.error(f"Failed to check interrupted imports: {e}")
+    
     # Start background workers
     try:
         import asyncio
@@ -1,17 +1,24 @@
 """API routes"""
+import asyncio
+import json
 import logging
 from typing import List, Optional
 from datetime import datetime
 from pathlib import Path
 import shutil
 
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Query
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
 from app.models.database import get_db
 from app.models.purchase import Purchase, Category, ImportHistory, AnalysisResult
 from app.services.data_processor import DataProcessor
 from app.services.ai_analyzer import AIAnalyzer
+from app.services.import_jobs import (
+    create_import_job, submit_import_job, fail_import_job, get_job_status, load_job_status
+)
 from config.settings import settings
 
 logger = logging.getLogger(__name__)
@@ -24,42 +31,95 @@ async def upload_csv(
     file: UploadFile = File(...),
     db: Session = Depends(get_db)
 ):
-    """Upload and process CSV file"""
+    """
+    Upload a CSV file and start importing it in the background
+    
+    Returns a job ID immediately; follow progress with
+    /import-jobs/{job_id} (polling) or /import-jobs/{job_id}/events (SSE).
+    """
     
     # Validate file extension
     if not file.filename.endswith('.csv'):
         raise HTTPException(status_code=400, detail="Only CSV files are allowed")
     
-    # Save uploaded file
-    file_path = settings.UPLOAD_DIR / file.filename
-    
+    import_record = None
     try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        filename = Path(file.filename).name
+        import_record = await run_in_threadpool(create_import_job, db, filename)
         
-        logger.info(f"Saved uploaded file: {file.filename}")
+        # Save uploaded file (job ID prefix so concurrent uploads of the same name don't collide)
+        file_path = settings.UPLOAD_DIR / f"{import_record.id}_{filename}"
+        await run_in_threadpool(_save_upload, file, file_path)
         
-        # Process CSV
-        processor = DataProcessor(db)
-        import_record = processor.import_csv_file(file_path)
+        logger.info(f"Saved uploaded file: {file.filename}")
         
-        # Initialize categories if needed
-        if db.query(Category).count() == 0:
-            processor.initialize_categories()
+        submit_import_job(import_record.id, file_path)
         
         return {
             "success": True,
-            "filename": file.filename,
+            "filename": filename,
+            "job_id": import_record.id,
             "import_id": import_record.id,
-            "record_count": import_record.record_count,
             "status": import_record.status,
         }
         
     except Exception as e:
         logger.error(f"Failed to process upload: {e}")
+        if import_record is not None:
+            # Don't leave the job queued when it will never run
+            await run_in_threadpool(fail_import_job, db, import_record.id, f"Upload failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _save_upload(file: UploadFile, file_path: Path):
+    with open(file_path, "wb") as buffer:
+        shutil.copyfileobj(file.file, buffer)
+
+
+@router.get("/import-jobs")
+async def list_import_jobs(db: Session = Depends(get_db)):
+    """Get queued and running import jobs"""
+    jobs = db.query(ImportHistory)\
+        .filter(ImportHistory.status.in_(['queued', 'processing']))\
+        .order_by(ImportHistory.id)\
+        .all()
+    return {"jobs": [get_job_status(job) for job in jobs]}
+
+
+@router.get("/import-jobs/{job_id}")
+async def get_import_job(job_id: int):
+    """Get the progress of an import job"""
+    status = await run_in_threadpool(load_job_status, job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return status
+
+
+@router.get("/import-jobs/{job_id}/events")
+async def stream_import_job(job_id: int, request: Request):
+    """Stream the progress of an import job as Server-Sent Events until it finishes"""
+    status = await run_in_threadpool(load_job_status, job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    
+    async def events():
+        current = status
+        while True:
+            yield f"event: progress\ndata: {json.dumps(current)}\n\n"
+            if current["finished"] or await request.is_disconnected():
+                break
+            await asyncio.sleep(settings.IMPORT_PROGRESS_INTERVAL)
+            current = await run_in_threadpool(load_job_status, job_id)
+            if current is None:
+                break
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.get("/statistics")
 async def get_statistics(db: Session = Depends(get_db)):
     """Get overall statistics"""
@@ -145,8 +205,12 @@ async def auto_classify(
     analyzer = AIAnalyzer(db)
     
     try:
-        analyzer.auto_classify_purchases(limit=limit)
-        return {"success": True, "message": "Classification complete"}
+        stats = await run_in_threadpool(analyzer.auto_classify_purchases, limit=limit)
+        if stats.get('stopped') == 'daily_quota':
+            raise HTTPException(status_code=429, detail="Daily quota limit reached")
+        return {"success": True, "message": "Classification complete", "stats": stats}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Classification failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -227,7 +291,12 @@ async def get_import_history(db: Session = Depends(get_db)):
                 "filename": h.filename,
                 "import_date": h.import_date.isoformat(),
                 "record_count": h.record_count,
+                "inserted_count": h.inserted_count,
+                "updated_count": h.updated_count,
+                "skipped_count": h.skipped_count,
                 "status": h.status,
+                "rows_parsed": h.rows_parsed,
+                "total_rows": h.total_rows,
                 "processing_time": h.processing_time,
                 "error_message": h.error_message,
             }
@@ -1,6 +1,6 @@
 """Database models"""
 from .database import Base, engine, SessionLocal, get_db
-from .purchase import Purchase, Category, AnalysisResult, ImportHistory
+from .purchase import Purchase, Category, AnalysisResult, ImportHistory, ProductCategoryCache
 
 __all__ = [
     "Base",
@@ -11,5 +11,6 @@ __all__ = [
     "Category",
     "AnalysisResult",
     "ImportHistory",
+    "ProductCategoryCache",
 ]
 
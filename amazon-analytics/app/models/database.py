@@ -1,5 +1,6 @@
 """Database configuration"""
-from sqlalchemy import create_engine
+import logging
+from sqlalchemy import create_engine, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from config.settings import settings
@@ -18,6 +19,20 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 # Create base class for models
 Base = declarative_base()
 
+logger = logging.getLogger(__name__)
+
+# Columns added after the initial schema (create_all does not alter existing tables)
+ADDITIONAL_COLUMNS = [
+    "ALTER TABLE import_history ADD COLUMN IF NOT EXISTS inserted_count INTEGER DEFAULT 0",
+    "ALTER TABLE import_history ADD COLUMN IF NOT EXISTS updated_count INTEGER DEFAULT 0",
+    "ALTER TABLE import_history ADD COLUMN IF NOT EXISTS skipped_count INTEGER DEFAULT 0",
+    "ALTER TABLE import_history ADD COLUMN IF NOT EXISTS total_rows INTEGER",
+    "ALTER TABLE import_history ADD COLUMN IF NOT EXISTS rows_parsed INTEGER DEFAULT 0",
+    "ALTER TABLE import_history ADD COLUMN IF NOT EXISTS rows_stored INTEGER DEFAULT 0",
+    "ALTER TABLE import_history ADD COLUMN IF NOT EXISTS started_at TIMESTAMP",
+    "ALTER TABLE import_history ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT now()",
+]
+
 
 def get_db():
     """Get database session"""
@@ -31,4 +46,36 @@ def get_db():
 def init_db():
     """Initialize database (create tables)"""
     Base.metadata.create_all(bind=engine)
+    
+    with engine.begin() as conn:
+        for statement in ADDITIONAL_COLUMNS:
+            conn.execute(text(statement))
+        _create_purchase_natural_key(conn)
+
+
+def _create_purchase_natural_key(conn):
+    """Add the purchase natural-key unique index to existing databases, removing duplicates first"""
+    exists = conn.execute(text(
+        "SELECT 1 FROM pg_indexes WHERE schemaname = current_schema() "
+        "AND tablename = 'purchases' AND indexname = 'uq_purchase_natural_key'"
+    )).first()
+    if exists:
+        return
+    
+    # Keep the oldest row of each duplicate group
+    removed = conn.execute(text("""
+        DELETE FROM purchases p
+        USING purchases d
+        WHERE p.order_id = d.order_id
+          AND p.order_date = d.order_date
+          AND md5(p.product_name) = md5(d.product_name)
+          AND p.id > d.id
+    """)).rowcount
+    if removed:
+        logger.info(f"Removed {removed} duplicate purchases before creating the natural-key index")
+    
+    conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_purchase_natural_key "
+        "ON purchases (order_id, order_date, md5(product_name))"
+    ))
 
@@ -1,5 +1,5 @@
 """Purchase-related database models"""
-from sqlalchemy import Column, Integer, String, Float, DateTime, JSON, Text, ForeignKey, Index
+from sqlalchemy import Column, Integer, String, Float, DateTime, JSON, Text, ForeignKey, Index, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .database import Base
@@ -52,6 +52,8 @@ class Purchase(Base):
     __table_args__ = (
         Index('idx_order_date_category', 'order_date', 'category_id'),
         Index('idx_product_asin', 'asin'),
+        # Natural key used to deduplicate re-imports (product names can be long, so hash them)
+        Index('uq_purchase_natural_key', 'order_id', 'order_date', text('md5(product_name)'), unique=True),
     )
 
     def __repr__(self):
@@ -77,6 +79,22 @@ class Category(Base):
         return f"<Category(id={self.id}, name={self.name})>"
 
 
+class ProductCategoryCache(Base):
+    """Product → category cache (keyed by ASIN or normalized product name)"""
+    __tablename__ = "product_category_cache"
+
+    id = Column(Integer, primary_key=True, index=True)
+    cache_key = Column(String(300), nullable=False, unique=True)  # "asin:B0..." or "name:<normalized name>"
+    category_id = Column(Integer, ForeignKey("categories.id", ondelete="CASCADE"), nullable=False)
+    source = Column(String(20), nullable=False)  # rule, history, llm
+    
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<ProductCategoryCache(key={self.cache_key[:40]}, category_id={self.category_id}, source={self.source})>"
+
+
 class AnalysisResult(Base):
     """Analysis results storage"""
     __tablename__ = "analysis_results"
@@ -104,12 +122,22 @@ class ImportHistory(Base):
     id = Column(Integer, primary_key=True, index=True)
     filename = Column(String(500), nullable=False)
     import_date = Column(DateTime, server_default=func.now())
-    record_count = Column(Integer, default=0)
-    status = Column(String(50), nullable=False)  # success, failed, partial
+    record_count = Column(Integer, default=0)  # Rows added by this import
+    inserted_count = Column(Integer, default=0)
+    updated_count = Column(Integer, default=0)  # Existing rows whose status/prices changed
+    skipped_count = Column(Integer, default=0)  # Rows already stored unchanged
+    status = Column(String(50), nullable=False)  # queued, processing, success, failed, partial
     error_message = Column(Text)
     processing_time = Column(Float)  # seconds
     
+    # Progress of the background import job
+    total_rows = Column(Integer)  # Estimated from the line count of the file
+    rows_parsed = Column(Integer, default=0)
+    rows_stored = Column(Integer, default=0)
+    started_at = Column(DateTime)
+    
     created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
     def __repr__(self):
         return f"<ImportHistory(id={self.id}, filename={self.filename}, status={self.status})>"
@@ -8,7 +8,8 @@ from collections import defaultdict, Counter
 from sqlalchemy.orm import Session
 from sqlalchemy import func, and_
 
-from app.models.purchase import Purchase, Category, AnalysisResult
+from app.models.purchase import Purchase, AnalysisResult
+from app.services.product_classifier import ProductClassifier
 from config.settings import settings
 
 logger = logging.getLogger(__name__)
@@ -45,144 +46,86 @@ class AIAnalyzer:
         if not self.gemini_model and not self.client:
             logger.warning("No AI provider configured. AI features will not work.")
     
+    def is_available(self) -> bool:
+        """Whether an AI provider is configured"""
+        return bool(self.gemini_model or self.client)
+    
+    def generate_json(self, prompt: str, max_tokens: int = 2000) -> Any:
+        """
+        Generate a JSON response (structured output mode of the provider)
+        
+        Args:
+            prompt: Prompt that describes the expected JSON
+            max_tokens: Maximum response tokens
+            
+        Returns:
+            Parsed JSON
+        """
+        if self.gemini_model:
+            # Gemini API
+            response = self.gemini_model.generate_content(
+                prompt,
+                generation_config={
+                    "response_mime_type": "application/json",
+                    "temperature": 0.2,
+                    "max_output_tokens": max_tokens,
+                },
+            )
+            text = response.text
+        elif self.client:
+            # OpenAI API
+            response = self.client.chat.completions.create(
+                model=settings.OPENAI_MODEL,
+                messages=[
+                    {"role": "system", "content": "あなたは商品分類の専門家です。JSONのみで回答します。"},
+                    {"role": "user", "content": prompt}
+                ],
+                response_format={"type": "json_object"},
+                temperature=0.2,
+                max_tokens=max_tokens,
+            )
+            text = response.choices[0].message.content
+        else:
+            raise RuntimeError("No AI provider available")
+        
+        # Strip a Markdown code fence if the model added one anyway
+        text = text.strip()
+        if text.startswith("```"):
+            text = text.strip("`")
+            text = text[text.find("{"):] if "{" in text else text
+        return json.loads(text)
+    
     def classify_product_category(self, product_name: str) -> Optional[str]:
         """
         Classify product into category using AI
         
+        Uses the product category cache and keyword rules before asking the AI.
+        
         Args:
             product_name: Product name
             
         Returns:
             Category name in Japanese
         """
-        categories = self.db.query(Category).all()
-        category_list = [cat.name for cat in categories]
-        
-        prompt = f"""以下の商品を適切なカテゴリに分類してください。
-
-商品名: {product_name}
-
-利用可能なカテゴリ:
-{', '.join(category_list)}
-
-商品の内容を理解し、最も適切なカテゴリ名を1つだけ返してください。
-カテゴリ名のみを返し、他の説明は不要です。"""
-
         try:
-            if self.gemini_model:
-                # Gemini API
-                response = self.gemini_model.generate_content(prompt)
-                category_name = response.text.strip()
-            elif self.client:
-                # OpenAI API
-                response = self.client.chat.completions.create(
-                    model=settings.OPENAI_MODEL,
-                    messages=[
-                        {"role": "system", "content": "あなたは商品分類の専門家です。"},
-                        {"role": "user", "content": prompt}
-                    ],
-                    temperature=0.3,
-                    max_tokens=50,
-                )
-                category_name = response.choices[0].message.content.strip()
-            else:
-                logger.warning("No AI provider available")
-                return 'その他'
-            
-            # Validate category exists
-            category = self.db.query(Category).filter(
-                Category.name == category_name
-            ).first()
-            
-            if category:
-                return category_name
-            else:
-                logger.warning(f"AI returned unknown category: {category_name}")
-                return 'その他'
-                
+            return ProductClassifier(self.db, self).classify_product(product_name)
         except Exception as e:
             logger.error(f"Failed to classify product: {e}")
             return 'その他'
     
-    def auto_classify_purchases(self, limit: Optional[int] = None):
-        """Auto-classify purchases without categories"""
-        import time
-        
-        query = self.db.query(Purchase).filter(Purchase.category_id.is_(None))
-        
-        if limit:
-            query = query.limit(limit)
-        
-        purchases = query.all()
-        
-        logger.info(f"Auto-classifying {len(purchases)} purchases using {self.ai_provider}")
-        
-        classified_count = 0
-        consecutive_errors = 0
-        max_consecutive_errors = 5  # Stop after 5 consecutive errors
+    def auto_classify_purchases(self, limit: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Auto-classify purchases without categories
         
-        for i, purchase in enumerate(purchases):
-            try:
-                category_name = self.classify_product_category(purchase.product_name)
-                category = self.db.query(Category).filter(
-                    Category.name == category_name
-                ).first()
-                
-                if category:
-                    purchase.category_id = category.id
-                    classified_count += 1
-                    consecutive_errors = 0  # Reset error counter on success
-                
-                # Rate limiting: Wait 4 seconds between requests (15 req/min)
-                if (i + 1) % 10 == 0:
-                    logger.info(f"Classified {i + 1}/{len(purchases)}, pausing to respect rate limits...")
-                    time.sleep(4)
-                    
-            except Exception as e:
-                consecutive_errors += 1
-                logger.error(f"Failed to classify {purchase.product_name}: {e}")
-                
-                # Stop if too many consecutive errors
-                if consecutive_errors >= max_consecutive_errors:
-                    logger.error(f"Too many consecutive errors ({consecutive_errors}), stopping classification")
-                    break
-                
-                # If rate limit error, wait longer
-                if "429" in str(e) or "quota" in str(e).lower():
-                    # Check if it's daily quota limit (more comprehensive check)
-                    error_str = str(e)
-                    logger.info(f"Error string: {error_str[:200]}...")  # Debug log
-                    
-                    # More specific check for daily quota
-                    is_daily_quota = (
-                        "GenerateRequestsPerDayPerProjectPerModel" in error_str or
-                        "FreeTier" in error_str or
-                        "limit: 50" in error_str or
-                        "quota_value: 50" in error_str
-                    )
-                    
-                    if is_daily_quota:
-                        logger.error("Daily quota limit reached. Stopping classification.")
-                        logger.error("Please wait until tomorrow or upgrade to a paid plan.")
-                        break
-                    
-                    # Extract retry delay from error message if available
-                    retry_delay = 60  # Default fallback
-                    if "retry_delay" in str(e):
-                        try:
-                            import re
-                            delay_match = re.search(r'retry_delay.*?(\d+)', str(e))
-                            if delay_match:
-                                retry_delay = int(delay_match.group(1))
-                        except:
-                            pass
-                    
-                    logger.warning(f"Rate limit hit, waiting {retry_delay} seconds...")
-                    time.sleep(retry_delay)
-                continue
+        Purchases are deduplicated by product; cached, previously classified
+        (same ASIN) and keyword-matched products are resolved locally and the
+        rest are sent to the AI in batches.
         
-        self.db.commit()
-        logger.info(f"Auto-classification complete: {classified_count}/{len(purchases)} successful")
+        Returns:
+            Classification statistics
+        """
+        logger.info(f"Auto-classifying purchases using {self.ai_provider}")
+        return ProductClassifier(self.db, self).classify_purchases(limit=limit)
     
     def analyze_impulse_buying(self, days: int = 7) -> Dict[str, Any]:
         """
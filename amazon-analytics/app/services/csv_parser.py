@@ -2,12 +2,17 @@
 import pandas as pd
 from datetime import datetime
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterator, Optional
 import logging
 from decimal import Decimal
 
+from config.settings import settings
+
 logger = logging.getLogger(__name__)
 
+# Currency symbols, thousands separators and quotes found in price cells
+PRICE_NOISE = r"[¥￥,'\"]"
+
 
 class AmazonCSVParser:
     """Parser for Amazon order history CSV files"""
@@ -28,31 +33,142 @@ class AmazonCSVParser:
         Returns:
             List of parsed order dictionaries
         """
-        try:
-            # Read CSV with proper encoding
-            df = pd.read_csv(file_path, encoding='utf-8')
-            
-            logger.info(f"Loaded {len(df)} rows from {file_path.name}")
+        orders = []
+        for batch in self.iter_retail_order_history(file_path):
+            orders.extend(batch)
+        return orders
+    
+    def iter_retail_order_history(
+        self,
+        file_path: Path,
+        chunk_size: Optional[int] = None,
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Parse Retail.OrderHistory.3.csv format in batches
+        
+        The file is read in chunks of ``chunk_size`` rows with every column as
+        string (no per-cell type inference) and each chunk is parsed column-wise.
+        
+        Args:
+            file_path: Path to CSV file
+            chunk_size: Rows per chunk (defaults to settings.CSV_CHUNK_SIZE)
             
-            orders = []
-            for idx, row in df.iterrows():
-                try:
-                    order = self._parse_retail_row(row)
-                    if order:
-                        orders.append(order)
-                except Exception as e:
-                    logger.warning(f"Failed to parse row {idx}: {e}")
-                    continue
+        Yields:
+            Lists of parsed order dictionaries, one list per chunk
+        """
+        chunk_size = chunk_size or settings.CSV_CHUNK_SIZE
+        total_rows = 0
+        total_orders = 0
+        
+        try:
+            reader = pd.read_csv(
+                file_path,
+                encoding='utf-8',
+                dtype=str,
+                keep_default_na=False,
+                chunksize=chunk_size,
+            )
+            for chunk in reader:
+                orders = self._parse_retail_frame(chunk)
+                total_rows += len(chunk)
+                total_orders += len(orders)
+                if orders:
+                    yield orders
             
-            logger.info(f"Successfully parsed {len(orders)} orders")
-            return orders
+            logger.info(f"Successfully parsed {total_orders} orders from {total_rows} rows in {file_path.name}")
             
         except Exception as e:
             logger.error(f"Failed to parse CSV file: {e}")
             raise
     
+    def _parse_retail_frame(self, df: pd.DataFrame) -> List[Dict[str, Any]]:
+        """Parse a chunk of retail order rows column-wise"""
+        if df.empty:
+            return []
+        
+        order_date = self._parse_date_column(self._column(df, 'Order Date'))
+        
+        # Skip rows missing essential fields
+        valid = (
+            (self._column(df, 'Order ID').str.strip() != '')
+            & (self._column(df, 'Product Name').str.strip() != '')
+            & order_date.notna()
+        ).to_numpy()
+        if not valid.any():
+            return []
+        
+        df = df[valid]
+        order_date = order_date[valid]
+        header = list(df.columns)
+        raw_data = [dict(zip(header, row)) for row in df.to_numpy(dtype=object).tolist()]
+        ship_date = self._parse_date_column(self._column(df, 'Ship Date'))
+        quantity = pd.to_numeric(self._column(df, 'Quantity'), errors='coerce').fillna(1).astype(int)
+        
+        columns = {
+            'order_id': self._column(df, 'Order ID').tolist(),
+            'order_date': self._to_datetimes(order_date),
+            'product_name': self._column(df, 'Product Name').tolist(),
+            'seller': self._column(df, 'Billing Address', 'Amazon').tolist(),
+            'asin': self._column(df, 'ASIN').tolist(),
+            'unit_price': self._parse_price_column(self._column(df, 'Unit Price')).tolist(),
+            'unit_price_tax': self._parse_price_column(self._column(df, 'Unit Price Tax')).tolist(),
+            'shipping_charge': self._parse_price_column(self._column(df, 'Shipping Charge')).tolist(),
+            'total_discounts': self._parse_price_column(self._column(df, 'Total Discounts')).abs().tolist(),  # Make discounts positive
+            'total_owed': self._parse_price_column(self._column(df, 'Total Owed')).tolist(),
+            'quantity': quantity.tolist(),
+            'product_condition': self._column(df, 'Product Condition', 'New').tolist(),
+            'order_status': self._column(df, 'Order Status', 'Unknown').tolist(),
+            'shipment_status': self._column(df, 'Shipment Status', 'Unknown').tolist(),
+            'ship_date': self._to_datetimes(ship_date),
+            'shipping_address': self._column(df, 'Shipping Address').tolist(),
+            'billing_address': self._column(df, 'Billing Address').tolist(),
+            'currency': self._column(df, 'Currency', 'JPY').tolist(),
+            'website': self._column(df, 'Website', 'Amazon.co.jp').tolist(),
+            'raw_data': raw_data,
+        }
+        
+        keys = list(columns)
+        return [dict(zip(keys, values)) for values in zip(*columns.values())]
+    
+    @staticmethod
+    def _column(df: pd.DataFrame, name: str, default: str = '') -> pd.Series:
+        """Get a string column, or a constant column if it is missing from the file"""
+        if name in df.columns:
+            return df[name].fillna('')
+        return pd.Series(default, index=df.index, dtype=object)
+    
+    @staticmethod
+    def _parse_date_column(values: pd.Series) -> pd.Series:
+        """Parse a date column (ISO 8601 first, then any other format) to naive datetimes"""
+        values = values.str.strip().replace('Not Available', '')
+        # ISO format (2025-10-17T20:33:51.287Z); naive values are kept as-is
+        parsed = pd.to_datetime(values, format='ISO8601', utc=True, errors='coerce').dt.tz_localize(None)
+        
+        # Fall back to per-value format detection for anything else
+        remaining = parsed.isna() & (values != '')
+        if remaining.any():
+            fallback = pd.to_datetime(values[remaining], format='mixed', utc=True, errors='coerce')
+            parsed[remaining] = fallback.dt.tz_localize(None)
+        return parsed
+    
+    @staticmethod
+    def _parse_price_column(values: pd.Series) -> pd.Series:
+        """Parse a price column (currency symbols, thousands separators, quotes) to floats"""
+        cleaned = values.str.replace(PRICE_NOISE, '', regex=True).str.strip()
+        return pd.to_numeric(cleaned, errors='coerce').fillna(0.0).astype(float)
+    
+    @staticmethod
+    def _to_datetimes(values: pd.Series) -> List[Optional[datetime]]:
+        """Convert a datetime column to a list of datetimes (None for missing)"""
+        return [None if pd.isna(value) else value.to_pydatetime() for value in values]
+    
     def _parse_retail_row(self, row: pd.Series) -> Optional[Dict[str, Any]]:
-        """Parse a single retail order row"""
+        """
+        Parse a single retail order row
+        
+        Row-by-row reference implementation, kept for comparison
+        (see scripts/benchmark_csv_parser.py).
+        """
         
         # Skip if essential fields are missing
         if pd.isna(row.get('Order ID')) or pd.isna(row.get('Product Name')):
@@ -4,13 +4,28 @@ from typing import List, Dict, Any, Optional
 from datetime import datetime
 from pathlib import Path
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, literal_column, tuple_
+from sqlalchemy.dialects.postgresql import insert
 
 from app.models.purchase import Purchase, ImportHistory, Category
 from app.services.csv_parser import csv_parser
+from config.settings import settings
 
 logger = logging.getLogger(__name__)
 
+# Fields that change after an order is placed (refreshed when a later export is re-imported)
+UPDATABLE_FIELDS = [
+    'order_status',
+    'shipment_status',
+    'ship_date',
+    'unit_price',
+    'unit_price_tax',
+    'shipping_charge',
+    'total_discounts',
+    'total_owed',
+    'quantity',
+]
+
 
 class DataProcessor:
     """Process and store purchase data"""
@@ -18,12 +33,16 @@ class DataProcessor:
     def __init__(self, db: Session):
         self.db = db
     
-    def import_csv_file(self, file_path: Path) -> ImportHistory:
+    def import_csv_file(self, file_path: Path, import_record: Optional[ImportHistory] = None) -> ImportHistory:
         """
         Import CSV file and store in database
         
+        Progress (rows parsed / stored) is committed to the import record after
+        every chunk so it can be followed from other requests.
+        
         Args:
             file_path: Path to CSV file
+            import_record: Existing record to update (background jobs); created if omitted
             
         Returns:
             ImportHistory record
@@ -31,11 +50,13 @@ class DataProcessor:
         start_time = datetime.now()
         
         # Create import history record
-        import_record = ImportHistory(
-            filename=file_path.name,
-            status='processing',
-        )
-        self.db.add(import_record)
+        if import_record is None:
+            import_record = ImportHistory(filename=file_path.name)
+            self.db.add(import_record)
+        import_record.status = 'processing'
+        import_record.started_at = start_time
+        import_record.rows_parsed = 0
+        import_record.rows_stored = 0
         self.db.commit()
         
         try:
@@ -46,58 +67,102 @@ class DataProcessor:
             
             logger.info(f"Detected CSV format: {csv_format}")
             
-            # Parse CSV
-            if csv_format == 'Retail.OrderHistory':
-                orders = csv_parser.parse_retail_order_history(file_path)
-            else:
+            if csv_format != 'Retail.OrderHistory':
                 raise ValueError(f"Unsupported format: {csv_format}")
             
-            if not orders:
-                raise ValueError("No valid orders found in CSV")
+            # Parse and store chunk by chunk
+            counts = {'parsed': 0, 'inserted': 0, 'updated': 0, 'skipped': 0}
+            for orders in csv_parser.iter_retail_order_history(file_path):
+                counts['parsed'] += len(orders)
+                import_record.rows_parsed = counts['parsed']
+                self.db.commit()
+                
+                for key, value in self._store_orders(orders).items():
+                    counts[key] += value
+                import_record.rows_stored = counts['inserted'] + counts['updated'] + counts['skipped']
+                self.db.commit()
             
-            # Store orders in database
-            saved_count = self._store_orders(orders)
+            if not counts['parsed']:
+                raise ValueError("No valid orders found in CSV")
             
             # Update import record
             processing_time = (datetime.now() - start_time).total_seconds()
-            import_record.record_count = saved_count
+            import_record.record_count = counts['inserted']
+            import_record.inserted_count = counts['inserted']
+            import_record.updated_count = counts['updated']
+            import_record.skipped_count = counts['skipped']
             import_record.status = 'success'
             import_record.processing_time = processing_time
             self.db.commit()
             
-            logger.info(f"Successfully imported {saved_count} orders in {processing_time:.2f}s")
+            logger.info(
+                f"Imported {counts['parsed']} orders in {processing_time:.2f}s: "
+                f"{counts['inserted']} inserted, {counts['updated']} updated, {counts['skipped']} skipped"
+            )
             return import_record
             
         except Exception as e:
             logger.error(f"Failed to import CSV: {e}")
+            self.db.rollback()
             import_record.status = 'failed'
             import_record.error_message = str(e)
+            # Batches stored before the failure stay committed
+            if 'counts' in locals() and counts['inserted'] + counts['updated'] > 0:
+                import_record.status = 'partial'
+                import_record.record_count = counts['inserted']
+                import_record.inserted_count = counts['inserted']
+                import_record.updated_count = counts['updated']
+                import_record.skipped_count = counts['skipped']
             self.db.commit()
             raise
     
-    def _store_orders(self, orders: List[Dict[str, Any]]) -> int:
-        """Store orders in database with deduplication"""
-        saved_count = 0
+    def _store_orders(self, orders: List[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Store orders in database with deduplication
         
-        for order_data in orders:
-            # Check if order already exists
-            existing = self.db.query(Purchase).filter(
-                Purchase.order_id == order_data['order_id'],
-                Purchase.product_name == order_data['product_name'],
-                Purchase.order_date == order_data['order_date'],
-            ).first()
-            
-            if existing:
-                logger.debug(f"Skipping duplicate order: {order_data['order_id']}")
-                continue
-            
-            # Create new purchase record
-            purchase = Purchase(**order_data)
-            self.db.add(purchase)
-            saved_count += 1
+        Rows are upserted in batches on the natural key (order ID, order date,
+        product name). Existing rows are only rewritten when their status,
+        ship date or prices changed.
+        
+        Returns:
+            Counts of inserted, updated and skipped rows
+        """
+        counts = {'inserted': 0, 'updated': 0, 'skipped': 0}
+        
+        # The same line can appear twice in one export; keep the last one
+        unique_orders = {
+            (order['order_id'], order['order_date'], order['product_name']): order
+            for order in orders
+        }
+        counts['skipped'] += len(orders) - len(unique_orders)
+        rows = list(unique_orders.values())
+        
+        # One statement executed per batch (executemany with RETURNING), so it is compiled only once
+        statement = insert(Purchase.__table__)
+        excluded = statement.excluded
+        statement = statement.on_conflict_do_update(
+            index_elements=[Purchase.order_id, Purchase.order_date, func.md5(Purchase.product_name)],
+            set_={
+                **{field: excluded[field] for field in UPDATABLE_FIELDS},
+                'raw_data': excluded.raw_data,
+                'updated_at': func.now(),
+            },
+            where=tuple_(*[getattr(Purchase, field) for field in UPDATABLE_FIELDS]).is_distinct_from(
+                tuple_(*[excluded[field] for field in UPDATABLE_FIELDS])
+            ),
+        ).returning(literal_column('xmax = 0').label('inserted'))
+        
+        for i in range(0, len(rows), settings.IMPORT_BATCH_SIZE):
+            batch = rows[i:i + settings.IMPORT_BATCH_SIZE]
+            # Unchanged duplicates are not returned; inserted rows have xmax = 0
+            result = self.db.execute(statement, batch).all()
+            inserted = sum(1 for row in result if row.inserted)
+            counts['inserted'] += inserted
+            counts['updated'] += len(result) - inserted
+            counts['skipped'] += len(batch) - len(result)
         
         self.db.commit()
-        return saved_count
+        return counts
     
     def get_statistics(self) -> Dict[str, Any]:
         """Get overall statistics"""
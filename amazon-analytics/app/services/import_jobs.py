@@ -0,0 +1,158 @@
+"""Background CSV import jobs"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models.database import SessionLocal
+from app.models.purchase import Category, ImportHistory
+from app.services.data_processor import DataProcessor
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Job states after which nothing changes
+FINISHED_STATUSES = {'success', 'failed', 'partial'}
+
+# Parsing and inserting run here instead of on the event loop.
+# The import record in the database is the job state, so any server process can report progress.
+_executor = ThreadPoolExecutor(max_workers=settings.IMPORT_MAX_WORKERS, thread_name_prefix="csv-import")
+
+
+def count_csv_rows(file_path: Path) -> int:
+    """Estimate the number of data rows from the line count (quoted newlines are rare)"""
+    lines = 0
+    last = b''
+    with open(file_path, 'rb') as f:
+        while True:
+            block = f.read(1024 * 1024)
+            if not block:
+                break
+            lines += block.count(b'\n')
+            last = block
+    if last and not last.endswith(b'\n'):
+        lines += 1
+    return max(lines - 1, 0)
+
+
+def create_import_job(db: Session, filename: str) -> ImportHistory:
+    """Create the import record for a new job"""
+    import_record = ImportHistory(filename=filename, status='queued')
+    db.add(import_record)
+    db.commit()
+    db.refresh(import_record)
+    return import_record
+
+
+def submit_import_job(import_id: int, file_path: Path):
+    """Queue the import of a saved file (runs in the import thread pool)"""
+    _executor.submit(_run_import_job, import_id, file_path)
+    logger.info(f"Queued import job {import_id}: {file_path.name}")
+
+
+def fail_import_job(db: Session, import_id: int, error_message: str):
+    """Mark a job that could not be started as failed"""
+    db.rollback()
+    import_record = db.get(ImportHistory, import_id)
+    if import_record is not None and import_record.status not in FINISHED_STATUSES:
+        import_record.status = 'failed'
+        import_record.error_message = error_message
+        db.commit()
+
+
+def _run_import_job(import_id: int, file_path: Path):
+    db = SessionLocal()
+    try:
+        import_record = db.get(ImportHistory, import_id)
+        if import_record is None:
+            logger.error(f"Import job {import_id} not found")
+            return
+        if import_record.status != 'queued':
+            logger.warning(f"Import job {import_id} is {import_record.status}, not running it")
+            return
+
+        import_record.total_rows = count_csv_rows(file_path)
+        db.commit()
+
+        processor = DataProcessor(db)
+        processor.import_csv_file(file_path, import_record=import_record)
+
+        # Initialize categories if needed
+        if db.query(Category).count() == 0:
+            processor.initialize_categories()
+
+    except Exception as e:
+        logger.error(f"Import job {import_id} failed: {e}")
+        # import_csv_file records its own failures; anything earlier is recorded here
+        fail_import_job(db, import_id, str(e))
+    finally:
+        db.close()
+
+
+def get_job_status(import_record: ImportHistory) -> Dict[str, Any]:
+    """Progress of an import job, with an ETA based on the rows stored so far"""
+    total = import_record.total_rows or 0
+    stored = import_record.rows_stored or 0
+
+    eta_seconds = None
+    elapsed = None
+    if import_record.started_at:
+        if import_record.status in FINISHED_STATUSES and import_record.processing_time is not None:
+            elapsed = import_record.processing_time
+        else:
+            elapsed = (datetime.now() - import_record.started_at).total_seconds()
+        if import_record.status == 'processing' and stored and total > stored:
+            eta_seconds = round(elapsed / stored * (total - stored), 1)
+
+    return {
+        "job_id": import_record.id,
+        "import_id": import_record.id,
+        "filename": import_record.filename,
+        "status": import_record.status,
+        "finished": import_record.status in FINISHED_STATUSES,
+        "total_rows": import_record.total_rows,
+        "rows_parsed": import_record.rows_parsed or 0,
+        "rows_stored": stored,
+        "progress": round(min(stored / total, 1.0), 3) if total else None,
+        "elapsed_seconds": round(elapsed, 1) if elapsed is not None else None,
+        "eta_seconds": eta_seconds,
+        "record_count": import_record.record_count,
+        "inserted_count": import_record.inserted_count,
+        "updated_count": import_record.updated_count,
+        "skipped_count": import_record.skipped_count,
+        "error_message": import_record.error_message,
+    }
+
+
+def load_job_status(import_id: int) -> Optional[Dict[str, Any]]:
+    """Read the current status of a job in a short-lived session"""
+    db = SessionLocal()
+    try:
+        import_record = db.get(ImportHistory, import_id)
+        return get_job_status(import_record) if import_record else None
+    finally:
+        db.close()
+
+
+def fail_stale_imports(db: Session) -> int:
+    """
+    Mark imports interrupted by a restart (no progress for IMPORT_STALE_MINUTES) as failed
+
+    Only running imports are checked: they record progress after every chunk. Queued jobs
+    may legitimately wait longer than that in another server process's executor.
+    """
+    stale = db.query(ImportHistory).filter(
+        ImportHistory.status == 'processing',
+        ImportHistory.updated_at < func.now() - timedelta(minutes=settings.IMPORT_STALE_MINUTES),
+    ).all()
+    for import_record in stale:
+        import_record.status = 'failed'
+        import_record.error_message = "Import was interrupted (server restarted)"
+    db.commit()
+    if stale:
+        logger.warning(f"Marked {len(stale)} interrupted imports as failed")
+    return len(stale)
@@ -0,0 +1,346 @@
+"""Product category classification engine (cache → purchase history → keyword rules → batched LLM)"""
+import logging
+import re
+import time
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.models.purchase import Category, ProductCategoryCache, Purchase
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+FALLBACK_CATEGORY = 'その他'
+
+# Keywords that identify a category on their own (matched against the normalized product name).
+# A product is only classified by rule when exactly one category matches.
+KEYWORD_RULES: Dict[str, List[str]] = {
+    'ペット用品': ['キャットフード', 'ドッグフード', '猫砂', 'ペットシーツ', '猫用', '犬用', 'ペット用'],
+    '本・メディア': ['kindle版', '単行本', '文庫', '新書', 'コミックス', 'blu-ray', 'dvd', '雑誌'],
+    '家電・PC関連': ['usb', 'hdmi', '充電器', 'ssd', 'hdd', 'ワイヤレスマウス', 'キーボード', 'モニター',
+                  'wi-fi', 'ルーター', 'イヤホン', 'ヘッドホン', 'microsd', 'sdカード', 'ノートパソコン', 'モバイルバッテリー'],
+    '日用品・消耗品': ['ティッシュ', 'トイレットペーパー', '洗剤', '柔軟剤', 'ゴミ袋', 'キッチンペーパー',
+                  'アルカリ乾電池', '歯ブラシ', 'ハンドソープ', '詰め替え'],
+    '健康・美容': ['サプリ', 'シャンプー', 'コンディショナー', '化粧水', '日焼け止め', 'ビタミン', '目薬', 'ボディソープ'],
+    '食品・飲料': ['コーヒー', '緑茶', 'ミネラルウォーター', '炭酸水', 'ジュース', 'ビール', 'カップ麺', '醤油', 'チョコレート', 'スナック菓子'],
+    'ファッション': ['tシャツ', 'スニーカー', '靴下', 'ソックス', 'ジャケット', 'パーカー', '財布'],
+    'ホビー・趣味': ['プラモデル', 'フィギュア', 'ボードゲーム', 'レゴ', 'lego', 'トレーディングカード'],
+}
+
+# Product names are truncated in prompts and cache keys
+PROMPT_NAME_LENGTH = 150
+CACHE_NAME_LENGTH = 200
+
+MAX_RATE_LIMIT_RETRIES = 3
+
+
+def normalize_product_name(name: str) -> str:
+    """Normalize a product name for deduplication (width, case, whitespace)"""
+    name = unicodedata.normalize('NFKC', name or '').lower()
+    return re.sub(r'\s+', ' ', name).strip()
+
+
+def product_keys(asin: Optional[str], product_name: str) -> List[str]:
+    """Cache keys for a product, most specific first"""
+    keys = []
+    asin = (asin or '').strip()
+    if asin and asin.lower() not in ('nan', 'not available'):
+        keys.append(f"asin:{asin}")
+    keys.append(f"name:{normalize_product_name(product_name)[:CACHE_NAME_LENGTH]}")
+    return keys
+
+
+def is_daily_quota_error(error: Exception) -> bool:
+    """Whether a provider error is the free-tier daily quota (retrying today is pointless)"""
+    error_str = str(error)
+    return (
+        "GenerateRequestsPerDayPerProjectPerModel" in error_str or
+        "FreeTier" in error_str or
+        "limit: 50" in error_str or
+        "quota_value: 50" in error_str
+    )
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    return "429" in str(error) or "quota" in str(error).lower()
+
+
+def retry_delay_seconds(error: Exception, default: int = 60) -> int:
+    """Retry delay suggested by the provider error message"""
+    match = re.search(r'retry_delay.*?(\d+)', str(error))
+    return int(match.group(1)) if match else default
+
+
+class ProductClassifier:
+    """
+    Classify purchases into categories with as few LLM requests as possible
+
+    Purchases are deduplicated by ASIN / normalized name. Each unique product is
+    resolved from the persistent cache, then from the category already assigned to
+    other purchases of the same ASIN, then by keyword rules. Only the remaining
+    products are sent to the LLM, many per request with JSON output.
+    """
+
+    def __init__(self, db: Session, analyzer=None):
+        self.db = db
+        self.analyzer = analyzer
+        self.categories: Dict[str, int] = {name: id_ for id_, name in db.query(Category.id, Category.name).all()}
+
+    def classify_purchases(self, limit: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Classify purchases without a category
+
+        Returns:
+            Counts per resolution source and whether the LLM quota stopped the run
+        """
+        query = self.db.query(Purchase.id, Purchase.asin, Purchase.product_name)\
+            .filter(Purchase.category_id.is_(None))\
+            .order_by(Purchase.id)
+        if limit:
+            query = query.limit(limit)
+        rows = query.all()
+
+        # Group purchases by product (first key = ASIN if available, otherwise name)
+        products: Dict[str, Dict[str, Any]] = {}
+        for row in rows:
+            keys = product_keys(row.asin, row.product_name)
+            product = products.setdefault(keys[0], {'keys': keys, 'name': row.product_name, 'purchase_ids': []})
+            product['purchase_ids'].append(row.id)
+
+        stats = {
+            'total': len(rows),
+            'unique_products': len(products),
+            'cache': 0,
+            'history': 0,
+            'rule': 0,
+            'llm': 0,
+            'unclassified': 0,
+            'llm_requests': 0,
+            'stopped': None,
+        }
+        logger.info(f"Classifying {len(rows)} purchases ({len(products)} unique products)")
+        if not products:
+            return stats
+
+        resolved: Dict[str, Tuple[str, str]] = {}  # product key -> (category name, source)
+        for key, category_name in self._lookup_cache(products).items():
+            resolved[key] = (category_name, 'cache')
+        for key, category_name in self._lookup_history(products, resolved).items():
+            resolved[key] = (category_name, 'history')
+        for key, product in products.items():
+            if key not in resolved:
+                category_name = self.classify_by_rules(product['name'])
+                if category_name:
+                    resolved[key] = (category_name, 'rule')
+
+        self._apply(products, resolved)
+
+        # Remaining products go to the LLM in batches (stored after every batch)
+        unknown = [key for key in products if key not in resolved]
+        if unknown and self.analyzer is not None and self.analyzer.is_available():
+            batch_size = max(1, settings.CLASSIFY_BATCH_SIZE)
+            for i in range(0, len(unknown), batch_size):
+                batch = unknown[i:i + batch_size]
+                if i:
+                    time.sleep(settings.CLASSIFY_REQUEST_INTERVAL)
+                try:
+                    results = self._classify_with_llm([products[key]['name'] for key in batch])
+                    stats['llm_requests'] += 1
+                except Exception as e:
+                    if is_daily_quota_error(e):
+                        logger.error("Daily quota limit reached. Stopping classification.")
+                        logger.error("Please wait until tomorrow or upgrade to a paid plan.")
+                        stats['stopped'] = 'daily_quota'
+                    else:
+                        logger.error(f"LLM classification failed: {e}")
+                        stats['stopped'] = 'error'
+                    break
+                # Products the model skipped or answered with an unknown category stay unresolved for the next run
+                batch_resolved = {
+                    key: (category_name, 'llm')
+                    for key, category_name in zip(batch, results)
+                    if category_name is not None
+                }
+                resolved.update(batch_resolved)
+                self._apply(products, batch_resolved)
+                logger.info(f"LLM classified {min(i + batch_size, len(unknown))}/{len(unknown)} unknown products")
+
+        for key, product in products.items():
+            if key in resolved:
+                stats[resolved[key][1]] += len(product['purchase_ids'])
+            else:
+                stats['unclassified'] += len(product['purchase_ids'])
+
+        logger.info(f"Classification complete: {stats}")
+        return stats
+
+    def classify_product(self, product_name: str, asin: Optional[str] = None) -> str:
+        """Classify a single product (cache, rules, then LLM)"""
+        keys = product_keys(asin, product_name)
+        products = {keys[0]: {'keys': keys, 'name': product_name, 'purchase_ids': []}}
+        cached = self._lookup_cache(products)
+        if cached:
+            return cached[keys[0]]
+
+        category_name = self.classify_by_rules(product_name)
+        source = 'rule'
+        if not category_name:
+            if self.analyzer is None or not self.analyzer.is_available():
+                return FALLBACK_CATEGORY
+            category_name = self._classify_with_llm([product_name])[0]
+            if category_name is None:
+                # Not cached, so the product is asked about again next time
+                return FALLBACK_CATEGORY
+            source = 'llm'
+        self._apply(products, {keys[0]: (category_name, source)})
+        return category_name
+
+    def classify_by_rules(self, product_name: str) -> Optional[str]:
+        """Category whose keywords (and only one category's keywords) appear in the product name"""
+        name = normalize_product_name(product_name)
+        matches = [
+            category_name for category_name, keywords in KEYWORD_RULES.items()
+            if category_name in self.categories and any(keyword in name for keyword in keywords)
+        ]
+        return matches[0] if len(matches) == 1 else None
+
+    def _lookup_cache(self, products: Dict[str, Dict[str, Any]]) -> Dict[str, str]:
+        """Cached categories for the products (ASIN key takes precedence over name key)"""
+        all_keys = [key for product in products.values() for key in product['keys']]
+        cached: Dict[str, int] = {}
+        for chunk in _chunks(all_keys, 1000):
+            for cache_key, category_id in self.db.query(
+                ProductCategoryCache.cache_key, ProductCategoryCache.category_id
+            ).filter(ProductCategoryCache.cache_key.in_(chunk)).all():
+                cached[cache_key] = category_id
+
+        names_by_id = {id_: name for name, id_ in self.categories.items()}
+        result = {}
+        for key, product in products.items():
+            for cache_key in product['keys']:
+                if cached.get(cache_key) in names_by_id:
+                    result[key] = names_by_id[cached[cache_key]]
+                    break
+        return result
+
+    def _lookup_history(
+        self,
+        products: Dict[str, Dict[str, Any]],
+        resolved: Dict[str, Tuple[str, str]],
+    ) -> Dict[str, str]:
+        """Most common category already assigned to other purchases of the same ASIN"""
+        asins = {
+            product['keys'][0][len('asin:'):]: key
+            for key, product in products.items()
+            if key not in resolved and product['keys'][0].startswith('asin:')
+        }
+        if not asins:
+            return {}
+
+        votes: Dict[str, Counter] = defaultdict(Counter)
+        for chunk in _chunks(list(asins), 1000):
+            rows = self.db.query(Purchase.asin, Category.name, func.count(Purchase.id))\
+                .join(Category, Category.id == Purchase.category_id)\
+                .filter(Purchase.asin.in_(chunk))\
+                .group_by(Purchase.asin, Category.name)\
+                .all()
+            for asin, category_name, count in rows:
+                votes[asin][category_name] += count
+
+        return {asins[asin]: counter.most_common(1)[0][0] for asin, counter in votes.items()}
+
+    def _classify_with_llm(self, names: List[str]) -> List[Optional[str]]:
+        """Classify several products in one request (None where the answer is missing or not a known category)"""
+        category_list = list(self.categories)
+        product_lines = "\n".join(
+            f"{i}. {name[:PROMPT_NAME_LENGTH]}" for i, name in enumerate(names, 1)
+        )
+        prompt = f"""以下の商品をそれぞれ最も適切なカテゴリに分類してください。
+
+利用可能なカテゴリ:
+{', '.join(category_list)}
+
+商品:
+{product_lines}
+
+次のJSON形式のみで、全ての商品について返してください（categoryは利用可能なカテゴリ名のいずれか）:
+{{"results": [{{"id": 1, "category": "カテゴリ名"}}]}}"""
+
+        for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+            try:
+                data = self.analyzer.generate_json(prompt, max_tokens=40 * len(names) + 100)
+                break
+            except Exception as e:
+                if attempt >= MAX_RATE_LIMIT_RETRIES or not is_rate_limit_error(e) or is_daily_quota_error(e):
+                    raise
+                delay = retry_delay_seconds(e)
+                logger.warning(f"Rate limit hit, waiting {delay} seconds...")
+                time.sleep(delay)
+
+        answers = {}
+        for item in data.get('results', []) if isinstance(data, dict) else []:
+            try:
+                answers[int(item['id'])] = str(item['category']).strip()
+            except (KeyError, TypeError, ValueError):
+                continue
+
+        results = []
+        for i in range(1, len(names) + 1):
+            category_name = answers.get(i)
+            if category_name not in self.categories:
+                if category_name:
+                    logger.warning(f"AI returned unknown category: {category_name}")
+                category_name = None
+            results.append(category_name)
+        missing = results.count(None)
+        if missing:
+            logger.warning(f"AI left {missing}/{len(names)} products unclassified")
+        return results
+
+    def _apply(self, products: Dict[str, Dict[str, Any]], resolved: Dict[str, Tuple[str, str]]):
+        """Assign categories to the purchases and store new results in the cache"""
+        if not resolved:
+            return
+
+        purchase_ids: Dict[int, List[int]] = defaultdict(list)
+        cache_rows = []
+        for key, (category_name, source) in resolved.items():
+            category_id = self.categories.get(category_name)
+            if category_id is None:
+                continue
+            purchase_ids[category_id].extend(products[key]['purchase_ids'])
+            if source != 'cache':
+                cache_rows.extend(
+                    {'cache_key': cache_key, 'category_id': category_id, 'source': source}
+                    for cache_key in products[key]['keys']
+                )
+
+        for category_id, ids in purchase_ids.items():
+            for chunk in _chunks(ids, 1000):
+                self.db.query(Purchase).filter(Purchase.id.in_(chunk))\
+                    .update({Purchase.category_id: category_id}, synchronize_session=False)
+
+        # Several products can share a name key; keep one row per key
+        unique_rows = list({row['cache_key']: row for row in cache_rows}.values())
+        for chunk in _chunks(unique_rows, 1000):
+            statement = insert(ProductCategoryCache).values(chunk)
+            self.db.execute(statement.on_conflict_do_update(
+                index_elements=[ProductCategoryCache.cache_key],
+                set_={
+                    'category_id': statement.excluded.category_id,
+                    'source': statement.excluded.source,
+                    'updated_at': func.now(),
+                },
+            ))
+
+        self.db.commit()
+
+
+def _chunks(items: List[Any], size: int) -> Iterable[List[Any]]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
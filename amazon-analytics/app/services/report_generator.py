@@ -3,20 +3,22 @@ import logging
 from typing import Dict, Any, List, Optional
 from datetime import datetime, timedelta
 from pathlib import Path
-from collections import defaultdict
 
 import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib
 matplotlib.use('Agg')  # Use non-GUI backend
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
+from sqlalchemy import func, and_, distinct
 
 from app.models.purchase import Purchase, Category
 from config.settings import settings
 
 logger = logging.getLogger(__name__)
 
+UNCATEGORIZED = '未分類'
+TOP_PRODUCTS_LIMIT = 10
+
 
 class ReportGenerator:
     """Generate reports and visualizations"""
@@ -30,6 +32,25 @@ class ReportGenerator:
         except:
             pass
     
+    def _in_period(self, start_date: datetime, end_date: datetime):
+        """Filter for purchases ordered in [start_date, end_date)"""
+        return and_(
+            Purchase.order_date >= start_date,
+            Purchase.order_date < end_date
+        )
+    
+    def _category_totals(self, start_date: datetime, end_date: datetime) -> Dict[str, float]:
+        """Spending per category (uncategorized purchases as 未分類), largest first"""
+        category_name = func.coalesce(Category.name, UNCATEGORIZED)
+        total = func.sum(Purchase.total_owed)
+        rows = self.db.query(category_name, total)\
+            .outerjoin(Category, Purchase.category_id == Category.id)\
+            .filter(self._in_period(start_date, end_date))\
+            .group_by(category_name)\
+            .order_by(total.desc())\
+            .all()
+        return {name: float(amount) for name, amount in rows}
+    
     def generate_monthly_report(self, year: int, month: int) -> Dict[str, Any]:
         """
         Generate monthly spending report
@@ -48,15 +69,20 @@ class ReportGenerator:
         else:
             end_date = datetime(year, month + 1, 1)
         
-        # Get purchases for the month
-        purchases = self.db.query(Purchase)\
-            .filter(and_(
-                Purchase.order_date >= start_date,
-                Purchase.order_date < end_date
-            ))\
-            .all()
+        prev_month = month - 1 if month > 1 else 12
+        prev_year = year if month > 1 else year - 1
+        prev_start = datetime(prev_year, prev_month, 1)
         
-        if not purchases:
+        # Totals for the month and the previous month in one scan
+        in_month = Purchase.order_date >= start_date
+        purchase_count, total_spent, unique_orders, prev_total = self.db.query(
+            func.count(Purchase.id).filter(in_month),
+            func.sum(Purchase.total_owed).filter(in_month),
+            func.count(distinct(Purchase.order_id)).filter(in_month),
+            func.sum(Purchase.total_owed).filter(Purchase.order_date < start_date),
+        ).filter(self._in_period(prev_start, end_date)).one()
+        
+        if not purchase_count:
             return {
                 'period': f'{year}年{month}月',
                 'total_spent': 0,
@@ -65,41 +91,30 @@ class ReportGenerator:
                 'top_products': [],
             }
         
-        # Calculate totals
-        total_spent = sum(p.total_owed for p in purchases)
-        
-        # Category breakdown
-        category_spending = defaultdict(float)
-        for purchase in purchases:
-            if purchase.category:
-                category_spending[purchase.category.name] += purchase.total_owed
-            else:
-                category_spending['未分類'] += purchase.total_owed
+        total_spent = float(total_spent)
+        prev_total = float(prev_total or 0)
         
         # Top products
-        product_list = []
-        for purchase in purchases:
-            product_list.append({
-                'name': purchase.product_name,
-                'price': purchase.total_owed,
-                'date': purchase.order_date,
-                'category': purchase.category.name if purchase.category else '未分類',
-            })
-        
-        product_list.sort(key=lambda x: x['price'], reverse=True)
-        top_products = product_list[:10]
-        
-        # Calculate previous month comparison
-        prev_month = month - 1 if month > 1 else 12
-        prev_year = year if month > 1 else year - 1
-        prev_start = datetime(prev_year, prev_month, 1)
-        prev_end = start_date
-        
-        prev_total = self.db.query(func.sum(Purchase.total_owed))\
-            .filter(and_(
-                Purchase.order_date >= prev_start,
-                Purchase.order_date < prev_end
-            )).scalar() or 0
+        top_rows = self.db.query(
+            Purchase.product_name,
+            Purchase.total_owed,
+            Purchase.order_date,
+            func.coalesce(Category.name, UNCATEGORIZED),
+        )\
+            .outerjoin(Category, Purchase.category_id == Category.id)\
+            .filter(self._in_period(start_date, end_date))\
+            .order_by(Purchase.total_owed.desc(), Purchase.id)\
+            .limit(TOP_PRODUCTS_LIMIT)\
+            .all()
+        top_products = [
+            {
+                'name': name,
+                'price': price,
+                'date': order_date,
+                'category': category,
+            }
+            for name, price, order_date, category in top_rows
+        ]
         
         change_pct = 0
         if prev_total > 0:
@@ -107,20 +122,14 @@ class ReportGenerator:
         
         return {
             'period': f'{year}年{month}月',
-            'total_spent': float(total_spent),
-            'purchase_count': len(purchases),
-            'unique_orders': len(set(p.order_id for p in purchases)),
-            'categories': {
-                k: float(v) for k, v in sorted(
-                    category_spending.items(),
-                    key=lambda x: x[1],
-                    reverse=True
-                )
-            },
+            'total_spent': total_spent,
+            'purchase_count': purchase_count,
+            'unique_orders': unique_orders,
+            'categories': self._category_totals(start_date, end_date),
             'top_products': top_products,
             'comparison': {
-                'previous_month': float(prev_total),
-                'change_amount': float(total_spent - prev_total),
+                'previous_month': prev_total,
+                'change_amount': total_spent - prev_total,
                 'change_percentage': round(change_pct, 1),
             }
         }
@@ -137,16 +146,15 @@ class ReportGenerator:
         """
         start_date = datetime(year, 1, 1)
         end_date = datetime(year + 1, 1, 1)
+        in_year = self._in_period(start_date, end_date)
         
-        # Get all purchases for the year
-        purchases = self.db.query(Purchase)\
-            .filter(and_(
-                Purchase.order_date >= start_date,
-                Purchase.order_date < end_date
-            ))\
-            .all()
+        purchase_count, total_spent, unique_orders = self.db.query(
+            func.count(Purchase.id),
+            func.sum(Purchase.total_owed),
+            func.count(distinct(Purchase.order_id)),
+        ).filter(in_year).one()
         
-        if not purchases:
+        if not purchase_count:
             return {
                 'year': year,
                 'total_spent': 0,
@@ -155,53 +163,45 @@ class ReportGenerator:
                 'top_products': [],
             }
         
-        # Total spending
-        total_spent = sum(p.total_owed for p in purchases)
-        
         # Monthly breakdown
-        monthly_spending = defaultdict(float)
-        for purchase in purchases:
-            month_key = purchase.order_date.strftime('%Y-%m')
-            monthly_spending[month_key] += purchase.total_owed
-        
-        # Category totals
-        category_totals = defaultdict(float)
-        for purchase in purchases:
-            if purchase.category:
-                category_totals[purchase.category.name] += purchase.total_owed
-            else:
-                category_totals['未分類'] += purchase.total_owed
-        
-        # Top products (by frequency)
-        product_counts = defaultdict(lambda: {'count': 0, 'total': 0, 'name': ''})
-        for purchase in purchases:
-            key = purchase.asin if purchase.asin else purchase.product_name[:50]
-            product_counts[key]['count'] += 1
-            product_counts[key]['total'] += purchase.total_owed
-            product_counts[key]['name'] = purchase.product_name
-        
-        top_by_freq = sorted(
-            product_counts.values(),
-            key=lambda x: x['count'],
-            reverse=True
-        )[:10]
+        month_key = func.to_char(Purchase.order_date, 'YYYY-MM')
+        monthly_rows = self.db.query(month_key, func.sum(Purchase.total_owed))\
+            .filter(in_year)\
+            .group_by(month_key)\
+            .order_by(month_key)\
+            .all()
+        
+        # Top products (by frequency), grouped by ASIN or the start of the product name.
+        # Window functions give each group's count and total, and the name of its latest purchase.
+        product_key = func.coalesce(func.nullif(Purchase.asin, ''), func.left(Purchase.product_name, 50))
+        per_product = self.db.query(
+            Purchase.product_name.label('name'),
+            func.count(Purchase.id).over(partition_by=product_key).label('purchase_count'),
+            func.sum(Purchase.total_owed).over(partition_by=product_key).label('total'),
+            func.row_number().over(
+                partition_by=product_key,
+                order_by=(Purchase.order_date.desc(), Purchase.id.desc())
+            ).label('recency'),
+        ).filter(in_year).subquery()
+        frequency_rows = self.db.query(per_product.c.purchase_count, per_product.c.total, per_product.c.name)\
+            .filter(per_product.c.recency == 1)\
+            .order_by(per_product.c.purchase_count.desc(), per_product.c.total.desc())\
+            .limit(TOP_PRODUCTS_LIMIT)\
+            .all()
         
         return {
             'year': year,
             'total_spent': float(total_spent),
-            'purchase_count': len(purchases),
-            'unique_orders': len(set(p.order_id for p in purchases)),
+            'purchase_count': purchase_count,
+            'unique_orders': unique_orders,
             'monthly_breakdown': {
-                k: float(v) for k, v in sorted(monthly_spending.items())
-            },
-            'categories': {
-                k: float(v) for k, v in sorted(
-                    category_totals.items(),
-                    key=lambda x: x[1],
-                    reverse=True
-                )
+                k: float(v) for k, v in monthly_rows
             },
-            'top_products_by_frequency': top_by_freq,
+            'categories': self._category_totals(start_date, end_date),
+            'top_products_by_frequency': [
+                {'count': count, 'total': float(total), 'name': name}
+                for count, total, name in frequency_rows
+            ],
         }
     
     def generate_category_chart(
@@ -42,10 +42,8 @@ document.addEventListener('DOMContentLoaded', function() {
         e.preventDefault();
         dropZone.classList.remove('dragover');
         
-        const files = e.dataTransfer.files;
-        if (files.length > 0) {
-            uploadFile(files[0]);
-        }
+        // 複数ファイルは並行してインポート（サーバー側で同時実行数を制限）
+        Array.from(e.dataTransfer.files).forEach(uploadFile);
     });
     
     dropZone.addEventListener('click', () => {
@@ -178,10 +176,42 @@ function updateCategoryChart(categories) {
 }
 
 function handleFileSelect(e) {
-    const file = e.target.files[0];
-    if (file) {
-        uploadFile(file);
-    }
+    Array.from(e.target.files).forEach(uploadFile);
+    e.target.value = '';
+}
+
+function formatSeconds(seconds) {
+    if (seconds === null || seconds === undefined) return '';
+    if (seconds < 60) return `${Math.round(seconds)}秒`;
+    return `${Math.floor(seconds / 60)}分${Math.round(seconds % 60)}秒`;
+}
+
+function createUploadStatus(fileName) {
+    // ファイルごとに進捗表示を作成
+    const statusDiv = document.getElementById('upload-status');
+    statusDiv.style.display = 'block';
+    
+    const item = document.createElement('div');
+    item.className = 'upload-job';
+    item.innerHTML = `
+        <p class="status-text"></p>
+        <div class="progress-bar">
+            <div class="progress-fill"></div>
+        </div>
+    `;
+    item.querySelector('.status-text').textContent = `${fileName}: アップロード中...`;
+    statusDiv.appendChild(item);
+    return item;
+}
+
+function removeUploadStatus(item) {
+    setTimeout(() => {
+        item.remove();
+        const statusDiv = document.getElementById('upload-status');
+        if (!statusDiv.querySelector('.upload-job')) {
+            statusDiv.style.display = 'none';
+        }
+    }, 3000);
 }
 
 async function uploadFile(file) {
@@ -193,13 +223,10 @@ async function uploadFile(file) {
     const formData = new FormData();
     formData.append('file', file);
     
-    const statusDiv = document.getElementById('upload-status');
-    const statusText = statusDiv.querySelector('.status-text');
-    const progressFill = statusDiv.querySelector('.progress-fill');
-    
-    statusDiv.style.display = 'block';
-    statusText.textContent = 'アップロード中...';
-    progressFill.style.width = '50%';
+    const item = createUploadStatus(file.name);
+    const statusText = item.querySelector('.status-text');
+    const progressFill = item.querySelector('.progress-fill');
+    progressFill.style.width = '5%';
     
     try {
         const response = await fetch(apiPath('/api/upload'), {
@@ -210,29 +237,67 @@ async function uploadFile(file) {
         
         const result = await response.json();
         
-        if (response.ok && result.success) {
-            progressFill.style.width = '100%';
-            statusText.textContent = `✓ 成功: ${result.record_count}件のデータをインポートしました`;
-            statusText.className = 'status-text status-success';
-            
-            // Refresh data
-            setTimeout(() => {
-                loadStatistics();
-                loadImportHistory();
-                statusDiv.style.display = 'none';
-                progressFill.style.width = '0%';
-            }, 2000);
-        } else {
+        if (!response.ok || !result.success) {
             throw new Error(result.detail || 'アップロードに失敗しました');
         }
+        
+        statusText.textContent = `${file.name}: インポート待ち...`;
+        watchImportJob(result.job_id, file.name, item);
     } catch (error) {
-        progressFill.style.width = '100%';
-        progressFill.style.background = '#dc3545';
-        statusText.textContent = '✗ エラー: ' + error.message;
-        statusText.className = 'status-text status-error';
+        showImportError(item, file.name, error.message);
     }
 }
 
+function watchImportJob(jobId, fileName, item) {
+    // インポートの進捗をSSEで受け取る
+    const statusText = item.querySelector('.status-text');
+    const progressFill = item.querySelector('.progress-fill');
+    const events = new EventSource(apiPath(`/api/import-jobs/${jobId}/events`), { withCredentials: true });
+    
+    events.addEventListener('progress', (e) => {
+        const job = JSON.parse(e.data);
+        
+        if (!job.finished) {
+            if (job.status === 'processing') {
+                const total = job.total_rows ? ` / 約${job.total_rows.toLocaleString()}` : '';
+                const eta = job.eta_seconds !== null ? ` - 残り約${formatSeconds(job.eta_seconds)}` : '';
+                statusText.textContent = `${fileName}: 解析 ${job.rows_parsed.toLocaleString()}件, ` +
+                    `保存 ${job.rows_stored.toLocaleString()}${total}件${eta}`;
+                progressFill.style.width = `${Math.max(5, Math.round((job.progress || 0) * 100))}%`;
+            }
+            return;
+        }
+        
+        events.close();
+        if (job.status === 'success') {
+            progressFill.style.width = '100%';
+            statusText.textContent = `✓ ${fileName}: ${job.record_count}件のデータをインポートしました` +
+                `（更新 ${job.updated_count}件, 重複スキップ ${job.skipped_count}件, ${formatSeconds(job.elapsed_seconds)}）`;
+            statusText.className = 'status-text status-success';
+            loadStatistics();
+            loadImportHistory();
+            removeUploadStatus(item);
+        } else {
+            showImportError(item, fileName, job.error_message || job.status);
+            loadImportHistory();
+        }
+    });
+    
+    events.onerror = () => {
+        // 接続が切れた場合はEventSourceが自動で再接続する
+        console.warn(`Import job ${jobId}: progress stream interrupted`);
+    };
+}
+
+function showImportError(item, fileName, message) {
+    const statusText = item.querySelector('.status-text');
+    const progressFill = item.querySelector('.progress-fill');
+    progressFill.style.width = '100%';
+    progressFill.style.background = '#dc3545';
+    statusText.textContent = `✗ ${fileName}: エラー: ${message}`;
+    statusText.className = 'status-text status-error';
+}
+
 async function loadImportHistory() {
     try {
         const response = await fetch(apiPath('/api/import-history'), {
@@ -399,12 +464,16 @@ async function autoClassify() {
         const result = await response.json();
         
         if (response.ok) {
+            const stats = result.stats || {};
+            const localCount = (stats.cache || 0) + (stats.history || 0) + (stats.rule || 0);
             progressArea.innerHTML = `
                 <div style="color: #28a745; display: flex; align-items: center;">
                     <span style="font-size: 1.2em; margin-right: 8px;">✅</span>
                     <strong>分類が完了しました！</strong>
                 </div>
                 <div style="margin-top: 10px; color: #666;">
+                    ${stats.total || 0}件（${stats.unique_products || 0}商品）: キャッシュ・履歴・ルール ${localCount}件, 
+                    AI ${stats.llm || 0}件（${stats.llm_requests || 0}リクエスト）, 未分類 ${stats.unclassified || 0}件<br>
                     統計データを更新しています...
                 </div>
             `;
@@ -49,9 +49,16 @@ class Settings(BaseSettings):
     # CSV Processing
     MAX_FILE_SIZE_MB: int = 10
     ALLOWED_EXTENSIONS: list = [".csv"]
+    CSV_CHUNK_SIZE: int = 20000  # Rows parsed per chunk (large exports are read incrementally)
+    IMPORT_BATCH_SIZE: int = 1000  # Rows per INSERT ... ON CONFLICT statement
+    IMPORT_MAX_WORKERS: int = 2  # Concurrent background imports per server process
+    IMPORT_PROGRESS_INTERVAL: float = 1.0  # Seconds between progress events (SSE)
+    IMPORT_STALE_MINUTES: int = 30  # Running imports with no progress for this long are marked failed on startup
     
     # Analysis
     CATEGORY_CONFIDENCE_THRESHOLD: float = 0.7
+    CLASSIFY_BATCH_SIZE: int = 40  # Products per LLM classification request
+    CLASSIFY_REQUEST_INTERVAL: float = 4.0  # Seconds between LLM requests (free tier: 15 req/min)
     IMPULSE_BUY_THRESHOLD_DAYS: int = 7
     IMPULSE_BUY_COUNT: int = 3
     
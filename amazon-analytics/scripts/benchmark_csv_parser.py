@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+CSV parser benchmark
+
+Generates a synthetic Retail.OrderHistory CSV and compares the row-by-row
+parser (iterrows + per-cell parsing) with the column-wise chunked parser.
+
+Usage:
+    python scripts/benchmark_csv_parser.py [--rows 50000] [--chunk-size 20000]
+"""
+import argparse
+import csv
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pandas as pd  # noqa: E402
+
+from app.services.csv_parser import AmazonCSVParser  # noqa: E402
+
+COLUMNS = [
+    'Website', 'Order ID', 'Order Date', 'Purchase Order Number', 'Currency',
+    'Unit Price', 'Unit Price Tax', 'Shipping Charge', 'Total Discounts', 'Total Owed',
+    'Shipment Item Subtotal', 'Shipment Item Subtotal Tax', 'ASIN', 'Product Condition',
+    'Quantity', 'Payment Instrument Type', 'Order Status', 'Shipment Status', 'Ship Date',
+    'Shipping Option', 'Shipping Address', 'Billing Address', 'Carrier Name & Tracking Number',
+    'Product Name', 'Gift Message', 'Gift Sender Name', 'Gift Recipient Contact Details',
+    'Item Serial Number',
+]
+
+
+def generate_csv(path: Path, rows: int, seed: int = 42):
+    """Write a synthetic order history export"""
+    rng = random.Random(seed)
+    start = datetime(2015, 1, 1)
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        for i in range(rows):
+            order_date = start + timedelta(seconds=rng.randint(0, 10 * 365 * 86400))
+            price = rng.randint(100, 50000)
+            shipped = rng.random() > 0.05
+            writer.writerow([
+                'Amazon.co.jp',
+                f'250-{i // 3:07d}-{rng.randint(0, 9999999):07d}',
+                order_date.strftime('%Y-%m-%dT%H:%M:%S.') + f'{rng.randint(0, 999):03d}Z',
+                'Not Applicable',
+                'JPY',
+                f"'{price:,}'",
+                f"'{price // 10:,}'",
+                "'0'" if rng.random() > 0.2 else "'350'",
+                f"'-{rng.randint(0, 500)}'" if rng.random() > 0.8 else "'0'",
+                f"'{price + price // 10:,}'",
+                f"'{price:,}'",
+                f"'{price // 10:,}'",
+                f'B0{rng.randint(0, 99999999):08d}',
+                'New',
+                str(rng.randint(1, 3)),
+                'Visa - 1234',
+                'Closed',
+                'Shipped' if shipped else 'Not Available',
+                (order_date + timedelta(days=1)).strftime('%Y-%m-%dT%H:%M:%SZ') if shipped else 'Not Available',
+                'next-1dc',
+                '山田 太郎 東京都千代田区1-1-1 100-0001 日本',
+                '山田 太郎 東京都千代田区1-1-1 100-0001 日本',
+                'AMZN_JP(1234567890)',
+                f'サンプル商品 {rng.randint(0, 5000)} - 容量 {rng.randint(1, 10)}個セット',
+                'Not Available', 'Not Available', 'Not Available', 'Not Available',
+            ])
+
+
+def parse_rowwise(parser: AmazonCSVParser, path: Path):
+    """Row-by-row parsing (previous implementation)"""
+    df = pd.read_csv(path, encoding='utf-8')
+    orders = []
+    for idx, row in df.iterrows():
+        try:
+            order = parser._parse_retail_row(row)
+            if order:
+                orders.append(order)
+        except Exception:
+            continue
+    return orders
+
+
+def parse_columnwise(parser: AmazonCSVParser, path: Path, chunk_size: int):
+    """Column-wise chunked parsing"""
+    orders = []
+    for batch in parser.iter_retail_order_history(path, chunk_size=chunk_size):
+        orders.extend(batch)
+    return orders
+
+
+def compare(rowwise, columnwise):
+    """Check that both parsers produce the same values for the stored fields"""
+    assert len(rowwise) == len(columnwise), f"{len(rowwise)} != {len(columnwise)}"
+    fields = ['order_id', 'order_date', 'unit_price', 'unit_price_tax', 'shipping_charge',
+              'total_discounts', 'total_owed', 'quantity', 'ship_date', 'asin']
+    for old, new in zip(rowwise, columnwise):
+        for field in fields:
+            if old[field] != new[field]:
+                raise AssertionError(f"{field} differs for {old['order_id']}: {old[field]!r} != {new[field]!r}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--chunk-size', type=int, default=20000)
+    args = parser.parse_args()
+
+    csv_parser = AmazonCSVParser()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'Retail.OrderHistory.3.csv'
+        generate_csv(path, args.rows)
+        print(f"Synthetic CSV: {args.rows} rows, {path.stat().st_size / 1024 / 1024:.1f} MB")
+
+        start = time.perf_counter()
+        columnwise = parse_columnwise(csv_parser, path, args.chunk_size)
+        columnwise_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        rowwise = parse_rowwise(csv_parser, path)
+        rowwise_seconds = time.perf_counter() - start
+
+        compare(rowwise, columnwise)
+
+    print(f"Row-by-row:  {rowwise_seconds:8.2f}s ({len(rowwise) / rowwise_seconds:,.0f} rows/s)")
+    print(f"Column-wise: {columnwise_seconds:8.2f}s ({len(columnwise) / columnwise_seconds:,.0f} rows/s)")
+    print(f"Speedup:     {rowwise_seconds / columnwise_seconds:8.1f}x (outputs match)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Purchase import (bulk upsert) benchmark
+
+Imports a synthetic Retail.OrderHistory CSV into a scratch schema of a
+PostgreSQL database and checks the ON CONFLICT upsert path:
+
+- first import: every unique line is inserted
+- re-import of the same file: every line is skipped
+- re-import with changed order statuses: exactly those lines are updated
+- adding the natural-key index to a table with duplicates keeps one row each
+
+It also times storing the parsed lines against the previous implementation
+(one SELECT per line, ORM inserts). The scratch schema is dropped afterwards.
+
+Usage:
+    python scripts/benchmark_import_upsert.py [--rows 50000] [--database-url postgresql://...]
+"""
+import argparse
+import csv
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import create_engine, func, text  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.models.database import Base, _create_purchase_natural_key  # noqa: E402
+from app.models.purchase import Purchase  # noqa: E402
+from app.services.csv_parser import csv_parser  # noqa: E402
+from app.services.data_processor import DataProcessor  # noqa: E402
+from config.settings import settings  # noqa: E402
+from benchmark_csv_parser import generate_csv  # noqa: E402
+
+SCHEMA = 'import_benchmark'
+
+
+def change_statuses(source: Path, target: Path, every: int = 10) -> int:
+    """Copy the CSV with the order status of every n-th line changed"""
+    changed = 0
+    with open(source, encoding='utf-8', newline='') as f_in, open(target, 'w', encoding='utf-8', newline='') as f_out:
+        reader = csv.DictReader(f_in)
+        writer = csv.DictWriter(f_out, fieldnames=reader.fieldnames)
+        writer.writeheader()
+        for i, row in enumerate(reader):
+            if i % every == 0:
+                row['Order Status'] = 'Cancelled'
+                changed += 1
+            writer.writerow(row)
+    return changed
+
+
+def legacy_store_orders(db, orders) -> int:
+    """Previous implementation: one SELECT per line, ORM inserts"""
+    saved_count = 0
+    for order_data in orders:
+        existing = db.query(Purchase).filter(
+            Purchase.order_id == order_data['order_id'],
+            Purchase.product_name == order_data['product_name'],
+            Purchase.order_date == order_data['order_date'],
+        ).first()
+        if existing:
+            continue
+        db.add(Purchase(**order_data))
+        saved_count += 1
+    db.commit()
+    return saved_count
+
+
+def import_file(Session, path: Path):
+    with Session() as db:
+        start = time.perf_counter()
+        record = DataProcessor(db).import_csv_file(path)
+        elapsed = time.perf_counter() - start
+        counts = (record.inserted_count, record.updated_count, record.skipped_count)
+        total = db.query(func.count(Purchase.id)).scalar()
+    return elapsed, counts, total
+
+
+def check(label: str, actual, expected):
+    if actual != expected:
+        raise AssertionError(f"{label}: expected {expected}, got {actual}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--database-url', default=settings.DATABASE_URL)
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url, connect_args={'options': f'-csearch_path={SCHEMA}'})
+    with engine.begin() as conn:
+        conn.execute(text(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE'))
+        conn.execute(text(f'CREATE SCHEMA {SCHEMA}'))
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'Retail.OrderHistory.1.csv'
+            changed_path = Path(tmp) / 'Retail.OrderHistory.2.csv'
+            generate_csv(path, args.rows)
+            changed = change_statuses(path, changed_path)
+
+            orders = csv_parser.parse_retail_order_history(path)
+            unique = len({(o['order_id'], o['order_date'], o['product_name']) for o in orders})
+            print(f"Synthetic CSV: {args.rows:,} rows, {len(orders):,} parsed, {unique:,} unique lines")
+
+            first_seconds, counts, total = import_file(Session, path)
+            check("first import (inserted, updated, skipped)", counts, (unique, 0, len(orders) - unique))
+            check("rows after first import", total, unique)
+
+            again_seconds, counts, total = import_file(Session, path)
+            check("re-import (inserted, updated, skipped)", counts, (0, 0, len(orders)))
+            check("rows after re-import", total, unique)
+
+            changed_seconds, counts, total = import_file(Session, changed_path)
+            check("status change re-import (inserted, updated)", counts[:2], (0, changed))
+            check("rows after status change", total, unique)
+            with Session() as db:
+                cancelled = db.query(func.count(Purchase.id)).filter(Purchase.order_status == 'Cancelled').scalar()
+            check("cancelled rows", cancelled, changed)
+
+            # Storing already imported lines (the re-import case), without parsing
+            with Session() as db:
+                start = time.perf_counter()
+                stored = DataProcessor(db)._store_orders(orders)
+                upsert_seconds = time.perf_counter() - start
+            check("upsert of imported lines (inserted)", stored['inserted'], 0)
+            with Session() as db:
+                start = time.perf_counter()
+                saved = legacy_store_orders(db, orders)
+                legacy_seconds = time.perf_counter() - start
+            check("per-line store of imported lines (saved)", saved, 0)
+
+        # Natural-key index on a table that already has duplicates (init_db on old databases)
+        with engine.begin() as conn:
+            conn.execute(text('DROP INDEX uq_purchase_natural_key'))
+            duplicates = conn.execute(text(
+                "INSERT INTO purchases (order_id, order_date, product_name, unit_price, total_owed) "
+                "SELECT order_id, order_date, product_name, unit_price, total_owed FROM purchases "
+                "WHERE id % 7 = 0"
+            )).rowcount
+            _create_purchase_natural_key(conn)
+        with Session() as db:
+            check("rows after index migration", db.query(func.count(Purchase.id)).scalar(), unique)
+            index = db.execute(text(
+                "SELECT 1 FROM pg_indexes WHERE schemaname = current_schema() "
+                "AND indexname = 'uq_purchase_natural_key'"
+            )).first()
+            check("natural-key index exists", index is not None, True)
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE'))
+        engine.dispose()
+
+    print(f"First import:           {first_seconds:8.2f}s ({unique:,} inserted)")
+    print(f"Re-import (unchanged):  {again_seconds:8.2f}s ({len(orders):,} skipped)")
+    print(f"Re-import ({changed:,} changed): {changed_seconds:8.2f}s ({changed:,} updated)")
+    print(f"Store {len(orders):,} imported lines:")
+    print(f"  Per-line SELECT:      {legacy_seconds:8.2f}s")
+    print(f"  Bulk upsert:          {upsert_seconds:8.2f}s ({legacy_seconds / upsert_seconds:.1f}x)")
+    print(f"Index migration removed {duplicates:,} duplicates")
+    print("All checks passed")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Report generation benchmark
+
+Loads synthetic purchases into a scratch schema of a PostgreSQL database and
+compares the previous report implementation (load every Purchase, lazy-load
+categories, aggregate in Python) with the SQL aggregates in ReportGenerator.
+
+The scratch schema is dropped afterwards, so the application tables are not touched.
+
+Usage:
+    python scripts/benchmark_reports.py [--purchases 100000] [--database-url postgresql://...]
+"""
+import argparse
+import random
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import create_engine, func, insert, text  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.models.database import Base  # noqa: E402
+from app.models.purchase import Purchase, Category  # noqa: E402
+from app.services.report_generator import ReportGenerator  # noqa: E402
+from config.settings import settings  # noqa: E402
+
+SCHEMA = 'report_benchmark'
+CATEGORIES = ['本・雑誌', '家電・カメラ', 'パソコン・周辺機器', '食品・飲料', '日用品', 'ファッション', 'ホーム・キッチン', 'その他']
+
+
+def load_purchases(session, purchases: int, seed: int = 42):
+    """Insert categories and synthetic purchases spread over three years"""
+    rng = random.Random(seed)
+    category_ids = session.execute(
+        insert(Category).returning(Category.id),
+        [{'name': name} for name in CATEGORIES]
+    ).scalars().all()
+
+    start = datetime(2022, 1, 1)
+    products = [
+        (f'B0{i:08d}' if rng.random() > 0.1 else '', f'サンプル商品 {i} - 容量 {rng.randint(1, 10)}個セット')
+        for i in range(max(purchases // 20, 1))
+    ]
+    rows = []
+    for i in range(purchases):
+        asin, name = rng.choice(products)
+        price = float(rng.randint(100, 50000))
+        rows.append({
+            'order_id': f'250-{i // 3:07d}-{rng.randint(0, 9999999):07d}',
+            'order_date': start + timedelta(seconds=rng.randint(0, 3 * 365 * 86400)),
+            'product_name': name,
+            'asin': asin,
+            'unit_price': price,
+            'total_owed': price,
+            'quantity': 1,
+            # About a fifth of purchases are left unclassified
+            'category_id': rng.choice(category_ids) if rng.random() > 0.2 else None,
+        })
+        if len(rows) == 10000:
+            session.execute(insert(Purchase), rows)
+            rows = []
+    if rows:
+        session.execute(insert(Purchase), rows)
+    session.commit()
+    session.execute(text('ANALYZE'))
+    session.commit()
+
+
+def legacy_monthly_report(db, year: int, month: int):
+    """Monthly report as computed before (all rows loaded, aggregated in Python)"""
+    start_date = datetime(year, month, 1)
+    end_date = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+    purchases = db.query(Purchase).filter(
+        Purchase.order_date >= start_date, Purchase.order_date < end_date
+    ).all()
+    if not purchases:
+        return None
+
+    total_spent = sum(p.total_owed for p in purchases)
+    category_spending = defaultdict(float)
+    for purchase in purchases:
+        category_spending[purchase.category.name if purchase.category else '未分類'] += purchase.total_owed
+    product_list = [{
+        'name': p.product_name,
+        'price': p.total_owed,
+        'date': p.order_date,
+        'category': p.category.name if p.category else '未分類',
+    } for p in purchases]
+    product_list.sort(key=lambda x: x['price'], reverse=True)
+
+    prev_start = datetime(year if month > 1 else year - 1, month - 1 if month > 1 else 12, 1)
+    prev_total = db.query(func.sum(Purchase.total_owed)).filter(
+        Purchase.order_date >= prev_start, Purchase.order_date < start_date
+    ).scalar() or 0
+    return {
+        'total_spent': float(total_spent),
+        'purchase_count': len(purchases),
+        'unique_orders': len(set(p.order_id for p in purchases)),
+        'categories': dict(sorted(category_spending.items(), key=lambda x: x[1], reverse=True)),
+        'top_products': product_list[:10],
+        'previous_month': float(prev_total),
+    }
+
+
+def legacy_yearly_report(db, year: int):
+    """Yearly report as computed before (all rows loaded, aggregated in Python)"""
+    purchases = db.query(Purchase).filter(
+        Purchase.order_date >= datetime(year, 1, 1), Purchase.order_date < datetime(year + 1, 1, 1)
+    ).all()
+    if not purchases:
+        return None
+
+    monthly_spending = defaultdict(float)
+    category_totals = defaultdict(float)
+    product_counts = defaultdict(lambda: {'count': 0, 'total': 0, 'name': ''})
+    for purchase in purchases:
+        monthly_spending[purchase.order_date.strftime('%Y-%m')] += purchase.total_owed
+        category_totals[purchase.category.name if purchase.category else '未分類'] += purchase.total_owed
+        key = purchase.asin if purchase.asin else purchase.product_name[:50]
+        product_counts[key]['count'] += 1
+        product_counts[key]['total'] += purchase.total_owed
+        product_counts[key]['name'] = purchase.product_name
+    return {
+        'total_spent': float(sum(p.total_owed for p in purchases)),
+        'purchase_count': len(purchases),
+        'unique_orders': len(set(p.order_id for p in purchases)),
+        'monthly_breakdown': dict(sorted(monthly_spending.items())),
+        'categories': dict(sorted(category_totals.items(), key=lambda x: x[1], reverse=True)),
+        'top_counts': sorted((p['count'] for p in product_counts.values()), reverse=True)[:10],
+    }
+
+
+def assert_close(label: str, old: float, new: float):
+    if abs(old - new) > 0.01:
+        raise AssertionError(f"{label} differs: {old!r} != {new!r}")
+
+
+def compare_monthly(old, new):
+    """Check that both implementations agree (ties in top-N may be ordered differently)"""
+    for field in ['total_spent', 'purchase_count', 'unique_orders']:
+        assert_close(field, old[field], new[field])
+    assert_close('previous_month', old['previous_month'], new['comparison']['previous_month'])
+    assert old['categories'].keys() == new['categories'].keys(), "category names differ"
+    for name, amount in old['categories'].items():
+        assert_close(f"category {name}", amount, new['categories'][name])
+    assert [p['price'] for p in old['top_products']] == [p['price'] for p in new['top_products']], "top products differ"
+
+
+def compare_yearly(old, new):
+    """Check that both implementations agree (ties in top-N may be ordered differently)"""
+    for field in ['total_spent', 'purchase_count', 'unique_orders']:
+        assert_close(field, old[field], new[field])
+    assert list(old['monthly_breakdown']) == list(new['monthly_breakdown']), "months differ"
+    for month, amount in old['monthly_breakdown'].items():
+        assert_close(f"month {month}", amount, new['monthly_breakdown'][month])
+    assert old['categories'].keys() == new['categories'].keys(), "category names differ"
+    for name, amount in old['categories'].items():
+        assert_close(f"category {name}", amount, new['categories'][name])
+    assert old['top_counts'] == [p['count'] for p in new['top_products_by_frequency']], "top products differ"
+
+
+def timed(fn, *args, repeat: int = 3):
+    """Best of `repeat` runs (seconds) and the last result"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--purchases', type=int, default=100000)
+    parser.add_argument('--database-url', default=settings.DATABASE_URL)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url, connect_args={'options': f'-csearch_path={SCHEMA}'})
+    with engine.begin() as conn:
+        conn.execute(text(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE'))
+        conn.execute(text(f'CREATE SCHEMA {SCHEMA}'))
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+
+    try:
+        with Session() as session:
+            start = time.perf_counter()
+            load_purchases(session, args.purchases)
+            print(f"Loaded {args.purchases:,} synthetic purchases in {time.perf_counter() - start:.1f}s")
+
+        # Fresh sessions so the legacy version cannot reuse already loaded objects
+        def legacy_monthly():
+            with Session() as db:
+                return legacy_monthly_report(db, 2023, 6)
+
+        def legacy_yearly():
+            with Session() as db:
+                return legacy_yearly_report(db, 2023)
+
+        def sql_monthly():
+            with Session() as db:
+                return ReportGenerator(db).generate_monthly_report(2023, 6)
+
+        def sql_yearly():
+            with Session() as db:
+                return ReportGenerator(db).generate_yearly_report(2023)
+
+        legacy_monthly_seconds, old_monthly = timed(legacy_monthly, repeat=args.repeat)
+        sql_monthly_seconds, new_monthly = timed(sql_monthly, repeat=args.repeat)
+        compare_monthly(old_monthly, new_monthly)
+
+        legacy_yearly_seconds, old_yearly = timed(legacy_yearly, repeat=args.repeat)
+        sql_yearly_seconds, new_yearly = timed(sql_yearly, repeat=args.repeat)
+        compare_yearly(old_yearly, new_yearly)
+
+        # Parity over every period of the data set, plus an empty one
+        with Session() as db:
+            generator = ReportGenerator(db)
+            for year in (2022, 2023, 2024):
+                compare_yearly(legacy_yearly_report(db, year), generator.generate_yearly_report(year))
+                for month in range(1, 13):
+                    compare_monthly(legacy_monthly_report(db, year, month),
+                                    generator.generate_monthly_report(year, month))
+            assert legacy_yearly_report(db, 2021) is None and generator.generate_yearly_report(2021) == {
+                'year': 2021, 'total_spent': 0, 'monthly_breakdown': {}, 'categories': {}, 'top_products': [],
+            }, "empty yearly report differs"
+            assert legacy_monthly_report(db, 2021, 5) is None and generator.generate_monthly_report(2021, 5) == {
+                'period': '2021年5月', 'total_spent': 0, 'purchase_count': 0, 'categories': {}, 'top_products': [],
+            }, "empty monthly report differs"
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE'))
+        engine.dispose()
+
+    print(f"Monthly report ({new_monthly['purchase_count']:,} purchases):")
+    print(f"  Python loops:   {legacy_monthly_seconds * 1000:9.1f} ms")
+    print(f"  SQL aggregates: {sql_monthly_seconds * 1000:9.1f} ms ({legacy_monthly_seconds / sql_monthly_seconds:.1f}x)")
+    print(f"Yearly report ({new_yearly['purchase_count']:,} purchases):")
+    print(f"  Python loops:   {legacy_yearly_seconds * 1000:9.1f} ms")
+    print(f"  SQL aggregates: {sql_yearly_seconds * 1000:9.1f} ms ({legacy_yearly_seconds / sql_yearly_seconds:.1f}x)")
+    print("Outputs match (36 months, 3 years and an empty period checked)")
+
+
+if __name__ == '__main__':
+    main()
@@ -263,6 +263,14 @@ async def startup_event():
         import traceback
         logger.error(f"トレースバック:\n{traceback.format_exc()}")
     
+    # デプロイ後にサービング中のコレクションが空になっていれば再登録する（Celeryワーカーで実行）
+    if RAG_ENABLED:
+        try:
+            from app.workers.rag_tasks import sync_new_documents
+            sync_new_documents.delay()
+        except Exception as e:
+            logger.error(f"ベクトルインデックス同期タスクの登録失敗: {e}")
+    
     logger.info("アプリケーション起動完了")
 
 
@@ -2,11 +2,16 @@
 ドキュメント管理用ルーター
 """
 from fastapi import APIRouter, HTTPException, Depends, Query
-from fastapi.responses import FileResponse, Response
+from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import desc, func
 from app.models.database import get_db
 from app.models.document import Document
+from app.services.file_storage_service import remove_document_file
+from app.services.rag_cache_service import invalidate_documents
+from app.services.zip_stream_service import ZipEntry, stream_zip
+from app.services.text_search_service import build_tsquery, is_indexable_query
+from app.workers.runtime import get_stage_stats
 from typing import Optional
 from datetime import datetime, timezone
 from urllib.parse import quote
@@ -14,8 +19,6 @@ from pydantic import BaseModel
 import logging
 import pytz
 import os
-import zipfile
-import io
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -60,11 +63,19 @@ async def list_documents(
         if category:
             query = query.filter(Document.category == category)
         if search:
-            query = query.filter(
-                (Document.original_filename.contains(search)) |
-                (Document.ocr_text.contains(search)) |
-                (Document.summary.contains(search))
-            )
+            if is_indexable_query(search):
+                # 全文検索インデックス（GIN）で検索（ファイル名は部分一致も併用）
+                query = query.filter(
+                    (Document.original_filename.contains(search)) |
+                    (Document.search_vector.op("@@")(build_tsquery(search, match_all=True)))
+                )
+            else:
+                # 日本語1文字などインデックスで引けない語は部分一致
+                query = query.filter(
+                    (Document.original_filename.contains(search)) |
+                    (Document.ocr_text.contains(search)) |
+                    (Document.summary.contains(search))
+                )
         
         # ページング
         total = query.count()
@@ -191,34 +202,22 @@ async def batch_download_documents(
         if not documents:
             raise HTTPException(status_code=404, detail="ドキュメントが見つかりません")
         
-        # ZIPファイルをメモリ上に作成
-        zip_buffer = io.BytesIO()
+        # 元ファイルを読みながらZIPを順次送信（アーカイブ全体をメモリに作らない）
+        # 同名ファイルの衝突を避けるため、IDをプレフィックスとして追加
+        entries = [
+            ZipEntry(name=f"{doc.id}_{doc.original_filename}", path=doc.file_path)
+            for doc in documents
+        ]
         
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            for doc in documents:
-                # ファイルの存在確認
-                if not os.path.exists(doc.file_path):
-                    logger.warning(f"ファイルが見つかりません: {doc.file_path}")
-                    continue
-                
-                # 元ファイルをZIPに追加
-                # 同名ファイルの衝突を避けるため、IDをプレフィックスとして追加
-                safe_filename = f"{doc.id}_{doc.original_filename}"
-                zip_file.write(doc.file_path, safe_filename)
-        
-        # ZIPファイルの内容を取得
-        zip_buffer.seek(0)
-        zip_content = zip_buffer.getvalue()
-        
-        logger.info(f"元ファイル一括ダウンロード成功: {len(documents)}件")
+        logger.info(f"元ファイル一括ダウンロード開始: {len(documents)}件")
         
         # ZIPファイル名を生成
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         zip_filename = f"original_files_{timestamp}.zip"
         encoded_filename = quote(zip_filename)
         
-        return Response(
-            content=zip_content,
+        return StreamingResponse(
+            stream_zip(entries),
             media_type="application/zip",
             headers={
                 "Content-Disposition": f"attachment; filename*=UTF-8''{encoded_filename}"
@@ -245,10 +244,18 @@ async def delete_document(
         if not document:
             raise HTTPException(status_code=404, detail="ドキュメントが見つかりません")
         
-        # ファイル削除
-        import os
-        if os.path.exists(document.file_path):
-            os.remove(document.file_path)
+        # ファイル削除（同じ内容の他のドキュメントが参照していれば残す）
+        remove_document_file(db, document)
+        
+        # この文書を引用したRAG回答キャッシュを破棄
+        invalidate_documents(db, [document_id])
+        
+        # 検索にヒットし続けないようQdrantのポイントを削除
+        try:
+            from app.workers.rag_tasks import remove_document_vectors
+            remove_document_vectors(db, [document_id])
+        except Exception as e:
+            logger.error(f"ベクトル削除エラー (ID {document_id}): {e}")
         
         # データベースから削除
         db.delete(document)
@@ -304,6 +311,13 @@ async def get_statistics(db: Session = Depends(get_db)):
             Document.category.isnot(None)
         ).group_by(Document.category).all()
         
+        # ワーカーのステージ別（OCR / AI分析）処理件数・平均時間
+        try:
+            stage_stats = get_stage_stats()
+        except Exception as e:
+            logger.warning(f"ステージ集計の取得エラー: {e}")
+            stage_stats = {}
+        
         return {
             "total_documents": total_documents,
             "status": {
@@ -312,7 +326,8 @@ async def get_statistics(db: Session = Depends(get_db)):
                 "completed": completed_documents,
                 "failed": failed_documents
             },
-            "categories": {cat: count for cat, count in categories if cat}
+            "categories": {cat: count for cat, count in categories if cat},
+            "stages": stage_stats
         }
         
     except Exception as e:
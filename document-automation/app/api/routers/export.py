@@ -2,16 +2,16 @@
 エクスポート用ルーター
 """
 from fastapi import APIRouter, HTTPException, Depends, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from app.models.database import get_db
+from app.models.database import get_db, SessionLocal
 from app.models.document import Document, ExportHistory
 from app.services.export_service import export_to_markdown, export_summary
+from app.services.zip_stream_service import ZipEntry, stream_zip
 from config.settings import settings
 from pydantic import BaseModel
 import logging
 import os
-import zipfile
-import io
 from datetime import datetime
 from urllib.parse import quote
 
@@ -165,45 +165,43 @@ async def export_batch_markdown_zip(
         if not documents:
             raise HTTPException(status_code=404, detail="ドキュメントが見つかりません")
         
-        # ZIPファイルをメモリ上に作成
-        zip_buffer = io.BytesIO()
-        
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            for doc in documents:
-                # 各ドキュメントのマークダウンを生成
-                markdown_content = export_to_markdown(doc)
-                
-                # ファイル名を生成（拡張子を除去してから.mdを追加）
-                base_filename = doc.original_filename.rsplit('.', 1)[0]
-                filename = f"{doc.id}_{base_filename}.md"
-                
-                # ZIPに追加
-                zip_file.writestr(filename, markdown_content.encode('utf-8'))
-        
-        # ZIPファイルの内容を取得
-        zip_buffer.seek(0)
-        zip_content = zip_buffer.getvalue()
+        # マークダウンはZIPに書き込む直前に1件ずつ生成し、順次送信する
+        # ファイル名は拡張子を除去してから.mdを追加
+        entries = [
+            ZipEntry(
+                name=f"{doc.id}_{doc.original_filename.rsplit('.', 1)[0]}.md",
+                render=lambda doc=doc: export_to_markdown(doc)
+            )
+            for doc in documents
+        ]
         
-        # エクスポート履歴記録
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        export_history = ExportHistory(
-            export_type="markdown_zip",
-            document_ids=request.document_ids,
-            file_path=f"/tmp/batch_markdown_{timestamp}.zip",
-            file_size=len(zip_content),
-            title=f"個別マークダウンエクスポート_{len(documents)}件"
-        )
-        db.add(export_history)
-        db.commit()
-        
-        logger.info(f"個別マークダウンZIPエクスポート成功: {len(documents)}件")
+        document_count = len(documents)
+        
+        def record_export(entry_count: int, zip_size: int):
+            # エクスポート履歴記録（送信完了後。リクエストのセッションは閉じているため別セッションで）
+            history_db = SessionLocal()
+            try:
+                history_db.add(ExportHistory(
+                    export_type="markdown_zip",
+                    document_ids=request.document_ids,
+                    file_path=f"/tmp/batch_markdown_{timestamp}.zip",
+                    file_size=zip_size,
+                    title=f"個別マークダウンエクスポート_{document_count}件"
+                ))
+                history_db.commit()
+                logger.info(f"個別マークダウンZIPエクスポート成功: {entry_count}件")
+            except Exception as e:
+                logger.error(f"エクスポート履歴の記録エラー: {e}")
+            finally:
+                history_db.close()
         
         # ZIPファイル名を生成
         zip_filename = f"markdown_export_{timestamp}.zip"
         encoded_filename = quote(zip_filename)
         
-        return Response(
-            content=zip_content,
+        return StreamingResponse(
+            stream_zip(entries, on_complete=record_export),
             media_type="application/zip",
             headers={
                 "Content-Disposition": f"attachment; filename*=UTF-8''{encoded_filename}"
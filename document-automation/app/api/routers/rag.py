@@ -5,11 +5,13 @@ import logging
 import time
 from typing import Optional, List, Dict, Any
 from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from app.models.database import get_db
 from app.services.rag_service import RAGService
-from app.models.document import RAGQuery, RAGSource, VectorIndex
+from app.models.document import RAGQuery, RAGSource, VectorIndex, EmbeddingMigration
+from app.services.embedding_registry import EMBEDDING_MODELS, get_model, serving_model, running_migration
 
 logger = logging.getLogger(__name__)
 
@@ -33,6 +35,11 @@ class DocumentFilters(BaseModel):
     metadata_filters: Optional[Dict[str, Any]] = None
 
 
+class ReembedRequest(BaseModel):
+    """再Embedding（モデル移行）リクエスト"""
+    model: str
+
+
 class RAGQueryRequest(BaseModel):
     """RAG質問リクエスト"""
     query: str
@@ -99,21 +106,22 @@ async def query_rag(
             processing_time=processing_time
         )
         db.add(query_record)
-        db.commit()
-        db.refresh(query_record)
+        db.flush()
         
-        # ソース情報を保存
-        for i, source in enumerate(result["sources"]):
-            source_record = RAGSource(
-                query_id=query_record.id,
-                document_id=source["document_id"],
-                similarity_score=source["score"],
-                rank=i + 1,
-                filename=source["filename"],
-                category=source["category"],
-                text_preview=source["text_preview"]
-            )
-            db.add(source_record)
+        # ソース情報を1回のINSERTでまとめて保存
+        if result["sources"]:
+            db.execute(insert(RAGSource), [
+                {
+                    "query_id": query_record.id,
+                    "document_id": source["document_id"],
+                    "similarity_score": source["score"],
+                    "rank": i + 1,
+                    "filename": source["filename"],
+                    "category": source["category"],
+                    "text_preview": source["text_preview"]
+                }
+                for i, source in enumerate(result["sources"])
+            ])
         
         db.commit()
         
@@ -307,11 +315,30 @@ async def get_index_status(db: Session = Depends(get_db)):
             VectorIndex.error_message.isnot(None)
         ).count()
         
+        # Embeddingモデルと移行状況
+        model = serving_model(db)
+        migration = running_migration(db) or db.query(EmbeddingMigration).order_by(
+            EmbeddingMigration.started_at.desc()
+        ).first()
+        
         return {
             "total_documents": total_documents,
             "indexed_documents": indexed_documents,
             "failed_documents": failed_documents,
             "indexing_rate": indexed_documents / total_documents if total_documents > 0 else 0,
+            "serving_model": {"key": model.key, "model_name": model.model_name, "dimension": model.dimension},
+            "available_models": list(EMBEDDING_MODELS),
+            "migration": {
+                "id": migration.id,
+                "source_model": migration.source_model,
+                "target_model": migration.target_model,
+                "status": migration.status,
+                "total_documents": migration.total_documents,
+                "processed_documents": migration.processed_documents,
+                "error_message": migration.error_message,
+                "started_at": migration.started_at.isoformat() if migration.started_at else None,
+                "completed_at": migration.completed_at.isoformat() if migration.completed_at else None
+            } if migration else None,
             "status": "success"
         }
         
@@ -341,6 +368,43 @@ async def rebuild_index(db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=f"Failed to rebuild index: {str(e)}")
 
 
+@router.post("/index/reembed")
+async def reembed_index(request: ReembedRequest, db: Session = Depends(get_db)):
+    """
+    Embeddingモデルの移行
+    
+    全文書を指定モデルで再Embeddingします。移行中も検索は現在のモデルで続き、
+    完了した時点で指定モデルに切り替わります。
+    """
+    try:
+        target = get_model(request.model)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    migration = running_migration(db)
+    if migration and migration.target_model != target.key:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Migration to {migration.target_model} is already running"
+        )
+    
+    try:
+        from app.workers.rag_tasks import reembed_documents
+        task = reembed_documents.delay(target.key)
+        
+        return {
+            "message": f"Re-embedding to {target.key} started",
+            "task_id": task.id,
+            "source_model": serving_model(db).key,
+            "target_model": target.key,
+            "status": "success"
+        }
+        
+    except Exception as e:
+        logger.error(f"Failed to start re-embedding: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to start re-embedding: {str(e)}")
+
+
 # ルーター登録完了の確認
 logger.info(f"=== RAGルーター: {len(router.routes)}個のエンドポイント登録済み ===")
 for route in router.routes:
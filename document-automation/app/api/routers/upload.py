@@ -5,10 +5,14 @@ from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks,
 from sqlalchemy.orm import Session
 from app.models.database import get_db
 from app.models.document import Document
-from app.workers.tasks import process_document_task
+from app.workers.tasks import process_document_task, log_processing
+from app.services.file_storage_service import store_file
+from app.services.result_cache_service import ResultCacheService
 from config.settings import settings, get_allowed_extensions
+import hashlib
 import os
 import uuid
+import time
 import magic
 import logging
 from datetime import datetime
@@ -32,28 +36,100 @@ def validate_file(file: UploadFile) -> tuple[bool, str]:
     return True, "OK"
 
 
-async def save_uploaded_file(file: UploadFile) -> tuple[str, int]:
-    """アップロードファイルを保存"""
-    # ユニークなファイル名生成
-    file_id = str(uuid.uuid4())
+async def save_uploaded_file(file: UploadFile) -> tuple[str, int, str]:
+    """
+    アップロードファイルを保存
+    
+    受信しながらSHA-256を計算し、内容のハッシュをファイル名にして保存する。
+    
+    Returns:
+        (保存先パス, ファイルサイズ, SHA-256)
+    """
     ext = file.filename.split(".")[-1].lower()
-    new_filename = f"{file_id}.{ext}"
-    file_path = os.path.join(settings.upload_dir, new_filename)
+    temp_path = os.path.join(settings.upload_dir, f".{uuid.uuid4()}.{ext}.part")
     
     # ファイル保存
     total_size = 0
-    with open(file_path, "wb") as f:
-        while chunk := await file.read(8192):
-            total_size += len(chunk)
-            if total_size > settings.max_file_size:
-                os.remove(file_path)
-                raise HTTPException(
-                    status_code=413,
-                    detail=f"ファイルサイズが上限を超えています: {settings.max_file_size / 1024 / 1024}MB"
-                )
-            f.write(chunk)
+    digest = hashlib.sha256()
+    try:
+        with open(temp_path, "wb") as f:
+            while chunk := await file.read(8192):
+                total_size += len(chunk)
+                if total_size > settings.max_file_size:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"ファイルサイズが上限を超えています: {settings.max_file_size / 1024 / 1024}MB"
+                    )
+                digest.update(chunk)
+                f.write(chunk)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    
+    content_hash = digest.hexdigest()
+    file_path = store_file(temp_path, content_hash, ext)
+    return file_path, total_size, content_hash
+
+
+def register_document(db: Session, file: UploadFile, file_path: str, file_size: int, content_hash: str) -> Document:
+    """
+    ドキュメントを登録し、処理をキューに入れる
+    
+    同じ内容のファイルのOCR・AI分析結果がキャッシュにあれば、処理せずに完了にする。
+    """
+    # MIMEタイプ取得
+    mime_type = magic.from_file(file_path, mime=True)
+    
+    # データベースに記録
+    document = Document(
+        filename=os.path.basename(file_path),
+        original_filename=file.filename,
+        file_path=file_path,
+        file_size=file_size,
+        file_type=file.filename.split(".")[-1].lower(),
+        mime_type=mime_type,
+        content_hash=content_hash,
+        status="pending"
+    )
+    db.add(document)
+    db.commit()
+    db.refresh(document)
     
-    return file_path, total_size
+    start_time = time.time()
+    cached = ResultCacheService(db).apply_cached_results(document)
+    if cached:
+        ocr_result, ai_result = cached
+        processing_time = time.time() - start_time
+        document.status = "completed"
+        document.processing_time = processing_time
+        document.processed_at = datetime.utcnow()
+        db.commit()
+        log_cached_processing(db, document.id, content_hash, ocr_result, ai_result, processing_time)
+        logger.info(f"処理結果キャッシュを再利用: {file.filename} (ID: {document.id})")
+    else:
+        # 非同期処理タスクをキューに登録
+        process_document_task.delay(document.id)
+    
+    return document
+
+
+def log_cached_processing(db: Session, document_id: int, content_hash: str,
+                          ocr_result: dict, ai_result: dict, processing_time: float):
+    """キャッシュから完了した文書にも、通常の処理と同じ処理ログを記録する"""
+    log_processing(db, document_id, "INFO", "processing_started", "処理を開始しました")
+    log_processing(db, document_id, "INFO", "ocr_started", "OCR処理を開始")
+    log_processing(db, document_id, "INFO", "ocr_completed",
+                   f"OCR完了: {len(ocr_result['text'] or '')}文字, 信頼度{ocr_result['confidence'] or 0:.2f}",
+                   {"pages": ocr_result.get("pages"), "page_results": ocr_result.get("page_results") or [],
+                    "cached": True, "stage_seconds": 0})
+    log_processing(db, document_id, "INFO", "ai_started", "AI分析を開始")
+    log_processing(db, document_id, "INFO", "ai_completed",
+                   f"AI分析完了: カテゴリ={ai_result['category']}",
+                   {"cached": True, "stage_seconds": 0})
+    log_processing(db, document_id, "INFO", "processing_completed",
+                   f"処理完了: {processing_time:.2f}秒（同一内容の処理結果を再利用）",
+                   {"content_hash": content_hash, "cached": True})
 
 
 @router.post("/upload")
@@ -71,27 +147,10 @@ async def upload_file(
             raise HTTPException(status_code=400, detail=message)
         
         # ファイル保存
-        file_path, file_size = await save_uploaded_file(file)
+        file_path, file_size, content_hash = await save_uploaded_file(file)
         
-        # MIMEタイプ取得
-        mime_type = magic.from_file(file_path, mime=True)
-        
-        # データベースに記録
-        document = Document(
-            filename=os.path.basename(file_path),
-            original_filename=file.filename,
-            file_path=file_path,
-            file_size=file_size,
-            file_type=file.filename.split(".")[-1].lower(),
-            mime_type=mime_type,
-            status="pending"
-        )
-        db.add(document)
-        db.commit()
-        db.refresh(document)
-        
-        # 非同期処理タスクをキューに登録
-        process_document_task.delay(document.id)
+        # データベースに記録して処理を開始
+        document = register_document(db, file, file_path, file_size, content_hash)
         
         logger.info(f"ファイルアップロード成功: {file.filename} (ID: {document.id})")
         
@@ -100,7 +159,8 @@ async def upload_file(
             "message": "ファイルをアップロードしました",
             "document_id": document.id,
             "filename": file.filename,
-            "file_size": file_size
+            "file_size": file_size,
+            "document_status": document.status
         }
         
     except HTTPException:
@@ -130,32 +190,16 @@ async def upload_batch_files(
                 continue
             
             # ファイル保存
-            file_path, file_size = await save_uploaded_file(file)
-            
-            # MIMEタイプ取得
-            mime_type = magic.from_file(file_path, mime=True)
-            
-            # データベースに記録
-            document = Document(
-                filename=os.path.basename(file_path),
-                original_filename=file.filename,
-                file_path=file_path,
-                file_size=file_size,
-                file_type=file.filename.split(".")[-1].lower(),
-                mime_type=mime_type,
-                status="pending"
-            )
-            db.add(document)
-            db.commit()
-            db.refresh(document)
+            file_path, file_size, content_hash = await save_uploaded_file(file)
             
-            # 非同期処理タスクをキューに登録
-            process_document_task.delay(document.id)
+            # データベースに記録して処理を開始
+            document = register_document(db, file, file_path, file_size, content_hash)
             
             results.append({
                 "document_id": document.id,
                 "filename": file.filename,
-                "status": "success"
+                "status": "success",
+                "document_status": document.status
             })
             
         except Exception as e:
@@ -1,11 +1,13 @@
 """
 データベース接続とセッション管理
 """
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker, Session
 from contextlib import contextmanager
 from config.settings import settings
 from app.models.document import Base
+# ドキュメント保存時に全文検索インデックスを更新するイベントを登録
+from app.services.text_search_service import reindex_missing
 import logging
 
 logger = logging.getLogger(__name__)
@@ -23,10 +25,28 @@ engine = create_engine(
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
+# create_allは既存テーブルに列を追加しないため、後から追加した列をここで補う
+ADDITIONAL_COLUMNS = [
+    ("documents", "content_hash", "VARCHAR(64)"),
+    ("documents", "search_vector", "TSVECTOR"),
+]
+
+
 def init_db():
     """データベースの初期化"""
     try:
         Base.metadata.create_all(bind=engine)
+        with engine.begin() as connection:
+            for table, column, column_type in ADDITIONAL_COLUMNS:
+                connection.execute(text(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {column_type}"))
+            connection.execute(text("CREATE INDEX IF NOT EXISTS ix_documents_content_hash ON documents (content_hash)"))
+            connection.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_documents_search_vector ON documents USING GIN (search_vector)"
+            ))
+        
+        # 既存ドキュメントの全文検索インデックスを作成
+        with get_db_session() as db:
+            reindex_missing(db)
         logger.info("データベースを初期化しました")
     except Exception as e:
         logger.error(f"データベース初期化エラー: {e}")
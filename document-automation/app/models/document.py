@@ -1,7 +1,8 @@
 """
 データベースモデル定義
 """
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, Float, JSON
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, Float, JSON, LargeBinary, UniqueConstraint, Index
+from sqlalchemy.dialects.postgresql import ARRAY, TSVECTOR
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
 
@@ -11,6 +12,9 @@ Base = declarative_base()
 class Document(Base):
     """ドキュメントのメタデータ"""
     __tablename__ = "documents"
+    __table_args__ = (
+        Index("ix_documents_search_vector", "search_vector", postgresql_using="gin"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     
@@ -21,6 +25,7 @@ class Document(Base):
     file_size = Column(Integer, nullable=False)
     file_type = Column(String(50), nullable=False)
     mime_type = Column(String(100))
+    content_hash = Column(String(64), index=True)  # ファイル内容のSHA-256
     
     # 処理状態
     status = Column(String(50), default="pending", index=True)
@@ -46,6 +51,9 @@ class Document(Base):
     #   ...
     # }
     
+    # 全文検索（ファイル名・OCRテキスト・要約・キーワードのトークン）
+    search_vector = Column(TSVECTOR)
+    
     # 処理情報
     processing_time = Column(Float)  # 秒
     error_message = Column(Text)
@@ -188,3 +196,109 @@ class VectorIndex(Base):
     def __repr__(self):
         return f"<VectorIndex(id={self.id}, document_id={self.document_id}, is_indexed={self.is_indexed})>"
 
+
+class EmbeddingCache(Base):
+    """チャンク本文のハッシュをキーにしたEmbeddingキャッシュ"""
+    __tablename__ = "embedding_cache"
+    __table_args__ = (
+        UniqueConstraint("content_hash", "embedding_model", name="uq_embedding_cache_hash_model"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    
+    # キー（本文のSHA-256 + モデル名）
+    content_hash = Column(String(64), nullable=False)
+    embedding_model = Column(String(100), nullable=False)
+    
+    # ベクトル（float32のバイト列）
+    embedding_dimension = Column(Integer, nullable=False)
+    vector = Column(LargeBinary, nullable=False)
+    
+    # タイムスタンプ
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<EmbeddingCache(id={self.id}, content_hash={self.content_hash[:12]}, model={self.embedding_model})>"
+
+
+class ProcessingResultCache(Base):
+    """ファイル内容のハッシュをキーにしたOCR・AI分析結果のキャッシュ"""
+    __tablename__ = "processing_result_cache"
+    __table_args__ = (
+        UniqueConstraint("content_hash", "stage", "version", name="uq_processing_result_cache_key"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    
+    # キー（ファイルのSHA-256 + 処理段階 + エンジン・モデルのバージョン）
+    content_hash = Column(String(64), nullable=False)
+    stage = Column(String(20), nullable=False)  # ocr, ai
+    version = Column(String(255), nullable=False)
+    
+    # 結果
+    result = Column(JSON, nullable=False)
+    hit_count = Column(Integer, default=0)
+    
+    # タイムスタンプ
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_hit_at = Column(DateTime)
+    
+    def __repr__(self):
+        return f"<ProcessingResultCache(id={self.id}, content_hash={self.content_hash[:12]}, stage={self.stage})>"
+
+
+class EmbeddingMigration(Base):
+    """Embeddingモデルの移行（再Embedding）履歴"""
+    __tablename__ = "embedding_migrations"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    
+    # 移行元・移行先のモデル（embedding_registry のキー）
+    source_model = Column(String(100))
+    target_model = Column(String(100), nullable=False)
+    
+    # 進捗
+    status = Column(String(20), default="running", index=True)  # running, completed, failed, cancelled
+    total_documents = Column(Integer, default=0)
+    processed_documents = Column(Integer, default=0)
+    last_document_id = Column(Integer, default=0)  # 再開時はこのIDより後から処理
+    error_message = Column(Text)
+    
+    # タイムスタンプ
+    started_at = Column(DateTime, default=datetime.utcnow)
+    completed_at = Column(DateTime)  # 完了・失敗した日時
+    
+    def __repr__(self):
+        return f"<EmbeddingMigration(id={self.id}, {self.source_model} -> {self.target_model}, status={self.status})>"
+
+
+class RAGAnswerCache(Base):
+    """RAG回答のセマンティックキャッシュ（類似した質問に保存済みの回答を返す）"""
+    __tablename__ = "rag_answer_cache"
+    __table_args__ = (
+        Index("ix_rag_answer_cache_scope", "embedding_model", "scope_hash"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    
+    # キー（Embeddingモデル + フィルタ・件数・閾値のハッシュ）
+    embedding_model = Column(String(100), nullable=False)
+    scope_hash = Column(String(64), nullable=False)
+    
+    # 質問（ベクトルは正規化済みfloat32のバイト列）
+    query_text = Column(Text, nullable=False)
+    query_vector = Column(LargeBinary, nullable=False)
+    
+    # 回答と引用元
+    answer = Column(Text, nullable=False)
+    sources = Column(JSON)
+    source_document_ids = Column(ARRAY(Integer), nullable=False)
+    source_versions = Column(JSON)  # {文書ID: インデックス更新日時}
+    hit_count = Column(Integer, default=0)
+    
+    # タイムスタンプ
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    last_hit_at = Column(DateTime)
+    
+    def __repr__(self):
+        return f"<RAGAnswerCache(id={self.id}, query_text={self.query_text[:50]}...)>"
@@ -1,8 +1,8 @@
 """
 AI要約・分類サービス（ハイブリッド対応）
 """
-import google.generativeai as genai
 from config.settings import settings
+from app.services.llm_client import get_llm_client
 import logging
 import json
 
@@ -17,8 +17,7 @@ class AIService:
         
         if self.provider == "gemini" and settings.gemini_api_key:
             try:
-                genai.configure(api_key=settings.gemini_api_key)
-                self.model = genai.GenerativeModel(settings.gemini_model)
+                self.llm = get_llm_client()
                 logger.info(f"Gemini AI 初期化成功: {settings.gemini_model}")
             except Exception as e:
                 logger.error(f"Gemini AI 初期化失敗: {e}")
@@ -109,8 +108,7 @@ class AIService:
 必ずJSON形式のみで返答してください。説明文は不要です。
 """
             
-            response = self.model.generate_content(prompt)
-            result_text = response.text.strip()
+            result_text = await self.llm.generate(prompt)
             
             # JSONパース
             # マークダウンのコードブロックを除去
@@ -127,7 +125,8 @@ class AIService:
                 "summary": result.get("summary", ""),
                 "category": result.get("category", "その他"),
                 "keywords": result.get("keywords", []),
-                "metadata": result.get("metadata", {})
+                "metadata": result.get("metadata", {}),
+                "engine": "gemini"
             }
             
         except json.JSONDecodeError as e:
@@ -155,7 +154,8 @@ class AIService:
                 "summary": summary,
                 "category": category,
                 "keywords": keywords,
-                "metadata": {}
+                "metadata": {},
+                "engine": "basic"
             }
             
         except Exception as e:
@@ -164,7 +164,8 @@ class AIService:
                 "summary": "分析に失敗しました",
                 "category": "その他",
                 "keywords": [],
-                "metadata": {}
+                "metadata": {},
+                "engine": "basic"
             }
     
     def _guess_category_from_filename(self, filename: str) -> str:
@@ -204,6 +205,20 @@ class AIService:
         
         return keywords
     
+    async def generate_summary(self, prompt: str) -> str:
+        """
+        任意のプロンプトでテキストを生成（RAGの回答生成など）
+        
+        Args:
+            prompt: プロンプト
+        
+        Returns:
+            生成テキスト
+        """
+        if self.provider != "gemini" or not settings.gemini_api_key:
+            raise RuntimeError(f"テキスト生成に対応していないAIプロバイダです: {self.provider}")
+        return await self.llm.generate(prompt)
+    
     async def generate_combined_summary(self, documents_data: list[dict], title: str) -> str:
         """
         複数文書の統合要約
@@ -279,8 +294,7 @@ class AIService:
 必要に応じて推奨される次のアクションを記載
 """
             
-            response = self.model.generate_content(prompt)
-            summary_text = response.text.strip()
+            summary_text = await self.llm.generate(prompt)
             
             logger.info(f"統合要約生成成功: {len(summary_text)}文字")
             
@@ -0,0 +1,53 @@
+"""
+テキストチャンク分割サービス
+"""
+from typing import List
+
+# チャンクの区切りとして優先する文字（文末・改行）
+BOUNDARY_CHARS = ("\n\n", "\n", "。", "．", "！", "？", ". ")
+
+
+def split_text(text: str, chunk_size: int = 800, overlap: int = 150) -> List[str]:
+    """
+    テキストを重複付きのチャンクに分割
+
+    チャンク末尾はウィンドウ後半にある文末・改行に合わせ、文の途中で切れにくくする。
+
+    Args:
+        text: 分割するテキスト
+        chunk_size: 1チャンクの最大文字数
+        overlap: 前のチャンクと重複させる文字数
+
+    Returns:
+        チャンクのリスト（空白のみのチャンクは含まない）
+    """
+    text = text.strip()
+    if not text:
+        return []
+    if len(text) <= chunk_size:
+        return [text]
+
+    overlap = min(overlap, chunk_size // 2)
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + chunk_size, len(text))
+        if end < len(text):
+            # ウィンドウの後半で最後に現れる区切りまでに縮める
+            window_start = start + chunk_size // 2
+            best = -1
+            for boundary in BOUNDARY_CHARS:
+                position = text.rfind(boundary, window_start, end)
+                if position != -1:
+                    best = max(best, position + len(boundary))
+            if best > 0:
+                end = best
+
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+
+    return chunks
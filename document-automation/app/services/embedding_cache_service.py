@@ -0,0 +1,67 @@
+"""
+Embeddingキャッシュサービス
+"""
+import hashlib
+import logging
+from typing import Dict, List, Iterable
+import numpy as np
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert
+from app.models.document import EmbeddingCache
+
+logger = logging.getLogger(__name__)
+
+# IN句1回あたりのハッシュ数
+LOOKUP_BATCH_SIZE = 1000
+
+
+def content_hash(text: str) -> str:
+    """チャンク本文のSHA-256ハッシュ"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCacheService:
+    """チャンク本文のハッシュ単位でEmbeddingを永続キャッシュする"""
+
+    def __init__(self, db_session: Session, model_name: str):
+        self.db = db_session
+        self.model_name = model_name
+
+    def get_many(self, hashes: Iterable[str]) -> Dict[str, List[float]]:
+        """
+        キャッシュ済みのEmbeddingをまとめて取得
+
+        Returns:
+            {ハッシュ: ベクトル}（キャッシュに無いハッシュは含まない）
+        """
+        hashes = list(dict.fromkeys(hashes))
+        found = {}
+        for i in range(0, len(hashes), LOOKUP_BATCH_SIZE):
+            rows = self.db.query(EmbeddingCache.content_hash, EmbeddingCache.vector).filter(
+                EmbeddingCache.embedding_model == self.model_name,
+                EmbeddingCache.content_hash.in_(hashes[i:i + LOOKUP_BATCH_SIZE])
+            ).all()
+            for row in rows:
+                found[row.content_hash] = np.frombuffer(row.vector, dtype=np.float32).tolist()
+        return found
+
+    def put_many(self, embeddings: Dict[str, List[float]]):
+        """Embeddingをまとめて保存（既存のハッシュは無視）"""
+        if not embeddings:
+            return
+        rows = [
+            {
+                "content_hash": digest,
+                "embedding_model": self.model_name,
+                "embedding_dimension": len(vector),
+                "vector": np.asarray(vector, dtype=np.float32).tobytes(),
+            }
+            for digest, vector in embeddings.items()
+        ]
+        for i in range(0, len(rows), LOOKUP_BATCH_SIZE):
+            statement = insert(EmbeddingCache).values(rows[i:i + LOOKUP_BATCH_SIZE])
+            self.db.execute(statement.on_conflict_do_nothing(
+                index_elements=["content_hash", "embedding_model"]
+            ))
+        self.db.commit()
+        logger.info(f"Cached {len(rows)} embeddings ({self.model_name})")
@@ -0,0 +1,115 @@
+"""
+Embeddingモデルレジストリ
+モデルごとに次元数とQdrantのコレクション（名前付きベクトル）を対応付け、
+検索に使うモデル（サービング中のモデル）を解決する
+"""
+import logging
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+from sqlalchemy.orm import Session
+from app.models.document import EmbeddingMigration
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class EmbeddingModelSpec:
+    """Embeddingモデルの定義"""
+    key: str  # 設定・APIで使う識別子
+    provider: str  # local, openai
+    model_name: str  # sentence-transformersのモデル名 / OpenAIのモデル名
+    dimension: int
+
+    @property
+    def collection_name(self) -> str:
+        """このモデル専用のQdrantコレクション名"""
+        return f"{settings.vector_collection_name}_{re.sub(r'[^a-z0-9]+', '_', self.key.lower())}"
+
+    @property
+    def vector_name(self) -> str:
+        """コレクション内の名前付きベクトル名"""
+        return self.key
+
+
+# 利用可能なモデル（キーは settings.embedding_model の値）
+EMBEDDING_MODELS: Dict[str, EmbeddingModelSpec] = {
+    "local": EmbeddingModelSpec("local", "local", "sentence-transformers/all-MiniLM-L6-v2", 384),
+    "local-multilingual": EmbeddingModelSpec(
+        "local-multilingual", "local", "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2", 384
+    ),
+    "openai": EmbeddingModelSpec("openai", "openai", "text-embedding-3-small", 1536),
+}
+
+# サービング中のモデルをDBから引き直す間隔（秒）
+SERVING_CACHE_TTL = 30
+
+_serving_cache = {"key": None, "expires_at": 0.0}
+_serving_lock = threading.Lock()
+
+
+def get_model(key: str) -> EmbeddingModelSpec:
+    """キーからモデル定義を取得"""
+    try:
+        return EMBEDDING_MODELS[key]
+    except KeyError:
+        raise ValueError(f"未登録のEmbeddingモデルです: {key}（利用可能: {', '.join(EMBEDDING_MODELS)}）")
+
+
+def default_model() -> EmbeddingModelSpec:
+    """設定上のモデル（移行履歴が無い場合のサービングモデル）"""
+    return get_model(settings.embedding_model)
+
+
+def serving_model(db: Session) -> EmbeddingModelSpec:
+    """
+    検索に使うモデルを取得
+
+    最後に完了した再Embedding（移行）の移行先。移行履歴が無ければ設定上のモデル。
+    """
+    now = time.time()
+    with _serving_lock:
+        if _serving_cache["key"] and _serving_cache["expires_at"] > now:
+            return get_model(_serving_cache["key"])
+
+    latest = db.query(EmbeddingMigration).filter(
+        EmbeddingMigration.status == "completed"
+    ).order_by(EmbeddingMigration.completed_at.desc()).first()
+    key = latest.target_model if latest and latest.target_model in EMBEDDING_MODELS else settings.embedding_model
+
+    with _serving_lock:
+        _serving_cache["key"] = key
+        _serving_cache["expires_at"] = now + SERVING_CACHE_TTL
+    return get_model(key)
+
+
+def running_migration(db: Session) -> Optional[EmbeddingMigration]:
+    """実行中の再Embedding（移行）"""
+    return db.query(EmbeddingMigration).filter(
+        EmbeddingMigration.status == "running"
+    ).order_by(EmbeddingMigration.started_at.desc()).first()
+
+
+def write_models(db: Session) -> List[EmbeddingModelSpec]:
+    """
+    新規・更新文書を登録するモデル
+
+    移行中はサービング中のモデルと移行先の両方に書き込み、切り替え時に取りこぼさない。
+    """
+    models = [serving_model(db)]
+    migration = running_migration(db)
+    if migration and migration.target_model in EMBEDDING_MODELS:
+        target = get_model(migration.target_model)
+        if target not in models:
+            models.append(target)
+    return models
+
+
+def invalidate_serving_cache():
+    """サービングモデルのキャッシュを破棄（移行完了時）"""
+    with _serving_lock:
+        _serving_cache["key"] = None
+        _serving_cache["expires_at"] = 0.0
@@ -2,14 +2,21 @@
 Embedding生成サービス
 """
 import logging
-from typing import List, Optional
+import threading
+from typing import Dict, List, Optional
 import openai
 from sentence_transformers import SentenceTransformer
 from config.settings import settings
+from app.services.embedding_registry import EmbeddingModelSpec
 import numpy as np
 
 logger = logging.getLogger(__name__)
 
+LOCAL_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+# OpenAI Embedding APIの1リクエストあたりの入力数
+OPENAI_BATCH_SIZE = 256
+
 
 class EmbeddingService:
     """Embedding生成サービス"""
@@ -17,6 +24,8 @@ class EmbeddingService:
     def __init__(self):
         self.openai_client = None
         self.local_model = None
+        self._local_models: Dict[str, SentenceTransformer] = {}
+        self._model_lock = threading.Lock()
         self._initialize_models()
     
     def _initialize_models(self):
@@ -29,7 +38,8 @@ class EmbeddingService:
                 logger.info("OpenAI Embedding model initialized")
             
             # ローカルモデルの初期化（フォールバック用）
-            self.local_model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
+            self.local_model = SentenceTransformer(LOCAL_MODEL_NAME)
+            self._local_models[LOCAL_MODEL_NAME] = self.local_model
             logger.info("Local embedding model initialized")
             
         except Exception as e:
@@ -78,15 +88,82 @@ class EmbeddingService:
             logger.error(f"OpenAI embedding generation failed: {e}")
             raise
     
-    def _generate_local_embeddings(self, texts: List[str]) -> List[List[float]]:
+    def _generate_local_embeddings(
+        self, 
+        texts: List[str], 
+        batch_size: Optional[int] = None
+    ) -> List[List[float]]:
         """ローカルモデルでのEmbedding生成"""
         try:
-            embeddings = self.local_model.encode(texts, convert_to_tensor=False)
+            embeddings = self.local_model.encode(
+                texts,
+                batch_size=batch_size or settings.embedding_batch_size,
+                convert_to_tensor=False,
+                show_progress_bar=False
+            )
             return embeddings.tolist()
         except Exception as e:
             logger.error(f"Local embedding generation failed: {e}")
             raise
     
+    def _get_local_model(self, model_name: str) -> SentenceTransformer:
+        """sentence-transformersのモデルを取得（初回のみ読み込み）"""
+        with self._model_lock:
+            if model_name not in self._local_models:
+                self._local_models[model_name] = SentenceTransformer(model_name)
+                logger.info(f"Local embedding model loaded: {model_name}")
+            return self._local_models[model_name]
+    
+    def embed(
+        self, 
+        texts: List[str], 
+        model: EmbeddingModelSpec, 
+        batch_size: Optional[int] = None
+    ) -> List[List[float]]:
+        """
+        指定モデルでEmbeddingを生成（失敗時に別モデルへフォールバックしない）
+        
+        インデックスとクエリで必ず同じモデル・次元数のベクトルを使うため、
+        モデルを明示して生成する。
+        
+        Args:
+            texts: テキストリスト
+            model: Embeddingモデル
+            batch_size: ローカルモデルのバッチサイズ
+            
+        Returns:
+            Embeddingベクトルのリスト（次元数は model.dimension）
+        """
+        if not texts:
+            return []
+        
+        if model.provider == "openai":
+            if not self.openai_client:
+                raise RuntimeError("OpenAI APIキーが設定されていません")
+            embeddings = []
+            for i in range(0, len(texts), OPENAI_BATCH_SIZE):
+                response = self.openai_client.embeddings.create(
+                    model=model.model_name,
+                    input=texts[i:i + OPENAI_BATCH_SIZE]
+                )
+                embeddings.extend(data.embedding for data in response.data)
+        else:
+            batch_size = batch_size or settings.embedding_batch_size
+            local_model = self._get_local_model(model.model_name)
+            step = batch_size * 8
+            embeddings = []
+            for i in range(0, len(texts), step):
+                embeddings.extend(local_model.encode(
+                    texts[i:i + step],
+                    batch_size=batch_size,
+                    convert_to_tensor=False,
+                    show_progress_bar=False
+                ).tolist())
+        
+        if embeddings and len(embeddings[0]) != model.dimension:
+            raise ValueError(f"モデル {model.key} の次元数が想定 ({model.dimension}) と異なります: {len(embeddings[0])}")
+        return embeddings
+    
     def generate_single_embedding(self, text: str, use_openai: bool = True) -> List[float]:
         """単一テキストのEmbedding生成"""
         return self.generate_embeddings([text], use_openai)[0]
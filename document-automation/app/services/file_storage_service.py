@@ -0,0 +1,50 @@
+"""
+アップロードファイルの保存サービス
+ファイルは内容のSHA-256で保存し、同じ内容の再アップロードはディスク上のファイルを共有する
+"""
+import logging
+import os
+from sqlalchemy.orm import Session
+from app.models.document import Document
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+def content_path(content_hash: str, ext: str) -> str:
+    """ハッシュから保存先のパスを決める"""
+    return os.path.join(settings.upload_dir, f"{content_hash}.{ext}")
+
+
+def store_file(temp_path: str, content_hash: str, ext: str) -> str:
+    """
+    一時ファイルをハッシュ名で確定させる
+
+    同じ内容のファイルが既にあれば一時ファイルを削除して既存のパスを返す。
+    """
+    file_path = content_path(content_hash, ext)
+    if os.path.exists(file_path):
+        os.remove(temp_path)
+        logger.info(f"同一内容のファイルを再利用: {os.path.basename(file_path)}")
+    else:
+        os.replace(temp_path, file_path)
+    return file_path
+
+
+def remove_document_file(db: Session, document: Document) -> bool:
+    """
+    ドキュメントのファイルを削除（他のドキュメントが同じファイルを参照していれば残す）
+
+    Returns:
+        削除した場合True
+    """
+    shared = db.query(Document.id).filter(
+        Document.file_path == document.file_path,
+        Document.id != document.id
+    ).first()
+    if shared:
+        return False
+    if os.path.exists(document.file_path):
+        os.remove(document.file_path)
+        return True
+    return False
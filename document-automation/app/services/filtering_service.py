@@ -3,20 +3,133 @@
 """
 import logging
 from typing import List, Dict, Any, Optional
-from datetime import datetime
+from datetime import datetime, timezone
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+from sqlalchemy import cast, or_
+from sqlalchemy.dialects.postgresql import JSONB
+from qdrant_client.models import Filter, FieldCondition, MatchAny, MatchValue, Range
 from app.models.document import Document
 
 logger = logging.getLogger(__name__)
 
 
+def to_timestamp(value: datetime) -> float:
+    """日時をUNIX時刻に変換（タイムゾーン無しはUTCとみなす。DBの created_at はUTC）"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
 class FilteringService:
     """フィルタリングサービス"""
     
     def __init__(self, db_session: Session):
         self.db = db_session
     
+    def sql_conditions(self, filters: Dict[str, Any]) -> List[Any]:
+        """
+        フィルタ条件をSQLの条件式に変換（全文検索などPostgres側の検索で使用）
+        
+        Args:
+            filters: フィルタ条件の辞書（空なら処理済み・未アーカイブのみ）
+            
+        Returns:
+            Document に対する条件式のリスト
+        """
+        # 処理済み・アーカイブされていない文書のみ対象
+        conditions = [Document.status == "completed", Document.is_archived == False]
+        
+        # カテゴリ絞り込み
+        if filters.get("categories"):
+            conditions.append(Document.category.in_(filters["categories"]))
+        
+        # 日付範囲絞り込み
+        if filters.get("date_range"):
+            date_range = filters["date_range"]
+            if date_range.get("start"):
+                conditions.append(Document.created_at >= datetime.fromisoformat(date_range["start"]))
+            if date_range.get("end"):
+                conditions.append(Document.created_at <= datetime.fromisoformat(date_range["end"]))
+        
+        # ファイル形式絞り込み
+        if filters.get("file_types"):
+            conditions.append(Document.file_type.in_(filters["file_types"]))
+        
+        # キーワード絞り込み
+        if filters.get("keywords"):
+            conditions.append(or_(*[cast(Document.keywords, JSONB).contains([keyword]) for keyword in filters["keywords"]]))
+        
+        # 特定文書指定
+        if filters.get("document_ids"):
+            conditions.append(Document.id.in_(filters["document_ids"]))
+        
+        # メタデータ絞り込み
+        for key, value in (filters.get("metadata_filters") or {}).items():
+            if isinstance(value, dict):
+                # 範囲指定（例: {"min": 1000, "max": 5000}）
+                if "min" in value:
+                    conditions.append(Document.extracted_metadata[key].as_float() >= value["min"])
+                if "max" in value:
+                    conditions.append(Document.extracted_metadata[key].as_float() <= value["max"])
+            else:
+                # 完全一致
+                conditions.append(Document.extracted_metadata[key].as_string() == str(value))
+        
+        return conditions
+    
+    def qdrant_filter(self, filters: Dict[str, Any]) -> Filter:
+        """
+        フィルタ条件をQdrantのフィルタに変換（ペイロードインデックスで絞り込む）
+        
+        文書IDの一覧をPostgresで作ってQdrantに渡すのではなく、条件そのものをQdrantで評価する。
+        
+        Args:
+            filters: フィルタ条件の辞書
+            
+        Returns:
+            Qdrantのフィルタ
+        """
+        must = []
+        
+        if filters.get("categories"):
+            must.append(FieldCondition(key="category", match=MatchAny(any=filters["categories"])))
+        
+        if filters.get("file_types"):
+            must.append(FieldCondition(key="file_type", match=MatchAny(any=filters["file_types"])))
+        
+        # keywordsは配列なので、いずれかのキーワードを含めば一致
+        if filters.get("keywords"):
+            must.append(FieldCondition(key="keywords", match=MatchAny(any=filters["keywords"])))
+        
+        if filters.get("document_ids"):
+            must.append(FieldCondition(key="document_id", match=MatchAny(any=filters["document_ids"])))
+        
+        if filters.get("date_range"):
+            date_range = filters["date_range"]
+            bounds = {}
+            if date_range.get("start"):
+                bounds["gte"] = to_timestamp(datetime.fromisoformat(date_range["start"]))
+            if date_range.get("end"):
+                bounds["lte"] = to_timestamp(datetime.fromisoformat(date_range["end"]))
+            if bounds:
+                must.append(FieldCondition(key="created_at_ts", range=Range(**bounds)))
+        
+        for key, value in (filters.get("metadata_filters") or {}).items():
+            if isinstance(value, dict):
+                bounds = {}
+                if "min" in value:
+                    bounds["gte"] = float(value["min"])
+                if "max" in value:
+                    bounds["lte"] = float(value["max"])
+                if bounds:
+                    must.append(FieldCondition(key=f"metadata_numeric.{key}", range=Range(**bounds)))
+            else:
+                must.append(FieldCondition(key=f"metadata_text.{key}", match=MatchValue(value=str(value))))
+        
+        # アーカイブ済みを除外（フラグの無い古いポイントは対象に含める）
+        must_not = [FieldCondition(key="is_archived", match=MatchValue(value=True))]
+        return Filter(must=must or None, must_not=must_not)
+    
     def apply_filters(self, filters: Dict[str, Any]) -> List[int]:
         """
         フィルタ条件を適用して文書IDリストを取得
@@ -28,69 +141,9 @@ class FilteringService:
             フィルタ済み文書IDのリスト
         """
         try:
-            query = self.db.query(Document)
-            
-            # 処理済み文書のみ対象
-            query = query.filter(Document.status == "completed")
-            
-            # カテゴリ絞り込み
-            if filters.get("categories"):
-                query = query.filter(Document.category.in_(filters["categories"]))
-            
-            # 日付範囲絞り込み
-            if filters.get("date_range"):
-                date_range = filters["date_range"]
-                if date_range.get("start"):
-                    start_date = datetime.fromisoformat(date_range["start"])
-                    query = query.filter(Document.created_at >= start_date)
-                if date_range.get("end"):
-                    end_date = datetime.fromisoformat(date_range["end"])
-                    query = query.filter(Document.created_at <= end_date)
-            
-            # ファイル形式絞り込み
-            if filters.get("file_types"):
-                query = query.filter(Document.file_type.in_(filters["file_types"]))
-            
-            # キーワード絞り込み
-            if filters.get("keywords"):
-                keyword_conditions = []
-                for keyword in filters["keywords"]:
-                    keyword_conditions.append(
-                        Document.keywords.contains([keyword])
-                    )
-                if keyword_conditions:
-                    query = query.filter(or_(*keyword_conditions))
-            
-            # 特定文書指定
-            if filters.get("document_ids"):
-                query = query.filter(Document.id.in_(filters["document_ids"]))
-            
-            # メタデータ絞り込み
-            if filters.get("metadata_filters"):
-                metadata_filters = filters["metadata_filters"]
-                for key, value in metadata_filters.items():
-                    if isinstance(value, dict):
-                        # 範囲指定（例: {"min": 1000, "max": 5000}）
-                        if "min" in value:
-                            query = query.filter(
-                                Document.extracted_metadata[key].astext.cast(float) >= value["min"]
-                            )
-                        if "max" in value:
-                            query = query.filter(
-                                Document.extracted_metadata[key].astext.cast(float) <= value["max"]
-                            )
-                    else:
-                        # 完全一致
-                        query = query.filter(
-                            Document.extracted_metadata[key].astext == str(value)
-                        )
-            
-            # アーカイブされていない文書のみ
-            query = query.filter(Document.is_archived == False)
-            
-            # 結果取得
-            documents = query.all()
-            document_ids = [doc.id for doc in documents]
+            # IDだけを取得（ORMオブジェクトは作らない）
+            rows = self.db.query(Document.id).filter(*self.sql_conditions(filters)).all()
+            document_ids = [row.id for row in rows]
             
             logger.info(f"Filtered {len(document_ids)} documents")
             return document_ids
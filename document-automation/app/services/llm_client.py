@@ -0,0 +1,138 @@
+"""
+非同期LLMクライアント
+Gemini呼び出しをイベントループをブロックせずに実行し、同時実行数の制限・タイムアウト・
+429時のバックオフ付きリトライ・同一プロンプトの相乗り（coalescing）をまとめて扱う
+"""
+import asyncio
+import hashlib
+import logging
+import random
+import weakref
+from typing import Dict, Optional
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# リトライ対象のエラー（レート制限・一時的な障害・タイムアウト）
+RETRYABLE_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.InternalServerError,
+    asyncio.TimeoutError,
+)
+
+
+class _LoopState:
+    """イベントループごとのモデル・セマフォと実行中リクエスト"""
+
+    def __init__(self, model_name: str, max_concurrency: int):
+        # 非同期のgRPCクライアントは作成したループでしか使えないため、モデルもループごとに持つ
+        self.model = genai.GenerativeModel(model_name)
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.inflight: Dict[str, asyncio.Future] = {}
+
+
+class AsyncLLMClient:
+    """
+    Geminiの非同期クライアント
+
+    モデル・セマフォ・実行中リクエストはイベントループ単位で持つ
+    （FastAPIは1つのループ、Celeryはワーカープロセスごとに1つの永続ループを
+    app.workers.runtime で保持して使うため）。
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        max_concurrency: int = 4,
+        timeout: float = 60,
+        max_retries: int = 3,
+        backoff_seconds: float = 2.0
+    ):
+        self.model_name = model_name
+        self.max_concurrency = max(1, max_concurrency)
+        self.timeout = timeout
+        self.max_retries = max(0, max_retries)
+        self.backoff_seconds = backoff_seconds
+        self._states: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopState]" = weakref.WeakKeyDictionary()
+        self.stats = {"requests": 0, "coalesced": 0, "retries": 0, "failures": 0}
+
+    def _state(self) -> _LoopState:
+        loop = asyncio.get_running_loop()
+        state = self._states.get(loop)
+        if state is None:
+            state = _LoopState(self.model_name, self.max_concurrency)
+            self._states[loop] = state
+        return state
+
+    async def generate(self, prompt: str) -> str:
+        """
+        プロンプトからテキストを生成
+
+        同じプロンプトのリクエストが実行中なら、新たに呼び出さずその結果を待つ。
+        """
+        state = self._state()
+        key = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        future = state.inflight.get(key)
+        if future is not None:
+            self.stats["coalesced"] += 1
+            logger.debug(f"LLMリクエストを相乗り: {key[:12]}")
+            return await asyncio.shield(future)
+
+        future = asyncio.ensure_future(self._generate_with_retry(prompt, state))
+        state.inflight[key] = future
+        future.add_done_callback(lambda _: state.inflight.pop(key, None))
+        return await asyncio.shield(future)
+
+    async def _generate_with_retry(self, prompt: str, state: _LoopState) -> str:
+        self.stats["requests"] += 1
+        for attempt in range(self.max_retries + 1):
+            try:
+                # 同時実行数はAPI呼び出しの間だけ制限する（バックオフ中は枠を空ける）
+                async with state.semaphore:
+                    response = await asyncio.wait_for(
+                        state.model.generate_content_async(prompt, request_options={"timeout": self.timeout}),
+                        timeout=self.timeout
+                    )
+                return response.text.strip()
+            except RETRYABLE_ERRORS as e:
+                if attempt >= self.max_retries:
+                    self.stats["failures"] += 1
+                    raise
+                delay = self._retry_delay(e, attempt)
+                self.stats["retries"] += 1
+                logger.warning(f"LLM呼び出しを再試行 ({attempt + 1}/{self.max_retries}, {delay:.1f}秒後): "
+                               f"{type(e).__name__}: {e}")
+                await asyncio.sleep(delay)
+            except Exception:
+                self.stats["failures"] += 1
+                raise
+
+    def _retry_delay(self, error: Exception, attempt: int) -> float:
+        """指数バックオフ（ジッター付き）。429は他のエラーより長めに待つ"""
+        delay = self.backoff_seconds * (2 ** attempt) * (0.5 + random.random())
+        if isinstance(error, google_exceptions.ResourceExhausted):
+            delay *= 2
+        return delay
+
+
+_llm_client: Optional[AsyncLLMClient] = None
+
+
+def get_llm_client() -> AsyncLLMClient:
+    """設定に基づくLLMクライアントを取得（プロセス内で共有）"""
+    global _llm_client
+    if _llm_client is None:
+        genai.configure(api_key=settings.gemini_api_key)
+        _llm_client = AsyncLLMClient(
+            settings.gemini_model,
+            max_concurrency=settings.llm_max_concurrency,
+            timeout=settings.llm_timeout_seconds,
+            max_retries=settings.llm_max_retries,
+            backoff_seconds=settings.llm_retry_backoff_seconds
+        )
+        logger.info(f"LLMクライアント初期化: {settings.gemini_model} (同時実行 {settings.llm_max_concurrency})")
+    return _llm_client
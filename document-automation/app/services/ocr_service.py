@@ -2,15 +2,206 @@
 OCR処理サービス（ハイブリッド対応）
 """
 from google.cloud import vision
-import pytesseract
-from PIL import Image
-from pdf2image import convert_from_path
+from PIL import Image, ImageEnhance, ImageFilter
+from pdf2image import convert_from_path, pdfinfo_from_path
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from config.settings import settings
-import os
+from app.services.ocr_strategy import PSMStats, adaptive_tesseract
+import asyncio
+import io
 import logging
+import multiprocessing
+import os
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
+# PDFページのレンダリング解像度
+PDF_DPI = 300
+
+# プロセスごとに1つだけ生成するクライアント・実行プール
+_vision_client = None
+_page_executor = None
+_executor_lock = threading.Lock()
+
+# 文書種別・レイアウトごとのPSM採用実績（ワーカー間で共有）
+_psm_stats = PSMStats(os.path.join(settings.cache_dir, "ocr_psm_stats.json"))
+
+
+def _get_vision_client():
+    """Google Cloud Visionクライアントを取得（プロセス内で共有）"""
+    global _vision_client
+    if _vision_client is None:
+        _vision_client = vision.ImageAnnotatorClient()
+    return _vision_client
+
+
+def _get_page_executor() -> Executor:
+    """
+    PDFページOCR用の実行プールを取得（同時実行数は settings.max_concurrent_tasks）
+    
+    Celeryのpreforkワーカーのようなデーモンプロセスでは子プロセスを作れないため、
+    スレッドプールを使う。Tesseract・pdftoppmは外部プロセスとして動くので、
+    スレッドでも複数コアで並列に処理される。
+    """
+    global _page_executor
+    with _executor_lock:
+        if _page_executor is None:
+            workers = max(1, settings.max_concurrent_tasks)
+            if multiprocessing.current_process().daemon:
+                _page_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ocr-page")
+                logger.info(f"PDFページOCR: スレッドプール（{workers}並列）")
+            else:
+                # gRPCクライアントをfork後に共有しないようspawnで起動
+                _page_executor = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+                logger.info(f"PDFページOCR: プロセスプール（{workers}並列）")
+        return _page_executor
+
+
+def _tesseract_lang() -> str:
+    """設定の言語コードをTesseract形式に変換"""
+    lang_codes = []
+    for lang in settings.ocr_language.split(","):
+        if lang.strip() == "ja":
+            lang_codes.append("jpn")
+        elif lang.strip() == "en":
+            lang_codes.append("eng")
+        else:
+            lang_codes.append(lang.strip())
+    return "+".join(lang_codes)
+
+
+def preprocess_image(image: Image.Image) -> Image.Image:
+    """Tesseract向けの画像前処理（精度向上のため）"""
+    # グレースケール変換
+    if image.mode != 'L':
+        image = image.convert('L')
+    
+    # ノイズ除去
+    image = image.filter(ImageFilter.MedianFilter(size=3))
+    
+    # コントラスト調整
+    enhancer = ImageEnhance.Contrast(image)
+    image = enhancer.enhance(1.5)  # コントラストを適度に強化
+    
+    # シャープネス調整
+    enhancer = ImageEnhance.Sharpness(image)
+    image = enhancer.enhance(2.0)  # シャープネスを強化
+    
+    # 明度調整
+    enhancer = ImageEnhance.Brightness(image)
+    image = enhancer.enhance(1.1)  # 明度を少し上げる
+    return image
+
+
+def run_tesseract(image: Image.Image, doc_type: str = "default") -> dict:
+    """Tesseract OCRでローカル処理"""
+    image = preprocess_image(image)
+    lang = _tesseract_lang()
+    
+    # レイアウト判定と採用実績で並べたPSM候補を、信頼度が目標に達するまで試行
+    result = adaptive_tesseract(
+        image,
+        lang,
+        doc_type=doc_type,
+        confidence_target=settings.ocr_confidence_target,
+        max_attempts=settings.ocr_max_psm_attempts,
+        stats=_psm_stats
+    )
+    best_text = result["text"]
+    best_confidence = result["confidence"]
+    best_config = f"--oem 3 --psm {result['psm']}" if result["psm"] is not None else ""
+    
+    logger.info(f"Local OCR 成功: {len(best_text)}文字, 信頼度 {best_confidence:.2f}, 最適設定: {best_config} "
+                f"(レイアウト: {result['layout']}, 試行: {result['attempts']}回)")
+    
+    return {
+        "text": best_text,
+        "confidence": best_confidence,
+        "engine": "local",
+        "language": settings.ocr_language,
+        "pages": 1,
+        "psm": result["psm"]
+    }
+
+
+def run_cloud_vision(content: bytes) -> dict:
+    """Google Cloud Vision APIでOCR（画像のバイト列を直接送信）"""
+    image = vision.Image(content=content)
+    
+    # 日本語対応の設定
+    image_context = vision.ImageContext(
+        language_hints=settings.ocr_language.split(",")
+    )
+    
+    response = _get_vision_client().document_text_detection(
+        image=image,
+        image_context=image_context
+    )
+    
+    if response.error.message:
+        raise Exception(f"Google Vision API エラー: {response.error.message}")
+    
+    # テキスト抽出
+    text = response.full_text_annotation.text if response.full_text_annotation else ""
+    
+    # 信頼度計算（平均）
+    confidences = []
+    for page in response.full_text_annotation.pages:
+        for block in page.blocks:
+            confidences.append(block.confidence)
+    
+    avg_confidence = sum(confidences) / len(confidences) if confidences else 0
+    
+    logger.info(f"Cloud OCR 成功: {len(text)}文字, 信頼度 {avg_confidence:.2f}")
+    
+    return {
+        "text": text,
+        "confidence": avg_confidence,
+        "engine": "cloud",
+        "language": settings.ocr_language,
+        "pages": 1
+    }
+
+
+def ocr_image(image: Image.Image, use_cloud: bool, doc_type: str = "default") -> dict:
+    """メモリ上の画像をOCR（クラウド失敗時はローカルにフォールバック）"""
+    if use_cloud:
+        try:
+            buffer = io.BytesIO()
+            image.save(buffer, "PNG")
+            return run_cloud_vision(buffer.getvalue())
+        except Exception as e:
+            logger.error(f"Cloud OCR エラー、ローカルにフォールバック: {e}")
+    return run_tesseract(image, doc_type)
+
+
+def ocr_pdf_page(pdf_path: str, page_number: int, use_cloud: bool) -> dict:
+    """
+    PDFの1ページだけをレンダリングしてOCR（実行プールのワーカーで実行）
+    
+    Returns:
+        OCR結果に page（1始まり）と elapsed_seconds を加えた辞書
+    """
+    started = time.time()
+    images = convert_from_path(pdf_path, dpi=PDF_DPI, first_page=page_number, last_page=page_number)
+    if not images:
+        return {"page": page_number, "text": "", "confidence": 0, "engine": "none",
+                "elapsed_seconds": round(time.time() - started, 2)}
+    
+    image = images[0]
+    try:
+        result = ocr_image(image, use_cloud, doc_type="pdf")
+    finally:
+        image.close()
+    result["page"] = page_number
+    result["elapsed_seconds"] = round(time.time() - started, 2)
+    return result
+
 
 class OCRService:
     """OCR処理のハイブリッドサービス"""
@@ -19,7 +210,7 @@ class OCRService:
         self.use_cloud = settings.ocr_engine == "cloud" and settings.gemini_api_key
         if self.use_cloud:
             try:
-                self.vision_client = vision.ImageAnnotatorClient()
+                self.vision_client = _get_vision_client()
                 logger.info("Google Cloud Vision API 初期化成功")
             except Exception as e:
                 logger.warning(f"Google Cloud Vision API 初期化失敗、ローカルモードにフォールバック: {e}")
@@ -35,7 +226,8 @@ class OCRService:
                 "confidence": float,
                 "engine": str,
                 "language": str,
-                "pages": int
+                "pages": int,
+                "page_results": list  # PDFのみ: ページごとの信頼度・処理時間
             }
         """
         try:
@@ -47,43 +239,56 @@ class OCRService:
             # 画像処理
             else:
                 return await self._process_image(file_path)
-                
+        
         except Exception as e:
             logger.error(f"OCR処理エラー: {e}")
             raise
     
     async def _process_pdf(self, pdf_path: str) -> dict:
-        """PDF処理"""
+        """
+        PDF処理
+        
+        全ページを一度に画像化せず、ページ単位でレンダリング + OCRを実行プールに分配する。
+        同時にメモリ上にある画像は並列数分だけで、結果はページ順に結合する。
+        """
         try:
-            # PDFを画像に変換
-            images = convert_from_path(pdf_path, dpi=300)
+            started = time.time()
+            page_count = pdfinfo_from_path(pdf_path)["Pages"]
+            use_cloud = bool(self.use_cloud)
+            logger.info(f"PDF OCR開始: {page_count}ページ")
             
-            all_text = []
-            confidences = []
+            loop = asyncio.get_running_loop()
+            executor = _get_page_executor()
+            results = await asyncio.gather(*[
+                loop.run_in_executor(executor, ocr_pdf_page, pdf_path, page_number, use_cloud)
+                for page_number in range(1, page_count + 1)
+            ])
             
-            for i, image in enumerate(images):
-                logger.info(f"PDFページ {i+1}/{len(images)} を処理中...")
-                
-                # 一時画像保存
-                temp_image_path = f"{pdf_path}_page_{i}.png"
-                image.save(temp_image_path, "PNG")
-                
-                # OCR実行
-                result = await self._process_image(temp_image_path)
-                all_text.append(result["text"])
-                confidences.append(result["confidence"])
-                
-                # 一時ファイル削除
-                os.remove(temp_image_path)
+            all_text = [result["text"] for result in results]
+            confidences = [result["confidence"] for result in results]
+            page_results = [
+                {
+                    "page": result["page"],
+                    "confidence": round(result["confidence"], 4),
+                    "engine": result["engine"],
+                    "psm": result.get("psm"),
+                    "characters": len(result["text"]),
+                    "elapsed_seconds": result["elapsed_seconds"]
+                }
+                for result in results
+            ]
+            
+            logger.info(f"PDF OCR完了: {page_count}ページ, {time.time() - started:.2f}秒")
             
             return {
                 "text": "\n\n--- ページ区切り ---\n\n".join(all_text),
                 "confidence": sum(confidences) / len(confidences) if confidences else 0,
-                "engine": "cloud" if self.use_cloud else "local",
+                "engine": "cloud" if use_cloud else "local",
                 "language": settings.ocr_language,
-                "pages": len(images)
+                "pages": page_count,
+                "page_results": page_results
             }
-            
+        
         except Exception as e:
             logger.error(f"PDF処理エラー: {e}")
             raise
@@ -100,43 +305,8 @@ class OCRService:
         try:
             with open(image_path, "rb") as image_file:
                 content = image_file.read()
-            
-            image = vision.Image(content=content)
-            
-            # 日本語対応の設定
-            image_context = vision.ImageContext(
-                language_hints=settings.ocr_language.split(",")
-            )
-            
-            response = self.vision_client.document_text_detection(
-                image=image,
-                image_context=image_context
-            )
-            
-            if response.error.message:
-                raise Exception(f"Google Vision API エラー: {response.error.message}")
-            
-            # テキスト抽出
-            text = response.full_text_annotation.text if response.full_text_annotation else ""
-            
-            # 信頼度計算（平均）
-            confidences = []
-            for page in response.full_text_annotation.pages:
-                for block in page.blocks:
-                    confidences.append(block.confidence)
-            
-            avg_confidence = sum(confidences) / len(confidences) if confidences else 0
-            
-            logger.info(f"Cloud OCR 成功: {len(text)}文字, 信頼度 {avg_confidence:.2f}")
-            
-            return {
-                "text": text,
-                "confidence": avg_confidence,
-                "engine": "cloud",
-                "language": settings.ocr_language,
-                "pages": 1
-            }
-            
+            return run_cloud_vision(content)
+        
         except Exception as e:
             logger.error(f"Cloud OCR エラー、ローカルにフォールバック: {e}")
             return await self._local_ocr(image_path)
@@ -144,90 +314,9 @@ class OCRService:
     async def _local_ocr(self, image_path: str) -> dict:
         """Tesseract OCRでローカル処理"""
         try:
-            image = Image.open(image_path)
-            
-            # 画像前処理の改善（精度向上のため）
-            from PIL import ImageEnhance, ImageFilter
-            import numpy as np
-            
-            # グレースケール変換
-            if image.mode != 'L':
-                image = image.convert('L')
-            
-            # ノイズ除去
-            image = image.filter(ImageFilter.MedianFilter(size=3))
-            
-            # コントラスト調整
-            enhancer = ImageEnhance.Contrast(image)
-            image = enhancer.enhance(1.5)  # コントラストを適度に強化
-            
-            # シャープネス調整
-            enhancer = ImageEnhance.Sharpness(image)
-            image = enhancer.enhance(2.0)  # シャープネスを強化
-            
-            # 明度調整
-            enhancer = ImageEnhance.Brightness(image)
-            image = enhancer.enhance(1.1)  # 明度を少し上げる
-            
-            # Tesseract設定（言語コード変換）
-            lang_codes = []
-            for lang in settings.ocr_language.split(","):
-                if lang.strip() == "ja":
-                    lang_codes.append("jpn")
-                elif lang.strip() == "en":
-                    lang_codes.append("eng")
-                else:
-                    lang_codes.append(lang.strip())
-            lang = "+".join(lang_codes)
-            
-            # 複数のPSM設定で試行して最良の結果を選択
-            psm_configs = [
-                r'--oem 3 --psm 1',  # 自動ページセグメンテーション（OSD付き）
-                r'--oem 3 --psm 3',  # 完全自動ページセグメンテーション
-                r'--oem 3 --psm 4',  # 単一列のテキスト
-                r'--oem 3 --psm 6',  # 単一ブロックのテキスト
-                r'--oem 3 --psm 8',  # 単一単語
-            ]
-            
-            best_text = ""
-            best_confidence = 0
-            best_config = ""
-            
-            for config in psm_configs:
-                try:
-                    # OCR実行
-                    text = pytesseract.image_to_string(image, lang=lang, config=config)
-                    
-                    # 信頼度取得
-                    data = pytesseract.image_to_data(image, lang=lang, config=config, output_type=pytesseract.Output.DICT)
-                    confidences = [int(conf) for conf in data['conf'] if conf != '-1']
-                    avg_confidence = sum(confidences) / len(confidences) / 100 if confidences else 0
-                    
-                    # より良い結果を選択（文字数と信頼度の組み合わせ）
-                    score = len(text.strip()) * avg_confidence
-                    if score > len(best_text.strip()) * best_confidence:
-                        best_text = text
-                        best_confidence = avg_confidence
-                        best_config = config
-                        
-                except Exception as e:
-                    logger.warning(f"PSM設定 {config} でエラー: {e}")
-                    continue
-            
-            text = best_text
-            avg_confidence = best_confidence
-            
-            logger.info(f"Local OCR 成功: {len(text)}文字, 信頼度 {avg_confidence:.2f}, 最適設定: {best_config}")
-            
-            return {
-                "text": text,
-                "confidence": avg_confidence,
-                "engine": "local",
-                "language": settings.ocr_language,
-                "pages": 1
-            }
-            
+            with Image.open(image_path) as image:
+                return run_tesseract(image, doc_type=image_path.split(".")[-1].lower())
+        
         except Exception as e:
             logger.error(f"Local OCR エラー: {e}")
             raise
-
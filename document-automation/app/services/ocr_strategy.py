@@ -0,0 +1,261 @@
+"""
+Tesseract PSM選択戦略
+PSM候補ごとに image_to_data を1回だけ実行してテキストと信頼度を同時に得る。
+候補は軽量なレイアウト判定と過去の採用実績で並べ、信頼度が目標に達した時点で打ち切る。
+"""
+import fcntl
+import json
+import logging
+import os
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pytesseract
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# 試行するPSM（説明はログ・統計用）
+PSM_DESCRIPTIONS = {
+    1: "自動ページセグメンテーション（OSD付き）",
+    3: "完全自動ページセグメンテーション",
+    4: "単一列のテキスト",
+    6: "単一ブロックのテキスト",
+    8: "単一単語",
+}
+
+# レイアウト別の試行順
+LAYOUT_CANDIDATES = {
+    "empty": [6, 3, 4, 1, 8],
+    "single_word": [8, 6, 3, 4, 1],
+    "single_block": [6, 4, 3, 1, 8],
+    "single_column": [4, 3, 6, 1, 8],
+    "multi_column": [3, 1, 4, 6, 8],
+}
+
+# 学習結果で並べ替えるのに必要な採用回数
+MIN_OBSERVATIONS = 5
+
+ASCII_WORD_EDGE = re.compile(r'[A-Za-z0-9]')
+
+
+def analyze_layout(image: Image.Image) -> Dict[str, float]:
+    """
+    縮小した二値画像の行・列の投影から大まかなレイアウトを判定（Tesseractを呼ばない）
+
+    Returns:
+        {"layout": str, "text_rows": int, "density": float}
+    """
+    small = image.convert("L")
+    if small.width > 600:
+        small = small.resize((600, max(1, int(small.height * 600 / small.width))), Image.BOX)
+    # 縮小で細い線が薄くなるため、白以外をインクとみなす
+    dark = np.asarray(small) < 200
+    density = float(dark.mean())
+
+    # 横方向の投影で文字行を数える
+    row_has_ink = dark.mean(axis=1) > 0.002
+    transitions = np.diff(row_has_ink.astype(np.int8))
+    text_rows = int((transitions == 1).sum() + (1 if row_has_ink[0] else 0))
+
+    ink_columns = np.flatnonzero(dark.any(axis=0))
+    if text_rows == 0 or not ink_columns.size:
+        layout = "empty"
+    elif text_rows == 1:
+        width_ratio = (ink_columns[-1] - ink_columns[0]) / dark.shape[1]
+        layout = "single_word" if width_ratio < 0.3 else "single_block"
+    elif text_rows <= 5:
+        layout = "single_block"
+    else:
+        layout = "multi_column" if _has_column_gutter(dark[row_has_ink]) else "single_column"
+
+    return {"layout": layout, "text_rows": text_rows, "density": round(density, 4)}
+
+
+def _has_column_gutter(rows: np.ndarray) -> bool:
+    """文字領域の中央付近に、左右両側を文字に挟まれた縦方向の余白（段組みの境目）があるか"""
+    column_has_ink = rows.mean(axis=0) > 0.01
+    ink_columns = np.flatnonzero(column_has_ink)
+    if ink_columns.size < 2:
+        return False
+    left, right = ink_columns[0], ink_columns[-1]
+    span = right - left
+    middle_start, middle_end = left + int(span * 0.3), left + int(span * 0.7)
+    middle_empty = ~column_has_ink[middle_start:middle_end]
+    if not middle_empty.any():
+        return False
+
+    # 中央部で最も長い余白の列
+    best_length, best_end, run = 0, 0, 0
+    for i, empty in enumerate(middle_empty):
+        run = run + 1 if empty else 0
+        if run > best_length:
+            best_length, best_end = run, middle_start + i
+    if best_length < max(3, span // 50):
+        return False
+
+    gutter_start = best_end - best_length + 1
+    left_ink = column_has_ink[left:gutter_start].sum()
+    right_ink = column_has_ink[best_end + 1:right + 1].sum()
+    return left_ink >= span * 0.1 and right_ink >= span * 0.1
+
+
+def data_to_text(data: Dict[str, list]) -> str:
+    """
+    image_to_data の出力から image_to_string 相当のテキストを復元
+
+    行・段落単位でまとめ、英数字同士の間にのみ空白を入れる（日本語は詰めて結合）。
+    """
+    lines: Dict[Tuple[int, int, int, int], List[str]] = {}
+    for i, word in enumerate(data["text"]):
+        if not word or not word.strip():
+            continue
+        key = (data["page_num"][i], data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        lines.setdefault(key, []).append(word.strip())
+
+    output = []
+    previous_paragraph = None
+    for key in sorted(lines):
+        paragraph = key[:3]
+        if previous_paragraph is not None and paragraph != previous_paragraph:
+            output.append("")
+        previous_paragraph = paragraph
+
+        words = lines[key]
+        line = words[0]
+        for word in words[1:]:
+            if ASCII_WORD_EDGE.match(line[-1]) and ASCII_WORD_EDGE.match(word[0]):
+                line += " "
+            line += word
+        output.append(line)
+    return "\n".join(output)
+
+
+def data_confidence(data: Dict[str, list]) -> float:
+    """単語信頼度の平均（0〜1）"""
+    confidences = []
+    for conf in data["conf"]:
+        try:
+            value = float(conf)
+        except (TypeError, ValueError):
+            continue
+        if value >= 0:
+            confidences.append(value)
+    return sum(confidences) / len(confidences) / 100 if confidences else 0
+
+
+class PSMStats:
+    """
+    文書種別・レイアウトごとにどのPSMが採用されたかを記録（キャッシュディレクトリのJSON）
+
+    複数ワーカープロセスから更新されるため、書き込みはファイルロック下で読み直してから行う。
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._counts: Dict[str, Dict[str, int]] = {}
+        self._loaded_at = 0.0
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._counts = json.load(f)
+            self._loaded_at = time.time()
+        except (OSError, ValueError) as e:
+            logger.warning(f"PSM統計の読み込みエラー: {e}")
+
+    def wins(self, key: str) -> Dict[int, int]:
+        """指定キーのPSM別採用回数"""
+        # 他プロセスの更新を取り込むため一定間隔で読み直す
+        if time.time() - self._loaded_at > 60:
+            self._load()
+        return {int(psm): count for psm, count in self._counts.get(key, {}).items()}
+
+    def record(self, key: str, psm: int):
+        """採用されたPSMを記録"""
+        if not self.path:
+            self._counts.setdefault(key, {})
+            self._counts[key][str(psm)] = self._counts[key].get(str(psm), 0) + 1
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, "a+", encoding="utf-8") as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    f.seek(0)
+                    content = f.read()
+                    counts = json.loads(content) if content.strip() else {}
+                    entry = counts.setdefault(key, {})
+                    entry[str(psm)] = entry.get(str(psm), 0) + 1
+                    f.seek(0)
+                    f.truncate()
+                    json.dump(counts, f, ensure_ascii=False)
+                    self._counts = counts
+                    self._loaded_at = time.time()
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+        except (OSError, ValueError) as e:
+            logger.warning(f"PSM統計の保存エラー: {e}")
+
+
+def order_candidates(layout: str, wins: Dict[int, int]) -> List[int]:
+    """レイアウト判定の順序を基本に、十分な実績があれば採用回数の多いPSMを先頭に並べる"""
+    candidates = LAYOUT_CANDIDATES.get(layout, LAYOUT_CANDIDATES["single_column"])
+    if sum(wins.values()) < MIN_OBSERVATIONS:
+        return list(candidates)
+    return sorted(candidates, key=lambda psm: (-wins.get(psm, 0), candidates.index(psm)))
+
+
+def adaptive_tesseract(
+    image: Image.Image,
+    lang: str,
+    doc_type: str = "default",
+    confidence_target: float = 0.8,
+    max_attempts: int = 3,
+    stats: Optional[PSMStats] = None
+) -> dict:
+    """
+    PSM候補を順に試し、信頼度が目標に達した時点で採用する
+
+    Args:
+        image: 前処理済みの画像
+        lang: Tesseractの言語コード（例: jpn+eng）
+        doc_type: 採用実績を分けるキー（ファイル種別など）
+        confidence_target: 打ち切る信頼度（0〜1）
+        max_attempts: 目標に届かない場合に試す最大候補数
+        stats: PSM採用実績
+
+    Returns:
+        {"text", "confidence", "psm", "layout", "attempts"}
+    """
+    layout = analyze_layout(image)
+    stats_key = f"{doc_type}:{layout['layout']}"
+    candidates = order_candidates(layout["layout"], stats.wins(stats_key) if stats else {})
+
+    best = {"text": "", "confidence": 0.0, "psm": None}
+    attempts = 0
+    for psm in candidates[:max(1, max_attempts)]:
+        attempts += 1
+        try:
+            data = pytesseract.image_to_data(
+                image, lang=lang, config=f"--oem 3 --psm {psm}", output_type=pytesseract.Output.DICT
+            )
+        except Exception as e:
+            logger.warning(f"PSM {psm} でエラー: {e}")
+            continue
+
+        text = data_to_text(data)
+        confidence = data_confidence(data)
+        # より良い結果を選択（文字数と信頼度の組み合わせ）
+        if len(text.strip()) * confidence > len(best["text"].strip()) * best["confidence"]:
+            best = {"text": text, "confidence": confidence, "psm": psm}
+        if confidence >= confidence_target and text.strip():
+            break
+
+    if stats and best["psm"] is not None:
+        stats.record(stats_key, best["psm"])
+
+    return {**best, "layout": layout["layout"], "attempts": attempts}
@@ -0,0 +1,183 @@
+"""
+RAGキャッシュサービス
+クエリEmbeddingのLRU（プロセス内）と、類似した質問に保存済みの回答を返す
+セマンティック回答キャッシュ（DB）を扱う
+"""
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from sqlalchemy.orm import Session
+from app.models.document import Document, RAGAnswerCache, VectorIndex
+from app.services.embedding_registry import EmbeddingModelSpec
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class QueryEmbeddingCache:
+    """クエリ文字列 → Embedding のLRUキャッシュ（スレッドセーフ）"""
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max(0, max_size)
+        self._entries: "OrderedDict[Tuple[str, str], List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(model: EmbeddingModelSpec, query: str) -> Tuple[str, str]:
+        return model.key, " ".join(query.split())
+
+    def get(self, model: EmbeddingModelSpec, query: str) -> Optional[List[float]]:
+        key = self._key(model, query)
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return embedding
+
+    def put(self, model: EmbeddingModelSpec, query: str, embedding: List[float]):
+        if not self.max_size:
+            return
+        key = self._key(model, query)
+        with self._lock:
+            self._entries[key] = embedding
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+query_embedding_cache = QueryEmbeddingCache(settings.rag_query_embedding_cache_size)
+
+
+def answer_cache_scope(filters: Optional[Dict[str, Any]], limit: int, similarity_threshold: float) -> str:
+    """回答が同じになる条件（フィルタ・件数・閾値）のハッシュ"""
+    scope = {"filters": filters or {}, "limit": limit, "similarity_threshold": similarity_threshold}
+    return hashlib.sha256(json.dumps(scope, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def _normalize(embedding: List[float]) -> np.ndarray:
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def invalidate_documents(db: Session, document_ids: Iterable[int]) -> int:
+    """
+    指定文書を引用元に含むキャッシュを破棄（再インデックス・削除時）
+
+    Returns:
+        破棄した件数
+    """
+    document_ids = list(document_ids)
+    if not document_ids:
+        return 0
+    deleted = db.query(RAGAnswerCache).filter(
+        RAGAnswerCache.source_document_ids.overlap(document_ids)
+    ).delete(synchronize_session=False)
+    if deleted:
+        logger.info(f"RAG回答キャッシュを破棄: {deleted}件 (文書 {document_ids[:10]})")
+    return deleted
+
+
+class AnswerCacheService:
+    """RAG回答のセマンティックキャッシュ"""
+
+    def __init__(self, db_session: Session):
+        self.db = db_session
+
+    def _source_versions(self, document_ids: List[int]) -> Dict[str, str]:
+        """引用元文書のインデックス更新日時（削除・アーカイブ済みの文書は含まない）"""
+        rows = self.db.query(VectorIndex.document_id, VectorIndex.last_updated).join(
+            Document, Document.id == VectorIndex.document_id
+        ).filter(
+            VectorIndex.document_id.in_(document_ids),
+            VectorIndex.is_indexed == True,
+            Document.is_archived == False
+        ).all()
+        return {str(row.document_id): row.last_updated.isoformat() if row.last_updated else "" for row in rows}
+
+    def lookup(
+        self,
+        model: EmbeddingModelSpec,
+        scope_hash: str,
+        query_embedding: List[float]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        類似した質問の回答を取得
+
+        類似度が閾値以上で、引用元の文書が保存時から変わっていないものだけを返す
+        （変わっていたキャッシュはその場で破棄する）。
+        """
+        expires_before = datetime.utcnow() - timedelta(seconds=settings.rag_answer_cache_ttl_seconds)
+        entries = self.db.query(RAGAnswerCache).filter(
+            RAGAnswerCache.embedding_model == model.key,
+            RAGAnswerCache.scope_hash == scope_hash,
+            RAGAnswerCache.created_at >= expires_before
+        ).order_by(RAGAnswerCache.created_at.desc()).limit(settings.rag_answer_cache_max_candidates).all()
+        if not entries:
+            return None
+
+        query_vector = _normalize(query_embedding)
+        matrix = np.stack([np.frombuffer(entry.query_vector, dtype=np.float32) for entry in entries])
+        similarities = matrix @ query_vector
+
+        for index in np.argsort(-similarities):
+            similarity = float(similarities[index])
+            if similarity < settings.rag_answer_cache_similarity:
+                break
+            entry = entries[index]
+            if self._source_versions(entry.source_document_ids) != (entry.source_versions or {}):
+                logger.info(f"引用元が更新されたためRAG回答キャッシュを破棄: {entry.id}")
+                self.db.delete(entry)
+                self.db.commit()
+                continue
+
+            entry.hit_count = (entry.hit_count or 0) + 1
+            entry.last_hit_at = datetime.utcnow()
+            self.db.commit()
+            return {
+                "answer": entry.answer,
+                "sources": entry.sources or [],
+                "cached_query": entry.query_text,
+                "similarity": round(similarity, 4),
+                "cache_id": entry.id
+            }
+        return None
+
+    def store(
+        self,
+        model: EmbeddingModelSpec,
+        scope_hash: str,
+        query: str,
+        query_embedding: List[float],
+        answer: str,
+        sources: List[Dict[str, Any]]
+    ):
+        """回答をキャッシュに保存（期限切れのキャッシュは同時に削除）"""
+        document_ids = sorted({source["document_id"] for source in sources})
+        if not document_ids:
+            return
+        expires_before = datetime.utcnow() - timedelta(seconds=settings.rag_answer_cache_ttl_seconds)
+        self.db.query(RAGAnswerCache).filter(
+            RAGAnswerCache.created_at < expires_before
+        ).delete(synchronize_session=False)
+        self.db.add(RAGAnswerCache(
+            embedding_model=model.key,
+            scope_hash=scope_hash,
+            query_text=query,
+            query_vector=_normalize(query_embedding).tobytes(),
+            answer=answer,
+            sources=sources,
+            source_document_ids=document_ids,
+            source_versions=self._source_versions(document_ids)
+        ))
+        self.db.commit()
@@ -4,13 +4,22 @@ RAG（Retrieval-Augmented Generation）サービス
 import logging
 from typing import List, Dict, Any, Optional
 from app.services.embedding_service import embedding_service
+from app.services.embedding_registry import EmbeddingModelSpec, serving_model
 from app.services.vector_store_service import vector_store_service
 from app.services.filtering_service import FilteringService
 from app.services.ai_service import ai_service
+from app.services.chunking_service import split_text
+from app.services.text_search_service import keyword_search, reciprocal_rank_fusion, tokenize
+from app.services.rag_cache_service import AnswerCacheService, answer_cache_scope, query_embedding_cache
+from app.models.document import Document
+from config.settings import settings
 from sqlalchemy.orm import Session
 
 logger = logging.getLogger(__name__)
 
+# 回答生成に失敗した場合の回答（キャッシュしない）
+ANSWER_FAILED_MESSAGE = "回答の生成に失敗しました。"
+
 
 class RAGService:
     """RAGサービス"""
@@ -18,6 +27,15 @@ class RAGService:
     def __init__(self, db_session: Session):
         self.db = db_session
         self.filtering_service = FilteringService(db_session)
+        self.answer_cache = AnswerCacheService(db_session)
+    
+    def _embed_query(self, query: str, model: EmbeddingModelSpec) -> List[float]:
+        """クエリのEmbeddingを生成（同じクエリはプロセス内のLRUから返す）"""
+        embedding = query_embedding_cache.get(model, query)
+        if embedding is None:
+            embedding = embedding_service.embed([query], model)[0]
+            query_embedding_cache.put(model, query, embedding)
+        return embedding
     
     async def query_with_filters(
         self, 
@@ -39,31 +57,38 @@ class RAGService:
             RAG結果（回答、引用元等）
         """
         try:
-            # 1. フィルタ適用
-            filtered_doc_ids = []
-            if filters:
-                filtered_doc_ids = self.filtering_service.apply_filters(filters)
-                if not filtered_doc_ids:
+            # 1. クエリのEmbedding生成（インデックスと同じ、検索に使うモデルで）
+            model = serving_model(self.db)
+            query_embedding = self._embed_query(query, model)
+            
+            # 2. 類似した質問の回答がキャッシュにあればそれを返す
+            scope_hash = answer_cache_scope(filters, limit, similarity_threshold)
+            if settings.rag_answer_cache_enabled:
+                try:
+                    cached = self.answer_cache.lookup(model, scope_hash, query_embedding)
+                except Exception as e:
+                    logger.warning(f"RAG answer cache lookup failed: {e}")
+                    self.db.rollback()
+                    cached = None
+                if cached:
+                    logger.info(f"RAG answer cache hit: {cached['cache_id']} (similarity {cached['similarity']})")
                     return {
-                        "answer": "指定された条件に合致する文書が見つかりませんでした。",
-                        "sources": [],
-                        "metadata": {"filtered_count": 0}
+                        "answer": cached["answer"],
+                        "sources": cached["sources"],
+                        "metadata": {
+                            "total_sources": len(cached["sources"]),
+                            "filters": sorted(filters.keys()) if filters else [],
+                            "similarity_threshold": similarity_threshold,
+                            "cache": {
+                                "hit": True,
+                                "cached_query": cached["cached_query"],
+                                "similarity": cached["similarity"]
+                            }
+                        }
                     }
             
-            # 2. クエリのEmbedding生成
-            query_embedding = embedding_service.generate_single_embedding(query, use_openai=False)
-            
-            # 3. ベクトル検索
-            search_filters = {}
-            if filtered_doc_ids:
-                search_filters["document_ids"] = filtered_doc_ids
-            
-            similar_docs = vector_store_service.search_similar(
-                query_embedding=query_embedding,
-                limit=limit,
-                score_threshold=similarity_threshold,
-                filters=search_filters
-            )
+            # 3. ベクトル検索 + 全文検索（フィルタはそれぞれの検索条件に変換して適用）
+            similar_docs = self._hybrid_search(query, query_embedding, model, filters or {}, limit, similarity_threshold)
             
             if not similar_docs:
                 return {
@@ -93,11 +118,19 @@ class RAGService:
                 ],
                 "metadata": {
                     "total_sources": len(similar_docs),
-                    "filtered_count": len(filtered_doc_ids) if filtered_doc_ids else "all",
-                    "similarity_threshold": similarity_threshold
+                    "filters": sorted(filters.keys()) if filters else [],
+                    "similarity_threshold": similarity_threshold,
+                    "cache": {"hit": False}
                 }
             }
             
+            if settings.rag_answer_cache_enabled and answer != ANSWER_FAILED_MESSAGE:
+                try:
+                    self.answer_cache.store(model, scope_hash, query, query_embedding, answer, result["sources"])
+                except Exception as e:
+                    logger.warning(f"RAG answer cache store failed: {e}")
+                    self.db.rollback()
+            
             logger.info(f"RAG query completed: {len(similar_docs)} sources found")
             return result
             
@@ -129,27 +162,12 @@ class RAGService:
             類似文書のリスト
         """
         try:
-            # 1. フィルタ適用
-            filtered_doc_ids = []
-            if filters:
-                filtered_doc_ids = self.filtering_service.apply_filters(filters)
-                if not filtered_doc_ids:
-                    return []
-            
-            # 2. クエリのEmbedding生成
-            query_embedding = embedding_service.generate_single_embedding(query, use_openai=False)
-            
-            # 3. ベクトル検索
-            search_filters = {}
-            if filtered_doc_ids:
-                search_filters["document_ids"] = filtered_doc_ids
-            
-            similar_docs = vector_store_service.search_similar(
-                query_embedding=query_embedding,
-                limit=limit,
-                score_threshold=similarity_threshold,
-                filters=search_filters
-            )
+            # 1. クエリのEmbedding生成（インデックスと同じ、検索に使うモデルで）
+            model = serving_model(self.db)
+            query_embedding = self._embed_query(query, model)
+            
+            # 2. ベクトル検索 + 全文検索（フィルタはそれぞれの検索条件に変換して適用）
+            similar_docs = self._hybrid_search(query, query_embedding, model, filters or {}, limit, similarity_threshold)
             
             logger.info(f"Found {len(similar_docs)} similar documents")
             return similar_docs
@@ -158,6 +176,112 @@ class RAGService:
             logger.error(f"Similar document search failed: {e}")
             return []
     
+    def _hybrid_search(
+        self,
+        query: str,
+        query_embedding: List[float],
+        model: EmbeddingModelSpec,
+        filters: Dict[str, Any],
+        limit: int,
+        similarity_threshold: float
+    ) -> List[Dict[str, Any]]:
+        """
+        ベクトル検索と全文検索（型番・金額など語の一致）を逆順位融合（RRF）で統合
+        
+        フィルタはQdrantにはペイロード条件、Postgresの全文検索にはSQL条件として渡す
+        （文書IDの一覧を作って受け渡すことはしない）。
+        全文検索のみでヒットした文書は、検索語を最も多く含むチャンクを本文として返す。
+        """
+        candidate_count = limit * 2 if settings.rag_hybrid_search else limit
+        vector_docs = vector_store_service.search_similar(
+            query_embedding=query_embedding,
+            limit=candidate_count,
+            score_threshold=similarity_threshold,
+            query_filter=self.filtering_service.qdrant_filter(filters),
+            model=model
+        )
+        vector_docs = self._existing_documents_only(vector_docs)
+        if not settings.rag_hybrid_search:
+            return vector_docs
+        
+        try:
+            keyword_hits = keyword_search(
+                self.db, query, limit=candidate_count,
+                conditions=self.filtering_service.sql_conditions(filters)
+            )
+        except Exception as e:
+            logger.error(f"Keyword search failed: {e}")
+            return vector_docs[:limit]
+        
+        vector_ids = [doc["document_id"] for doc in vector_docs]
+        keyword_ids = [hit["document_id"] for hit in keyword_hits]
+        fused = reciprocal_rank_fusion([vector_ids, keyword_ids], k=settings.rag_rrf_k)
+        ranked_ids = sorted(fused, key=lambda document_id: fused[document_id], reverse=True)[:limit]
+        
+        results_by_id = {doc["document_id"]: doc for doc in vector_docs}
+        keyword_only_ids = [document_id for document_id in ranked_ids if document_id not in results_by_id]
+        if keyword_only_ids:
+            results_by_id.update(self._keyword_results(query, keyword_only_ids))
+        
+        results = []
+        for document_id in ranked_ids:
+            doc = results_by_id.get(document_id)
+            if doc is None:
+                continue
+            in_vector = document_id in vector_ids
+            in_keyword = document_id in keyword_ids
+            doc["rrf_score"] = round(fused[document_id], 6)
+            doc["match_type"] = "hybrid" if in_vector and in_keyword else ("vector" if in_vector else "keyword")
+            results.append(doc)
+        
+        logger.info(f"Hybrid search: vector {len(vector_docs)}件, keyword {len(keyword_hits)}件 → {len(results)}件")
+        return results
+    
+    def _existing_documents_only(self, docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """削除済み文書のヒット（Qdrantから削除しきれなかったポイント）を除外"""
+        if not docs:
+            return docs
+        document_ids = {doc["document_id"] for doc in docs}
+        existing = {
+            row.id for row in self.db.query(Document.id).filter(Document.id.in_(document_ids)).all()
+        }
+        if len(existing) < len(document_ids):
+            logger.warning(f"Dropped vector hits of deleted documents: {sorted(document_ids - existing)}")
+        return [doc for doc in docs if doc["document_id"] in existing]
+    
+    def _keyword_results(
+        self,
+        query: str,
+        document_ids: List[int]
+    ) -> Dict[int, Dict[str, Any]]:
+        """全文検索のみでヒットした文書を検索結果の形式に整形"""
+        query_tokens = set(tokenize(query))
+        documents = self.db.query(Document).filter(Document.id.in_(document_ids)).all()
+        
+        results = {}
+        for document in documents:
+            # 検索語を最も多く含むチャンクを本文とする
+            chunks = split_text(document.ocr_text or "", settings.rag_chunk_size, settings.rag_chunk_overlap)
+            best_index, best_text, best_overlap = 0, (chunks[0] if chunks else ""), -1
+            for index, chunk in enumerate(chunks):
+                overlap = len(query_tokens.intersection(tokenize(chunk)))
+                if overlap > best_overlap:
+                    best_index, best_text, best_overlap = index, chunk, overlap
+            
+            results[document.id] = {
+                "id": None,
+                "score": 0.0,
+                "document_id": document.id,
+                "filename": document.original_filename,
+                "category": document.category,
+                "text": best_text,
+                "summary": document.summary,
+                "metadata": document.extracted_metadata or {},
+                "keywords": document.keywords or [],
+                "chunk_index": best_index
+            }
+        return results
+    
     def _build_context(self, similar_docs: List[Dict[str, Any]]) -> str:
         """検索結果からコンテキストを構築"""
         context_parts = []
@@ -204,7 +328,7 @@ class RAGService:
             
         except Exception as e:
             logger.error(f"Answer generation failed: {e}")
-            return "回答の生成に失敗しました。"
+            return ANSWER_FAILED_MESSAGE
     
     def get_available_filters(self) -> Dict[str, Any]:
         """利用可能なフィルタ情報を取得"""
@@ -213,7 +337,7 @@ class RAGService:
                 "categories": self.filtering_service.get_available_categories(),
                 "file_types": self.filtering_service.get_available_file_types(),
                 "keywords": self.filtering_service.get_available_keywords(),
-                "collection_info": vector_store_service.get_collection_info()
+                "collection_info": vector_store_service.get_collection_info(serving_model(self.db))
             }
         except Exception as e:
             logger.error(f"Failed to get available filters: {e}")
@@ -0,0 +1,117 @@
+"""
+OCR・AI分析結果キャッシュサービス
+同じ内容のファイルが再アップロードされた場合に、OCRとAI分析をやり直さず結果を再利用する
+"""
+import logging
+from datetime import datetime
+from typing import Optional, Tuple
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert
+from app.models.document import Document, ProcessingResultCache
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# OCR処理・プロンプトを変更したら上げる（古いキャッシュを使わないため）
+OCR_CACHE_VERSION = 1
+AI_CACHE_VERSION = 1
+
+# キャッシュするOCR結果の項目
+OCR_RESULT_KEYS = ("text", "confidence", "engine", "language", "pages", "page_results")
+
+
+def ocr_cache_version() -> str:
+    """現在の設定でのOCRエンジンのバージョン文字列"""
+    if settings.ocr_engine == "cloud" and settings.gemini_api_key:
+        return f"cloud:vision:{settings.ocr_language}:v{OCR_CACHE_VERSION}"
+    return (f"local:tesseract:{settings.ocr_language}:target{settings.ocr_confidence_target}"
+            f":attempts{settings.ocr_max_psm_attempts}:v{OCR_CACHE_VERSION}")
+
+
+def ai_cache_version() -> str:
+    """現在の設定でのAI分析のバージョン文字列（入力となるOCRのバージョンを含む）"""
+    model = settings.gemini_model if settings.ai_provider == "gemini" else settings.ai_provider
+    return f"{settings.ai_provider}:{model}:v{AI_CACHE_VERSION}|{ocr_cache_version()}"
+
+
+class ResultCacheService:
+    """ファイル内容のハッシュ + エンジン・モデルのバージョン単位で処理結果をキャッシュする"""
+
+    def __init__(self, db_session: Session):
+        self.db = db_session
+
+    def get(self, content_hash: str, stage: str, version: str) -> Optional[dict]:
+        """キャッシュ済みの結果を取得（無ければNone）"""
+        if not content_hash:
+            return None
+        entry = self.db.query(ProcessingResultCache).filter(
+            ProcessingResultCache.content_hash == content_hash,
+            ProcessingResultCache.stage == stage,
+            ProcessingResultCache.version == version
+        ).first()
+        if not entry:
+            return None
+
+        entry.hit_count = (entry.hit_count or 0) + 1
+        entry.last_hit_at = datetime.utcnow()
+        self.db.commit()
+        logger.info(f"処理結果キャッシュヒット: {stage} {content_hash[:12]} ({entry.hit_count}回目)")
+        return entry.result
+
+    def put(self, content_hash: str, stage: str, version: str, result: dict):
+        """結果を保存（同じキーが既にあれば何もしない）"""
+        if not content_hash:
+            return
+        statement = insert(ProcessingResultCache).values(
+            content_hash=content_hash,
+            stage=stage,
+            version=version,
+            result=result,
+            hit_count=0,
+            created_at=datetime.utcnow()
+        )
+        self.db.execute(statement.on_conflict_do_nothing(
+            index_elements=["content_hash", "stage", "version"]
+        ))
+        self.db.commit()
+
+    def get_ocr(self, content_hash: str) -> Optional[dict]:
+        return self.get(content_hash, "ocr", ocr_cache_version())
+
+    def put_ocr(self, content_hash: str, ocr_result: dict):
+        self.put(content_hash, "ocr", ocr_cache_version(),
+                 {key: ocr_result.get(key) for key in OCR_RESULT_KEYS})
+
+    def get_ai(self, content_hash: str) -> Optional[dict]:
+        return self.get(content_hash, "ai", ai_cache_version())
+
+    def put_ai(self, content_hash: str, ai_result: dict):
+        # APIエラー時の簡易分析はキャッシュしない（次回はAPIで再分析する）
+        if ai_result.get("engine") == "basic":
+            return
+        self.put(content_hash, "ai", ai_cache_version(), ai_result)
+
+    def apply_cached_results(self, document: Document) -> Optional[Tuple[dict, dict]]:
+        """
+        OCR・AI分析の両方がキャッシュにあればドキュメントに反映する
+
+        Returns:
+            反映した場合は (OCR結果, AI分析結果)、無ければNone（呼び出し側でステータスを完了にする）
+        """
+        if not document.content_hash:
+            return None
+        ocr_result = self.get_ocr(document.content_hash)
+        if ocr_result is None:
+            return None
+        ai_result = self.get_ai(document.content_hash)
+        if ai_result is None:
+            return None
+
+        document.ocr_text = ocr_result["text"]
+        document.ocr_confidence = ocr_result["confidence"]
+        document.ocr_engine = ocr_result["engine"]
+        document.summary = ai_result["summary"]
+        document.category = ai_result["category"]
+        document.keywords = ai_result["keywords"]
+        document.extracted_metadata = ai_result["metadata"]
+        return ocr_result, ai_result
@@ -0,0 +1,169 @@
+"""
+全文検索サービス（PostgreSQL tsvector + GINインデックス）
+日本語は形態素解析の代わりに文字bigram、英数字（型番・金額など）は語単位でトークン化し、
+tsvectorに直接格納する（PostgreSQLのパーサ・ロケールに依存しない）
+"""
+import logging
+import re
+import unicodedata
+from typing import Any, Dict, List, Optional, Sequence
+from sqlalchemy import Text, cast, event, func, inspect, literal_column
+from sqlalchemy.dialects.postgresql import ARRAY, TSQUERY
+from sqlalchemy.orm import Session
+from app.models.document import Document
+
+logger = logging.getLogger(__name__)
+
+# 英数字の語（型番の区切り記号を含む: AB-123, v1.2, 2025/10/18 など）
+ASCII_TOKEN = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+ASCII_PART = re.compile(r"[a-z0-9]+")
+# 日本語（ひらがな・カタカナ・漢字）の連続
+CJK_RUN = re.compile(r"[぀-ヿ㐀-䶿一-鿿豈-﫿]+")
+# 金額などの桁区切り（12,800 → 12800）
+DIGIT_SEPARATOR = re.compile(r"(?<=\d),(?=\d{3})")
+
+# 1文書あたりに索引するトークン数の上限（tsvectorのサイズ制限対策）
+MAX_TOKENS = 20000
+
+# 索引対象の列（いずれかが変わったら作り直す）
+INDEXED_FIELDS = ("original_filename", "ocr_text", "summary", "keywords")
+
+# 逆順位融合（RRF）の定数
+RRF_K = 60
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    テキストを検索用トークンに分割（重複なし・出現順）
+
+    - 英数字: 語全体と、区切り記号で分けた各部分（"ab-123" → "ab-123", "ab", "123"）
+    - 日本語: 文字bigram（1文字だけの連続はそのまま）
+    """
+    if not text:
+        return []
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = DIGIT_SEPARATOR.sub("", text)
+
+    tokens: Dict[str, None] = {}
+    for match in ASCII_TOKEN.finditer(text):
+        word = match.group()
+        tokens[word] = None
+        if not word.isalnum():
+            for part in ASCII_PART.findall(word):
+                tokens[part] = None
+    for match in CJK_RUN.finditer(text):
+        run = match.group()
+        if len(run) == 1:
+            tokens[run] = None
+        for i in range(len(run) - 1):
+            tokens[run[i:i + 2]] = None
+    return list(tokens)[:MAX_TOKENS]
+
+
+def document_tokens(document: Document) -> List[str]:
+    """ドキュメントの索引対象テキストをトークン化"""
+    parts = [document.original_filename or "", document.summary or "", document.ocr_text or ""]
+    if document.keywords:
+        parts.append(" ".join(str(keyword) for keyword in document.keywords))
+    return tokenize("\n".join(parts))
+
+
+def search_vector_expression(tokens: Sequence[str]):
+    """トークン列をそのままレキシームとするtsvector式"""
+    return func.array_to_tsvector(cast(list(tokens), ARRAY(Text)))
+
+
+def _tsquery_literal(tokens: Sequence[str], operator: str) -> str:
+    return f" {operator} ".join("'" + token.replace("'", "''") + "'" for token in tokens)
+
+
+def build_tsquery(query: str, match_all: bool = False):
+    """
+    検索語からtsquery式を作成（トークンが作れない場合はNone）
+
+    Args:
+        match_all: Trueなら全トークンを含む文書のみ（一覧検索）、Falseならいずれかを含む文書（RAG）
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return None
+    return cast(_tsquery_literal(tokens, "&" if match_all else "|"), TSQUERY)
+
+
+def is_indexable_query(query: str) -> bool:
+    """
+    索引で検索できる語か（日本語1文字だけの検索は文書側にunigramが無いため不可）
+    """
+    text = unicodedata.normalize("NFKC", query or "").lower()
+    return bool(ASCII_TOKEN.search(text)) or any(len(run) >= 2 for run in CJK_RUN.findall(text))
+
+
+def keyword_search(
+    db: Session,
+    query: str,
+    limit: int = 20,
+    conditions: Optional[List[Any]] = None
+) -> List[Dict]:
+    """
+    全文検索（GINインデックスを使用）でスコア順に文書を取得
+
+    Args:
+        conditions: 追加の絞り込み条件（FilteringService.sql_conditions）
+
+    Returns:
+        [{"document_id": int, "rank": float}, ...]
+    """
+    tsquery = build_tsquery(query)
+    if tsquery is None:
+        return []
+
+    rank = func.ts_rank_cd(Document.search_vector, tsquery).label("rank")
+    statement = db.query(Document.id, rank).filter(Document.search_vector.op("@@")(tsquery))
+    if conditions:
+        statement = statement.filter(*conditions)
+    rows = statement.order_by(literal_column("rank").desc()).limit(limit).all()
+    return [{"document_id": row.id, "rank": float(row.rank)} for row in rows]
+
+
+def reciprocal_rank_fusion(result_lists: List[List[int]], k: int = RRF_K) -> Dict[int, float]:
+    """
+    複数の順位リスト（文書IDの並び）を逆順位融合でスコア化
+
+    Returns:
+        {文書ID: RRFスコア}
+    """
+    scores: Dict[int, float] = {}
+    for results in result_lists:
+        for position, document_id in enumerate(results, 1):
+            scores[document_id] = scores.get(document_id, 0.0) + 1.0 / (k + position)
+    return scores
+
+
+def reindex_missing(db: Session, batch_size: int = 200) -> int:
+    """索引が未作成のドキュメントを索引する（既存データの移行用）"""
+    indexed = 0
+    while True:
+        documents = db.query(Document).filter(
+            Document.search_vector.is_(None)
+        ).order_by(Document.id).limit(batch_size).all()
+        if not documents:
+            break
+        for document in documents:
+            document.search_vector = search_vector_expression(document_tokens(document))
+        db.commit()
+        indexed += len(documents)
+    if indexed:
+        logger.info(f"全文検索インデックスを作成: {indexed}件")
+    return indexed
+
+
+@event.listens_for(Document, "before_insert")
+def _index_on_insert(mapper, connection, target: Document):
+    target.search_vector = search_vector_expression(document_tokens(target))
+
+
+@event.listens_for(Document, "before_update")
+def _index_on_update(mapper, connection, target: Document):
+    state = inspect(target)
+    if any(state.attrs[field].history.has_changes() for field in INDEXED_FIELDS):
+        target.search_vector = search_vector_expression(document_tokens(target))
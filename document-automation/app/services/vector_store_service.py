@@ -4,20 +4,83 @@
 import logging
 from typing import List, Dict, Any, Optional
 from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct, Filter, FieldCondition, MatchValue
-from qdrant_client.http import models
+from qdrant_client.models import (
+    Distance, VectorParams, PointStruct, Filter, FieldCondition, MatchAny, PayloadSchemaType,
+    NamedVector
+)
+import re
 import uuid
 from config.settings import settings
+from app.services.embedding_registry import EMBEDDING_MODELS, EmbeddingModelSpec, default_model
 
 logger = logging.getLogger(__name__)
 
+# チャンクのポイントIDを決定的に生成するための名前空間
+CHUNK_ID_NAMESPACE = uuid.UUID("6f1c1b0e-5d0a-4c1e-9a55-8d3c2b7e4f10")
+
+
+# 絞り込みに使うペイロードのインデックス
+PAYLOAD_INDEXES = {
+    "document_id": PayloadSchemaType.INTEGER,
+    "category": PayloadSchemaType.KEYWORD,
+    "file_type": PayloadSchemaType.KEYWORD,
+    "keywords": PayloadSchemaType.KEYWORD,
+    "created_at_ts": PayloadSchemaType.FLOAT,
+    "is_archived": PayloadSchemaType.BOOL,
+}
+
+# 数値の先頭部分（"10,000円" → 10000）
+NUMERIC_PREFIX = re.compile(r"^[¥￥$]?\s*(-?[\d,]+(?:\.\d+)?)")
+
+
+def chunk_point_id(document_id: int, chunk_index: int) -> str:
+    """文書ID・チャンク番号から再インデックス時も同じになるポイントIDを生成"""
+    return str(uuid.uuid5(CHUNK_ID_NAMESPACE, f"{document_id}:{chunk_index}"))
+
+
+def _to_number(value: Any) -> Optional[float]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        match = NUMERIC_PREFIX.match(value.strip())
+        if match:
+            try:
+                return float(match.group(1).replace(",", ""))
+            except ValueError:
+                return None
+    return None
+
+
+def filterable_payload(metadata: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    抽出メタデータを絞り込み用のペイロードに変換
+    
+    Returns:
+        {"metadata_text": {キー: 文字列}, "metadata_numeric": {キー: 数値}}
+    """
+    metadata_text, metadata_numeric = {}, {}
+    for key, value in (metadata or {}).items():
+        if value is None or isinstance(value, (dict, list)):
+            continue
+        metadata_text[key] = str(value)
+        number = _to_number(value)
+        if number is not None:
+            metadata_numeric[key] = number
+    return {"metadata_text": metadata_text, "metadata_numeric": metadata_numeric}
+
 
 class VectorStoreService:
-    """ベクトルストアサービス"""
+    """
+    ベクトルストアサービス
+    
+    Embeddingモデルごとに専用のコレクション（名前付きベクトル、モデルの次元数）を持つ。
+    """
     
     def __init__(self):
         self.client = None
-        self.collection_name = "documents"
+        self._ready_collections = set()
         self._initialize_client()
     
     def _initialize_client(self):
@@ -30,84 +93,151 @@ class VectorStoreService:
                 timeout=30
             )
             
-            # コレクションの作成
-            self._create_collection()
+            # 設定上のモデルのコレクションを作成
+            self.ensure_collection(default_model())
             logger.info("Qdrant client initialized successfully")
             
         except Exception as e:
             logger.error(f"Failed to initialize Qdrant client: {e}")
             raise
     
-    def _create_collection(self):
-        """コレクションの作成"""
-        try:
-            # コレクションが存在するかチェック
-            collections = self.client.get_collections()
-            collection_names = [col.name for col in collections.collections]
+    def ensure_collection(self, model: EmbeddingModelSpec, create: bool = True) -> bool:
+        """
+        モデルのコレクションを用意（無ければ作成）
+        
+        Args:
+            model: Embeddingモデル
+            create: Falseなら存在確認のみ
             
-            if self.collection_name not in collection_names:
-                # コレクション作成
-                self.client.create_collection(
-                    collection_name=self.collection_name,
-                    vectors_config=VectorParams(
-                        size=1536,  # OpenAI embedding dimension
-                        distance=Distance.COSINE
-                    )
-                )
-                logger.info(f"Created collection: {self.collection_name}")
-            else:
-                logger.info(f"Collection already exists: {self.collection_name}")
-                
+        Returns:
+            コレクションが使える場合True
+        """
+        if model.collection_name in self._ready_collections:
+            return True
+        
+        collections = self.client.get_collections()
+        collection_names = [col.name for col in collections.collections]
+        
+        if model.collection_name not in collection_names:
+            if not create:
+                return False
+            self.client.create_collection(
+                collection_name=model.collection_name,
+                vectors_config={
+                    model.vector_name: VectorParams(size=model.dimension, distance=Distance.COSINE)
+                }
+            )
+            logger.info(f"Created collection: {model.collection_name} ({model.model_name}, {model.dimension}次元)")
+        else:
+            info = self.client.get_collection(model.collection_name)
+            vectors = info.config.params.vectors
+            params = vectors.get(model.vector_name) if isinstance(vectors, dict) else None
+            if params is None or params.size != model.dimension:
+                raise ValueError(f"コレクション {model.collection_name} の次元数がモデル {model.key} と一致しません")
+        
+        self._create_payload_indexes(model.collection_name)
+        self._ready_collections.add(model.collection_name)
+        return True
+    
+    def existing_models(self) -> List[EmbeddingModelSpec]:
+        """コレクションが存在するモデル"""
+        collection_names = {col.name for col in self.client.get_collections().collections}
+        return [model for model in EMBEDDING_MODELS.values() if model.collection_name in collection_names]
+    
+    def count_points(self, model: EmbeddingModelSpec) -> Optional[int]:
+        """コレクションのポイント数（コレクションが無ければ0、取得に失敗した場合None）"""
+        try:
+            if not self.ensure_collection(model, create=False):
+                return 0
+            return self.client.count(collection_name=model.collection_name, exact=False).count
         except Exception as e:
-            logger.error(f"Failed to create collection: {e}")
-            raise
+            logger.error(f"Failed to count points in {model.collection_name}: {e}")
+            return None
     
-    def add_documents(
+    def _create_payload_indexes(self, collection_name: str):
+        """絞り込み用のペイロードインデックスを作成（既存のインデックスはそのまま）"""
+        info = self.client.get_collection(collection_name)
+        existing = set((info.payload_schema or {}).keys())
+        fields = dict(PAYLOAD_INDEXES)
+        for key in settings.rag_numeric_metadata_fields.split(","):
+            if key.strip():
+                fields[f"metadata_numeric.{key.strip()}"] = PayloadSchemaType.FLOAT
+        for field_name, schema in fields.items():
+            if field_name in existing:
+                continue
+            try:
+                self.client.create_payload_index(
+                    collection_name=collection_name,
+                    field_name=field_name,
+                    field_schema=schema
+                )
+                logger.info(f"Created payload index: {collection_name}.{field_name} ({schema})")
+            except Exception as e:
+                logger.warning(f"Failed to create payload index {field_name}: {e}")
+    
+    def upsert_chunks(
         self, 
-        documents: List[Dict[str, Any]], 
-        embeddings: List[List[float]]
-    ) -> bool:
+        chunks: List[Dict[str, Any]], 
+        model: EmbeddingModelSpec,
+        batch_size: int = 256
+    ) -> int:
         """
-        文書をベクトルストアに追加
+        文書チャンクをまとめて登録
         
         Args:
-            documents: 文書メタデータのリスト
-            embeddings: 対応するEmbeddingベクトル
+            chunks: {"document_id", "chunk_index", "vector", "payload"} のリスト
+            model: ベクトルを生成したモデル（登録先のコレクション）
+            batch_size: 1回のupsertで送るポイント数
             
         Returns:
-            成功フラグ
+            登録したポイント数
         """
-        try:
-            points = []
-            for doc, embedding in zip(documents, embeddings):
-                point = PointStruct(
-                    id=str(uuid.uuid4()),
-                    vector=embedding,
-                    payload={
-                        "document_id": doc["id"],
-                        "filename": doc["filename"],
-                        "category": doc.get("category"),
-                        "file_type": doc.get("file_type"),
-                        "created_at": doc.get("created_at"),
-                        "keywords": doc.get("keywords", []),
-                        "metadata": doc.get("extracted_metadata", {}),
-                        "text": doc.get("text", ""),
-                        "summary": doc.get("summary", "")
-                    }
-                )
-                points.append(point)
-            
-            # バッチで追加
+        self.ensure_collection(model)
+        points = [
+            PointStruct(
+                id=chunk_point_id(chunk["document_id"], chunk["chunk_index"]),
+                vector={model.vector_name: chunk["vector"]},
+                payload=chunk["payload"]
+            )
+            for chunk in chunks
+        ]
+        for i in range(0, len(points), batch_size):
+            # 最後のバッチだけ反映完了を待つ
             self.client.upsert(
-                collection_name=self.collection_name,
-                points=points
+                collection_name=model.collection_name,
+                points=points[i:i + batch_size],
+                wait=i + batch_size >= len(points)
             )
-            
-            logger.info(f"Added {len(points)} documents to vector store")
+        logger.info(f"Upserted {len(points)} chunks to {model.collection_name}")
+        return len(points)
+    
+    def delete_documents(
+        self, 
+        document_ids: List[int], 
+        models: Optional[List[EmbeddingModelSpec]] = None
+    ) -> bool:
+        """
+        複数文書のポイントをまとめて削除
+        
+        Args:
+            document_ids: 文書IDリスト
+            models: 削除対象のモデル（省略時はコレクションがある全モデル）
+        """
+        if not document_ids:
+            return True
+        try:
+            for model in models if models is not None else self.existing_models():
+                if not self.ensure_collection(model, create=False):
+                    continue
+                self.client.delete(
+                    collection_name=model.collection_name,
+                    points_selector=Filter(
+                        must=[FieldCondition(key="document_id", match=MatchAny(any=list(document_ids)))]
+                    )
+                )
             return True
-            
         except Exception as e:
-            logger.error(f"Failed to add documents to vector store: {e}")
+            logger.error(f"Failed to delete documents {document_ids}: {e}")
             return False
     
     def search_similar(
@@ -115,7 +245,9 @@ class VectorStoreService:
         query_embedding: List[float], 
         limit: int = 5,
         score_threshold: float = 0.7,
-        filters: Optional[Dict[str, Any]] = None
+        filters: Optional[Dict[str, Any]] = None,
+        query_filter: Optional[Filter] = None,
+        model: Optional[EmbeddingModelSpec] = None
     ) -> List[Dict[str, Any]]:
         """
         類似文書を検索
@@ -125,6 +257,8 @@ class VectorStoreService:
             limit: 取得件数
             score_threshold: 類似度閾値
             filters: フィルタ条件
+            query_filter: Qdrantのフィルタ（FilteringService.qdrant_filter で作成）
+            model: クエリのEmbeddingを作ったモデル（そのモデルのコレクションを検索）
             
         Returns:
             検索結果のリスト
@@ -163,18 +297,33 @@ class VectorStoreService:
                 if conditions:
                     search_filter = Filter(must=conditions)
             
-            # 検索実行
+            if query_filter is not None:
+                search_filter = Filter(must=[search_filter, query_filter]) if search_filter else query_filter
+            
+            # 検索実行（1文書が複数チャンクでヒットするため多めに取得）
+            model = model or default_model()
+            if len(query_embedding) != model.dimension:
+                raise ValueError(f"クエリの次元数 {len(query_embedding)} がモデル {model.key} ({model.dimension}) と一致しません")
+            if not self.ensure_collection(model):
+                return []
             search_results = self.client.search(
-                collection_name=self.collection_name,
-                query_vector=query_embedding,
-                limit=limit,
+                collection_name=model.collection_name,
+                query_vector=NamedVector(name=model.vector_name, vector=query_embedding),
+                limit=limit * 4,
                 score_threshold=score_threshold,
                 query_filter=search_filter
             )
             
-            # 結果の整形
+            # 結果の整形（文書ごとに最も類似度の高いチャンクのみ採用）
             results = []
+            seen_documents = set()
             for result in search_results:
+                document_id = result.payload.get("document_id")
+                if document_id in seen_documents:
+                    continue
+                seen_documents.add(document_id)
+                if len(results) >= limit:
+                    break
                 results.append({
                     "id": result.id,
                     "score": result.score,
@@ -184,7 +333,8 @@ class VectorStoreService:
                     "text": result.payload.get("text"),
                     "summary": result.payload.get("summary"),
                     "metadata": result.payload.get("metadata", {}),
-                    "keywords": result.payload.get("keywords", [])
+                    "keywords": result.payload.get("keywords", []),
+                    "chunk_index": result.payload.get("chunk_index")
                 })
             
             logger.info(f"Found {len(results)} similar documents")
@@ -195,36 +345,21 @@ class VectorStoreService:
             return []
     
     def delete_document(self, document_id: int) -> bool:
-        """文書を削除"""
-        try:
-            # フィルタで文書を特定して削除
-            filter_condition = Filter(
-                must=[
-                    FieldCondition(
-                        key="document_id",
-                        match=MatchValue(value=document_id)
-                    )
-                ]
-            )
-            
-            self.client.delete(
-                collection_name=self.collection_name,
-                points_selector=filter_condition
-            )
-            
+        """文書を削除（全モデルのコレクションから）"""
+        success = self.delete_documents([document_id])
+        if success:
             logger.info(f"Deleted document {document_id} from vector store")
-            return True
-            
-        except Exception as e:
-            logger.error(f"Failed to delete document {document_id}: {e}")
-            return False
+        return success
     
-    def get_collection_info(self) -> Dict[str, Any]:
+    def get_collection_info(self, model: Optional[EmbeddingModelSpec] = None) -> Dict[str, Any]:
         """コレクション情報を取得"""
+        model = model or default_model()
         try:
-            info = self.client.get_collection(self.collection_name)
+            info = self.client.get_collection(model.collection_name)
             return {
-                "name": self.collection_name,
+                "name": model.collection_name,
+                "embedding_model": model.key,
+                "dimension": model.dimension,
                 "vectors_count": info.vectors_count,
                 "indexed_vectors_count": info.indexed_vectors_count,
                 "points_count": info.points_count
@@ -0,0 +1,113 @@
+"""
+ZIPストリーミングサービス
+アーカイブ全体をメモリに作らず、元ファイルを少しずつ読みながらZIPのバイト列を順次生成する
+（StreamingResponseにそのまま渡せる）
+"""
+import logging
+import os
+import time
+import zipfile
+from dataclasses import dataclass
+from typing import Callable, Iterable, Iterator, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# 元ファイルを読み込む単位
+READ_CHUNK_SIZE = 1024 * 1024
+# この量がたまったらクライアントに送る
+FLUSH_SIZE = 64 * 1024
+
+# 圧縮済みの形式は再圧縮せずに格納する（CPUを使うだけでサイズはほぼ変わらない）
+STORED_EXTENSIONS = {".pdf", ".jpg", ".jpeg", ".png", ".gif", ".webp", ".zip", ".gz"}
+
+
+@dataclass
+class ZipEntry:
+    """ZIPに追加するファイル（path か render のどちらかを指定）"""
+    name: str  # ZIP内のファイル名
+    path: Optional[str] = None  # ディスク上のファイル
+    render: Optional[Callable[[], Union[str, bytes]]] = None  # 内容を生成する関数（書き込む直前に呼ぶ）
+
+
+class _StreamBuffer:
+    """zipfileの出力先。書き込まれたバイト列をためておき、取り出すたびに空にする"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self.size = 0
+        self.total = 0
+
+    def write(self, data: bytes) -> int:
+        if data:
+            self._chunks.append(bytes(data))
+            self.size += len(data)
+            self.total += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        self.size = 0
+        return data
+
+
+def _compress_type(name: str) -> int:
+    return zipfile.ZIP_STORED if os.path.splitext(name)[1].lower() in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+
+
+def stream_zip(
+    entries: Iterable[ZipEntry],
+    on_complete: Optional[Callable[[int, int], None]] = None
+) -> Iterator[bytes]:
+    """
+    ZIPアーカイブを順次生成
+
+    出力先がシーク不可のため、各エントリのサイズ・CRCはデータの後ろ（データディスクリプタ）に書かれる。
+    見つからないファイルは警告を出して飛ばす。
+
+    Args:
+        entries: 追加するファイル
+        on_complete: 全体を出力し終えたときに (エントリ数, ZIPのバイト数) で呼ばれる
+    """
+    buffer = _StreamBuffer()
+    count = 0
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for entry in entries:
+            if entry.path is not None and not os.path.exists(entry.path):
+                logger.warning(f"ファイルが見つかりません: {entry.path}")
+                continue
+
+            info = zipfile.ZipInfo(entry.name, date_time=time.localtime()[:6])
+            info.compress_type = _compress_type(entry.path or entry.name)
+            info.external_attr = 0o644 << 16
+
+            if entry.path is not None:
+                info.file_size = os.path.getsize(entry.path)
+                with open(entry.path, "rb") as source, archive.open(info, "w") as target:
+                    while True:
+                        data = source.read(READ_CHUNK_SIZE)
+                        if not data:
+                            break
+                        target.write(data)
+                        if buffer.size >= FLUSH_SIZE:
+                            yield buffer.drain()
+            else:
+                content = entry.render()
+                if isinstance(content, str):
+                    content = content.encode("utf-8")
+                info.file_size = len(content)
+                with archive.open(info, "w") as target:
+                    target.write(content)
+            count += 1
+
+            if buffer.size >= FLUSH_SIZE:
+                yield buffer.drain()
+
+    # 中央ディレクトリ（ZipFileを閉じた時点で書き込まれる）
+    yield buffer.drain()
+    logger.info(f"ZIPストリーミング完了: {count}件, {buffer.total}バイト")
+    if on_complete:
+        on_complete(count, buffer.total)
@@ -24,5 +24,10 @@ celery_app.conf.update(
     task_soft_time_limit=1500,  # 25分
     worker_prefetch_multiplier=1,
     worker_max_tasks_per_child=50,
+    # OCR（CPU）とAI分析（API待ち）を別キューにして、文書をまたいで並行に進める
+    task_routes={
+        "app.workers.tasks.process_document_task": {"queue": "ocr"},
+        "app.workers.tasks.analyze_document_task": {"queue": "ai"},
+    },
 )
 
@@ -2,22 +2,274 @@
 RAG関連のCeleryタスク
 """
 import logging
-from typing import List, Dict, Any
+import time
+from datetime import datetime
+from typing import Callable, List, Dict, Any, Optional
 from celery import Celery
+from sqlalchemy import func, or_
 from sqlalchemy.orm import Session
+from config.settings import settings
 from app.models.database import SessionLocal
-from app.models.document import Document, VectorIndex
+from app.models.document import Document, VectorIndex, EmbeddingMigration
+from app.services.chunking_service import split_text
+from app.services.embedding_cache_service import EmbeddingCacheService, content_hash
 from app.services.embedding_service import embedding_service
-from app.services.vector_store_service import vector_store_service
+from app.services.rag_cache_service import invalidate_documents
+from app.services.embedding_registry import (
+    EMBEDDING_MODELS, EmbeddingModelSpec, get_model, serving_model, running_migration, write_models,
+    invalidate_serving_cache
+)
+from app.services.vector_store_service import vector_store_service, filterable_payload
+from app.services.filtering_service import to_timestamp
 from app.workers.celery_app import celery_app
 
 logger = logging.getLogger(__name__)
 
 
+def _build_document_text(document: Document) -> str:
+    """インデックス対象のテキスト（OCR本文 + 要約）を作成"""
+    text_content = ""
+    if document.ocr_text:
+        text_content += document.ocr_text
+    if document.summary:
+        text_content += f"\n\n要約: {document.summary}"
+    return text_content
+
+
+def _build_document_chunks(document: Document) -> List[Dict[str, Any]]:
+    """文書を重複付きチャンクに分割し、Qdrantに登録するペイロードを作成"""
+    texts = split_text(
+        _build_document_text(document),
+        chunk_size=settings.rag_chunk_size,
+        overlap=settings.rag_chunk_overlap
+    )
+    base_payload = {
+        "document_id": document.id,
+        "filename": document.filename,
+        "category": document.category,
+        "file_type": document.file_type,
+        "created_at": document.created_at.isoformat() if document.created_at else None,
+        "created_at_ts": to_timestamp(document.created_at) if document.created_at else None,
+        "is_archived": bool(document.is_archived),
+        "keywords": document.keywords or [],
+        "metadata": document.extracted_metadata or {},
+        **filterable_payload(document.extracted_metadata),
+        "summary": document.summary or "",
+        "chunk_count": len(texts)
+    }
+    return [
+        {
+            "document_id": document.id,
+            "chunk_index": index,
+            "text": text,
+            "payload": {**base_payload, "text": text, "chunk_index": index}
+        }
+        for index, text in enumerate(texts)
+    ]
+
+
+def _save_index_result(
+    db: Session, 
+    existing: Dict[int, VectorIndex], 
+    document_id: int, 
+    model: Optional[EmbeddingModelSpec] = None, 
+    error: Optional[str] = None
+):
+    """VectorIndexに結果を記録"""
+    vector_index = existing.get(document_id)
+    if vector_index is None:
+        vector_index = VectorIndex(document_id=document_id)
+        db.add(vector_index)
+        existing[document_id] = vector_index
+    
+    if error:
+        vector_index.is_indexed = False
+        vector_index.error_message = error
+        return
+    
+    vector_index.is_indexed = True
+    vector_index.vector_id = f"doc_{document_id}"
+    vector_index.embedding_model = model.key
+    vector_index.embedding_dimension = model.dimension
+    vector_index.error_message = None
+    vector_index.last_updated = datetime.utcnow()
+
+
+def _index_documents(
+    db: Session, 
+    documents: List[Document], 
+    models: Optional[List[EmbeddingModelSpec]] = None
+) -> Dict[str, int]:
+    """
+    文書群をチャンク分割・Embedding生成してQdrantにまとめて登録
+    
+    本文ハッシュがキャッシュ済みのチャンクはEmbedding生成を省略し、
+    同一内容のチャンクは1回だけ生成する。
+    
+    Args:
+        models: 登録先のモデル（省略時はサービング中のモデル + 移行中なら移行先）
+    
+    Returns:
+        {"indexed", "skipped", "failed", "chunks", "cached_chunks", "embedded_chunks"}
+    """
+    stats = {"indexed": 0, "skipped": 0, "failed": 0, "chunks": 0, "cached_chunks": 0, "embedded_chunks": 0}
+    models = models or write_models(db)
+    document_ids = [document.id for document in documents]
+    existing = {
+        index.document_id: index
+        for index in db.query(VectorIndex).filter(VectorIndex.document_id.in_(document_ids)).all()
+    }
+    
+    # チャンク分割
+    chunks_by_document: Dict[int, List[Dict[str, Any]]] = {}
+    for document in documents:
+        chunks = _build_document_chunks(document)
+        if not chunks:
+            logger.warning(f"Document {document.id} has no text content")
+            stats["skipped"] += 1
+            continue
+        chunks_by_document[document.id] = chunks
+    
+    all_chunks = [chunk for chunks in chunks_by_document.values() for chunk in chunks]
+    if not all_chunks:
+        return stats
+    
+    for chunk in all_chunks:
+        chunk["hash"] = content_hash(chunk["text"])
+    
+    try:
+        for model in models:
+            # キャッシュに無いチャンクだけEmbeddingを生成（キャッシュはモデルごと）
+            cache = EmbeddingCacheService(db, model.model_name)
+            vectors = cache.get_many(chunk["hash"] for chunk in all_chunks)
+            stats["cached_chunks"] += sum(1 for chunk in all_chunks if chunk["hash"] in vectors)
+            
+            missing = {chunk["hash"]: chunk["text"] for chunk in all_chunks if chunk["hash"] not in vectors}
+            if missing:
+                embeddings = embedding_service.embed(list(missing.values()), model)
+                new_vectors = dict(zip(missing.keys(), embeddings))
+                cache.put_many(new_vectors)
+                vectors.update(new_vectors)
+                stats["embedded_chunks"] += len(new_vectors)
+            
+            for chunk in all_chunks:
+                chunk["vector"] = vectors[chunk["hash"]]
+            
+            # 再インデックス時に古いチャンクが残らないよう既存ポイントを削除してから登録
+            vector_store_service.delete_documents(list(chunks_by_document.keys()), models=[model])
+            stats["chunks"] += vector_store_service.upsert_chunks(
+                all_chunks, model, batch_size=settings.vector_upsert_batch_size
+            )
+    except Exception as e:
+        logger.error(f"Failed to index documents {list(chunks_by_document.keys())}: {e}")
+        db.rollback()
+        existing = {
+            index.document_id: index
+            for index in db.query(VectorIndex).filter(VectorIndex.document_id.in_(document_ids)).all()
+        }
+        for document_id in chunks_by_document:
+            _save_index_result(db, existing, document_id, error=str(e))
+        invalidate_documents(db, document_ids)
+        db.commit()
+        stats["failed"] += len(chunks_by_document)
+        return stats
+    
+    for document_id in chunks_by_document:
+        _save_index_result(db, existing, document_id, model=models[0])
+    # 内容が変わった可能性があるため、これらの文書を引用したRAG回答キャッシュを破棄
+    invalidate_documents(db, document_ids)
+    db.commit()
+    stats["indexed"] += len(chunks_by_document)
+    return stats
+
+
+def _index_document_ids(
+    task, 
+    db: Session, 
+    document_ids: List[int], 
+    models: Optional[List[EmbeddingModelSpec]] = None,
+    on_batch: Optional[Callable[[List[int], Dict[str, int]], None]] = None
+) -> Dict[str, Any]:
+    """
+    文書IDリストを一定件数ずつ読み込んでバッチインデックスし、進捗をタスク状態に記録
+    
+    Args:
+        models: 登録先のモデル（省略時は _index_documents の既定）
+        on_batch: バッチごとに (処理した文書ID, そのバッチの結果) で呼ばれる
+    """
+    totals = {"indexed": 0, "skipped": 0, "failed": 0, "chunks": 0, "cached_chunks": 0, "embedded_chunks": 0}
+    started = time.time()
+    batch_size = settings.index_documents_per_batch
+    
+    for i in range(0, len(document_ids), batch_size):
+        documents = db.query(Document).filter(
+            Document.id.in_(document_ids[i:i + batch_size])
+        ).all()
+        stats = _index_documents(db, documents, models)
+        for key, value in stats.items():
+            totals[key] += value
+        if on_batch:
+            on_batch(document_ids[i:i + batch_size], stats)
+        # 読み込んだ本文をセッションから解放
+        db.expunge_all()
+        
+        processed = min(i + batch_size, len(document_ids))
+        task.update_state(state="PROGRESS", meta={
+            "processed": processed,
+            "total": len(document_ids),
+            **totals
+        })
+        logger.info(f"Indexed {processed}/{len(document_ids)} documents ({totals['chunks']} chunks)")
+    
+    totals["elapsed_seconds"] = round(time.time() - started, 2)
+    return totals
+
+
+def remove_document_vectors(db: Session, document_ids: List[int]) -> bool:
+    """
+    削除する文書のポイントを全モデルのコレクションから削除
+    
+    削除できた文書のVectorIndexも消す（失敗した場合は残し、cleanup_vector_indexで再削除される）。
+    コミットは呼び出し側で行う。
+    """
+    if not vector_store_service.delete_documents(document_ids, models=list(EMBEDDING_MODELS.values())):
+        return False
+    db.query(VectorIndex).filter(VectorIndex.document_id.in_(document_ids)).delete(synchronize_session=False)
+    return True
+
+
+def _reset_missing_serving_index(db: Session) -> List[int]:
+    """
+    サービング中のモデルのコレクションが無い・空なのにインデックス済みの記録がある場合、
+    記録をリセットして再登録の対象にする（コレクション名の変更やQdrantのデータ消失後）
+    
+    Returns:
+        リセットした文書IDリスト
+    """
+    indexed = db.query(VectorIndex.document_id).filter(VectorIndex.is_indexed == True)
+    if indexed.first() is None:
+        return []
+    
+    model = serving_model(db)
+    if vector_store_service.count_points(model) != 0:
+        return []
+    
+    document_ids = [row.document_id for row in indexed.all()]
+    db.query(VectorIndex).filter(VectorIndex.document_id.in_(document_ids)).update(
+        {"is_indexed": False, "error_message": None}, synchronize_session=False
+    )
+    db.commit()
+    logger.warning(
+        f"Collection {model.collection_name} is missing or empty; "
+        f"re-indexing {len(document_ids)} documents marked as indexed"
+    )
+    return document_ids
+
+
 @celery_app.task(bind=True)
 def index_document_to_vector(self, document_id: int):
     """
-    単一文書をベクトル化してQdrantに登録
+    単一文書をチャンク分割・ベクトル化してQdrantに登録
     
     Args:
         document_id: 文書ID
@@ -44,97 +296,19 @@ def index_document_to_vector(self, document_id: int):
             logger.info(f"Document {document_id} already indexed")
             return {"status": "skipped", "message": "Already indexed"}
         
-        # テキスト準備
-        text_content = ""
-        if document.ocr_text:
-            text_content += document.ocr_text
-        if document.summary:
-            text_content += f"\n\n要約: {document.summary}"
+        stats = _index_documents(db, [document])
         
-        if not text_content.strip():
-            logger.warning(f"Document {document_id} has no text content")
+        if stats["indexed"]:
+            logger.info(f"Successfully indexed document {document_id} ({stats['chunks']} chunks)")
+            return {"status": "success", "document_id": document_id, "chunks": stats["chunks"]}
+        if stats["skipped"]:
             return {"status": "skipped", "message": "No text content"}
         
-        # Embedding生成
-        embedding = embedding_service.generate_single_embedding(text_content)
-        
-        # 文書データ準備
-        doc_data = {
-            "id": document.id,
-            "filename": document.filename,
-            "category": document.category,
-            "file_type": document.file_type,
-            "created_at": document.created_at.isoformat() if document.created_at else None,
-            "keywords": document.keywords or [],
-            "extracted_metadata": document.extracted_metadata or {},
-            "text": text_content,
-            "summary": document.summary
-        }
-        
-        # Qdrantに登録
-        success = vector_store_service.add_documents([doc_data], [embedding])
-        
-        if success:
-            # ベクトルインデックス情報を保存
-            if existing_index:
-                existing_index.is_indexed = True
-                existing_index.vector_id = f"doc_{document_id}"
-                existing_index.embedding_model = "text-embedding-3-small"
-                existing_index.embedding_dimension = len(embedding)
-                existing_index.error_message = None
-            else:
-                vector_index = VectorIndex(
-                    document_id=document_id,
-                    vector_id=f"doc_{document_id}",
-                    embedding_model="text-embedding-3-small",
-                    embedding_dimension=len(embedding),
-                    is_indexed=True
-                )
-                db.add(vector_index)
-            
-            db.commit()
-            logger.info(f"Successfully indexed document {document_id}")
-            return {"status": "success", "document_id": document_id}
-        else:
-            # エラー情報を保存
-            if existing_index:
-                existing_index.error_message = "Failed to add to vector store"
-            else:
-                vector_index = VectorIndex(
-                    document_id=document_id,
-                    is_indexed=False,
-                    error_message="Failed to add to vector store"
-                )
-                db.add(vector_index)
-            
-            db.commit()
-            logger.error(f"Failed to index document {document_id}")
-            return {"status": "error", "message": "Failed to add to vector store"}
+        logger.error(f"Failed to index document {document_id}")
+        return {"status": "error", "message": "Failed to add to vector store"}
             
     except Exception as e:
         logger.error(f"Error indexing document {document_id}: {e}")
-        
-        # エラー情報を保存
-        try:
-            db = SessionLocal()
-            existing_index = db.query(VectorIndex).filter(
-                VectorIndex.document_id == document_id
-            ).first()
-            
-            if existing_index:
-                existing_index.error_message = str(e)
-            else:
-                vector_index = VectorIndex(
-                    document_id=document_id,
-                    is_indexed=False,
-                    error_message=str(e)
-                )
-                db.add(vector_index)
-            
-            db.commit()
-        except Exception as db_error:
-            logger.error(f"Failed to save error info: {db_error}")
-        
         return {"status": "error", "message": str(e)}
     
     finally:
@@ -147,39 +321,28 @@ def batch_index_documents(self, document_ids: List[int] = None):
     """
     複数文書をバッチでベクトル化
     
+    文書ごとにタスクを分けず、チャンクのEmbedding生成とQdrant登録をまとめて行います。
+    
     Args:
         document_ids: 文書IDリスト（Noneの場合は全処理済み文書）
     """
     try:
         db = SessionLocal()
         
-        # 対象文書の取得
+        # 対象文書のIDのみ取得（本文はバッチごとに読み込む）
+        query = db.query(Document.id).filter(Document.status == "completed")
         if document_ids:
-            documents = db.query(Document).filter(
-                Document.id.in_(document_ids),
-                Document.status == "completed"
-            ).all()
-        else:
-            documents = db.query(Document).filter(
-                Document.status == "completed"
-            ).all()
-        
-        logger.info(f"Starting batch indexing for {len(documents)} documents")
+            query = query.filter(Document.id.in_(document_ids))
+        target_ids = [row.id for row in query.order_by(Document.id).all()]
         
-        # 各文書をベクトル化
-        results = []
-        for document in documents:
-            result = index_document_to_vector.delay(document.id)
-            results.append({
-                "document_id": document.id,
-                "task_id": result.id
-            })
+        logger.info(f"Starting batch indexing for {len(target_ids)} documents")
+        totals = _index_document_ids(self, db, target_ids)
         
-        logger.info(f"Started indexing tasks for {len(results)} documents")
+        logger.info(f"Batch indexing finished: {totals}")
         return {
-            "status": "started",
-            "total_documents": len(documents),
-            "tasks": results
+            "status": "success",
+            "total_documents": len(target_ids),
+            **totals
         }
         
     except Exception as e:
@@ -196,36 +359,32 @@ def rebuild_vector_index(self):
     """
     ベクトルインデックスの再構築
     
-    全文書のベクトル化を再実行します。
+    全文書のベクトル化を再実行します。本文が変わっていないチャンクは
+    Embeddingキャッシュから再利用されます。
     """
     try:
         db = SessionLocal()
         
-        # 全処理済み文書を取得
-        documents = db.query(Document).filter(
-            Document.status == "completed"
-        ).all()
+        # 全処理済み文書のIDを取得
+        target_ids = [
+            row.id for row in db.query(Document.id).filter(
+                Document.status == "completed"
+            ).order_by(Document.id).all()
+        ]
         
-        logger.info(f"Starting vector index rebuild for {len(documents)} documents")
+        logger.info(f"Starting vector index rebuild for {len(target_ids)} documents")
         
         # 既存のベクトルインデックスをリセット
         db.query(VectorIndex).update({"is_indexed": False, "error_message": None})
         db.commit()
         
-        # バッチ処理でベクトル化
-        results = []
-        for document in documents:
-            result = index_document_to_vector.delay(document.id)
-            results.append({
-                "document_id": document.id,
-                "task_id": result.id
-            })
+        totals = _index_document_ids(self, db, target_ids)
         
-        logger.info(f"Started rebuild tasks for {len(results)} documents")
+        logger.info(f"Vector index rebuild finished: {totals}")
         return {
-            "status": "started",
-            "total_documents": len(documents),
-            "tasks": results
+            "status": "success",
+            "total_documents": len(target_ids),
+            **totals
         }
         
     except Exception as e:
@@ -264,6 +423,7 @@ def cleanup_vector_index(self):
                 db.delete(index)
                 deleted_count += 1
         
+        invalidate_documents(db, [index.document_id for index in deleted_indexes])
         db.commit()
         
         logger.info(f"Cleaned up {deleted_count} orphaned vector indexes")
@@ -286,37 +446,34 @@ def sync_new_documents(self):
     """
     新規文書の同期
     
-    処理完了した新規文書をベクトル化します。
+    処理完了した新規文書をベクトル化します。サービング中のモデルのコレクションが
+    無い・空の場合は、インデックス済みとして記録されている文書も登録し直します。
     """
     try:
         db = SessionLocal()
         
-        # ベクトル化されていない処理済み文書を取得
-        documents = db.query(Document).filter(
+        reset_ids = _reset_missing_serving_index(db)
+        
+        # ベクトル化されていない処理済み文書のIDを取得
+        documents = db.query(Document.id).filter(
             Document.status == "completed"
         ).outerjoin(VectorIndex, Document.id == VectorIndex.document_id).filter(
-            VectorIndex.document_id.is_(None)
-        ).all()
+            or_(VectorIndex.document_id.is_(None), VectorIndex.document_id.in_(reset_ids))
+        ).order_by(Document.id).all()
         
         logger.info(f"Found {len(documents)} new documents to sync")
         
         if not documents:
             return {"status": "success", "message": "No new documents to sync"}
         
-        # 各文書をベクトル化
-        results = []
-        for document in documents:
-            result = index_document_to_vector.delay(document.id)
-            results.append({
-                "document_id": document.id,
-                "task_id": result.id
-            })
+        # まとめてベクトル化
+        totals = _index_document_ids(self, db, [document.id for document in documents])
         
-        logger.info(f"Started sync tasks for {len(results)} documents")
+        logger.info(f"Synced {totals['indexed']} new documents")
         return {
-            "status": "started",
+            "status": "success",
             "new_documents": len(documents),
-            "tasks": results
+            **totals
         }
         
     except Exception as e:
@@ -328,5 +485,117 @@ def sync_new_documents(self):
             db.close()
 
 
-
-
+@celery_app.task(bind=True)
+def reembed_documents(self, target_model: str):
+    """
+    Embeddingモデルの移行（再Embedding）
+    
+    全処理済み文書を移行先モデルのコレクションにバッチで登録する。移行中も検索は
+    現在のモデルで続け、新規文書は両方のモデルに登録される。全件完了した時点で
+    検索に使うモデルを移行先に切り替える。失敗・中断した場合は同じモデルを指定して
+    再実行すると、最後に失敗した文書を含むバッチから処理を再開する（失敗後に更新された
+    文書も再登録する）。
+    
+    Args:
+        target_model: 移行先モデルのキー（embedding_registry.EMBEDDING_MODELS）
+    """
+    try:
+        db = SessionLocal()
+        target = get_model(target_model)
+        source = serving_model(db)
+        if target == source:
+            return {"status": "skipped", "message": f"Already serving {target.key}"}
+        
+        migration = running_migration(db)
+        if migration and migration.target_model != target.key:
+            return {"status": "error", "message": f"Migration to {migration.target_model} is already running"}
+        if migration is None:
+            # 同じ移行先で失敗した移行があればその続きから再開する
+            migration = db.query(EmbeddingMigration).filter(
+                EmbeddingMigration.target_model == target.key,
+                EmbeddingMigration.status == "failed"
+            ).order_by(EmbeddingMigration.started_at.desc()).first()
+        
+        resumed_from = None
+        if migration is None:
+            migration = EmbeddingMigration(source_model=source.key, target_model=target.key, status="running")
+            db.add(migration)
+        elif migration.status == "failed":
+            resumed_from = migration.completed_at
+            migration.status = "running"
+            migration.error_message = None
+            migration.completed_at = None
+        db.commit()
+        migration_id = migration.id
+        last_document_id = migration.last_document_id or 0
+        
+        # 前回の続きから（ID順に処理済みの位置を記録している）
+        query = db.query(Document.id).filter(Document.status == "completed")
+        if resumed_from:
+            # 失敗後は移行先に書き込まれていないため、その間に更新された処理済み文書もやり直す
+            query = query.filter(or_(Document.id > last_document_id, Document.updated_at >= resumed_from))
+        else:
+            query = query.filter(Document.id > last_document_id)
+        target_ids = [row.id for row in query.order_by(Document.id).all()]
+        db.query(EmbeddingMigration).filter(EmbeddingMigration.id == migration_id).update({
+            "total_documents": (migration.processed_documents or 0) + len(target_ids)
+        })
+        db.commit()
+        logger.info(f"Starting re-embedding {source.key} -> {target.key}: {len(target_ids)} documents")
+        
+        # 失敗した文書を含むバッチ以降は再開位置を進めない（再実行時にやり直す）
+        progress = {"blocked": False}
+        
+        def record_progress(batch_ids: List[int], stats: Dict[str, int]):
+            if stats["failed"]:
+                progress["blocked"] = True
+            if progress["blocked"]:
+                return
+            db.query(EmbeddingMigration).filter(EmbeddingMigration.id == migration_id).update({
+                "processed_documents": EmbeddingMigration.processed_documents + len(batch_ids),
+                "last_document_id": func.greatest(EmbeddingMigration.last_document_id, max(batch_ids))
+            }, synchronize_session=False)
+            db.commit()
+        
+        totals = _index_document_ids(self, db, target_ids, models=[target], on_batch=record_progress)
+        
+        if totals["failed"]:
+            db.query(EmbeddingMigration).filter(EmbeddingMigration.id == migration_id).update({
+                "status": "failed",
+                "error_message": f"{totals['failed']} documents failed",
+                "completed_at": datetime.utcnow()
+            })
+            db.commit()
+            logger.error(f"Re-embedding {source.key} -> {target.key} failed: {totals}")
+            return {"status": "error", "migration_id": migration_id, **totals}
+        
+        # 検索に使うモデルを切り替え
+        db.query(EmbeddingMigration).filter(EmbeddingMigration.id == migration_id).update({
+            "status": "completed",
+            "completed_at": datetime.utcnow()
+        })
+        db.query(VectorIndex).filter(VectorIndex.is_indexed == True).update({
+            "embedding_model": target.key,
+            "embedding_dimension": target.dimension
+        })
+        db.commit()
+        invalidate_serving_cache()
+        
+        logger.info(f"Re-embedding {source.key} -> {target.key} completed: {totals}")
+        return {"status": "success", "migration_id": migration_id, "total_documents": len(target_ids), **totals}
+        
+    except Exception as e:
+        logger.error(f"Error in re-embedding: {e}")
+        if 'migration_id' in locals():
+            db.rollback()
+            db.query(EmbeddingMigration).filter(EmbeddingMigration.id == migration_id).update({
+                "status": "failed",
+                "error_message": str(e),
+                "completed_at": datetime.utcnow()
+            })
+            db.commit()
+        return {"status": "error", "message": str(e)}
+    
+    finally:
+        if 'db' in locals():
+            db.close()
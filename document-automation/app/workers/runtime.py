@@ -0,0 +1,138 @@
+"""
+ワーカープロセスの実行環境
+OCR・AIクライアントとイベントループをワーカープロセスごとに1つだけ作って使い回し、
+ステージ（OCR / AI分析）ごとの処理件数・処理時間をRedisに集計する
+"""
+import asyncio
+import logging
+import threading
+import time
+from typing import Optional
+import redis
+from celery.signals import worker_process_init, worker_process_shutdown
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# ステージ別集計のRedisキー
+STAGE_STATS_KEY = "document_automation:stage_stats:{stage}"
+STAGES = ("ocr", "ai")
+
+# この件数ごとにプロセス内の集計をログに出す
+LOG_EVERY = 10
+
+
+class WorkerRuntime:
+    """ワーカープロセス内で共有するイベントループとサービス"""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self._ocr_service = None
+        self._ai_service = None
+        self._redis = None
+        self.local_stats = {stage: {"documents": 0, "cached": 0, "seconds": 0.0} for stage in STAGES}
+        self.started_at = time.time()
+
+    @property
+    def ocr_service(self):
+        if self._ocr_service is None:
+            from app.services.ocr_service import OCRService
+            self._ocr_service = OCRService()
+        return self._ocr_service
+
+    @property
+    def ai_service(self):
+        if self._ai_service is None:
+            from app.services.ai_service import AIService
+            self._ai_service = AIService()
+        return self._ai_service
+
+    def run(self, coroutine):
+        """コルーチンを共有イベントループで実行"""
+        return self.loop.run_until_complete(coroutine)
+
+    def record_stage(self, stage: str, elapsed: float, cached: bool = False):
+        """ステージの処理時間を記録（プロセス内とRedisの両方）"""
+        stats = self.local_stats[stage]
+        stats["documents"] += 1
+        stats["seconds"] += elapsed
+        if cached:
+            stats["cached"] += 1
+
+        try:
+            if self._redis is None:
+                self._redis = redis.Redis.from_url(settings.redis_url)
+            key = STAGE_STATS_KEY.format(stage=stage)
+            pipe = self._redis.pipeline()
+            pipe.hincrby(key, "documents", 1)
+            pipe.hincrbyfloat(key, "seconds", elapsed)
+            if cached:
+                pipe.hincrby(key, "cached", 1)
+            pipe.hset(key, "last_completed_at", time.time())
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"ステージ集計の保存エラー: {e}")
+
+        if stats["documents"] % LOG_EVERY == 0:
+            self.log_stats()
+
+    def log_stats(self):
+        """プロセス内のステージ別スループットをログに出す"""
+        uptime = max(time.time() - self.started_at, 1e-9)
+        for stage, stats in self.local_stats.items():
+            if not stats["documents"]:
+                continue
+            average = stats["seconds"] / stats["documents"]
+            logger.info(f"ステージ集計 [{stage}]: {stats['documents']}件 (キャッシュ {stats['cached']}件), "
+                        f"平均 {average:.2f}秒/件, {stats['documents'] / uptime * 60:.1f}件/分")
+
+    def close(self):
+        self.log_stats()
+        if not self.loop.is_closed():
+            self.loop.close()
+
+
+_runtime: Optional[WorkerRuntime] = None
+_runtime_lock = threading.Lock()
+
+
+def get_runtime() -> WorkerRuntime:
+    """このワーカープロセスの実行環境を取得"""
+    global _runtime
+    with _runtime_lock:
+        if _runtime is None:
+            _runtime = WorkerRuntime()
+        return _runtime
+
+
+@worker_process_init.connect
+def _init_runtime(**kwargs):
+    # fork前に作ったクライアントを子プロセスで共有しないよう、子プロセスの起動時に作り直す
+    global _runtime
+    _runtime = None
+    get_runtime()
+
+
+@worker_process_shutdown.connect
+def _close_runtime(**kwargs):
+    if _runtime is not None:
+        _runtime.close()
+
+
+def get_stage_stats() -> dict:
+    """全ワーカーのステージ別集計（Redis）"""
+    client = redis.Redis.from_url(settings.redis_url, decode_responses=True)
+    result = {}
+    for stage in STAGES:
+        values = client.hgetall(STAGE_STATS_KEY.format(stage=stage))
+        documents = int(values.get("documents", 0))
+        seconds = float(values.get("seconds", 0))
+        result[stage] = {
+            "documents": documents,
+            "cached": int(values.get("cached", 0)),
+            "total_seconds": round(seconds, 2),
+            "average_seconds": round(seconds / documents, 2) if documents else 0,
+            "last_completed_at": float(values["last_completed_at"]) if "last_completed_at" in values else None
+        }
+    return result
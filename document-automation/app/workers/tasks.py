@@ -4,14 +4,16 @@
 from app.workers.celery_app import celery_app
 from app.models.database import get_db_session
 from app.models.document import Document, ProcessingLog
-from app.services.ocr_service import OCRService
-from app.services.ai_service import AIService
+from app.services.file_storage_service import remove_document_file
+from app.services.rag_cache_service import invalidate_documents
+from app.services.result_cache_service import ResultCacheService
+from app.workers.runtime import get_runtime
 from datetime import datetime
 import logging
 import time
 
 # RAGタスクをインポート
-from app.workers.rag_tasks import index_document_to_vector, rebuild_vector_index
+from app.workers.rag_tasks import index_document_to_vector, rebuild_vector_index, remove_document_vectors
 
 logger = logging.getLogger(__name__)
 
@@ -19,10 +21,14 @@ logger = logging.getLogger(__name__)
 @celery_app.task(name="app.workers.tasks.process_document_task")
 def process_document_task(document_id: int):
     """
-    ドキュメント処理タスク
+    ドキュメント処理タスク（OCRステージ）
+    
+    OCRが終わったらAI分析ステージ（aiキュー）に引き渡す。CPUを使うTesseractと
+    API待ちのLLM呼び出しを別キューにすることで、複数文書の処理が重なって進む。
     """
     logger.info(f"ドキュメント処理開始: ID {document_id}")
     start_time = time.time()
+    runtime = get_runtime()
     
     try:
         with get_db_session() as db:
@@ -40,38 +46,80 @@ def process_document_task(document_id: int):
             log_processing(db, document_id, "INFO", "processing_started", "処理を開始しました")
             
             try:
-                # 1. OCR処理
+                # OCR処理（同じ内容のファイルの結果があれば再利用）
                 logger.info(f"OCR処理開始: {document.original_filename}")
                 log_processing(db, document_id, "INFO", "ocr_started", "OCR処理を開始")
                 
-                ocr_service = OCRService()
-                ocr_result = ocr_service.__class__().process_document(document.file_path)
-                # 同期的に実行（awaitを使わない）
-                import asyncio
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                ocr_result = loop.run_until_complete(ocr_service.process_document(document.file_path))
-                loop.close()
+                result_cache = ResultCacheService(db)
+                ocr_result = result_cache.get_ocr(document.content_hash)
+                ocr_cached = ocr_result is not None
+                if not ocr_cached:
+                    ocr_result = runtime.run(runtime.ocr_service.process_document(document.file_path))
+                    result_cache.put_ocr(document.content_hash, ocr_result)
                 
                 document.ocr_text = ocr_result["text"]
                 document.ocr_confidence = ocr_result["confidence"]
                 document.ocr_engine = ocr_result["engine"]
                 db.commit()
                 
+                ocr_time = time.time() - start_time
+                runtime.record_stage("ocr", ocr_time, ocr_cached)
                 log_processing(db, document_id, "INFO", "ocr_completed", 
-                             f"OCR完了: {len(ocr_result['text'])}文字, 信頼度{ocr_result['confidence']:.2f}")
+                             f"OCR完了: {len(ocr_result['text'])}文字, 信頼度{ocr_result['confidence']:.2f}",
+                             {"pages": ocr_result.get("pages"), "page_results": ocr_result.get("page_results") or [],
+                              "cached": ocr_cached, "stage_seconds": round(ocr_time, 2)})
                 
-                # 2. AI要約・分類
+            except Exception as e:
+                fail_document(db, document, e, start_time)
+                raise
+        
+        # AI分析ステージへ
+        analyze_document_task.delay(document_id, start_time)
+        
+        return {
+            "status": "ocr_completed",
+            "document_id": document_id,
+            "ocr_time": ocr_time
+        }
+                
+    except Exception as e:
+        logger.error(f"タスク実行エラー: {e}")
+        raise
+
+
+@celery_app.task(name="app.workers.tasks.analyze_document_task")
+def analyze_document_task(document_id: int, started_at: float = None):
+    """
+    ドキュメント処理タスク（AI分析ステージ）
+    
+    Args:
+        document_id: ドキュメントID
+        started_at: OCRステージの開始時刻（処理時間の計算用）
+    """
+    stage_start = time.time()
+    start_time = started_at or stage_start
+    runtime = get_runtime()
+    
+    try:
+        with get_db_session() as db:
+            document = db.query(Document).filter(Document.id == document_id).first()
+            if not document:
+                logger.error(f"ドキュメントが見つかりません: ID {document_id}")
+                return
+            
+            try:
+                # AI要約・分類（同じ内容のファイルの結果があれば再利用）
                 logger.info(f"AI分析開始: {document.original_filename}")
                 log_processing(db, document_id, "INFO", "ai_started", "AI分析を開始")
                 
-                ai_service = AIService()
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                ai_result = loop.run_until_complete(
-                    ai_service.analyze_document(document.ocr_text, document.original_filename)
-                )
-                loop.close()
+                result_cache = ResultCacheService(db)
+                ai_result = result_cache.get_ai(document.content_hash)
+                ai_cached = ai_result is not None
+                if not ai_cached:
+                    ai_result = runtime.run(
+                        runtime.ai_service.analyze_document(document.ocr_text or "", document.original_filename)
+                    )
+                    result_cache.put_ai(document.content_hash, ai_result)
                 
                 document.summary = ai_result["summary"]
                 document.category = ai_result["category"]
@@ -79,10 +127,13 @@ def process_document_task(document_id: int):
                 document.extracted_metadata = ai_result["metadata"]
                 db.commit()
                 
+                ai_time = time.time() - stage_start
+                runtime.record_stage("ai", ai_time, ai_cached)
                 log_processing(db, document_id, "INFO", "ai_completed", 
-                             f"AI分析完了: カテゴリ={ai_result['category']}")
+                             f"AI分析完了: カテゴリ={ai_result['category']}",
+                             {"cached": ai_cached, "stage_seconds": round(ai_time, 2)})
                 
-                # 3. 処理完了
+                # 処理完了
                 processing_time = time.time() - start_time
                 document.status = "completed"
                 document.processing_time = processing_time
@@ -101,16 +152,7 @@ def process_document_task(document_id: int):
                 }
                 
             except Exception as e:
-                # エラーハンドリング
-                logger.error(f"ドキュメント処理エラー: {e}")
-                
-                document.status = "failed"
-                document.error_message = str(e)
-                document.processing_time = time.time() - start_time
-                db.commit()
-                
-                log_processing(db, document_id, "ERROR", "processing_failed", str(e))
-                
+                fail_document(db, document, e, start_time)
                 raise
                 
     except Exception as e:
@@ -118,6 +160,18 @@ def process_document_task(document_id: int):
         raise
 
 
+def fail_document(db, document: Document, error: Exception, start_time: float):
+    """ドキュメントを失敗状態にしてログを記録"""
+    logger.error(f"ドキュメント処理エラー: {error}")
+    
+    document.status = "failed"
+    document.error_message = str(error)
+    document.processing_time = time.time() - start_time
+    db.commit()
+    
+    log_processing(db, document.id, "ERROR", "processing_failed", str(error))
+
+
 def log_processing(db, document_id: int, level: str, step: str, message: str, details: dict = None):
     """処理ログを記録"""
     try:
@@ -138,14 +192,20 @@ def log_processing(db, document_id: int, level: str, step: str, message: str, de
 def batch_process_task(document_ids: list[int]):
     """
     バッチ処理タスク
+    
+    各ドキュメントをOCRキューに登録する（ワーカー間で並列に処理される）。
     """
     logger.info(f"バッチ処理開始: {len(document_ids)}件")
     
     results = []
     for document_id in document_ids:
         try:
-            result = process_document_task(document_id)
-            results.append(result)
+            task = process_document_task.delay(document_id)
+            results.append({
+                "status": "queued",
+                "document_id": document_id,
+                "task_id": task.id
+            })
         except Exception as e:
             logger.error(f"バッチ処理エラー (ID {document_id}): {e}")
             results.append({
@@ -154,7 +214,7 @@ def batch_process_task(document_ids: list[int]):
                 "error": str(e)
             })
     
-    logger.info(f"バッチ処理完了: {len(results)}件")
+    logger.info(f"バッチ処理登録完了: {len(results)}件")
     return results
 
 
@@ -167,7 +227,6 @@ def cleanup_old_files_task():
     
     try:
         from datetime import timedelta
-        import os
         
         with get_db_session() as db:
             # 30日以上前のアーカイブ済みドキュメント
@@ -177,18 +236,25 @@ def cleanup_old_files_task():
                 Document.created_at < cutoff_date
             ).all()
             
-            deleted_count = 0
+            deleted_ids = []
             for doc in old_documents:
                 try:
-                    # ファイル削除
-                    if os.path.exists(doc.file_path):
-                        os.remove(doc.file_path)
+                    # ファイル削除（同じ内容の他のドキュメントが参照していれば残す）
+                    remove_document_file(db, doc)
                     
                     # DB削除
                     db.delete(doc)
-                    deleted_count += 1
+                    db.flush()
+                    deleted_ids.append(doc.id)
                 except Exception as e:
                     logger.error(f"ファイル削除エラー (ID {doc.id}): {e}")
+            deleted_count = len(deleted_ids)
+            
+            if deleted_ids:
+                # 削除した文書のRAG回答キャッシュとQdrantのポイントを破棄
+                invalidate_documents(db, deleted_ids)
+                if not remove_document_vectors(db, deleted_ids):
+                    logger.error(f"ベクトル削除エラー: {deleted_ids}")
             
             db.commit()
             
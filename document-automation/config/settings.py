@@ -25,19 +25,40 @@ class Settings(BaseSettings):
     # OCR設定
     ocr_engine: Literal["cloud", "local"] = "cloud"
     ocr_language: str = "jpn,eng"  # Tesseractの言語コード
+    ocr_confidence_target: float = 0.8  # この信頼度に達したPSMで打ち切る
+    ocr_max_psm_attempts: int = 3  # 目標に届かない場合に試すPSM候補数
     
     # AI設定
     ai_provider: Literal["gemini", "openai", "claude", "local"] = "gemini"
     gemini_model: str = "gemini-2.5-flash"
     openai_api_key: str = ""
+    llm_max_concurrency: int = 4  # プロセス内で同時に実行するLLM呼び出し数
+    llm_timeout_seconds: float = 60  # 1回のLLM呼び出しのタイムアウト
+    llm_max_retries: int = 3  # 429・一時的エラー時の再試行回数
+    llm_retry_backoff_seconds: float = 2.0  # 再試行の初回待ち時間（指数的に増加）
     
     # RAG設定
     qdrant_url: str = "http://qdrant:6333"
-    embedding_model: Literal["openai", "local"] = "local"
-    embedding_dimension: int = 384  # sentence-transformers/all-MiniLM-L6-v2
+    # 初期のEmbeddingモデル（embedding_registry.EMBEDDING_MODELS のキー）
+    # 運用中の変更は POST /api/rag/index/reembed で移行する（次元数はモデル定義に従う）
+    embedding_model: str = "local"
+    embedding_dimension: int = 384  # 参考値（実際の次元数はモデル定義を使用）
     vector_collection_name: str = "documents"
     similarity_threshold: float = 0.7
     max_search_results: int = 10
+    rag_chunk_size: int = 800  # 1チャンクの文字数
+    rag_chunk_overlap: int = 150  # 前後チャンクとの重複文字数
+    embedding_batch_size: int = 64  # 1回のencodeに渡すチャンク数
+    vector_upsert_batch_size: int = 256  # Qdrantへの1回のupsert件数
+    index_documents_per_batch: int = 50  # インデックス処理で1度に読み込む文書数
+    rag_hybrid_search: bool = True  # ベクトル検索と全文検索を統合する
+    rag_rrf_k: int = 60  # 逆順位融合（RRF）の定数
+    rag_numeric_metadata_fields: str = "amount,total,price"  # 範囲検索用にインデックスするメタデータ（数値）
+    rag_query_embedding_cache_size: int = 1024  # クエリEmbeddingのLRU件数（プロセスごと）
+    rag_answer_cache_enabled: bool = True  # 類似した質問に保存済みの回答を返す
+    rag_answer_cache_similarity: float = 0.95  # キャッシュを使うクエリ間のコサイン類似度
+    rag_answer_cache_ttl_seconds: int = 86400  # キャッシュの有効期間
+    rag_answer_cache_max_candidates: int = 500  # 1回の照合で比較するキャッシュ件数
     
     # Notion (Phase 2)
     notion_api_key: str = ""
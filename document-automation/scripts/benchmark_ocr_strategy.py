@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+ローカルOCRのPSM選択ベンチマーク
+従来の全探索（5つのPSM × image_to_string + image_to_data）と、適応的なPSM選択を
+同じ画像で比較し、処理速度・信頼度・テキストの一致率を表示する
+
+使い方:
+    python scripts/benchmark_ocr_strategy.py sample1.png sample2.pdf ...
+    （正解テキストがある場合は同名の .txt を置くと文字一致率も表示）
+"""
+
+import argparse
+import difflib
+import sys
+import time
+from pathlib import Path
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytesseract
+from PIL import Image
+from pdf2image import convert_from_path
+
+from app.services.ocr_service import preprocess_image, _tesseract_lang
+from app.services.ocr_strategy import PSMStats, adaptive_tesseract
+
+LEGACY_PSM_CONFIGS = [
+    r'--oem 3 --psm 1',
+    r'--oem 3 --psm 3',
+    r'--oem 3 --psm 4',
+    r'--oem 3 --psm 6',
+    r'--oem 3 --psm 8',
+]
+
+
+def exhaustive_tesseract(image: Image.Image, lang: str) -> dict:
+    """従来方式: 全PSMで image_to_string と image_to_data を実行して最良を選ぶ"""
+    best_text, best_confidence, best_config = "", 0, ""
+    for config in LEGACY_PSM_CONFIGS:
+        try:
+            text = pytesseract.image_to_string(image, lang=lang, config=config)
+            data = pytesseract.image_to_data(image, lang=lang, config=config, output_type=pytesseract.Output.DICT)
+        except Exception as e:
+            print(f"  {config} でエラー: {e}")
+            continue
+        confidences = [float(conf) for conf in data['conf'] if float(conf) >= 0]
+        avg_confidence = sum(confidences) / len(confidences) / 100 if confidences else 0
+        if len(text.strip()) * avg_confidence > len(best_text.strip()) * best_confidence:
+            best_text, best_confidence, best_config = text, avg_confidence, config
+    return {"text": best_text, "confidence": best_confidence, "psm": best_config, "attempts": len(LEGACY_PSM_CONFIGS) * 2}
+
+
+def load_pages(path: Path):
+    """画像またはPDFの各ページを読み込む"""
+    if path.suffix.lower() == ".pdf":
+        return convert_from_path(str(path), dpi=300)
+    return [Image.open(path)]
+
+
+def similarity(a: str, b: str) -> float:
+    """空白を除いた文字列の一致率"""
+    return difflib.SequenceMatcher(None, "".join(a.split()), "".join(b.split())).ratio()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ローカルOCRのPSM選択ベンチマーク")
+    parser.add_argument("files", nargs="+", help="画像またはPDFファイル")
+    parser.add_argument("--target", type=float, default=0.8, help="打ち切る信頼度")
+    parser.add_argument("--max-attempts", type=int, default=3, help="試すPSM候補の最大数")
+    args = parser.parse_args()
+
+    lang = _tesseract_lang()
+    stats = PSMStats()
+    totals = {"legacy": 0.0, "adaptive": 0.0, "legacy_calls": 0, "adaptive_calls": 0, "pages": 0}
+    agreement, accuracy_legacy, accuracy_adaptive = [], [], []
+
+    for file in args.files:
+        path = Path(file)
+        ground_truth_path = path.with_suffix(".txt")
+        ground_truth = ground_truth_path.read_text(encoding="utf-8") if ground_truth_path.exists() else None
+
+        for page_number, page in enumerate(load_pages(path), 1):
+            image = preprocess_image(page)
+
+            started = time.perf_counter()
+            legacy = exhaustive_tesseract(image, lang)
+            legacy_time = time.perf_counter() - started
+
+            started = time.perf_counter()
+            adaptive = adaptive_tesseract(image, lang, doc_type=path.suffix.lstrip(".").lower(),
+                                          confidence_target=args.target, max_attempts=args.max_attempts,
+                                          stats=stats)
+            adaptive_time = time.perf_counter() - started
+
+            totals["legacy"] += legacy_time
+            totals["adaptive"] += adaptive_time
+            totals["legacy_calls"] += legacy["attempts"]
+            totals["adaptive_calls"] += adaptive["attempts"]
+            totals["pages"] += 1
+            agreement.append(similarity(legacy["text"], adaptive["text"]))
+
+            line = (f"{path.name} p{page_number}: 全探索 {legacy_time:.2f}秒 (信頼度 {legacy['confidence']:.2f}, {legacy['psm']}) / "
+                    f"適応 {adaptive_time:.2f}秒 (信頼度 {adaptive['confidence']:.2f}, psm {adaptive['psm']}, "
+                    f"{adaptive['layout']}, {adaptive['attempts']}回)")
+            if ground_truth is not None and page_number == 1:
+                accuracy_legacy.append(similarity(legacy["text"], ground_truth))
+                accuracy_adaptive.append(similarity(adaptive["text"], ground_truth))
+                line += f" / 正解一致率 {accuracy_legacy[-1]:.3f} → {accuracy_adaptive[-1]:.3f}"
+            print(line)
+
+    if not totals["pages"]:
+        return 1
+
+    print()
+    print(f"ページ数: {totals['pages']}")
+    print(f"全探索: {totals['pages'] / totals['legacy']:.2f} ページ/秒 (Tesseract呼び出し {totals['legacy_calls']}回)")
+    print(f"適応:   {totals['pages'] / totals['adaptive']:.2f} ページ/秒 (Tesseract呼び出し {totals['adaptive_calls']}回)")
+    print(f"高速化: {totals['legacy'] / totals['adaptive']:.1f}倍")
+    print(f"全探索との出力一致率（平均）: {sum(agreement) / len(agreement):.3f}")
+    if accuracy_legacy:
+        print(f"正解一致率（平均）: 全探索 {sum(accuracy_legacy) / len(accuracy_legacy):.3f} / "
+              f"適応 {sum(accuracy_adaptive) / len(accuracy_adaptive):.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,25 +4,31 @@ NAS統合管理ダッシュボード
 複数のWebアプリケーションとシステム監視を統合管理
 """
 
-from flask import Flask, render_template, jsonify, request, redirect, url_for, send_file, send_from_directory, make_response
-import subprocess
+from flask import Flask, render_template, jsonify, request, redirect, url_for, send_file, send_from_directory, make_response, Response, stream_with_context
 import json
 import os
-import psutil
 import requests
 from datetime import datetime, timedelta
 import logging
 from pathlib import Path
 import shutil
-import zipfile
 import tempfile
 import re
+import threading
 from typing import Optional, Dict
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import google.generativeai as genai
 from version import get_version, get_version_string, get_full_version_info
 from utils.email_sender import EmailSender
 from utils.ai_analyzer import AIAnalyzer
+from utils.ban_history_store import BanHistoryStore
+from utils.metrics_sampler import MetricsSampler
+from utils.service_health import ServiceHealthChecker
+from utils.docker_client import DockerClient, ContainerStateCache, DockerAPIError, DockerTimeoutError
+from utils.log_tail import tail_lines, tail_lines_with_offset, follow_lines
+from utils.log_classifier import LogTemplateHistogram, format_template_summary
+from utils.backup_engine import BackupEngine, BackupInProgressError
+from utils.ip_geolocation import IPGeolocator, load_offline_provider
 from utils.auth_db import (
     init_auth_db, get_user_by_username, get_user_by_id, get_all_users,
     create_user, update_user, deactivate_user,
@@ -65,97 +71,64 @@ if GEMINI_API_KEY:
 else:
     model = None
 
+# Docker Engine APIクライアント（CLIのプロセス起動を避け、ソケットへ直接接続）
+docker_client = DockerClient()
+# コンテナ一覧のスナップショット（Dockerイベントで更新）
+docker_state = ContainerStateCache(docker_client)
+if docker_client.is_available():
+    docker_state.start()
+
+# Fail2Ban BAN履歴ストア（docker logsを差分取り込み）
+ban_history_store = BanHistoryStore()
+
+# システムメトリクスのバックグラウンドサンプラー（リクエスト内でのcpu_percent(interval=1)待ちを回避）
+metrics_sampler = MetricsSampler(
+    interval=int(os.getenv('METRICS_SAMPLE_INTERVAL', '10')),
+    rollup_interval=int(os.getenv('METRICS_ROLLUP_INTERVAL', '300'))
+)
+metrics_sampler.start()
+
+# IP地理情報（永続キャッシュ + オフラインDB、未解決分のみip-api.comへバッチ問い合わせ）
+ip_geolocator = IPGeolocator(
+    offline_provider=load_offline_provider(),
+    online=os.getenv('GEOIP_ONLINE_LOOKUP', 'true').lower() == 'true',
+    cache_ttl_days=int(os.getenv('GEOIP_CACHE_TTL_DAYS', '30'))
+)
+
+# ログのSSE配信は接続中ずっとgunicornのスレッドを占有するため、ワーカーあたりの同時接続数を制限
+log_stream_slots = threading.BoundedSemaphore(int(os.getenv('LOG_STREAM_MAX_CONNECTIONS', '4')))
+
 def get_ip_location(ip):
     """IPアドレスの地理的位置情報を取得"""
     try:
-        # プライベートIPアドレスの場合は「ローカル」を返す
-        if ip.startswith('192.168.') or ip.startswith('10.') or ip.startswith('172.'):
-            return "ローカル"
-        
-        # 外部APIを使用して地理的位置情報を取得（タイムアウトを短縮）
-        response = requests.get(f"http://ip-api.com/json/{ip}", timeout=2)
-        if response.status_code == 200:
-            data = response.json()
-            if data['status'] == 'success':
-                country = data.get('country', 'Unknown')
-                region = data.get('regionName', '')
-                city = data.get('city', '')
-                
-                location_parts = [part for part in [city, region, country] if part]
-                return ', '.join(location_parts) if location_parts else 'Unknown'
-        
-        return "Unknown"
+        return ip_geolocator.lookup(ip)
     except Exception as e:
         logger.warning(f"IP位置情報取得エラー ({ip}): {e}")
         return "Unknown"
 
+def get_ip_locations(ips):
+    """複数IPアドレスの地理的位置情報をまとめて取得（{ip: 位置}）"""
+    try:
+        return ip_geolocator.lookup_many(ips)
+    except Exception as e:
+        logger.warning(f"IP位置情報一括取得エラー: {e}")
+        return {}
+
 def get_monthly_ban_history():
     """過去30日間のBAN履歴を取得（月次レポート用）"""
     try:
         if os.getenv('NAS_MODE'):
-            logger.info("月次レポート用BAN履歴を取得中")
-            ban_history = []
-            
-            # 過去30日間の日付を計算
-            from datetime import datetime, timedelta
             thirty_days_ago = datetime.now() - timedelta(days=30)
-            thirty_days_ago_str = thirty_days_ago.strftime('%Y-%m-%d')
+            logger.info(f"過去30日間のBAN履歴を取得中 (from: {thirty_days_ago.strftime('%Y-%m-%d')})")
             
-            logger.info(f"過去30日間のBAN履歴を取得中 (from: {thirty_days_ago_str})")
-            
-            try:
-                # Dockerログから全履歴を取得
-                result = subprocess.run([
-                    'docker', 'logs', 'fail2ban'
-                ], capture_output=True, text=True, timeout=60)
-                
-                if result.returncode == 0:
-                    # BAN実行ログを解析
-                    for line in result.stdout.split('\n'):
-                        if 'Ban ' in line and 'NOTICE' in line:
-                            try:
-                                # タイムスタンプを抽出
-                                timestamp_part = line.split(' fail2ban.actions')[0]
-                                timestamp_str = timestamp_part.split(' ')[0] + ' ' + timestamp_part.split(' ')[1].split(',')[0]
-                                
-                                # 日付を解析して30日間フィルタを適用
-                                log_date_str = timestamp_part.split(' ')[0]
-                                log_date = datetime.strptime(log_date_str, '%Y-%m-%d')
-                                
-                                # 過去30日間のログのみを処理
-                                if log_date >= thirty_days_ago:
-                                    # Jail名を抽出
-                                    jail_start = line.find('[') + 1
-                                    jail_end = line.find(']', jail_start)
-                                    jail = line[jail_start:jail_end]
-                                    
-                                    # IPアドレスを抽出
-                                    ip_start = line.find('Ban ') + 4
-                                    ip = line[ip_start:].strip()
-                                    
-                                    logger.info(f"月次BAN履歴追加: IP={ip}, Jail={jail}, Time={timestamp_str}")
-                                    ban_history.append({
-                                        'timestamp': timestamp_str,
-                                        'ip': ip,
-                                        'jail': jail,
-                                        'action': 'Ban'
-                                    })
-                                else:
-                                    logger.debug(f"30日間範囲外のログをスキップ: {log_date_str}")
-                            except Exception as parse_error:
-                                logger.warning(f"BANログ解析エラー: {parse_error}, Line: {line}")
-                                continue
-                    
-                    # タイムスタンプでソート（新しい順）
-                    ban_history.sort(key=lambda x: x['timestamp'], reverse=True)
-                    logger.info(f"月次BAN履歴取得完了: {len(ban_history)}件")
-                    
-                else:
-                    logger.error(f"Dockerログ取得エラー: {result.stderr}")
-                    
-            except Exception as e:
-                logger.error(f"Dockerログ取得エラー: {e}")
-                
+            # 前回取り込み以降のログだけをストアに追加してから期間検索
+            ban_history_store.ingest()
+            ban_history = ban_history_store.get_events(since=thirty_days_ago, actions=('Ban',))
+            # 重複を除いたIPをまとめて位置情報に変換
+            locations = get_ip_locations(event['ip'] for event in ban_history)
+            for event in ban_history:
+                event['location'] = locations.get(event['ip'], 'Unknown')
+            logger.info(f"月次BAN履歴取得完了: {len(ban_history)}件")
             return ban_history
         else:
             # ローカル環境ではモックデータを返す
@@ -181,108 +154,14 @@ def get_ban_history_simple():
     """BAN履歴を取得（位置情報なし）"""
     try:
         if os.getenv('NAS_MODE'):
-            # NAS環境ではFail2banログから過去7日間のBAN履歴を取得
-            ban_history = []
+            # NAS環境ではBAN履歴ストアから過去7日間のBAN/UNBAN履歴を取得
+            seven_days_ago = datetime.now() - timedelta(days=7)
+            logger.info(f"過去7日間のBAN履歴を取得中 (from: {seven_days_ago.strftime('%Y-%m-%d')})")
             
-            logger.info("BAN履歴をログから取得中")
-            
-            try:
-                # 過去7日間の日付を計算
-                from datetime import datetime, timedelta
-                seven_days_ago = datetime.now() - timedelta(days=7)
-                seven_days_ago_str = seven_days_ago.strftime('%Y-%m-%d')
-                
-                logger.info(f"過去7日間のBAN履歴を取得中 (from: {seven_days_ago_str})")
-                
-                # Fail2banログから全履歴を取得（--sinceが動作しないため）
-                result = subprocess.run([
-                    'docker', 'logs', 'fail2ban'
-                ], capture_output=True, text=True, timeout=30)
-                
-                if result.returncode == 0:
-                    # BAN実行ログを解析
-                    for line in result.stdout.split('\n'):
-                        if 'Ban ' in line and 'NOTICE' in line:
-                            # 例: 2025-10-24 15:21:50,993 fail2ban.actions [1]: NOTICE [sshd] Ban 183.66.17.82
-                            try:
-                                # タイムスタンプを抽出
-                                timestamp_part = line.split(' fail2ban.actions')[0]
-                                timestamp_str = timestamp_part.split(' ')[0] + ' ' + timestamp_part.split(' ')[1].split(',')[0]
-                                
-                                # 日付を解析して7日間フィルタを適用
-                                log_date_str = timestamp_part.split(' ')[0]
-                                log_date = datetime.strptime(log_date_str, '%Y-%m-%d')
-                                
-                                # 過去7日間のログのみを処理
-                                if log_date >= seven_days_ago:
-                                    # Jail名を抽出
-                                    jail_start = line.find('[') + 1
-                                    jail_end = line.find(']', jail_start)
-                                    jail = line[jail_start:jail_end]
-                                    
-                                    # IPアドレスを抽出
-                                    ip_start = line.find('Ban ') + 4
-                                    ip = line[ip_start:].strip()
-                                    
-                                    logger.info(f"BAN履歴追加: IP={ip}, Jail={jail}, Time={timestamp_str}")
-                                    ban_history.append({
-                                        'timestamp': timestamp_str,
-                                        'ip': ip,
-                                        'jail': jail,
-                                        'action': 'Ban'
-                                    })
-                                else:
-                                    logger.debug(f"7日間範囲外のログをスキップ: {log_date_str}")
-                            except Exception as parse_error:
-                                logger.warning(f"BANログ解析エラー: {parse_error}, Line: {line}")
-                                continue
-                
-                # 過去7日間のUNBAN実行も取得
-                for line in result.stdout.split('\n'):
-                    if 'Unban ' in line and 'NOTICE' in line:
-                        # 例: 2025-10-24 16:12:50,302 fail2ban.actions [1]: NOTICE [sshd] Unban 196.251.70.164
-                        try:
-                            # タイムスタンプを抽出
-                            timestamp_part = line.split(' fail2ban.actions')[0]
-                            timestamp_str = timestamp_part.split(' ')[0] + ' ' + timestamp_part.split(' ')[1].split(',')[0]
-                            
-                            # 日付を解析して7日間フィルタを適用
-                            log_date_str = timestamp_part.split(' ')[0]
-                            log_date = datetime.strptime(log_date_str, '%Y-%m-%d')
-                            
-                            # 過去7日間のログのみを処理
-                            if log_date >= seven_days_ago:
-                                # Jail名を抽出
-                                jail_start = line.find('[') + 1
-                                jail_end = line.find(']', jail_start)
-                                jail = line[jail_start:jail_end]
-                                
-                                # IPアドレスを抽出
-                                ip_start = line.find('Unban ') + 6
-                                ip = line[ip_start:].strip()
-                                
-                                logger.info(f"UNBAN履歴追加: IP={ip}, Jail={jail}, Time={timestamp_str}")
-                                ban_history.append({
-                                    'timestamp': timestamp_str,
-                                    'ip': ip,
-                                    'jail': jail,
-                                    'action': 'Unban'
-                                })
-                            else:
-                                logger.debug(f"7日間範囲外のUNBANログをスキップ: {log_date_str}")
-                        except Exception as parse_error:
-                            logger.warning(f"UNBANログ解析エラー: {parse_error}, Line: {line}")
-                            continue
-                
-                # タイムスタンプでソート（新しい順）
-                ban_history.sort(key=lambda x: x['timestamp'], reverse=True)
-                
-                logger.info(f"BAN履歴取得完了: {len(ban_history)}件")
-                return ban_history
-                
-            except Exception as log_error:
-                logger.error(f"Fail2banログ取得エラー: {log_error}")
-                return []
+            ban_history_store.ingest()
+            ban_history = ban_history_store.get_events(since=seven_days_ago, actions=('Ban', 'Unban'))
+            logger.info(f"BAN履歴取得完了: {len(ban_history)}件")
+            return ban_history
         else:
             # ローカル環境ではモックデータを返す
             return [
@@ -962,51 +841,41 @@ def proxy_metrics():
         return jsonify({'error': str(e)}), 500
 
 # バックアップ関連のAPIエンドポイント
+def get_backup_engine():
+    """バックアップエンジンを取得（環境に応じたディレクトリ設定）"""
+    if os.getenv('NAS_MODE'):
+        backup_dir = Path('/app/backups')
+        project_dir = Path('/nas-project')
+    else:
+        backup_dir = Path('/Users/Yoshi/nas-project/data/backups')
+        project_dir = Path('/Users/Yoshi/nas-project')
+    
+    return BackupEngine(
+        backup_dir,
+        project_dir,
+        max_workers=int(os.getenv('BACKUP_WORKERS', '0')) or None,
+        full_interval_days=int(os.getenv('BACKUP_FULL_INTERVAL_DAYS', '7'))
+    )
+
 @app.route('/api/backup/create', methods=['POST'])
 def create_backup():
-    """バックアップを作成"""
+    """バックアップ作成ジョブを開始（進捗は /api/backup/status/<job_id> で取得）"""
     try:
-        # バックアップディレクトリを設定
-        if os.getenv('NAS_MODE'):
-            backup_dir = Path('/app/backups')
-            project_dir = Path('/nas-project')
-        else:
-            backup_dir = Path('/Users/Yoshi/nas-project/data/backups')
-            project_dir = Path('/Users/Yoshi/nas-project')
-        
-        backup_dir.mkdir(parents=True, exist_ok=True)
-        
-        # バックアップファイル名を生成
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        backup_filename = f"nas-project-backup-{timestamp}.zip"
-        backup_path = backup_dir / backup_filename
-        
-        # プロジェクトディレクトリをZIP圧縮
-        with zipfile.ZipFile(backup_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for root, dirs, files in os.walk(project_dir):
-                # 除外するディレクトリ
-                dirs[:] = [d for d in dirs if d not in ['.git', '__pycache__', 'node_modules', '.venv', 'venv']]
-                
-                for file in files:
-                    # 除外するファイル
-                    if file.endswith(('.pyc', '.pyo', '.log', '.tmp')):
-                        continue
-                    
-                    file_path = Path(root) / file
-                    arcname = file_path.relative_to(project_dir)
-                    zipf.write(file_path, arcname)
-        
-        # バックアップファイルのサイズを取得
-        backup_size = backup_path.stat().st_size
+        data = request.get_json(silent=True) or {}
+        job = get_backup_engine().start(full=bool(data.get('full', False)))
         
         return jsonify({
             'success': True,
-            'message': f'バックアップが作成されました: {backup_filename}',
-            'filename': backup_filename,
-            'size': backup_size,
-            'path': str(backup_path)
-        })
+            'message': 'バックアップを開始しました',
+            'job_id': job['id'],
+            'status': job['status']
+        }), 202
         
+    except BackupInProgressError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 409
     except Exception as e:
         logger.error(f"バックアップ作成エラー: {e}")
         return jsonify({
@@ -1014,6 +883,20 @@ def create_backup():
             'message': f'バックアップの作成に失敗しました: {str(e)}'
         }), 500
 
+@app.route('/api/backup/status/<job_id>')
+def backup_status(job_id):
+    """バックアップ作成ジョブの進捗を取得"""
+    job = get_backup_engine().get_job(job_id)
+    if not job:
+        return jsonify({'success': False, 'message': 'バックアップジョブが見つかりません'}), 404
+    
+    job['success'] = job['status'] != 'failed'
+    if job['status'] == 'completed':
+        job['message'] = f"バックアップが作成されました: {job['filename']}"
+    elif job['status'] == 'failed':
+        job['message'] = f"バックアップの作成に失敗しました: {job['error']}"
+    return jsonify(job)
+
 @app.route('/api/backup/list')
 def list_backups():
     """バックアップ一覧を取得"""
@@ -1089,9 +972,16 @@ def delete_backup(filename):
         
         backup_path.unlink()
         
+        message = f'バックアップ「{filename}」が削除されました'
+        # 増分バックアップの基になるファイルだった場合は次回をフルバックアップにする
+        chain_reset = get_backup_engine().forget_backup(filename)
+        if chain_reset:
+            message += '（増分チェーンが途切れたため、次回はフルバックアップを作成します）'
+        
         return jsonify({
             'success': True,
-            'message': f'バックアップ「{filename}」が削除されました'
+            'message': message,
+            'chain_reset': chain_reset
         })
         
     except Exception as e:
@@ -1105,23 +995,14 @@ def delete_backup(filename):
 def system_status():
     """システム状態を取得"""
     try:
-        # CPU使用率
-        cpu_percent = psutil.cpu_percent(interval=1)
-        
-        # メモリ使用率
-        memory = psutil.virtual_memory()
-        memory_percent = memory.percent
-        
-        # ディスク使用率
-        disk = psutil.disk_usage('/')
-        disk_percent = (disk.used / disk.total) * 100
-        
-        # ネットワーク統計
-        network = psutil.net_io_counters()
+        # バックグラウンドサンプラーの最新値を使用（ブロッキングなし）
+        sample = metrics_sampler.latest()
+        cpu_percent = sample['cpu_percent']
+        memory_percent = sample['memory_percent']
+        disk_percent = (sample['disk_used'] / sample['disk_total']) * 100
         
         # システム情報
-        boot_time = datetime.fromtimestamp(psutil.boot_time())
-        uptime = datetime.now() - boot_time
+        uptime = datetime.now() - metrics_sampler.boot_time
         
         status = {
             'cpu': {
@@ -1130,28 +1011,29 @@ def system_status():
             },
             'memory': {
                 'percent': memory_percent,
-                'used': memory.used,
-                'total': memory.total,
+                'used': sample['memory_used'],
+                'total': sample['memory_total'],
                 'status': 'warning' if memory_percent > Config.SYSTEM_MONITORING['memory_threshold'] else 'success'
             },
             'disk': {
                 'percent': disk_percent,
-                'used': disk.used,
-                'total': disk.total,
+                'used': sample['disk_used'],
+                'total': sample['disk_total'],
                 'status': 'warning' if disk_percent > Config.SYSTEM_MONITORING['disk_threshold'] else 'success'
             },
             'network': {
-                'bytes_sent': network.bytes_sent,
-                'bytes_recv': network.bytes_recv,
-                'packets_sent': network.packets_sent,
-                'packets_recv': network.packets_recv
+                'bytes_sent': sample['net_bytes_sent'],
+                'bytes_recv': sample['net_bytes_recv'],
+                'packets_sent': sample['net_packets_sent'],
+                'packets_recv': sample['net_packets_recv']
             },
+            'containers': sample['containers'],
             'uptime': {
                 'days': uptime.days,
                 'hours': uptime.seconds // 3600,
                 'minutes': (uptime.seconds % 3600) // 60
             },
-            'timestamp': datetime.now().isoformat()
+            'timestamp': datetime.fromtimestamp(sample['ts']).isoformat()
         }
         
         return jsonify(status)
@@ -1160,109 +1042,92 @@ def system_status():
         logger.error(f"システム状態取得エラー: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/services/status')
-def services_status():
-    """各サービスの稼働状況を確認"""
-    services_status = {}
+def _probe_service(service_id, service_config, session):
+    """1サービスの稼働状況を確認"""
+    # Fail2Ban機能はNAS監視システムのセキュリティタブで確認できます
+    # (fail2banサービスはConfig.SERVICESから削除済み)
+    if service_config['url'] == '#':
+        return {
+            'name': service_config['name'],
+            'status': 'unknown',
+            'url': service_config['url'],
+            'response_time': None
+        }
     
-    for service_id, service_config in Config.SERVICES.items():
-        try:
-            # Fail2Ban機能はNAS監視システムのセキュリティタブで確認できます
-            # (fail2banサービスはConfig.SERVICESから削除済み)
-            
-            # その他のサービスはHTTPリクエストで確認
-            if service_config['url'] != '#':
-                try:
-                    # Dockerコンテナ内からのアクセスのため、localhostを使用
-                    if os.getenv('NAS_MODE'):
-                        # NAS環境ではlocalhostでアクセス
-                        if '192.168.68.110' in service_config['url']:
-                            local_url = service_config['url'].replace('192.168.68.110', 'localhost')
-                        else:
-                            local_url = service_config['url']
-                    else:
-                        local_url = service_config['url']
-                    
-                    response = requests.get(f"{local_url}/", timeout=3)
-                    services_status[service_id] = {
-                        'name': service_config['name'],
-                        'status': 'running' if response.status_code == 200 else 'error',
-                        'url': service_config['url'],
-                        'response_time': response.elapsed.total_seconds() if hasattr(response, 'elapsed') else None
-                    }
-                except requests.exceptions.RequestException as e:
-                    # HTTPリクエストが失敗した場合、Dockerコンテナの状態を確認
-                    if os.getenv('NAS_MODE'):
-                        try:
-                            # Dockerコンテナの状態を確認
-                            # サービスIDに応じて適切なコンテナ名を設定
-                            if service_id == 'document_automation':
-                                container_name = 'doc-automation-web'
-                            elif service_id == 'meeting_minutes':
-                                container_name = 'meeting-minutes-byc'
-                            elif service_id == 'youtube_to_notion':
-                                container_name = 'youtube-to-notion'
-                            else:
-                                container_name = service_id.replace('_', '-')
-                            
-                            result = subprocess.run([
-                                'docker', 'ps', '--filter', f'name={container_name}', '--format', '{{.Status}}'
-                            ], capture_output=True, text=True, timeout=5)
-                            
-                            if result.returncode == 0 and result.stdout.strip():
-                                # コンテナが稼働している場合
-                                services_status[service_id] = {
-                                    'name': service_config['name'],
-                                    'status': 'running',
-                                    'url': service_config['url'],
-                                    'response_time': None,
-                                    'note': 'コンテナ稼働中（HTTP接続不可）'
-                                }
-                            else:
-                                services_status[service_id] = {
-                                    'name': service_config['name'],
-                                    'status': 'stopped',
-                                    'url': service_config['url'],
-                                    'response_time': None
-                                }
-                        except subprocess.TimeoutExpired:
-                            services_status[service_id] = {
-                                'name': service_config['name'],
-                                'status': 'unknown',
-                                'url': service_config['url'],
-                                'response_time': None
-                            }
-                    else:
-                        services_status[service_id] = {
-                            'name': service_config['name'],
-                            'status': 'stopped',
-                            'url': service_config['url'],
-                            'response_time': None
-                        }
-            else:
-                services_status[service_id] = {
-                    'name': service_config['name'],
-                    'status': 'unknown',
-                    'url': service_config['url'],
-                    'response_time': None
-                }
-        except requests.exceptions.RequestException:
-            services_status[service_id] = {
+    # その他のサービスはHTTPリクエストで確認
+    try:
+        # Dockerコンテナ内からのアクセスのため、localhostを使用
+        if os.getenv('NAS_MODE') and '192.168.68.110' in service_config['url']:
+            local_url = service_config['url'].replace('192.168.68.110', 'localhost')
+        else:
+            local_url = service_config['url']
+        
+        response = session.get(f"{local_url}/", timeout=3)
+        return {
+            'name': service_config['name'],
+            'status': 'running' if response.status_code == 200 else 'error',
+            'url': service_config['url'],
+            'response_time': response.elapsed.total_seconds() if hasattr(response, 'elapsed') else None
+        }
+    except requests.exceptions.RequestException:
+        if not os.getenv('NAS_MODE'):
+            return {
                 'name': service_config['name'],
                 'status': 'stopped',
                 'url': service_config['url'],
                 'response_time': None
             }
-        except Exception as e:
-            logger.error(f"サービス {service_id} の状態確認エラー: {e}")
-            services_status[service_id] = {
-                'name': service_config['name'],
-                'status': 'error',
-                'url': service_config['url'],
-                'response_time': None
-            }
     
-    return jsonify(services_status)
+    # HTTPリクエストが失敗した場合、Dockerコンテナの状態を確認
+    # サービスIDに応じて適切なコンテナ名を設定
+    if service_id == 'document_automation':
+        container_name = 'doc-automation-web'
+    elif service_id == 'meeting_minutes':
+        container_name = 'meeting-minutes-byc'
+    elif service_id == 'youtube_to_notion':
+        container_name = 'youtube-to-notion'
+    else:
+        container_name = service_id.replace('_', '-')
+    
+    try:
+        container = docker_state.find(container_name)
+    except DockerAPIError:
+        return {
+            'name': service_config['name'],
+            'status': 'unknown',
+            'url': service_config['url'],
+            'response_time': None
+        }
+    
+    if container:
+        # コンテナが稼働している場合
+        return {
+            'name': service_config['name'],
+            'status': 'running',
+            'url': service_config['url'],
+            'response_time': None,
+            'note': 'コンテナ稼働中（HTTP接続不可）'
+        }
+    return {
+        'name': service_config['name'],
+        'status': 'stopped',
+        'url': service_config['url'],
+        'response_time': None
+    }
+
+# サービス稼働状況チェッカー（並列プローブ + 全リクエスト共有のTTLキャッシュ）
+service_health_checker = ServiceHealthChecker(
+    Config.SERVICES,
+    _probe_service,
+    ttl=float(os.getenv('SERVICE_STATUS_TTL', '15')),
+    refresh_interval=float(os.getenv('SERVICE_STATUS_REFRESH_INTERVAL', '10'))
+)
+service_health_checker.start()
+
+@app.route('/api/services/status')
+def services_status():
+    """各サービスの稼働状況を確認"""
+    return jsonify(service_health_checker.get_status())
 
 # Fail2Ban関連のAPIエンドポイントは監視システム（nas-dashboard-monitoring）に移動済み
 # 詳細は http://192.168.68.110:8002 のセキュリティ監視タブを参照してください
@@ -1304,17 +1169,15 @@ def get_system_status_data():
     """システム状態データを取得"""
     try:
         if os.getenv('NAS_MODE'):
-            # NAS環境では実際のシステムデータを取得
-            cpu_percent = psutil.cpu_percent(interval=1)
-            memory = psutil.virtual_memory()
-            disk = psutil.disk_usage('/')
+            # NAS環境ではサンプラーの最新値を使用
+            sample = metrics_sampler.latest()
             
             return {
-                'cpu_percent': cpu_percent,
-                'memory_percent': memory.percent,
-                'memory_available_gb': round(memory.available / (1024**3), 2),
-                'disk_percent': disk.percent,
-                'disk_free_gb': round(disk.free / (1024**3), 2),
+                'cpu_percent': sample['cpu_percent'],
+                'memory_percent': sample['memory_percent'],
+                'memory_available_gb': round(sample['memory_available'] / (1024**3), 2),
+                'disk_percent': sample['disk_percent'],
+                'disk_free_gb': round(sample['disk_free'] / (1024**3), 2),
                 'timestamp': datetime.now().strftime('%Y年%m月%d日 %H:%M:%S')
             }
         else:
@@ -1344,9 +1207,7 @@ def get_fail2ban_status_data():
     try:
         if os.getenv('NAS_MODE'):
             # NAS環境では実際のFail2Banデータを取得
-            result = subprocess.run([
-                'docker', 'exec', 'fail2ban', 'fail2ban-client', 'status'
-            ], capture_output=True, text=True, timeout=10)
+            result = docker_client.exec_run('fail2ban', ['fail2ban-client', 'status'], timeout=10)
 
             if result.returncode == 0:
                 # アクティブなjailを取得
@@ -1361,9 +1222,7 @@ def get_fail2ban_status_data():
                 jail_details = {}
                 total_banned = 0
                 for jail in jails:
-                    jail_result = subprocess.run([
-                        'docker', 'exec', 'fail2ban', 'fail2ban-client', 'status', jail
-                    ], capture_output=True, text=True, timeout=5)
+                    jail_result = docker_client.exec_run('fail2ban', ['fail2ban-client', 'status', jail], timeout=5)
 
                     if jail_result.returncode == 0:
                         banned_count = 0
@@ -1415,21 +1274,18 @@ def get_docker_status_data():
     """Docker状態データを取得"""
     try:
         if os.getenv('NAS_MODE'):
-            # NAS環境では実際のDockerデータを取得
-            result = subprocess.run([
-                'docker', 'ps', '--format', 'json'
-            ], capture_output=True, text=True, timeout=10)
-
-            if result.returncode == 0:
-                containers = []
-                for line in result.stdout.strip().split('\n'):
-                    if line:
-                        container_info = json.loads(line)
-                        containers.append({
-                            'name': container_info['Names'],
-                            'image': container_info['Image'],
-                            'status': container_info['Status']
-                        })
+            # NAS環境ではコンテナスナップショットから稼働中コンテナを取得
+            try:
+                running_containers = docker_state.get_containers(all=False)
+            except DockerAPIError as e:
+                logger.warning(f"Dockerコンテナ情報取得エラー: {e}")
+                running_containers = None
+
+            if running_containers is not None:
+                containers = [
+                    {'name': c['name'], 'image': c['image'], 'status': c['status']}
+                    for c in running_containers
+                ]
 
                 running_count = len([c for c in containers if 'Up' in c['status']])
                 return {
@@ -1897,26 +1753,23 @@ def docker_containers():
     try:
         # NAS環境では実際のDockerコンテナ情報を取得
         if os.getenv('NAS_MODE'):
-            result = subprocess.run([
-                'docker', 'ps', '--format', 'json'
-            ], capture_output=True, text=True, timeout=10)
-            
-            if result.returncode == 0:
-                containers = []
-                for line in result.stdout.strip().split('\n'):
-                    if line:
-                        container_info = json.loads(line)
-                        containers.append({
-                            'id': container_info['ID'],
-                            'name': container_info['Names'],
-                            'image': container_info['Image'],
-                            'status': container_info['Status'],
-                            'ports': container_info['Ports']
-                        })
-                
-                return jsonify(containers)
-            else:
+            try:
+                running_containers = docker_state.get_containers(all=False)
+            except DockerAPIError as e:
+                logger.warning(f"Dockerコンテナ情報取得エラー: {e}")
                 return jsonify({'error': 'Dockerコンテナ情報の取得に失敗しました'}), 500
+            
+            containers = [
+                {
+                    'id': c['id'],
+                    'name': c['name'],
+                    'image': c['image'],
+                    'status': c['status'],
+                    'ports': c['ports']
+                }
+                for c in running_containers
+            ]
+            return jsonify(containers)
         else:
             # ローカル環境ではモックデータを返す
             return jsonify([
@@ -1946,16 +1799,14 @@ def insta360_status():
     """Insta360自動同期システムの状態を取得"""
     try:
         if os.getenv('NAS_MODE'):
-            # NAS環境では実際のDockerコンテナの状態を確認
-            result = subprocess.run([
-                'docker', 'ps', '--filter', 'name=insta360-auto-sync', '--format', '{{.Status}}'
-            ], capture_output=True, text=True, timeout=5)
+            # NAS環境ではコンテナスナップショットから状態を確認
+            container = docker_state.find('insta360-auto-sync')
             
-            if result.returncode == 0 and result.stdout.strip():
+            if container:
                 # コンテナが稼働している場合
                 return jsonify({
                     'status': 'running',
-                    'container_status': result.stdout.strip(),
+                    'container_status': container['status'],
                     'message': 'Insta360自動同期システムが稼働中です'
                 })
             else:
@@ -2056,9 +1907,7 @@ def insta360_test_connection():
     try:
         if os.getenv('NAS_MODE'):
             # NAS環境では実際のテストを実行
-            result = subprocess.run([
-                'docker', 'exec', 'insta360-auto-sync', 'python', '/app/scripts/sync.py', '--test'
-            ], capture_output=True, text=True, timeout=30)
+            result = docker_client.exec_run('insta360-auto-sync', ['python', '/app/scripts/sync.py', '--test'], timeout=30)
             
             if result.returncode == 0:
                 return jsonify({
@@ -2084,7 +1933,7 @@ def insta360_test_connection():
                 'timestamp': datetime.now().isoformat()
             })
             
-    except subprocess.TimeoutExpired:
+    except DockerTimeoutError:
         return jsonify({
             'success': False,
             'message': '接続テストがタイムアウトしました',
@@ -2109,149 +1958,68 @@ def insta360_test_connection():
 def get_docker_containers():
     """Dockerコンテナ一覧を取得"""
     try:
-        if os.getenv('NAS_MODE'):
-            # NAS環境では実際のDockerコンテナを取得
-            result = subprocess.run([
-                'docker', 'ps', '-a', '--format', 'json'
-            ], capture_output=True, text=True, timeout=10)
+        try:
+            # コンテナスナップショットから全コンテナを取得
+            snapshot = docker_state.get_containers(all=True)
+        except DockerAPIError as e:
+            if os.getenv('NAS_MODE'):
+                raise
+            # ローカル環境でDockerが使えない場合はモックデータにフォールバック
+            logger.debug(f"ローカル環境のDockerコンテナ取得失敗: {e}")
+            snapshot = []
+        
+        if snapshot or os.getenv('NAS_MODE'):
+            containers = [
+                {
+                    'id': c['id'],
+                    'name': c['name'],
+                    'image': c['image'],
+                    'status': c['status'],
+                    'state': c['state'],
+                    'created': c['created'],
+                    'ports': c['ports']
+                }
+                for c in snapshot
+            ]
             
-            if result.returncode == 0:
-                containers = []
-                for line in result.stdout.strip().split('\n'):
-                    if line.strip():
-                        try:
-                            container_data = json.loads(line)
-                            # Namesフィールドから先頭の/を削除し、最初の名前のみを使用
-                            names = container_data.get('Names', '').strip()
-                            if names:
-                                # 複数の名前がスペース区切りの場合、最初の名前を使用
-                                name = names.split()[0] if ' ' in names else names
-                                # 先頭の/を削除
-                                name = name.lstrip('/')
-                            else:
-                                name = container_data.get('ID', '')[:12]  # IDの最初の12文字をフォールバック
-                            
-                            containers.append({
-                                'id': container_data.get('ID', ''),
-                                'name': name,
-                                'image': container_data.get('Image', ''),
-                                'status': container_data.get('Status', ''),
-                                'state': container_data.get('State', ''),
-                                'created': container_data.get('CreatedAt', ''),
-                                'ports': container_data.get('Ports', '')
-                            })
-                        except json.JSONDecodeError as e:
-                            logger.warning(f"JSONパースエラー: {line[:100]}... - {e}")
-                            continue
-                
-                # コンテナ名でソート
-                containers.sort(key=lambda x: x['name'].lower())
-                
-                return jsonify({
-                    'success': True,
-                    'containers': containers,
-                    'total_containers': len(containers),
-                    'timestamp': datetime.now().isoformat()
-                })
-            else:
-                return jsonify({
-                    'success': False,
-                    'message': f'Dockerコンテナ取得に失敗しました: {result.stderr}',
-                    'containers': [],
-                    'timestamp': datetime.now().isoformat()
-                }), 500
-        else:
-            # ローカル環境でも実際のDockerコンテナを取得を試行
-            try:
-                result = subprocess.run([
-                    'docker', 'ps', '-a', '--format', 'json'
-                ], capture_output=True, text=True, timeout=10)
-                
-                if result.returncode == 0 and result.stdout.strip():
-                    containers = []
-                    for line in result.stdout.strip().split('\n'):
-                        if line.strip():
-                            try:
-                                container_data = json.loads(line)
-                                # Namesフィールドから先頭の/を削除し、最初の名前のみを使用
-                                names = container_data.get('Names', '').strip()
-                                if names:
-                                    # 複数の名前がスペース区切りの場合、最初の名前を使用
-                                    name = names.split()[0] if ' ' in names else names
-                                    # 先頭の/を削除
-                                    name = name.lstrip('/')
-                                else:
-                                    name = container_data.get('ID', '')[:12]  # IDの最初の12文字をフォールバック
-                                
-                                containers.append({
-                                    'id': container_data.get('ID', ''),
-                                    'name': name,
-                                    'image': container_data.get('Image', ''),
-                                    'status': container_data.get('Status', ''),
-                                    'state': container_data.get('State', ''),
-                                    'created': container_data.get('CreatedAt', ''),
-                                    'ports': container_data.get('Ports', '')
-                                })
-                            except json.JSONDecodeError as e:
-                                logger.warning(f"JSONパースエラー: {line[:100]}... - {e}")
-                                continue
-                    
-                    # コンテナ名でソート
-                    containers.sort(key=lambda x: x['name'].lower())
-                    
-                    return jsonify({
-                        'success': True,
-                        'containers': containers,
-                        'total_containers': len(containers),
-                        'timestamp': datetime.now().isoformat()
-                    })
-                else:
-                    # Dockerコンテナが見つからない場合はモックデータを返す
-                    return jsonify({
-                        'success': True,
-                        'containers': [
-                            {
-                                'id': 'abc123def456',
-                                'name': 'nas-dashboard',
-                                'image': 'nas-dashboard:latest',
-                                'status': 'Up 2 hours',
-                                'state': 'running',
-                                'created': '2024-01-15T12:00:00Z',
-                                'ports': '9001->9000/tcp'
-                            },
-                            {
-                                'id': 'def456ghi789',
-                                'name': 'amazon-analytics',
-                                'image': 'amazon-analytics:latest',
-                                'status': 'Up 1 hour',
-                                'state': 'running',
-                                'created': '2024-01-15T13:00:00Z',
-                                'ports': '8000->8000/tcp'
-                            }
-                        ],
-                        'total_containers': 2,
-                        'timestamp': datetime.now().isoformat()
-                    })
-            except Exception as e:
-                # Dockerコマンドが失敗した場合はモックデータを返す
-                return jsonify({
-                    'success': True,
-                    'containers': [
-                        {
-                            'id': 'abc123def456',
-                            'name': 'nas-dashboard',
-                            'image': 'nas-dashboard:latest',
-                            'status': 'Up 2 hours',
-                            'state': 'running',
-                            'created': '2024-01-15T12:00:00Z',
-                            'ports': '9001->9000/tcp'
-                        }
-                    ],
-                    'total_containers': 1,
-                    'timestamp': datetime.now().isoformat()
-                })
+            # コンテナ名でソート
+            containers.sort(key=lambda x: x['name'].lower())
             
-    except subprocess.TimeoutExpired:
+            return jsonify({
+                'success': True,
+                'containers': containers,
+                'total_containers': len(containers),
+                'timestamp': datetime.now().isoformat()
+            })
+        
+        # Dockerコンテナが見つからない場合はモックデータを返す
+        return jsonify({
+            'success': True,
+            'containers': [
+                {
+                    'id': 'abc123def456',
+                    'name': 'nas-dashboard',
+                    'image': 'nas-dashboard:latest',
+                    'status': 'Up 2 hours',
+                    'state': 'running',
+                    'created': '2024-01-15T12:00:00Z',
+                    'ports': '9001->9000/tcp'
+                },
+                {
+                    'id': 'def456ghi789',
+                    'name': 'amazon-analytics',
+                    'image': 'amazon-analytics:latest',
+                    'status': 'Up 1 hour',
+                    'state': 'running',
+                    'created': '2024-01-15T13:00:00Z',
+                    'ports': '8000->8000/tcp'
+                }
+            ],
+            'total_containers': 2,
+            'timestamp': datetime.now().isoformat()
+        })
+            
+    except DockerTimeoutError:
         return jsonify({
             'success': False,
             'message': 'Dockerコンテナ取得がタイムアウトしました',
@@ -2267,30 +2035,21 @@ def get_docker_containers():
             'timestamp': datetime.now().isoformat()
         }), 500
 
-
-
-
-
-
 @app.route('/api/docker/logs/<container_name>')
 def get_docker_logs(container_name):
     """特定のDockerコンテナのログを取得（シンプル実装）"""
     try:
-        # コンテナの存在確認
-        check_result = subprocess.run([
-            'docker', 'ps', '-a', '--format', '{{.Names}}'
-        ], capture_output=True, text=True, timeout=5)
-        
-        if check_result.returncode != 0:
+        # コンテナの存在確認（スナップショットを使用）
+        try:
+            available_containers = docker_state.names(all=True)
+        except DockerAPIError as e:
             return jsonify({
                 'success': False,
-                'message': f'コンテナ一覧の取得に失敗しました: {check_result.stderr}',
+                'message': f'コンテナ一覧の取得に失敗しました: {e}',
                 'logs': [],
                 'timestamp': datetime.now().isoformat()
             }), 500
         
-        available_containers = [name.strip() for name in check_result.stdout.split('\n') if name.strip()]
-        
         if container_name not in available_containers:
             return jsonify({
                 'success': False,
@@ -2302,54 +2061,28 @@ def get_docker_logs(container_name):
             }), 404
         
         # ログを取得（stdoutとstderrの両方を取得）
-        result = subprocess.run([
-            'docker', 'logs', '--tail', '100', '--timestamps', container_name
-        ], capture_output=True, text=True, timeout=10)
-        
-        if result.returncode == 0:
-            logs = result.stdout.split('\n')
-            # 空行と空文字列をフィルタリング
-            filtered_logs = [log.strip() for log in logs if log.strip()]
-            
-            # ログが空の場合はstderrも確認
-            if not filtered_logs and result.stderr:
-                stderr_logs = result.stderr.split('\n')
-                filtered_logs = [log.strip() for log in stderr_logs if log.strip()]
-            
-            # それでもログが空の場合はメッセージを追加
-            if not filtered_logs:
-                filtered_logs = [f"コンテナ '{container_name}' にはログがありません"]
-            
-            return jsonify({
-                'success': True,
-                'logs': filtered_logs,
-                'container_name': container_name,
-                'total_lines': len(filtered_logs),
-                'timestamp': datetime.now().isoformat()
-            })
-        else:
-            # エラーでもstderrにログがある可能性がある
-            error_logs = []
-            if result.stderr:
-                error_logs = [log.strip() for log in result.stderr.split('\n') if log.strip()]
-            
-            if error_logs:
-                return jsonify({
-                    'success': True,
-                    'logs': error_logs,
-                    'container_name': container_name,
-                    'total_lines': len(error_logs),
-                    'timestamp': datetime.now().isoformat()
-                })
-            
-            return jsonify({
-                'success': False,
-                'message': f'ログ取得に失敗しました: {result.stderr}',
-                'logs': [],
-                'timestamp': datetime.now().isoformat()
-            }), 500
+        stdout, stderr = docker_client.logs(container_name, tail=100, timestamps=True, timeout=10)
+        
+        # 空行と空文字列をフィルタリング
+        filtered_logs = [log.strip() for log in stdout.split('\n') if log.strip()]
+        
+        # ログが空の場合はstderrも確認
+        if not filtered_logs and stderr:
+            filtered_logs = [log.strip() for log in stderr.split('\n') if log.strip()]
+        
+        # それでもログが空の場合はメッセージを追加
+        if not filtered_logs:
+            filtered_logs = [f"コンテナ '{container_name}' にはログがありません"]
+        
+        return jsonify({
+            'success': True,
+            'logs': filtered_logs,
+            'container_name': container_name,
+            'total_lines': len(filtered_logs),
+            'timestamp': datetime.now().isoformat()
+        })
             
-    except subprocess.TimeoutExpired:
+    except DockerTimeoutError:
         logger.error(f"Dockerログ取得タイムアウト ({container_name})")
         return jsonify({
             'success': False,
@@ -2366,63 +2099,65 @@ def get_docker_logs(container_name):
             'timestamp': datetime.now().isoformat()
         }), 500
 
+def get_text_log_systems():
+    """テキストログを持つシステムとログファイルのパスを取得"""
+    if os.getenv('NAS_MODE'):
+        # NAS環境では実際のログファイルを読み取り
+        # docker-compose.ymlで /home/AdminUser/nas-project-data:/nas-project-data にマウントされている
+        return {
+            'meeting-minutes-byc': {
+                'name': 'Meeting Minutes BYC',
+                'log_file': '/nas-project-data/meeting-minutes-byc/logs/app.log'
+            },
+            'amazon-analytics': {
+                'name': 'Amazon Analytics',
+                'log_file': '/nas-project-data/amazon-analytics/logs/app.log'
+            },
+            'document-automation': {
+                'name': 'Document Automation',
+                'log_file': '/nas-project-data/document-automation/logs/app.log'
+            },
+            'youtube-to-notion': {
+                'name': 'YouTube to Notion',
+                'log_file': '/nas-project-data/youtube-to-notion/logs/app.log'
+            },
+            'nas-dashboard': {
+                'name': 'NAS Dashboard',
+                'log_file': '/nas-project-data/nas-dashboard/logs/app.log'
+            },
+            'nas-dashboard-monitoring': {
+                'name': 'NAS Dashboard Monitoring',
+                'log_file': '/nas-project-data/nas-dashboard-monitoring/logs/app.log'
+            }
+        }
+    else:
+        # Dockerコンテナ内ではマウントされたパスを使用
+        return {
+            'nas-dashboard': {
+                'name': 'NAS Dashboard',
+                'log_file': '/app/logs/app.log'
+            }
+        }
+
 @app.route('/api/logs/text')
 def get_text_logs():
     """テキストログ一覧を取得（システム別）"""
     try:
-        if os.getenv('NAS_MODE'):
-            # NAS環境では実際のログファイルを読み取り
-            # docker-compose.ymlで /home/AdminUser/nas-project-data:/nas-project-data にマウントされている
-            log_systems = {
-                'meeting-minutes-byc': {
-                    'name': 'Meeting Minutes BYC',
-                    'log_file': '/nas-project-data/meeting-minutes-byc/logs/app.log'
-                },
-                'amazon-analytics': {
-                    'name': 'Amazon Analytics',
-                    'log_file': '/nas-project-data/amazon-analytics/logs/app.log'
-                },
-                'document-automation': {
-                    'name': 'Document Automation',
-                    'log_file': '/nas-project-data/document-automation/logs/app.log'
-                },
-                'youtube-to-notion': {
-                    'name': 'YouTube to Notion',
-                    'log_file': '/nas-project-data/youtube-to-notion/logs/app.log'
-                },
-                'nas-dashboard': {
-                    'name': 'NAS Dashboard',
-                    'log_file': '/nas-project-data/nas-dashboard/logs/app.log'
-                },
-                'nas-dashboard-monitoring': {
-                    'name': 'NAS Dashboard Monitoring',
-                    'log_file': '/nas-project-data/nas-dashboard-monitoring/logs/app.log'
-                }
-            }
-        else:
-            # Dockerコンテナ内ではマウントされたパスを使用
-            log_systems = {
-                'nas-dashboard': {
-                    'name': 'NAS Dashboard',
-                    'log_file': '/app/logs/app.log'
-                }
-            }
+        log_systems = get_text_log_systems()
         
         systems = []
         for system_id, system_info in log_systems.items():
             if os.path.exists(system_info['log_file']):
                 try:
-                    with open(system_info['log_file'], 'r', encoding='utf-8', errors='ignore') as f:
-                        lines = f.readlines()
-                        # 最新の10行を取得
-                        recent_lines = lines[-10:] if len(lines) > 10 else lines
-                        logs = [line.strip() for line in recent_lines if line.strip()]
-                        systems.append({
-                            'id': system_id,
-                            'name': system_info['name'],
-                            'logs': logs,
-                            'total_lines': len(logs)
-                        })
+                    # 最新の10行を末尾から読み取り（ファイル全体は読み込まない）
+                    recent_lines = tail_lines(system_info['log_file'], 10)
+                    logs = [line.strip() for line in recent_lines if line.strip()]
+                    systems.append({
+                        'id': system_id,
+                        'name': system_info['name'],
+                        'logs': logs,
+                        'total_lines': len(logs)
+                    })
                 except Exception as e:
                     logger.warning(f"ログファイル読み取りエラー {system_info['log_file']}: {e}")
                     continue
@@ -2447,24 +2182,9 @@ def get_text_logs():
 def get_text_logs_by_system(system_id):
     """特定システムのテキストログを取得"""
     try:
-        if os.getenv('NAS_MODE'):
-            # NAS環境では実際のログファイルを読み取り
-            # docker-compose.ymlで /home/AdminUser/nas-project-data:/nas-project-data にマウントされている
-            log_files = {
-                'meeting-minutes-byc': '/nas-project-data/meeting-minutes-byc/logs/app.log',
-                'amazon-analytics': '/nas-project-data/amazon-analytics/logs/app.log',
-                'document-automation': '/nas-project-data/document-automation/logs/app.log',
-                'youtube-to-notion': '/nas-project-data/youtube-to-notion/logs/app.log',
-                'nas-dashboard': '/nas-project-data/nas-dashboard/logs/app.log',
-                'nas-dashboard-monitoring': '/nas-project-data/nas-dashboard-monitoring/logs/app.log'
-            }
-        else:
-            # Dockerコンテナ内ではマウントされたパスを使用
-            log_files = {
-                'nas-dashboard': '/app/logs/app.log'
-            }
+        log_systems = get_text_log_systems()
         
-        if system_id not in log_files:
+        if system_id not in log_systems:
             return jsonify({
                 'success': False,
                 'message': f'システム {system_id} が見つかりません',
@@ -2472,7 +2192,7 @@ def get_text_logs_by_system(system_id):
                 'timestamp': datetime.now().isoformat()
             }), 404
         
-        log_file = log_files[system_id]
+        log_file = log_systems[system_id]['log_file']
         if not os.path.exists(log_file):
             return jsonify({
                 'success': False,
@@ -2482,11 +2202,9 @@ def get_text_logs_by_system(system_id):
             }), 404
         
         try:
-            with open(log_file, 'r', encoding='utf-8', errors='ignore') as f:
-                lines = f.readlines()
-                # 最新の50行を取得
-                recent_lines = lines[-50:] if len(lines) > 50 else lines
-                logs = [line.strip() for line in recent_lines if line.strip()]
+            # 最新の50行を末尾から読み取り
+            recent_lines = tail_lines(log_file, 50)
+            logs = [line.strip() for line in recent_lines if line.strip()]
             
             return jsonify({
                 'success': True,
@@ -2513,6 +2231,58 @@ def get_text_logs_by_system(system_id):
             'timestamp': datetime.now().isoformat()
         }), 500
 
+@app.route('/api/logs/text/<system_id>/stream')
+def stream_text_logs(system_id):
+    """特定システムのテキストログをServer-Sent Eventsで配信（追記された行をプッシュ）"""
+    log_systems = get_text_log_systems()
+    if system_id not in log_systems or not os.path.exists(log_systems[system_id]['log_file']):
+        return jsonify({
+            'success': False,
+            'message': f'システム {system_id} のログが見つかりません',
+            'timestamp': datetime.now().isoformat()
+        }), 404
+    
+    if not log_stream_slots.acquire(blocking=False):
+        response = jsonify({
+            'success': False,
+            'message': 'ログのストリーミング接続数が上限に達しています',
+            'timestamp': datetime.now().isoformat()
+        })
+        response.status_code = 503
+        response.headers['Retry-After'] = '10'
+        return response
+    
+    log_file = log_systems[system_id]['log_file']
+    initial_lines = request.args.get('lines', 50, type=int)
+    max_duration = float(os.getenv('LOG_STREAM_MAX_SECONDS', '300'))
+    
+    # EventSourceの再接続時は最後に受信した位置（イベントID）から続きを送る
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    
+    def generate():
+        if last_event_id is None:
+            # 接続直後に直近の行を送り、その後は追記分のみを送信
+            lines, offset = tail_lines_with_offset(log_file, initial_lines)
+            for line in lines:
+                if line.strip():
+                    yield f"id: {offset}\ndata: {json.dumps(line.strip(), ensure_ascii=False)}\n\n"
+        else:
+            offset = last_event_id
+        # 一定時間で切断（EventSourceが自動的に再接続する）
+        for line, position in follow_lines(log_file, offset=offset, poll_interval=1.0,
+                                           heartbeat_interval=15, max_duration=max_duration):
+            if line is None:
+                yield ": keep-alive\n\n"
+            elif line.strip():
+                yield f"id: {position}\ndata: {json.dumps(line.strip(), ensure_ascii=False)}\n\n"
+    
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    # 切断・タイムアウト時に接続枠を返す
+    response.call_on_close(log_stream_slots.release)
+    return response
+
 @app.route('/api/security/analysis')
 def security_analysis():
     """セキュリティ分析結果を取得"""
@@ -2613,8 +2383,8 @@ def send_weekly_report():
         <h3>システム概要</h3>
         <ul>
             <li><strong>稼働時間:</strong> {report_data['uptime']}</li>
-            <li><strong>CPU使用率:</strong> {report_data['cpu_usage']}%</li>
-            <li><strong>メモリ使用率:</strong> {report_data['memory_usage']}%</li>
+            <li><strong>CPU使用率:</strong> 平均 {report_data['cpu_usage']}%（最大 {report_data['cpu_peak']}%）</li>
+            <li><strong>メモリ使用率:</strong> 平均 {report_data['memory_usage']}%（最大 {report_data['memory_peak']}%）</li>
             <li><strong>ディスク使用率:</strong> {report_data['disk_usage']}%</li>
         </ul>
         
@@ -2661,14 +2431,12 @@ def send_weekly_report():
 def generate_weekly_report_data():
     """週次レポートデータを生成"""
     try:
-        # システム情報を取得
-        cpu_usage = psutil.cpu_percent(interval=1)
-        memory = psutil.virtual_memory()
-        disk = psutil.disk_usage('/')
-        
         # 期間を計算
         now = datetime.now()
         week_ago = now - timedelta(days=7)
+        
+        # 期間中の平均・最大をサンプラーの履歴から集計
+        metrics = metrics_sampler.summarize(since=week_ago)
         period = f"{week_ago.strftime('%Y-%m-%d')} ～ {now.strftime('%Y-%m-%d')}"
         
         # バックアップ情報を取得
@@ -2680,9 +2448,12 @@ def generate_weekly_report_data():
         return {
             'period': period,
             'uptime': '7日間（24時間稼働）',
-            'cpu_usage': round(cpu_usage, 1),
-            'memory_usage': round(memory.percent, 1),
-            'disk_usage': round(disk.percent, 1),
+            'cpu_usage': round(metrics['cpu_percent']['avg'], 1),
+            'memory_usage': round(metrics['memory_percent']['avg'], 1),
+            'disk_usage': round(metrics['disk_percent']['avg'], 1),
+            'cpu_peak': round(metrics['cpu_percent']['max'], 1),
+            'memory_peak': round(metrics['memory_percent']['max'], 1),
+            'disk_peak': round(metrics['disk_percent']['max'], 1),
             'total_bans': 0,  # 実際の実装ではFail2Banから取得
             'new_bans': 0,
             'active_bans': 0,
@@ -2697,6 +2468,9 @@ def generate_weekly_report_data():
             'cpu_usage': 0,
             'memory_usage': 0,
             'disk_usage': 0,
+            'cpu_peak': 0,
+            'memory_peak': 0,
+            'disk_peak': 0,
             'total_bans': 0,
             'new_bans': 0,
             'active_bans': 0,
@@ -2707,11 +2481,6 @@ def generate_weekly_report_data():
 def generate_monthly_ai_report_data(system_data, fail2ban_data, docker_data):
     """月次AI分析レポートデータを生成"""
     try:
-        # システム情報を取得
-        cpu_usage = psutil.cpu_percent(interval=1)
-        memory = psutil.virtual_memory()
-        disk = psutil.disk_usage('/')
-        
         # 期間を計算（前月1日から今月1日まで）
         now = datetime.now()
         if now.month == 1:
@@ -2724,6 +2493,12 @@ def generate_monthly_ai_report_data(system_data, fail2ban_data, docker_data):
         end_date = datetime(now.year, now.month, 1)
         period = f"{start_date.strftime('%Y年%m月')} ～ {end_date.strftime('%Y年%m月')}"
         
+        # 期間中の平均・最大をサンプラーの履歴から集計
+        metrics = metrics_sampler.summarize(since=start_date, until=end_date)
+        cpu_usage = metrics['cpu_percent']['avg']
+        memory_usage = metrics['memory_percent']['avg']
+        disk_usage = metrics['disk_percent']['avg']
+        
         # バックアップ情報を取得
         backup_dir = os.getenv('BACKUP_DIR', '/home/AdminUser/nas-project-data/backups')
         backup_files = []
@@ -2735,8 +2510,11 @@ def generate_monthly_ai_report_data(system_data, fail2ban_data, docker_data):
             'period': period,
             'system_metrics': {
                 'cpu_usage': round(cpu_usage, 1),
-                'memory_usage': round(memory.percent, 1),
-                'disk_usage': round(disk.percent, 1),
+                'memory_usage': round(memory_usage, 1),
+                'disk_usage': round(disk_usage, 1),
+                'cpu_peak': round(metrics['cpu_percent']['max'], 1),
+                'memory_peak': round(metrics['memory_percent']['max'], 1),
+                'disk_peak': round(metrics['disk_percent']['max'], 1),
                 'uptime_days': 30  # 月次なので30日間
             },
             'security_metrics': {
@@ -2772,8 +2550,10 @@ def generate_monthly_ai_report_data(system_data, fail2ban_data, docker_data):
                 'ban_history': ban_history_data,
                 'system_stats': {
                     'cpu_percent': round(cpu_usage, 1),
-                    'memory_percent': round(memory.percent, 1),
-                    'disk_percent': round(disk.percent, 1)
+                    'memory_percent': round(memory_usage, 1),
+                    'disk_percent': round(disk_usage, 1),
+                    'cpu_peak': round(metrics['cpu_percent']['max'], 1),
+                    'memory_peak': round(metrics['memory_percent']['max'], 1)
                 },
                 'fail2ban_stats': fail2ban_data,
                 'docker_stats': docker_data,
@@ -2976,34 +2756,25 @@ def get_log_data_for_analysis(system_id):
             'logs': []
         }
 
-def analyze_log_patterns(log_lines):
-    """ログパターンを分析"""
+def analyze_log_patterns(log_lines, top_k=15):
+    """ログパターンを分析（レベル別件数と、可変部分を除いたテンプレート別の上位集計）"""
     try:
-        error_count = 0
-        warning_count = 0
-        info_count = 0
-        error_patterns = []
-        warning_patterns = []
-        
-        for line in log_lines:
-            line_lower = line.lower()
-            if 'error' in line_lower or 'exception' in line_lower:
-                error_count += 1
-                if len(error_patterns) < 10:  # 最新10個のエラーパターンを保存
-                    error_patterns.append(line.strip())
-            elif 'warning' in line_lower or 'warn' in line_lower:
-                warning_count += 1
-                if len(warning_patterns) < 10:  # 最新10個の警告パターンを保存
-                    warning_patterns.append(line.strip())
-            elif 'info' in line_lower:
-                info_count += 1
+        histogram = LogTemplateHistogram()
+        histogram.ingest(log_lines)
+        error_templates = histogram.top('error', top_k)
+        warning_templates = histogram.top('warning', top_k)
         
         return {
-            'error_count': error_count,
-            'warning_count': warning_count,
-            'info_count': info_count,
-            'error_patterns': error_patterns,
-            'warning_patterns': warning_patterns,
+            'error_count': histogram.counts['error'],
+            'warning_count': histogram.counts['warning'],
+            'info_count': histogram.counts['info'],
+            # 従来互換: 重複を除いた代表行（件数の多い順）
+            'error_patterns': [t['example'] for t in error_templates[:10]],
+            'warning_patterns': [t['example'] for t in warning_templates[:10]],
+            'error_templates': error_templates,
+            'warning_templates': warning_templates,
+            'distinct_error_templates': histogram.distinct('error'),
+            'distinct_warning_templates': histogram.distinct('warning'),
             'total_lines': len(log_lines)
         }
     except Exception as e:
@@ -3014,6 +2785,10 @@ def analyze_log_patterns(log_lines):
             'info_count': 0,
             'error_patterns': [],
             'warning_patterns': [],
+            'error_templates': [],
+            'warning_templates': [],
+            'distinct_error_templates': 0,
+            'distinct_warning_templates': 0,
             'total_lines': 0
         }
 
@@ -3065,8 +2840,14 @@ def create_log_analysis_prompt(analysis_data):
         - 警告数: {log_stats.get('warning_count', 0)}
         - 情報数: {log_stats.get('info_count', 0)}
 
-        【実際のログデータ】
-        {log_data.get('log_text', 'ログデータが取得できませんでした')}
+        エラーテンプレート（{log_stats.get('distinct_error_templates', 0)}種類、件数上位）:
+        {format_template_summary(log_stats.get('error_templates', []))}
+
+        警告テンプレート（{log_stats.get('distinct_warning_templates', 0)}種類、件数上位）:
+        {format_template_summary(log_stats.get('warning_templates', []))}
+
+        【実際のログデータ（最新30行）】
+        {chr(10).join(recent_logs[-30:]) or 'ログデータが取得できませんでした'}
 
         【重要な分析指針】
         - エラー数が0の場合、コンテナは正常に動作しています
@@ -3106,8 +2887,14 @@ def create_log_analysis_prompt(analysis_data):
         - 警告数: {log_stats.get('warning_count', 0)}
         - 情報数: {log_stats.get('info_count', 0)}
 
-        【実際の統合ログデータ】
-        {log_data.get('log_text', 'ログデータが取得できませんでした')}
+        エラーテンプレート（{log_stats.get('distinct_error_templates', 0)}種類、件数上位）:
+        {format_template_summary(log_stats.get('error_templates', []))}
+
+        警告テンプレート（{log_stats.get('distinct_warning_templates', 0)}種類、件数上位）:
+        {format_template_summary(log_stats.get('warning_templates', []))}
+
+        【実際の統合ログデータ（最新30行）】
+        {chr(10).join(recent_logs[-30:]) or 'ログデータが取得できませんでした'}
 
         【重要な分析指針】
         - エラー数が0の場合、システムは正常に動作しています
@@ -3145,11 +2932,11 @@ def create_log_analysis_prompt(analysis_data):
         最新のログエントリ:
         {chr(10).join(recent_logs[-20:])}
 
-        エラーパターン:
-        {chr(10).join(log_stats.get('error_patterns', [])[:5])}
+        エラーテンプレート（{log_stats.get('distinct_error_templates', 0)}種類、件数上位）:
+        {format_template_summary(log_stats.get('error_templates', []))}
 
-        警告パターン:
-        {chr(10).join(log_stats.get('warning_patterns', [])[:5])}
+        警告テンプレート（{log_stats.get('distinct_warning_templates', 0)}種類、件数上位）:
+        {format_template_summary(log_stats.get('warning_templates', []))}
 
         分析結果は以下の項目を含めてマークダウン形式で出力してください。
         1. システム健全性の評価
@@ -3165,9 +2952,7 @@ def get_fail2ban_status():
     try:
         if os.getenv('NAS_MODE'):
             # NAS環境では実際のFail2Ban状態を取得
-            result = subprocess.run([
-                'docker', 'exec', 'fail2ban', 'fail2ban-client', 'status'
-            ], capture_output=True, text=True, timeout=10)
+            result = docker_client.exec_run('fail2ban', ['fail2ban-client', 'status'], timeout=10)
             
             if result.returncode == 0:
                 return {
@@ -3205,9 +2990,7 @@ def get_ban_history_data():
             
             # 利用可能なjailを取得
             try:
-                result = subprocess.run([
-                    'docker', 'exec', 'fail2ban', 'fail2ban-client', 'status'
-                ], capture_output=True, text=True, timeout=10)
+                result = docker_client.exec_run('fail2ban', ['fail2ban-client', 'status'], timeout=10)
                 
                 if result.returncode == 0:
                     jail_lines = [line for line in result.stdout.split('\n') if 'Jail list:' in line]
@@ -3217,9 +3000,7 @@ def get_ban_history_data():
                         # 各jailのBAN情報を取得
                         for jail in available_jails:
                             try:
-                                jail_result = subprocess.run([
-                                    'docker', 'exec', 'fail2ban', 'fail2ban-client', 'status', jail
-                                ], capture_output=True, text=True, timeout=10)
+                                jail_result = docker_client.exec_run('fail2ban', ['fail2ban-client', 'status', jail], timeout=10)
                                 
                                 if jail_result.returncode == 0:
                                     for line in jail_result.stdout.split('\n'):
@@ -3348,9 +3129,7 @@ def get_ban_history_data():
             # 利用可能なjailを取得
             available_jails = []
             try:
-                result = subprocess.run([
-                    'docker', 'exec', 'fail2ban', 'fail2ban-client', 'status'
-                ], capture_output=True, text=True, timeout=10)
+                result = docker_client.exec_run('fail2ban', ['fail2ban-client', 'status'], timeout=10)
                 
                 if result.returncode == 0:
                     jail_lines = [line for line in result.stdout.split('\n') if 'Jail list:' in line]
@@ -3362,9 +3141,7 @@ def get_ban_history_data():
             # 各jailのBAN情報を取得
             for jail in available_jails:
                 try:
-                    result = subprocess.run([
-                        'docker', 'exec', 'fail2ban', 'fail2ban-client', 'status', jail
-                    ], capture_output=True, text=True, timeout=10)
+                    result = docker_client.exec_run('fail2ban', ['fail2ban-client', 'status', jail], timeout=10)
                     
                     if result.returncode == 0:
                         for line in result.stdout.split('\n'):
@@ -3374,19 +3151,22 @@ def get_ban_history_data():
                                     banned_ips = [ip.strip() for ip in ip_line.split() if ip.strip()]
                                     
                                     for ip in banned_ips:
-                                        location = get_ip_location(ip)
                                         ban_history.append({
                                             'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
                                             'ip': ip,
-                                            'jail': jail,
-                                            'location': location
+                                            'jail': jail
                                         })
                                 break
                 except Exception as e:
                     logger.warning(f"jail {jail} の情報取得エラー: {e}")
                     continue
             
-            return ban_history[:50]  # 最新50件に制限
+            ban_history = ban_history[:50]  # 最新50件に制限
+            # 全jail分のIPを重複排除してまとめて位置情報を取得
+            locations = get_ip_locations(entry['ip'] for entry in ban_history)
+            for entry in ban_history:
+                entry['location'] = locations.get(entry['ip'], 'Unknown')
+            return ban_history
         else:
             # ローカル環境ではモックデータ
             return [
@@ -3469,25 +3249,13 @@ def get_analysis_systems():
 def get_docker_containers_for_analysis():
     """AI分析用のDockerコンテナ一覧を取得"""
     try:
-        import subprocess
-        
-        # 実行中のDockerコンテナ一覧を取得
-        result = subprocess.run([
-            'docker', 'ps', '--format', '{{.Names}}\t{{.Status}}'
-        ], capture_output=True, text=True, timeout=10)
-        
-        if result.returncode != 0:
-            return []
-        
-        containers = []
-        for line in result.stdout.strip().split('\n'):
-            if line.strip():
-                parts = line.split('\t')
-                if len(parts) >= 2:
-                    containers.append({
-                        'name': parts[0],
-                        'status': parts[1]
-                    })
+        # 実行中のDockerコンテナ一覧を取得（スナップショットを使用）
+        snapshot = docker_state.get_containers(all=True)
+        containers = [
+            {'name': c['name'], 'status': c['status']}
+            for c in snapshot if c['state'] == 'running'
+        ]
+        all_names = {c['name'] for c in snapshot}
         
         # 新しい監視システムのコンテナを追加
         monitoring_containers = [
@@ -3499,11 +3267,7 @@ def get_docker_containers_for_analysis():
         
         for container_name in monitoring_containers:
             # コンテナが存在するかチェック
-            check_result = subprocess.run([
-                'docker', 'ps', '-a', '--filter', f'name={container_name}', '--format', '{{.Names}}'
-            ], capture_output=True, text=True, timeout=5)
-            
-            if check_result.returncode == 0 and container_name in check_result.stdout:
+            if container_name in all_names:
                 containers.append({
                     'name': container_name,
                     'status': 'running'  # 簡易的な状態
@@ -3529,13 +3293,10 @@ def determine_system_type(system_id):
         
         # Dockerコンテナの存在確認
         has_docker_log = False
-        import subprocess
-        result = subprocess.run([
-            'docker', 'ps', '--format', '{{.Names}}'
-        ], capture_output=True, text=True, timeout=5)
-        
-        if result.returncode == 0 and system_id in result.stdout:
-            has_docker_log = True
+        try:
+            has_docker_log = any(system_id in name for name in docker_state.names(all=False))
+        except DockerAPIError as e:
+            logger.warning(f"Dockerコンテナ確認エラー: {e}")
         
         # システムタイプを判定
         if has_text_log and has_docker_log:
@@ -3554,18 +3315,15 @@ def get_docker_only_log_data_for_analysis(system_id):
     """Dockerのみのシステムのログデータを取得"""
     try:
         # Dockerコンテナのログを直接取得
-        result = subprocess.run([
-            'docker', 'logs', '--tail', '1000', system_id
-        ], capture_output=True, text=True, timeout=30)
-        
-        if result.returncode != 0:
+        try:
+            log_text, _ = docker_client.logs(system_id, tail=1000, timeout=30)
+        except DockerAPIError as e:
             return {
-                'error': f'Dockerコンテナ {system_id} のログ取得に失敗しました: {result.stderr}',
+                'error': f'Dockerコンテナ {system_id} のログ取得に失敗しました: {e}',
                 'logs': []
             }
         
         # ログをそのままテキストとして使用
-        log_text = result.stdout
         log_lines = log_text.split('\n')
         
         # ログを解析（統計情報用）
@@ -3607,27 +3365,22 @@ def get_hybrid_log_data_for_analysis(system_id):
         
         text_log_text = ""
         if system_id in log_files and os.path.exists(log_files[system_id]):
-            with open(log_files[system_id], 'r', encoding='utf-8') as f:
-                text_log_text = f.read()
-                text_log_data = {
-                    'text': text_log_text,
-                    'source': 'text_file'
-                }
+            # Dockerログと同様に最新1000行のみを末尾から読み取り
+            text_log_text = '\n'.join(tail_lines(log_files[system_id], 1000))
+            text_log_data = {
+                'text': text_log_text,
+                'source': 'text_file'
+            }
         
         # Dockerログを取得
         docker_log_text = ""
         docker_log_data = None
         try:
-            result = subprocess.run([
-                'docker', 'logs', '--tail', '1000', system_id
-            ], capture_output=True, text=True, timeout=30)
-            
-            if result.returncode == 0:
-                docker_log_text = result.stdout
-                docker_log_data = {
-                    'text': docker_log_text,
-                    'source': 'docker'
-                }
+            docker_log_text, _ = docker_client.logs(system_id, tail=1000, timeout=30)
+            docker_log_data = {
+                'text': docker_log_text,
+                'source': 'docker'
+            }
         except Exception as e:
             logger.warning(f"Dockerログ取得エラー: {e}")
         
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+認証チェックのベンチマーク
+一時的な認証DBを作成し、1リクエスト分の認証処理（セッション検証 + ユーザー取得）の
+毎秒処理数を、従来の接続ごとの方式と永続接続・キャッシュ方式で比較する
+
+使い方:
+    python scripts/benchmark_auth_cache.py [--requests 20000] [--threads 8]
+"""
+
+import argparse
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils import auth_common
+
+
+def create_database(db_path: Path, sessions: int) -> list:
+    """ユーザー1人とセッションを作成してセッションIDの一覧を返す"""
+    conn = sqlite3.connect(db_path)
+    conn.executescript('''
+        CREATE TABLE users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            is_active BOOLEAN DEFAULT 1
+        );
+        CREATE TABLE sessions (
+            session_id TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            expires_at TIMESTAMP NOT NULL
+        );
+    ''')
+    conn.execute("INSERT INTO users (username, password_hash) VALUES ('bench', 'x')")
+    expires_at = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d %H:%M:%S')
+    session_ids = [f'session-{i}' for i in range(sessions)]
+    conn.executemany('INSERT INTO sessions (session_id, user_id, expires_at) VALUES (?, 1, ?)',
+                     [(sid, expires_at) for sid in session_ids])
+    conn.commit()
+    conn.close()
+    return session_ids
+
+
+def legacy_authenticate(db_path: Path, session_id: str):
+    """従来方式: リクエストごとに接続・検索・切断を2回行う"""
+    conn = sqlite3.connect(db_path)
+    try:
+        row = conn.execute('SELECT user_id FROM sessions WHERE session_id = ? AND expires_at > ?',
+                           (session_id, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))).fetchone()
+    finally:
+        conn.close()
+    if not row:
+        return None
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        user = conn.execute('SELECT * FROM users WHERE id = ? AND is_active = 1', (row[0],)).fetchone()
+        return dict(user) if user else None
+    finally:
+        conn.close()
+
+
+def cached_authenticate(db_path: Path, session_id: str):
+    """新方式: スレッドごとの永続接続 + TTLキャッシュ"""
+    user_id = auth_common.lookup_session(db_path, session_id)
+    return auth_common.lookup_user(db_path, user_id) if user_id else None
+
+
+def run(label: str, func, db_path: Path, session_ids: list, requests: int, threads: int) -> float:
+    def worker(offset: int):
+        for i in range(offset, requests, threads):
+            if func(db_path, session_ids[i % len(session_ids)]) is None:
+                raise RuntimeError('認証に失敗しました')
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(worker, range(threads)))
+    elapsed = time.perf_counter() - started
+    rate = requests / elapsed
+    print(f"{label:<28} {rate:>10,.0f} req/s  ({elapsed:.2f}秒)")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description='認証チェックのベンチマーク')
+    parser.add_argument('--requests', type=int, default=20000, help='認証チェックの回数')
+    parser.add_argument('--threads', type=int, default=8, help='同時実行スレッド数')
+    parser.add_argument('--sessions', type=int, default=50, help='アクティブなセッション数')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / 'auth.db'
+        session_ids = create_database(db_path, args.sessions)
+        print(f"認証チェック {args.requests:,}回 / {args.threads}スレッド / セッション {args.sessions}件")
+
+        baseline = run('接続ごと（従来）', legacy_authenticate, db_path, session_ids, args.requests, args.threads)
+
+        auth_common._auth_cache.ttl = 0
+        pooled = run('永続接続のみ', cached_authenticate, db_path, session_ids, args.requests, args.threads)
+
+        auth_common._auth_cache.ttl = 30
+        cached = run('永続接続 + キャッシュ', cached_authenticate, db_path, session_ids, args.requests, args.threads)
+
+        print(f"\n永続接続: {pooled / baseline:.1f}倍 / 永続接続 + キャッシュ: {cached / baseline:.1f}倍")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -67,8 +67,8 @@ def send_monthly_ai_report():
 期間: {report_data.get('period', '不明')}
 
 【システム状況】
-- CPU使用率: {report_data.get('system_metrics', {}).get('cpu_usage', 0):.1f}%
-- メモリ使用率: {report_data.get('system_metrics', {}).get('memory_usage', 0):.1f}%
+- CPU使用率: 平均 {report_data.get('system_metrics', {}).get('cpu_usage', 0):.1f}%（最大 {report_data.get('system_metrics', {}).get('cpu_peak', 0):.1f}%）
+- メモリ使用率: 平均 {report_data.get('system_metrics', {}).get('memory_usage', 0):.1f}%（最大 {report_data.get('system_metrics', {}).get('memory_peak', 0):.1f}%）
 - ディスク使用率: {report_data.get('system_metrics', {}).get('disk_usage', 0):.1f}%
 
 【セキュリティ状況】
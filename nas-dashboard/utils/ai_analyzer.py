@@ -149,7 +149,10 @@ class AIAnalyzer:
         
         formatted = []
         for ban in ban_history[:10]:  # 最新10件のみ
-            formatted.append(f"- {ban.get('ip', 'N/A')} | {ban.get('jail', 'N/A')} | {ban.get('timestamp', 'N/A')}")
+            line = f"- {ban.get('ip', 'N/A')} | {ban.get('jail', 'N/A')} | {ban.get('timestamp', 'N/A')}"
+            if ban.get('location'):
+                line += f" | {ban['location']}"
+            formatted.append(line)
         
         return "\n".join(formatted)
     
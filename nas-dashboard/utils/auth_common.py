@@ -6,12 +6,24 @@
 """
 
 import os
+import sqlite3
+import threading
+import time
 import logging
+from datetime import datetime
 from pathlib import Path
-from typing import Optional, Dict
+from typing import Optional, Dict, Any, Tuple
 
 logger = logging.getLogger(__name__)
 
+# セッション・ユーザー情報のキャッシュ有効期間（秒、0でキャッシュ無効）
+AUTH_CACHE_TTL = float(os.getenv('AUTH_CACHE_TTL', '30'))
+
+# 固定のSQL文字列を使い、接続ごとのプリペアドステートメントキャッシュを再利用させる
+SESSION_LOOKUP_SQL = 'SELECT user_id, expires_at FROM sessions WHERE session_id = ? AND expires_at > ?'
+USER_LOOKUP_SQL = 'SELECT * FROM users WHERE id = ?'
+ACTIVE_USER_LOOKUP_SQL = 'SELECT * FROM users WHERE id = ? AND is_active = 1'
+
 # 認証データベースのパスを取得
 def get_auth_db_path() -> Path:
     """認証データベースのパスを取得"""
@@ -25,74 +37,210 @@ def get_auth_db_path() -> Path:
         project_root = Path(__file__).parent.parent.parent
         return project_root / 'nas-dashboard' / 'data' / 'auth.db'
 
-def verify_session_from_cookie(session_id: str) -> Optional[int]:
-    """セッションIDからユーザーIDを取得（共通関数）"""
+class AuthCache:
+    """
+    セッション検証結果とユーザー情報のTTLキャッシュ
+
+    ログアウト・ユーザー無効化時は invalidate_session() / invalidate_user() で明示的に破棄する。
+    別プロセス（他サービスや別ワーカー）での変更は、接続ごとの PRAGMA data_version の変化を
+    検知してキャッシュ全体を破棄することで反映する。
+    """
+
+    def __init__(self, ttl: float = AUTH_CACHE_TTL):
+        self.ttl = ttl
+        self._sessions: Dict[str, Tuple[int, float]] = {}
+        self._users: Dict[Tuple[int, bool], Tuple[Dict[str, Any], float]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def get_session(self, session_id: str) -> Optional[int]:
+        entry = self._sessions.get(session_id)
+        if entry and entry[1] > time.time():
+            return entry[0]
+        return None
+
+    def put_session(self, session_id: str, user_id: int, expires_at: float):
+        if not self.enabled:
+            return
+        # セッション自体の有効期限を超えてキャッシュしない
+        with self._lock:
+            self._sessions[session_id] = (user_id, min(time.time() + self.ttl, expires_at))
+
+    def get_user(self, user_id: int, active_only: bool) -> Optional[Dict[str, Any]]:
+        entry = self._users.get((user_id, active_only))
+        if entry and entry[1] > time.time():
+            return dict(entry[0])
+        return None
+
+    def put_user(self, user_id: int, active_only: bool, user: Dict[str, Any]):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._users[(user_id, active_only)] = (dict(user), time.time() + self.ttl)
+
+    def invalidate_session(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def invalidate_user(self, user_id: int):
+        """ユーザー情報と、そのユーザーのセッションを破棄"""
+        with self._lock:
+            self._users.pop((user_id, True), None)
+            self._users.pop((user_id, False), None)
+            for session_id in [sid for sid, (uid, _) in self._sessions.items() if uid == user_id]:
+                del self._sessions[session_id]
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+            self._users.clear()
+
+
+_auth_cache = AuthCache()
+_local = threading.local()
+
+
+def _get_connection(db_path: Path) -> Optional[sqlite3.Connection]:
+    """スレッドごとに保持する永続接続を取得（DBファイルが無い場合はNone）"""
+    if not hasattr(_local, 'connections'):
+        _local.connections = {}
+        _local.data_versions = {}
+
+    key = str(db_path)
+    if not db_path.exists():
+        # DBが再作成された場合に古いファイルを掴み続けないよう接続を破棄
+        _discard_connection(db_path)
+        return None
+
+    conn = _local.connections.get(key)
+    if conn is None:
+        conn = sqlite3.connect(key, timeout=10, cached_statements=32)
+        conn.row_factory = sqlite3.Row
+        # auth.dbは他サービスから読み取り専用マウント（:ro）で参照されるため、
+        # WALモードにすると-wal/-shmを作れず開けなくなる。以前WALに切り替えたDBは元に戻す
+        try:
+            if conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal':
+                conn.execute('PRAGMA journal_mode=DELETE')
+        except sqlite3.Error as e:
+            logger.debug(f"ジャーナルモードの復元をスキップ: {e}")
+        _local.connections[key] = conn
+    return conn
+
+
+def _discard_connection(db_path: Path):
+    key = str(db_path)
+    _local.data_versions.pop(key, None)
+    conn = _local.connections.pop(key, None)
+    if conn:
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+
+def _sync_with_database(conn: sqlite3.Connection, db_path: Path):
+    """
+    他の接続がDBを更新していればキャッシュを破棄
+
+    data_version は接続ごとの値で他スレッドの値とは比較できないため、基準値はスレッドごとに持つ。
+    キャッシュはプロセス全体で共有しているので、基準値が無い（スレッドで初めて確認する）場合は
+    他スレッドが作ったエントリがその後の更新を反映しているか分からず、破棄する。
+    """
+    if not _auth_cache.enabled:
+        return
+    version = conn.execute('PRAGMA data_version').fetchone()[0]
+    key = str(db_path)
+    if _local.data_versions.get(key) != version:
+        _auth_cache.clear()
+        _local.data_versions[key] = version
+
+
+def lookup_session(db_path: Path, session_id: str) -> Optional[int]:
+    """セッションIDからユーザーIDを取得（キャッシュ・永続接続を使用）"""
     if not session_id:
         return None
-    
+
+    conn = _get_connection(db_path)
+    if conn is None:
+        logger.warning(f"認証データベースが見つかりません: {db_path}")
+        return None
+
     try:
-        # データベースパスを取得
-        db_path = get_auth_db_path()
-        
-        if not db_path.exists():
-            logger.warning(f"認証データベースが見つかりません: {db_path}")
-            return None
-        
-        import sqlite3
-        from datetime import datetime
-        
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        try:
-            cursor.execute('''
-                SELECT user_id FROM sessions
-                WHERE session_id = ? AND expires_at > ?
-            ''', (session_id, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
-            
-            result = cursor.fetchone()
-            if result:
-                return result[0]
+        _sync_with_database(conn, db_path)
+        user_id = _auth_cache.get_session(session_id)
+        if user_id is not None:
+            return user_id
+
+        row = conn.execute(SESSION_LOOKUP_SQL, (session_id, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))).fetchone()
+        if not row:
             return None
-        except Exception as e:
-            logger.error(f"セッション検証エラー: {e}")
+        expires_at = datetime.strptime(row['expires_at'], '%Y-%m-%d %H:%M:%S').timestamp()
+        _auth_cache.put_session(session_id, row['user_id'], expires_at)
+        return row['user_id']
+    except (sqlite3.Error, ValueError) as e:
+        logger.error(f"セッション検証エラー: {e}")
+        _discard_connection(db_path)
+        return None
+
+
+def lookup_user(db_path: Path, user_id: int, active_only: bool = True) -> Optional[Dict]:
+    """ユーザーIDからユーザー情報を取得（キャッシュ・永続接続を使用）"""
+    if not user_id:
+        return None
+
+    conn = _get_connection(db_path)
+    if conn is None:
+        logger.warning(f"認証データベースが見つかりません: {db_path}")
+        return None
+
+    try:
+        _sync_with_database(conn, db_path)
+        user = _auth_cache.get_user(user_id, active_only)
+        if user is not None:
+            return user
+
+        row = conn.execute(ACTIVE_USER_LOOKUP_SQL if active_only else USER_LOOKUP_SQL, (user_id,)).fetchone()
+        if not row:
             return None
-        finally:
-            conn.close()
+        user = dict(row)
+        _auth_cache.put_user(user_id, active_only, user)
+        return user
+    except sqlite3.Error as e:
+        logger.error(f"ユーザー取得エラー: {e}")
+        _discard_connection(db_path)
+        return None
+
+
+def invalidate_session(session_id: str):
+    """セッションのキャッシュを破棄（ログアウト時）"""
+    _auth_cache.invalidate_session(session_id)
+
+
+def invalidate_user(user_id: int):
+    """ユーザーとそのセッションのキャッシュを破棄（ユーザー更新・無効化時）"""
+    _auth_cache.invalidate_user(user_id)
+
+
+def clear_auth_cache():
+    """認証キャッシュを全て破棄"""
+    _auth_cache.clear()
+
+
+def verify_session_from_cookie(session_id: str) -> Optional[int]:
+    """セッションIDからユーザーIDを取得（共通関数）"""
+    try:
+        return lookup_session(get_auth_db_path(), session_id)
     except Exception as e:
         logger.error(f"セッション検証エラー: {e}")
         return None
 
 def get_user_by_id(user_id: int) -> Optional[Dict]:
     """ユーザーIDからユーザー情報を取得（共通関数）"""
-    if not user_id:
-        return None
-    
     try:
-        # データベースパスを取得
-        db_path = get_auth_db_path()
-        
-        if not db_path.exists():
-            logger.warning(f"認証データベースが見つかりません: {db_path}")
-            return None
-        
-        import sqlite3
-        
-        conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        try:
-            cursor.execute('SELECT * FROM users WHERE id = ? AND is_active = 1', (user_id,))
-            row = cursor.fetchone()
-            if row:
-                return dict(row)
-            return None
-        except Exception as e:
-            logger.error(f"ユーザー取得エラー: {e}")
-            return None
-        finally:
-            conn.close()
+        return lookup_user(get_auth_db_path(), user_id, active_only=True)
     except Exception as e:
         logger.error(f"ユーザー取得エラー: {e}")
         return None
@@ -14,6 +14,8 @@ from pathlib import Path
 from typing import Optional, Dict, List
 import logging
 
+from .auth_common import lookup_session, lookup_user, invalidate_session, invalidate_user
+
 logger = logging.getLogger(__name__)
 
 def get_db_path():
@@ -111,23 +113,8 @@ def get_user_by_username(username: str) -> Optional[Dict]:
         conn.close()
 
 def get_user_by_id(user_id: int) -> Optional[Dict]:
-    """ユーザーIDでユーザーを取得"""
-    db_path = get_db_path()
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    
-    try:
-        cursor.execute('SELECT * FROM users WHERE id = ?', (user_id,))
-        row = cursor.fetchone()
-        if row:
-            return dict(row)
-        return None
-    except Exception as e:
-        logger.error(f"ユーザー取得エラー: {e}")
-        return None
-    finally:
-        conn.close()
+    """ユーザーIDでユーザーを取得（無効化されたユーザーも含む）"""
+    return lookup_user(get_db_path(), user_id, active_only=False)
 
 def get_all_users() -> List[Dict]:
     """すべてのユーザーを取得"""
@@ -199,6 +186,7 @@ def update_user(user_id: int, username: Optional[str] = None, password: Optional
         query = f'UPDATE users SET {", ".join(updates)} WHERE id = ?'
         cursor.execute(query, params)
         conn.commit()
+        invalidate_user(user_id)
         logger.info(f"ユーザーを更新しました: {user_id}")
         return True
     except Exception as e:
@@ -217,6 +205,7 @@ def deactivate_user(user_id: int) -> bool:
     try:
         cursor.execute('UPDATE users SET is_active = 0, updated_at = CURRENT_TIMESTAMP WHERE id = ?', (user_id,))
         conn.commit()
+        invalidate_user(user_id)
         logger.info(f"ユーザーを無効化しました: {user_id}")
         return True
     except Exception as e:
@@ -249,29 +238,8 @@ def create_session(user_id: int, expires_at: datetime) -> Optional[str]:
         conn.close()
 
 def verify_session(session_id: str) -> Optional[int]:
-    """セッションを検証してユーザーIDを返す"""
-    if not session_id:
-        return None
-    
-    db_path = get_db_path()
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
-    try:
-        cursor.execute('''
-            SELECT user_id FROM sessions
-            WHERE session_id = ? AND expires_at > ?
-        ''', (session_id, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
-        
-        result = cursor.fetchone()
-        if result:
-            return result[0]
-        return None
-    except Exception as e:
-        logger.error(f"セッション検証エラー: {e}")
-        return None
-    finally:
-        conn.close()
+    """セッションを検証してユーザーIDを返す（スレッドごとの永続接続とTTLキャッシュを使用）"""
+    return lookup_session(get_db_path(), session_id)
 
 def delete_session(session_id: str) -> bool:
     """セッションを削除"""
@@ -282,6 +250,7 @@ def delete_session(session_id: str) -> bool:
     try:
         cursor.execute('DELETE FROM sessions WHERE session_id = ?', (session_id,))
         conn.commit()
+        invalidate_session(session_id)
         logger.info(f"セッションを削除しました: {session_id}")
         return True
     except Exception as e:
@@ -0,0 +1,465 @@
+"""
+バックアップエンジン
+バックグラウンドジョブとしてZIPバックアップを作成する
+
+- 前回バックアップのマニフェスト（サイズ・更新時刻・SHA-256）と比較して変更ファイルのみを格納（増分）
+- 画像・動画・圧縮済みファイルは再圧縮せずに格納（ZIP_STORED）
+- 圧縮は複数スレッドで並列に行い、ZIPへの書き込みのみを直列化
+"""
+import io
+import os
+import sys
+import json
+import uuid
+import zlib
+import fcntl
+import hashlib
+import tempfile
+import threading
+import time
+import zipfile
+import logging
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+EXCLUDED_DIRS = {'.git', '__pycache__', 'node_modules', '.venv', 'venv'}
+EXCLUDED_SUFFIXES = ('.pyc', '.pyo', '.log', '.tmp')
+
+# 圧縮しても小さくならない拡張子（再圧縮せずに格納）
+INCOMPRESSIBLE_EXTENSIONS = {
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.heic', '.heif',
+    '.mp4', '.mov', '.mkv', '.avi', '.webm', '.insv', '.insp', '.lrv',
+    '.mp3', '.m4a', '.aac', '.ogg', '.flac', '.opus',
+    '.zip', '.gz', '.tgz', '.bz2', '.xz', '.7z', '.rar', '.zst',
+    '.pdf', '.docx', '.xlsx', '.pptx', '.woff', '.woff2',
+}
+
+READ_CHUNK_SIZE = 1024 * 1024
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+STATE_FILENAME = '.backup_state.json'
+JOBS_DIRNAME = '.jobs'
+LOCK_FILENAME = '.backup.lock'
+ARCHIVE_MANIFEST_NAME = '.backup-manifest.json'
+
+
+class BackupInProgressError(Exception):
+    """別のバックアップジョブが実行中"""
+
+
+def _is_incompressible(path: Path) -> bool:
+    return path.suffix.lower() in INCOMPRESSIBLE_EXTENSIONS
+
+
+def _process_file(path: Path, compress: bool, level: int) -> Dict[str, Any]:
+    """
+    ファイルを1回だけ読み、SHA-256・CRC32を計算する（compress=Trueなら同時にDeflate圧縮）
+
+    zlibはGILを解放するため、複数スレッドで実行すると複数コアで圧縮できる。
+    """
+    sha256 = hashlib.sha256()
+    crc = 0
+    size = 0
+    spool = None
+    compressor = None
+    if compress:
+        spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+        # ZIPエントリ用のraw deflate（ヘッダーなし）
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+
+    try:
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                sha256.update(chunk)
+                crc = zlib.crc32(chunk, crc)
+                size += len(chunk)
+                if compressor:
+                    spool.write(compressor.compress(chunk))
+        if compressor:
+            spool.write(compressor.flush())
+            spool.seek(0)
+    except Exception:
+        if spool:
+            spool.close()
+        raise
+
+    return {'sha256': sha256.hexdigest(), 'crc': crc, 'size': size, 'compressed': spool}
+
+
+# _write_precompressed が依存するzipfileの内部実装を確認済みのPythonバージョン
+PRECOMPRESSED_WRITE_VERSIONS = ((3, 8), (3, 13))
+_precompressed_write_checked: Optional[bool] = None
+
+
+def _write_precompressed(zipf: zipfile.ZipFile, zinfo: zipfile.ZipInfo, data, compress_size: int):
+    """
+    圧縮済みのraw deflateデータをZIPエントリとして書き込む
+
+    zipfileの公開APIは書き込み時に自前で圧縮するため、並列圧縮した結果を格納するには
+    ZipFile.mkdir() と同じ手順でヘッダーを直接書き込む。zipfileの内部状態に依存するため、
+    precompressed_write_supported() が True の場合のみ使用する。
+    """
+    zinfo.compress_type = zipfile.ZIP_DEFLATED
+    zinfo.compress_size = compress_size
+    zip64 = zinfo.file_size > zipfile.ZIP64_LIMIT or compress_size > zipfile.ZIP64_LIMIT
+    with zipf._lock:
+        zipf._writecheck(zinfo)
+        zipf._didModify = True
+        zinfo.header_offset = zipf.fp.tell()
+        zipf.fp.write(zinfo.FileHeader(zip64))
+        while True:
+            chunk = data.read(READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            zipf.fp.write(chunk)
+        zipf.filelist.append(zinfo)
+        zipf.NameToInfo[zinfo.filename] = zinfo
+        zipf.start_dir = zipf.fp.tell()
+
+
+def precompressed_write_supported() -> bool:
+    """
+    圧縮済みデータの直接書き込みが使えるか（初回のみ判定）
+
+    確認済みのバージョン範囲内で、メモリ上のZIPに書き込んだエントリを testzip() で
+    検証できた場合のみ True。使えない場合は ZipFile の公開APIで（直列に）圧縮する。
+    """
+    global _precompressed_write_checked
+    if _precompressed_write_checked is None:
+        _precompressed_write_checked = _check_precompressed_write()
+    return _precompressed_write_checked
+
+
+def _check_precompressed_write() -> bool:
+    low, high = PRECOMPRESSED_WRITE_VERSIONS
+    if not low <= sys.version_info[:2] <= high:
+        logger.info(f"Python {sys.version_info[0]}.{sys.version_info[1]} では並列圧縮を使用しません（確認済み: "
+                    f"{low[0]}.{low[1]}〜{high[0]}.{high[1]}）")
+        return False
+
+    content = b'backup engine self-check\n' * 64
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+    compressed = compressor.compress(content) + compressor.flush()
+    try:
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED, allowZip64=True) as zipf:
+            zinfo = zipfile.ZipInfo('check.txt', date_time=(2024, 1, 1, 0, 0, 0))
+            zinfo.CRC = zlib.crc32(content)
+            zinfo.file_size = len(content)
+            _write_precompressed(zipf, zinfo, io.BytesIO(compressed), len(compressed))
+            zipf.writestr('after.txt', b'ok')
+        with zipfile.ZipFile(io.BytesIO(buffer.getvalue())) as zipf:
+            if zipf.testzip() is not None or zipf.read('check.txt') != content or zipf.read('after.txt') != b'ok':
+                raise zipfile.BadZipFile('round trip mismatch')
+    except Exception as e:
+        logger.warning(f"圧縮済みデータの直接書き込みが使えないため並列圧縮を無効化します: {e}")
+        return False
+    return True
+
+
+class BackupEngine:
+    """
+    バックアップエンジン
+
+    Args:
+        backup_dir: バックアップの保存先
+        project_dir: バックアップ対象のディレクトリ
+        max_workers: 並列圧縮スレッド数
+        full_interval_days: この日数が経過したら増分ではなくフルバックアップを作成
+        compress_level: Deflate圧縮レベル
+    """
+
+    def __init__(self, backup_dir: Path, project_dir: Path, max_workers: Optional[int] = None,
+                 full_interval_days: int = 7, compress_level: int = 6):
+        self.backup_dir = Path(backup_dir)
+        self.project_dir = Path(project_dir)
+        self.max_workers = max_workers or os.cpu_count() or 2
+        self.full_interval_days = full_interval_days
+        self.compress_level = compress_level
+        self.jobs_dir = self.backup_dir / JOBS_DIRNAME
+
+    # ------------------------------------------------------------------
+    # ジョブ管理（複数ワーカープロセスから参照できるようファイルに保存）
+    # ------------------------------------------------------------------
+    def _job_path(self, job_id: str) -> Path:
+        return self.jobs_dir / f'{job_id}.json'
+
+    def _save_job(self, job: Dict[str, Any]):
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self._job_path(job['id']).with_suffix('.tmp')
+        tmp_path.write_text(json.dumps(job, ensure_ascii=False), encoding='utf-8')
+        os.replace(tmp_path, self._job_path(job['id']))
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """ジョブの進捗を取得"""
+        # パス区切りを含むIDは受け付けない
+        if not job_id or '/' in job_id or '..' in job_id:
+            return None
+        path = self._job_path(job_id)
+        if not path.exists():
+            return None
+        try:
+            return json.loads(path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return None
+
+    def _cleanup_jobs(self, keep_days: int = 7):
+        if not self.jobs_dir.exists():
+            return
+        cutoff = time.time() - keep_days * 86400
+        for path in self.jobs_dir.glob('*.json'):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+            except OSError:
+                continue
+
+    def start(self, full: bool = False) -> Dict[str, Any]:
+        """
+        バックアップジョブをバックグラウンドで開始
+
+        Raises:
+            BackupInProgressError: 他のバックアップが実行中
+        """
+        self.backup_dir.mkdir(parents=True, exist_ok=True)
+        lock_file = open(self.backup_dir / LOCK_FILENAME, 'w')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            raise BackupInProgressError('別のバックアップが実行中です')
+
+        job = {
+            'id': uuid.uuid4().hex,
+            'status': 'queued',
+            'mode': None,
+            'filename': None,
+            'size': 0,
+            'total_files': 0,
+            'processed_files': 0,
+            'archived_files': 0,
+            'skipped_files': 0,
+            'deleted_files': 0,
+            'total_bytes': 0,
+            'processed_bytes': 0,
+            'progress': 0.0,
+            'error': None,
+            'started_at': datetime.now().isoformat(),
+            'finished_at': None,
+        }
+        self._save_job(job)
+        thread = threading.Thread(target=self._run, args=(job, full, lock_file), name='backup-job', daemon=True)
+        thread.start()
+        return job
+
+    # ------------------------------------------------------------------
+    # バックアップ本体
+    # ------------------------------------------------------------------
+    def _load_state(self) -> Dict[str, Any]:
+        path = self.backup_dir / STATE_FILENAME
+        if path.exists():
+            try:
+                return json.loads(path.read_text(encoding='utf-8'))
+            except (OSError, ValueError) as e:
+                logger.warning(f"バックアップマニフェスト読み込みエラー（フルバックアップを作成します）: {e}")
+        return {}
+
+    def _save_state(self, state: Dict[str, Any]):
+        path = self.backup_dir / STATE_FILENAME
+        tmp_path = path.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps(state, ensure_ascii=False), encoding='utf-8')
+        os.replace(tmp_path, path)
+
+    def forget_backup(self, filename: str) -> bool:
+        """
+        削除されたバックアップが現在の増分チェーンに含まれていれば状態をリセット
+
+        Returns:
+            True: チェーンが途切れたため次回はフルバックアップになる
+        """
+        path = self.backup_dir / STATE_FILENAME
+        if filename not in self._load_state().get('chain', []):
+            return False
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+        logger.warning(f"増分チェーン内のバックアップが削除されました（次回はフルバックアップ）: {filename}")
+        return True
+
+    def _scan(self) -> List[Tuple[Path, str, os.stat_result]]:
+        files = []
+        backup_dir = self.backup_dir.resolve()
+        for root, dirs, filenames in os.walk(self.project_dir):
+            # 除外するディレクトリ（バックアップ先自身がプロジェクト内にある場合も除外）
+            dirs[:] = [d for d in dirs
+                       if d not in EXCLUDED_DIRS and (Path(root) / d).resolve() != backup_dir]
+            for filename in filenames:
+                # 除外するファイル
+                if filename.endswith(EXCLUDED_SUFFIXES):
+                    continue
+                path = Path(root) / filename
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                files.append((path, path.relative_to(self.project_dir).as_posix(), stat))
+        return files
+
+    def _run(self, job: Dict[str, Any], full: bool, lock_file):
+        last_saved = 0.0
+
+        def update(force: bool = False, **fields):
+            nonlocal last_saved
+            job.update(fields)
+            if job['total_bytes']:
+                job['progress'] = round(job['processed_bytes'] / job['total_bytes'] * 100, 1)
+            # 進捗の書き込みは0.5秒に1回まで
+            if force or time.monotonic() - last_saved >= 0.5:
+                self._save_job(job)
+                last_saved = time.monotonic()
+
+        backup_path = None
+        try:
+            state = self._load_state()
+            previous_files = state.get('files', {})
+            last_full = state.get('last_full')
+            # 前回のフルバックアップ以降のアーカイブ（復元に必要な一式）
+            chain = state.get('chain') or []
+            missing = [name for name in chain if not (self.backup_dir / name).exists()]
+            if missing:
+                logger.warning(f"増分の基になるバックアップがありません（フルバックアップを作成します）: {missing}")
+            if not previous_files or not last_full or not chain or missing:
+                full = True
+            elif datetime.now() - datetime.fromisoformat(last_full) > timedelta(days=self.full_interval_days):
+                full = True
+            mode = 'full' if full else 'incremental'
+
+            files = self._scan()
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            suffix = '' if full else '-incr'
+            backup_filename = f"nas-project-backup-{timestamp}{suffix}.zip"
+            backup_path = self.backup_dir / backup_filename
+            update(force=True, status='running', mode=mode, filename=backup_filename,
+                   total_files=len(files), total_bytes=sum(stat.st_size for _, _, stat in files))
+            logger.info(f"バックアップ開始: {backup_filename} ({mode}, {len(files)}ファイル)")
+
+            new_files: Dict[str, List[Any]] = {}
+            errors: List[str] = []
+            candidates = []
+            for path, arcname, stat in files:
+                previous = previous_files.get(arcname)
+                if not full and previous and previous[0] == stat.st_size and previous[1] == stat.st_mtime_ns:
+                    # サイズと更新時刻が同じファイルは読み込まずにスキップ
+                    new_files[arcname] = previous
+                    update(processed_files=job['processed_files'] + 1,
+                           processed_bytes=job['processed_bytes'] + stat.st_size,
+                           skipped_files=job['skipped_files'] + 1)
+                else:
+                    candidates.append((path, arcname, stat))
+
+            with zipfile.ZipFile(backup_path, 'w', zipfile.ZIP_DEFLATED, allowZip64=True) as zipf, \
+                    ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='backup-compress') as executor:
+                pending = {}
+                queue_iter = iter(candidates)
+
+                # 使えない場合はハッシュ計算のみ並列で行い、圧縮はZIPへの書き込み時に行う
+                precompress = precompressed_write_supported()
+
+                def submit_next() -> bool:
+                    item = next(queue_iter, None)
+                    if item is None:
+                        return False
+                    path, arcname, stat = item
+                    compress = precompress and not _is_incompressible(path)
+                    future = executor.submit(_process_file, path, compress, self.compress_level)
+                    pending[future] = item
+                    return True
+
+                # 一時データが増えすぎないよう同時処理数を制限
+                for _ in range(self.max_workers * 2):
+                    if not submit_next():
+                        break
+
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        path, arcname, stat = pending.pop(future)
+                        submit_next()
+                        try:
+                            result = future.result()
+                        except OSError as e:
+                            logger.warning(f"バックアップ対象の読み込みエラー: {path}: {e}")
+                            errors.append(arcname)
+                            previous = previous_files.get(arcname)
+                            if not full and previous:
+                                # 前回までのアーカイブにある内容を引き継ぎ、削除扱いにしない
+                                new_files[arcname] = previous
+                            update(processed_files=job['processed_files'] + 1,
+                                   processed_bytes=job['processed_bytes'] + stat.st_size)
+                            continue
+
+                        previous = previous_files.get(arcname)
+                        new_files[arcname] = [result['size'], stat.st_mtime_ns, result['sha256']]
+                        spool = result['compressed']
+                        try:
+                            if not full and previous and previous[2] == result['sha256']:
+                                # 更新時刻のみ変わったファイル（内容は同一）
+                                update(skipped_files=job['skipped_files'] + 1)
+                            else:
+                                zinfo = zipfile.ZipInfo.from_file(path, arcname)
+                                if spool is not None:
+                                    zinfo.CRC = result['crc']
+                                    zinfo.file_size = result['size']
+                                    spool.seek(0, os.SEEK_END)
+                                    compress_size = spool.tell()
+                                    spool.seek(0)
+                                    _write_precompressed(zipf, zinfo, spool, compress_size)
+                                elif _is_incompressible(path):
+                                    zipf.write(path, arcname, compress_type=zipfile.ZIP_STORED)
+                                else:
+                                    zipf.write(path, arcname, compress_type=zipfile.ZIP_DEFLATED,
+                                               compresslevel=self.compress_level)
+                                update(archived_files=job['archived_files'] + 1)
+                        finally:
+                            if spool is not None:
+                                spool.close()
+                        update(processed_files=job['processed_files'] + 1,
+                               processed_bytes=job['processed_bytes'] + stat.st_size)
+
+                deleted = sorted(set(previous_files) - set(new_files) - set(errors)) if not full else []
+                manifest = {
+                    'type': mode,
+                    'created_at': datetime.now().isoformat(),
+                    'base_backup': None if full else state.get('last_backup'),
+                    'deleted': deleted,
+                    'errors': sorted(errors),
+                    'files': len(new_files),
+                }
+                zipf.writestr(ARCHIVE_MANIFEST_NAME, json.dumps(manifest, ensure_ascii=False, indent=2))
+
+            self._save_state({
+                'files': new_files,
+                'last_backup': backup_filename,
+                'last_full': datetime.now().isoformat() if full else last_full,
+                'chain': [backup_filename] if full else chain + [backup_filename],
+            })
+            update(force=True, status='completed', deleted_files=len(deleted), progress=100.0,
+                   size=backup_path.stat().st_size, finished_at=datetime.now().isoformat())
+            logger.info(f"バックアップ完了: {backup_filename} (格納 {job['archived_files']}件, "
+                        f"スキップ {job['skipped_files']}件, 読み込みエラー {len(errors)}件)")
+        except Exception as e:
+            logger.error(f"バックアップ作成エラー: {e}", exc_info=True)
+            if backup_path and backup_path.exists():
+                backup_path.unlink()
+            update(force=True, status='failed', error=str(e), finished_at=datetime.now().isoformat())
+        finally:
+            self._cleanup_jobs()
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
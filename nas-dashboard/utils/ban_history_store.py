@@ -0,0 +1,237 @@
+"""
+Fail2Ban BAN履歴ストア
+`docker logs fail2ban` を前回のカーソル位置から差分取り込みしてSQLiteに蓄積し、
+レポートからは日付範囲のインデックス検索で参照する
+"""
+import os
+import re
+import sqlite3
+import subprocess
+import threading
+import time
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 例（--timestamps付き）:
+# 2025-10-24T06:21:50.993123456Z 2025-10-24 15:21:50,993 fail2ban.actions        [1]: NOTICE  [sshd] Ban 183.66.17.82
+BAN_LINE_PATTERN = re.compile(
+    r'^(?:(?P<docker_ts>\d{4}-\d{2}-\d{2}T\S+Z)\s+)?'
+    r'(?P<date>\d{4}-\d{2}-\d{2}) (?P<time>\d{2}:\d{2}:\d{2})(?:,\d+)?\s+'
+    r'fail2ban\.actions\s*\[\d+\]:\s+NOTICE\s+\[(?P<jail>[^\]]+)\]\s+'
+    r'(?:Restore\s+)?(?P<action>Ban|Unban)\s+(?P<ip>\S+)'
+)
+DOCKER_TS_PATTERN = re.compile(r'^(\d{4}-\d{2}-\d{2}T\S+Z)\s')
+
+INSERT_BATCH_SIZE = 1000
+
+
+def get_ban_history_db_path() -> Path:
+    """BAN履歴データベースのパスを取得（環境に応じて）"""
+    env_path = os.getenv('BAN_HISTORY_DB_PATH')
+    if env_path:
+        return Path(env_path)
+    if os.getenv('NAS_MODE'):
+        # 認証DBと同じ統合データディレクトリに保存
+        return Path('/nas-project-data/nas-dashboard/ban_history.db')
+    return Path(__file__).parent.parent / 'data' / 'ban_history.db'
+
+
+def parse_ban_line(line: str) -> Optional[Dict[str, str]]:
+    """Fail2BanのBAN/UNBANログ行を解析（該当しない行はNone）"""
+    match = BAN_LINE_PATTERN.match(line)
+    if not match:
+        return None
+    return {
+        'timestamp': f"{match.group('date')} {match.group('time')}",
+        'ip': match.group('ip'),
+        'jail': match.group('jail'),
+        'action': match.group('action'),
+    }
+
+
+class BanHistoryStore:
+    """追記専用のBANイベントストア（SQLite）"""
+
+    def __init__(self, db_path: Optional[Path] = None, container_name: str = 'fail2ban',
+                 min_ingest_interval: int = 60):
+        self.db_path = Path(db_path) if db_path else get_ban_history_db_path()
+        self.container_name = container_name
+        self.min_ingest_interval = min_ingest_interval
+        self._lock = threading.Lock()
+        self._last_ingest = 0.0
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_db(self):
+        """テーブルとインデックスを作成"""
+        if self._initialized:
+            return
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS ban_events (
+                    timestamp TEXT NOT NULL,
+                    ip TEXT NOT NULL,
+                    jail TEXT NOT NULL,
+                    action TEXT NOT NULL,
+                    UNIQUE (timestamp, ip, jail, action)
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_ban_events_timestamp ON ban_events(timestamp)')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS ingest_state (
+                    source TEXT PRIMARY KEY,
+                    cursor TEXT NOT NULL,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            conn.commit()
+            self._initialized = True
+        finally:
+            conn.close()
+
+    def _get_cursor(self, conn: sqlite3.Connection) -> Optional[str]:
+        row = conn.execute('SELECT cursor FROM ingest_state WHERE source = ?',
+                           (self.container_name,)).fetchone()
+        return row['cursor'] if row else None
+
+    def _save_cursor(self, conn: sqlite3.Connection, cursor: str):
+        conn.execute('''
+            INSERT INTO ingest_state (source, cursor, updated_at) VALUES (?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(source) DO UPDATE SET cursor = excluded.cursor, updated_at = CURRENT_TIMESTAMP
+        ''', (self.container_name, cursor))
+
+    def ingest_lines(self, lines: Iterable[str], conn: Optional[sqlite3.Connection] = None) -> Dict[str, Optional[str]]:
+        """
+        ログ行を取り込む
+
+        Returns:
+            {'inserted': 追加件数, 'cursor': 最後に読んだDockerタイムスタンプ}
+        """
+        own_conn = conn is None
+        if own_conn:
+            self._init_db()
+            conn = self._connect()
+
+        inserted = 0
+        last_docker_ts = None
+        batch = []
+        try:
+            for line in lines:
+                ts_match = DOCKER_TS_PATTERN.match(line)
+                if ts_match:
+                    last_docker_ts = ts_match.group(1)
+                if 'NOTICE' not in line or 'ban ' not in line.lower():
+                    continue
+                event = parse_ban_line(line)
+                if event:
+                    batch.append((event['timestamp'], event['ip'], event['jail'], event['action']))
+                if len(batch) >= INSERT_BATCH_SIZE:
+                    inserted += self._insert_batch(conn, batch)
+                    batch = []
+            if batch:
+                inserted += self._insert_batch(conn, batch)
+            if last_docker_ts:
+                self._save_cursor(conn, last_docker_ts)
+            conn.commit()
+        finally:
+            if own_conn:
+                conn.close()
+        return {'inserted': inserted, 'cursor': last_docker_ts}
+
+    @staticmethod
+    def _insert_batch(conn: sqlite3.Connection, batch: List[tuple]) -> int:
+        before = conn.total_changes
+        conn.executemany(
+            'INSERT OR IGNORE INTO ban_events (timestamp, ip, jail, action) VALUES (?, ?, ?, ?)',
+            batch
+        )
+        return conn.total_changes - before
+
+    def ingest(self, force: bool = False, timeout: int = 60) -> int:
+        """
+        fail2banコンテナのログを前回カーソル以降だけ取り込む
+
+        初回のみ全履歴を読み込み、以降は `docker logs --since <cursor>` で差分のみを取得する。
+        書き込みできない環境（読み取り専用マウント等）では取り込みをスキップする。
+
+        Returns:
+            新規に追加されたイベント件数
+        """
+        with self._lock:
+            if not force and time.monotonic() - self._last_ingest < self.min_ingest_interval:
+                return 0
+
+            try:
+                self._init_db()
+                conn = self._connect()
+            except sqlite3.Error as e:
+                logger.warning(f"BAN履歴ストアを開けません（取り込みをスキップ）: {e}")
+                return 0
+
+            try:
+                cursor = self._get_cursor(conn)
+                cmd = ['docker', 'logs', '--timestamps']
+                if cursor:
+                    cmd += ['--since', cursor]
+                cmd.append(self.container_name)
+                logger.info(f"BAN履歴の差分取り込み開始 (since: {cursor or '全履歴'})")
+
+                started = time.monotonic()
+                proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                        text=True, errors='replace')
+                killer = threading.Timer(timeout, proc.kill)
+                killer.start()
+                try:
+                    result = self.ingest_lines(proc.stdout, conn=conn)
+                finally:
+                    killer.cancel()
+                    proc.stdout.close()
+                    returncode = proc.wait()
+
+                if returncode != 0:
+                    logger.error(f"Dockerログ取得エラー: returncode={returncode}")
+                self._last_ingest = time.monotonic()
+                logger.info(f"BAN履歴の差分取り込み完了: {result['inserted']}件追加 "
+                            f"({time.monotonic() - started:.2f}秒)")
+                return result['inserted']
+            except (sqlite3.Error, OSError) as e:
+                logger.warning(f"BAN履歴の取り込みエラー: {e}")
+                return 0
+            finally:
+                conn.close()
+
+    def get_events(self, since: datetime, until: Optional[datetime] = None,
+                   actions: Iterable[str] = ('Ban',)) -> List[Dict[str, str]]:
+        """指定期間のBANイベントを新しい順で取得"""
+        actions = list(actions)
+        if not self.db_path.exists():
+            return []
+
+        query = 'SELECT timestamp, ip, jail, action FROM ban_events WHERE timestamp >= ?'
+        params: List[str] = [since.strftime('%Y-%m-%d %H:%M:%S')]
+        if until:
+            query += ' AND timestamp < ?'
+            params.append(until.strftime('%Y-%m-%d %H:%M:%S'))
+        if actions:
+            query += f" AND action IN ({', '.join('?' for _ in actions)})"
+            params.extend(actions)
+        query += ' ORDER BY timestamp DESC'
+
+        conn = self._connect()
+        try:
+            return [dict(row) for row in conn.execute(query, params)]
+        except sqlite3.Error as e:
+            logger.error(f"BAN履歴クエリエラー: {e}")
+            return []
+        finally:
+            conn.close()
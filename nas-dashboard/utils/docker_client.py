@@ -0,0 +1,318 @@
+"""
+Docker Engine APIクライアント
+`docker` CLIをプロセス起動する代わりにDockerソケットへ直接HTTPで接続し、
+コンテナ一覧はイベントストリームで更新されるスナップショットから返す
+"""
+import os
+import json
+import queue
+import socket
+import struct
+import threading
+import time
+import logging
+import http.client
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import quote, urlencode
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOCKET_PATH = '/var/run/docker.sock'
+
+
+class DockerAPIError(Exception):
+    """Docker Engine APIのエラー"""
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+class DockerTimeoutError(DockerAPIError):
+    """Docker Engine APIのタイムアウト"""
+
+
+class ExecResult(NamedTuple):
+    """コンテナ内コマンドの実行結果（subprocess.CompletedProcess互換の属性名）"""
+    returncode: int
+    stdout: str
+    stderr: str
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """Unixドメインソケット経由のHTTP接続"""
+
+    def __init__(self, socket_path: str, timeout: Optional[float] = None):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self.sock = sock
+
+
+def _demux_stream(data: bytes) -> Tuple[str, str]:
+    """
+    Dockerの多重化ストリーム（8バイトヘッダー + ペイロード）をstdout/stderrに分離
+
+    TTY付きコンテナはヘッダーなしの生データなので、そのままstdoutとして扱う。
+    """
+    stdout_chunks, stderr_chunks = [], []
+    pos = 0
+    while pos + 8 <= len(data):
+        stream_type = data[pos]
+        if stream_type not in (0, 1, 2) or data[pos + 1:pos + 4] != b'\x00\x00\x00':
+            break
+        size = struct.unpack('>I', data[pos + 4:pos + 8])[0]
+        chunk = data[pos + 8:pos + 8 + size]
+        (stderr_chunks if stream_type == 2 else stdout_chunks).append(chunk)
+        pos += 8 + size
+
+    if pos == 0 and data:
+        return data.decode('utf-8', errors='replace'), ''
+    return (b''.join(stdout_chunks).decode('utf-8', errors='replace'),
+            b''.join(stderr_chunks).decode('utf-8', errors='replace'))
+
+
+def _format_ports(ports: List[Dict[str, Any]]) -> str:
+    """ポート情報を `docker ps` と同じ表記に変換"""
+    formatted = []
+    for port in ports or []:
+        private = f"{port.get('PrivatePort')}/{port.get('Type', 'tcp')}"
+        if port.get('PublicPort'):
+            formatted.append(f"{port.get('IP', '0.0.0.0')}:{port['PublicPort']}->{private}")
+        else:
+            formatted.append(private)
+    # IPv4/IPv6で重複する表記をまとめる
+    return ', '.join(dict.fromkeys(formatted))
+
+
+def _normalize_container(raw: Dict[str, Any]) -> Dict[str, Any]:
+    """APIのコンテナ情報を `docker ps` 相当のフィールドに変換"""
+    names = raw.get('Names') or []
+    name = names[0].lstrip('/') if names else raw.get('Id', '')[:12]
+    created = raw.get('Created')
+    return {
+        'id': raw.get('Id', '')[:12],
+        'full_id': raw.get('Id', ''),
+        'name': name,
+        'image': raw.get('Image', ''),
+        'status': raw.get('Status', ''),
+        'state': raw.get('State', ''),
+        'created': datetime.fromtimestamp(created).isoformat() if created else '',
+        'ports': _format_ports(raw.get('Ports')),
+        'labels': raw.get('Labels') or {},
+    }
+
+
+class DockerClient:
+    """
+    Docker Engine APIクライアント（keep-alive接続をプールして再利用）
+
+    Args:
+        socket_path: Dockerソケットのパス
+        pool_size: プールに保持する接続数
+        timeout: デフォルトのタイムアウト（秒）
+    """
+
+    def __init__(self, socket_path: Optional[str] = None, pool_size: int = 4, timeout: float = 10):
+        self.socket_path = socket_path or os.getenv('DOCKER_SOCKET_PATH', DEFAULT_SOCKET_PATH)
+        self.timeout = timeout
+        self._pool: queue.LifoQueue = queue.LifoQueue(maxsize=pool_size)
+
+    def is_available(self) -> bool:
+        """Dockerソケットが存在するか"""
+        return os.path.exists(self.socket_path)
+
+    def _get_connection(self, timeout: float) -> UnixHTTPConnection:
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = UnixHTTPConnection(self.socket_path, timeout=timeout)
+        conn.timeout = timeout
+        if conn.sock:
+            conn.sock.settimeout(timeout)
+        return conn
+
+    def _release_connection(self, conn: UnixHTTPConnection):
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def request(self, method: str, path: str, params: Optional[Dict[str, Any]] = None,
+                body: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None) -> bytes:
+        """APIリクエストを送信してレスポンス本文を返す（2xx以外はDockerAPIError）"""
+        timeout = self.timeout if timeout is None else timeout
+        url = path + (f'?{urlencode(params)}' if params else '')
+        payload = json.dumps(body).encode('utf-8') if body is not None else None
+        headers = {'Content-Type': 'application/json'} if payload is not None else {}
+
+        # プール内の接続が切れていた場合に備えて1回だけ新しい接続で再試行
+        for attempt in range(2):
+            conn = self._get_connection(timeout)
+            try:
+                conn.request(method, url, body=payload, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+            except socket.timeout as e:
+                conn.close()
+                raise DockerTimeoutError(f'Docker APIがタイムアウトしました: {method} {path}') from e
+            except (http.client.HTTPException, ConnectionError) as e:
+                conn.close()
+                if attempt == 0:
+                    continue
+                raise DockerAPIError(f'Docker API接続エラー: {e}') from e
+            except OSError as e:
+                conn.close()
+                raise DockerAPIError(f'Dockerソケットに接続できません: {e}') from e
+
+            if response.will_close:
+                conn.close()
+            else:
+                self._release_connection(conn)
+
+            if response.status >= 400:
+                try:
+                    message = json.loads(data).get('message', '')
+                except ValueError:
+                    message = data.decode('utf-8', errors='replace')
+                raise DockerAPIError(message or f'HTTP {response.status}', status=response.status)
+            return data
+        raise DockerAPIError('Docker API接続エラー')
+
+    def request_json(self, method: str, path: str, **kwargs) -> Any:
+        data = self.request(method, path, **kwargs)
+        return json.loads(data) if data else None
+
+    def list_containers(self, all: bool = True) -> List[Dict[str, Any]]:
+        """コンテナ一覧を取得（`docker ps [-a]` 相当）"""
+        raw = self.request_json('GET', '/containers/json', params={'all': 1 if all else 0})
+        return [_normalize_container(c) for c in raw]
+
+    def logs(self, container: str, tail: Optional[int] = None, timestamps: bool = False,
+             since: Optional[int] = None, timeout: float = 30) -> Tuple[str, str]:
+        """コンテナログを取得（`docker logs` 相当）し、(stdout, stderr) を返す"""
+        params = {'stdout': 1, 'stderr': 1, 'timestamps': 1 if timestamps else 0}
+        if tail is not None:
+            params['tail'] = tail
+        if since is not None:
+            params['since'] = since
+        data = self.request('GET', f'/containers/{quote(container)}/logs', params=params, timeout=timeout)
+        return _demux_stream(data)
+
+    def exec_run(self, container: str, cmd: List[str], timeout: float = 10) -> ExecResult:
+        """
+        コンテナ内でコマンドを実行（`docker exec` 相当）
+
+        コンテナが存在しない・停止中の場合はCLIと同様に終了コード1として返す。
+        """
+        try:
+            created = self.request_json('POST', f'/containers/{quote(container)}/exec', body={
+                'AttachStdout': True,
+                'AttachStderr': True,
+                'Cmd': cmd,
+            }, timeout=timeout)
+        except DockerAPIError as e:
+            if e.status in (404, 409):
+                return ExecResult(1, '', str(e))
+            raise
+        exec_id = created['Id']
+        data = self.request('POST', f'/exec/{exec_id}/start', body={'Detach': False, 'Tty': False},
+                            timeout=timeout)
+        stdout, stderr = _demux_stream(data)
+        inspect = self.request_json('GET', f'/exec/{exec_id}/json', timeout=timeout)
+        exit_code = inspect.get('ExitCode')
+        return ExecResult(exit_code if exit_code is not None else -1, stdout, stderr)
+
+
+class ContainerStateCache:
+    """
+    コンテナ一覧のスナップショット
+
+    Dockerのイベントストリームを監視し、コンテナの作成・起動・停止などが起きたときだけ
+    一覧を取り直す。イベントストリームが使えない場合もmax_age秒ごとに更新する。
+    """
+
+    def __init__(self, client: DockerClient, max_age: float = 60):
+        self.client = client
+        self.max_age = max_age
+        self._containers: Optional[List[Dict[str, Any]]] = None
+        self._fetched_at = 0.0
+        self._dirty = True
+        self._lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+    def start(self):
+        """イベント監視スレッドを起動"""
+        if self._watcher and self._watcher.is_alive():
+            return
+        self._stop_event.clear()
+        self._watcher = threading.Thread(target=self._watch_events, name='docker-events', daemon=True)
+        self._watcher.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def invalidate(self):
+        """次回参照時に一覧を取り直す"""
+        self._dirty = True
+
+    def _watch_events(self):
+        backoff = 1
+        while not self._stop_event.is_set():
+            conn = UnixHTTPConnection(self.client.socket_path, timeout=300)
+            try:
+                filters = json.dumps({'type': ['container']})
+                conn.request('GET', f"/events?{urlencode({'filters': filters})}")
+                response = conn.getresponse()
+                if response.status != 200:
+                    raise DockerAPIError(f'イベントストリーム取得失敗: HTTP {response.status}')
+                # 接続中に起きた変化を取りこぼさないよう、接続直後に一度無効化
+                self.invalidate()
+                backoff = 1
+                while not self._stop_event.is_set():
+                    line = response.readline()
+                    if not line:
+                        break
+                    self.invalidate()
+            except socket.timeout:
+                # 一定時間イベントが無いだけなので再接続
+                continue
+            except (OSError, http.client.HTTPException, DockerAPIError) as e:
+                logger.debug(f"Dockerイベント監視エラー（{backoff}秒後に再接続）: {e}")
+                self._stop_event.wait(backoff)
+                backoff = min(backoff * 2, 60)
+            finally:
+                conn.close()
+
+    def get_containers(self, all: bool = True) -> List[Dict[str, Any]]:
+        """スナップショットからコンテナ一覧を返す（all=Falseで稼働中のみ）"""
+        if self._dirty or self._containers is None or time.monotonic() - self._fetched_at > self.max_age:
+            with self._lock:
+                if self._dirty or self._containers is None or time.monotonic() - self._fetched_at > self.max_age:
+                    self._dirty = False
+                    try:
+                        self._containers = self.client.list_containers(all=True)
+                    except DockerAPIError:
+                        self._dirty = True
+                        raise
+                    self._fetched_at = time.monotonic()
+        containers = self._containers
+        if all:
+            return list(containers)
+        return [c for c in containers if c['state'] == 'running']
+
+    def find(self, name: str, all: bool = False) -> Optional[Dict[str, Any]]:
+        """名前を部分一致で検索（`docker ps --filter name=...` 相当）"""
+        for container in self.get_containers(all=all):
+            if name in container['name']:
+                return container
+        return None
+
+    def names(self, all: bool = False) -> List[str]:
+        return [c['name'] for c in self.get_containers(all=all)]
@@ -0,0 +1,348 @@
+"""
+IPアドレス地理情報の取得
+SQLiteの永続キャッシュ + メモリ上のLRUで同じIPの再取得を避け、
+オフラインDB（MaxMind mmdb / CSV範囲テーブル）→ ip-api.com バッチAPI の順で解決する
+"""
+import os
+import csv
+import bisect
+import ipaddress
+import sqlite3
+import threading
+import time
+import logging
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+try:
+    import maxminddb
+    MAXMINDDB_AVAILABLE = True
+except ImportError:
+    MAXMINDDB_AVAILABLE = False
+
+LOCAL_LOCATION = 'ローカル'
+UNKNOWN_LOCATION = 'Unknown'
+
+# ip-api.com バッチAPIの1リクエストあたりの上限
+IP_API_BATCH_URL = 'http://ip-api.com/batch'
+IP_API_BATCH_SIZE = 100
+
+
+def get_geoip_cache_db_path() -> Path:
+    """IP地理情報キャッシュのパスを取得（環境に応じて）"""
+    env_path = os.getenv('GEOIP_CACHE_DB_PATH')
+    if env_path:
+        return Path(env_path)
+    if os.getenv('NAS_MODE'):
+        return Path('/nas-project-data/nas-dashboard/geoip_cache.db')
+    return Path(__file__).parent.parent / 'data' / 'geoip_cache.db'
+
+
+def format_location(city: str = '', region: str = '', country: str = '') -> str:
+    """「都市, 地域, 国」形式に整形"""
+    parts = [part for part in (city, region, country) if part]
+    return ', '.join(parts) if parts else UNKNOWN_LOCATION
+
+
+def is_local_ip(ip: str) -> Optional[bool]:
+    """プライベート・ループバック等のIPか判定（IPとして不正ならNone）"""
+    try:
+        address = ipaddress.ip_address(ip)
+    except ValueError:
+        return None
+    return address.is_private or address.is_loopback or address.is_link_local or address.is_reserved
+
+
+class CSVRangeProvider:
+    """
+    CSV範囲テーブルによるオフライン検索
+
+    各行 `start_ip,end_ip,country[,region[,city]]`（IPはドット表記または整数）を
+    開始アドレス順の整数配列に変換し、二分探索で該当範囲を引く。
+    """
+
+    name = 'csv'
+
+    def __init__(self, path: str):
+        ranges: List[Tuple[int, int, str]] = []
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.reader(f):
+                if len(row) < 3 or row[0].startswith('#'):
+                    continue
+                try:
+                    start, end = self._to_int(row[0]), self._to_int(row[1])
+                except ValueError:
+                    # ヘッダー行など
+                    continue
+                country = row[2].strip()
+                region = row[3].strip() if len(row) > 3 else ''
+                city = row[4].strip() if len(row) > 4 else ''
+                ranges.append((start, end, format_location(city, region, country)))
+        ranges.sort()
+        self._starts = [r[0] for r in ranges]
+        self._ranges = ranges
+        logger.info(f"IP範囲テーブルを読み込みました: {path}（{len(ranges)}件）")
+
+    @staticmethod
+    def _to_int(value: str) -> int:
+        value = value.strip()
+        if value.isdigit():
+            return int(value)
+        return int(ipaddress.ip_address(value))
+
+    def lookup(self, ip: str) -> Optional[str]:
+        value = int(ipaddress.ip_address(ip))
+        index = bisect.bisect_right(self._starts, value) - 1
+        if index >= 0:
+            start, end, location = self._ranges[index]
+            if start <= value <= end:
+                return location
+        return None
+
+
+class MMDBProvider:
+    """MaxMind形式（GeoLite2-City等）のmmdbファイルによるオフライン検索"""
+
+    name = 'mmdb'
+
+    def __init__(self, path: str):
+        if not MAXMINDDB_AVAILABLE:
+            raise RuntimeError('maxminddb パッケージがインストールされていません')
+        self._reader = maxminddb.open_database(path)
+        logger.info(f"IP地理情報DBを読み込みました: {path}")
+
+    @staticmethod
+    def _name(entry: Optional[Dict]) -> str:
+        names = (entry or {}).get('names') or {}
+        return names.get('ja') or names.get('en') or ''
+
+    def lookup(self, ip: str) -> Optional[str]:
+        record = self._reader.get(ip)
+        if not record:
+            return None
+        subdivisions = record.get('subdivisions') or [None]
+        return format_location(
+            self._name(record.get('city')),
+            self._name(subdivisions[0]),
+            self._name(record.get('country')),
+        )
+
+
+def load_offline_provider(path: Optional[str] = None):
+    """パスの拡張子に応じてオフラインプロバイダーを生成（未設定・読み込み失敗時はNone）"""
+    path = path or os.getenv('GEOIP_DB_PATH')
+    if not path:
+        return None
+    if not os.path.exists(path):
+        logger.warning(f"IP地理情報DBが見つかりません: {path}")
+        return None
+    try:
+        if path.endswith('.mmdb'):
+            return MMDBProvider(path)
+        return CSVRangeProvider(path)
+    except Exception as e:
+        logger.warning(f"IP地理情報DBの読み込みに失敗しました ({path}): {e}")
+        return None
+
+
+class IPGeolocator:
+    """
+    IP地理情報リゾルバー
+
+    Args:
+        offline_provider: オフライン検索（lookup(ip) -> 位置文字列 or None）
+        online: オフラインで解決できないIPをip-api.comに問い合わせるか
+        cache_ttl_days: キャッシュの有効日数
+        memory_cache_size: メモリ上のLRUキャッシュ件数
+    """
+
+    def __init__(self, offline_provider=None, online: bool = True, cache_ttl_days: int = 30,
+                 memory_cache_size: int = 4096, db_path: Optional[Path] = None, timeout: float = 5):
+        self.offline_provider = offline_provider
+        self.online = online
+        self.cache_ttl = cache_ttl_days * 86400
+        self.memory_cache_size = memory_cache_size
+        self.timeout = timeout
+        self.db_path = Path(db_path) if db_path else get_geoip_cache_db_path()
+        self.session = requests.Session()
+        self._memory: 'OrderedDict[str, Tuple[str, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._db_available = True
+        self._initialized = False
+
+    # ------------------------------------------------------------------
+    # キャッシュ
+    # ------------------------------------------------------------------
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=10)
+
+    def _init_db(self):
+        if self._initialized or not self._db_available:
+            return
+        try:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = self._connect()
+            try:
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS ip_locations (
+                        ip TEXT PRIMARY KEY,
+                        location TEXT NOT NULL,
+                        source TEXT NOT NULL,
+                        updated_at REAL NOT NULL
+                    )
+                ''')
+                conn.commit()
+            finally:
+                conn.close()
+            self._initialized = True
+        except (sqlite3.Error, OSError) as e:
+            # 読み取り専用マウント等ではメモリキャッシュのみで動作
+            logger.warning(f"IP地理情報キャッシュを無効化します: {e}")
+            self._db_available = False
+
+    def _remember(self, ip: str, location: str, fetched_at: float):
+        with self._lock:
+            self._memory[ip] = (location, fetched_at)
+            self._memory.move_to_end(ip)
+            while len(self._memory) > self.memory_cache_size:
+                self._memory.popitem(last=False)
+
+    def _get_cached(self, ips: List[str]) -> Dict[str, str]:
+        now = time.time()
+        found: Dict[str, str] = {}
+        with self._lock:
+            for ip in ips:
+                entry = self._memory.get(ip)
+                if entry and now - entry[1] < self.cache_ttl:
+                    self._memory.move_to_end(ip)
+                    found[ip] = entry[0]
+
+        missing = [ip for ip in ips if ip not in found]
+        self._init_db()
+        if missing and self._db_available:
+            try:
+                conn = self._connect()
+                try:
+                    # SQLiteの変数上限を超えないよう分割して検索
+                    for i in range(0, len(missing), 500):
+                        chunk = missing[i:i + 500]
+                        rows = conn.execute(
+                            f"SELECT ip, location, updated_at FROM ip_locations "
+                            f"WHERE ip IN ({', '.join('?' for _ in chunk)}) AND updated_at >= ?",
+                            chunk + [now - self.cache_ttl]
+                        ).fetchall()
+                        for ip, location, updated_at in rows:
+                            found[ip] = location
+                            self._remember(ip, location, updated_at)
+                finally:
+                    conn.close()
+            except sqlite3.Error as e:
+                logger.warning(f"IP地理情報キャッシュの読み込みエラー: {e}")
+        return found
+
+    def _store(self, results: Dict[str, str], source: str):
+        now = time.time()
+        for ip, location in results.items():
+            self._remember(ip, location, now)
+        if not results or not self._db_available:
+            return
+        try:
+            conn = self._connect()
+            try:
+                conn.executemany(
+                    'INSERT OR REPLACE INTO ip_locations (ip, location, source, updated_at) VALUES (?, ?, ?, ?)',
+                    [(ip, location, source, now) for ip, location in results.items()]
+                )
+                conn.commit()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"IP地理情報キャッシュの保存エラー: {e}")
+
+    # ------------------------------------------------------------------
+    # 解決
+    # ------------------------------------------------------------------
+    def _lookup_offline(self, ips: List[str]) -> Dict[str, str]:
+        if not self.offline_provider:
+            return {}
+        results = {}
+        for ip in ips:
+            try:
+                location = self.offline_provider.lookup(ip)
+            except Exception as e:
+                logger.debug(f"オフラインIP検索エラー ({ip}): {e}")
+                continue
+            if location:
+                results[ip] = location
+        return results
+
+    def _lookup_online(self, ips: List[str]) -> Dict[str, str]:
+        """ip-api.com バッチAPIで最大100件ずつ問い合わせ"""
+        results = {}
+        for i in range(0, len(ips), IP_API_BATCH_SIZE):
+            chunk = ips[i:i + IP_API_BATCH_SIZE]
+            try:
+                response = self.session.post(
+                    IP_API_BATCH_URL,
+                    json=[{'query': ip, 'fields': 'status,country,regionName,city,query'} for ip in chunk],
+                    timeout=self.timeout
+                )
+                if response.status_code == 429:
+                    logger.warning("ip-api.com のレート制限に達したため問い合わせを中断します")
+                    break
+                response.raise_for_status()
+                for item in response.json():
+                    ip = item.get('query')
+                    if not ip:
+                        continue
+                    if item.get('status') == 'success':
+                        results[ip] = format_location(item.get('city', ''), item.get('regionName', ''),
+                                                      item.get('country', ''))
+                    else:
+                        results[ip] = UNKNOWN_LOCATION
+            except (requests.RequestException, ValueError) as e:
+                # 取得できなかったIPはキャッシュせず次回再試行
+                logger.warning(f"IP位置情報の一括取得エラー（{len(chunk)}件）: {e}")
+        return results
+
+    def lookup_many(self, ips: Iterable[str]) -> Dict[str, str]:
+        """複数IPの位置情報をまとめて取得（重複は1回だけ解決）"""
+        results: Dict[str, str] = {}
+        pending: List[str] = []
+        for ip in dict.fromkeys(ip.strip() for ip in ips if ip):
+            local = is_local_ip(ip)
+            if local is None:
+                results[ip] = UNKNOWN_LOCATION
+            elif local:
+                results[ip] = LOCAL_LOCATION
+            else:
+                pending.append(ip)
+        if not pending:
+            return results
+
+        cached = self._get_cached(pending)
+        results.update(cached)
+        pending = [ip for ip in pending if ip not in cached]
+
+        offline = self._lookup_offline(pending)
+        self._store(offline, 'offline')
+        results.update(offline)
+        pending = [ip for ip in pending if ip not in offline]
+
+        if pending and self.online:
+            online = self._lookup_online(pending)
+            self._store(online, 'ip-api')
+            results.update(online)
+
+        for ip in pending:
+            results.setdefault(ip, UNKNOWN_LOCATION)
+        return results
+
+    def lookup(self, ip: str) -> str:
+        """1件のIPの位置情報を取得"""
+        return self.lookup_many([ip]).get(ip.strip(), UNKNOWN_LOCATION)
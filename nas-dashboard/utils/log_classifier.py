@@ -0,0 +1,143 @@
+"""
+ログ分類・テンプレート集計エンジン
+ログレベルを1つのコンパイル済み正規表現で判定し、数値・IP・UUID・タイムスタンプ等を
+プレースホルダーに置き換えたテンプレートごとに件数と初出・最終出現時刻を集計する
+"""
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+
+# レベル判定用キーワード（優先度順: error > warning > info）
+LEVEL_PATTERN = re.compile(
+    r'(?P<error>error|exception|critical|fatal|traceback)'
+    r'|(?P<warning>warn)'
+    r'|(?P<info>info)',
+    re.IGNORECASE
+)
+LEVEL_PRIORITY = {'error': 3, 'warning': 2, 'info': 1}
+
+# 行頭などに現れるタイムスタンプ（ISO8601 / syslog / fail2ban 形式）
+TIMESTAMP_PATTERN = re.compile(
+    r'\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?(?:Z|[+-]\d{2}:?\d{2})?'
+    r'|(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec) +\d{1,2} \d{2}:\d{2}:\d{2}'
+)
+
+# テンプレート化で置き換える可変部分（先に書いたものほど優先）
+VARIABLE_PATTERN = re.compile(
+    r'(?P<ts>' + TIMESTAMP_PATTERN.pattern + r')'
+    r'|(?P<uuid>\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b)'
+    r'|(?P<ip>\b\d{1,3}(?:\.\d{1,3}){3}(?::\d+)?\b|\b(?:[0-9a-fA-F]{1,4}:){3,7}[0-9a-fA-F]{1,4}\b)'
+    r'|(?P<hex>\b0x[0-9a-fA-F]+\b|\b[0-9a-fA-F]{12,}\b)'
+    r'|(?P<num>(?<![A-Za-z_])[-+]?\d+(?:\.\d+)?)'
+)
+PLACEHOLDERS = {'ts': '<TS>', 'uuid': '<UUID>', 'ip': '<IP>', 'hex': '<HEX>', 'num': '<NUM>'}
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+MAX_TEMPLATE_LENGTH = 300
+
+
+def classify_level(line: str) -> Optional[str]:
+    """ログ行のレベルを判定（該当キーワードが無ければNone）"""
+    best = None
+    for match in LEVEL_PATTERN.finditer(line):
+        level = match.lastgroup
+        if level == 'error':
+            return level
+        if best is None or LEVEL_PRIORITY[level] > LEVEL_PRIORITY[best]:
+            best = level
+    return best
+
+
+def _replace_variable(match: 're.Match') -> str:
+    return PLACEHOLDERS[match.lastgroup]
+
+
+def normalize_line(line: str) -> str:
+    """可変部分をプレースホルダーに置き換えてテンプレート化"""
+    template = VARIABLE_PATTERN.sub(_replace_variable, line.strip())
+    template = WHITESPACE_PATTERN.sub(' ', template)
+    return template[:MAX_TEMPLATE_LENGTH]
+
+
+def extract_timestamp(line: str) -> Optional[str]:
+    """行に含まれる最初のタイムスタンプ文字列を取得"""
+    match = TIMESTAMP_PATTERN.search(line)
+    return match.group(0) if match else None
+
+
+class LogTemplateHistogram:
+    """
+    テンプレート別の出現件数ヒストグラム
+
+    ingest() を繰り返し呼ぶことで追記分だけを積み上げられる。テンプレート数が
+    max_templates を超えた場合は、最後に出現してから最も時間が経ったものから破棄する。
+
+    Args:
+        max_templates: レベルごとに保持するテンプレート数の上限
+        levels: テンプレートを集計するレベル
+    """
+
+    def __init__(self, max_templates: int = 500, levels: Iterable[str] = ('error', 'warning')):
+        self.max_templates = max_templates
+        self.levels = tuple(levels)
+        self.counts = {'error': 0, 'warning': 0, 'info': 0}
+        self.total_lines = 0
+        self._templates: Dict[str, 'OrderedDict[str, Dict[str, Any]]'] = {
+            level: OrderedDict() for level in self.levels
+        }
+        self._lock = threading.Lock()
+
+    def ingest(self, lines: Iterable[str]):
+        """ログ行をまとめて分類・集計"""
+        with self._lock:
+            for index, line in enumerate(lines, start=self.total_lines):
+                self.total_lines += 1
+                if not line or line.isspace():
+                    continue
+                level = classify_level(line)
+                if level is None:
+                    continue
+                self.counts[level] += 1
+                if level not in self._templates:
+                    continue
+
+                seen = extract_timestamp(line) or f'line {index + 1}'
+                templates = self._templates[level]
+                key = normalize_line(line)
+                entry = templates.get(key)
+                if entry is None:
+                    templates[key] = {
+                        'template': key,
+                        'count': 1,
+                        'first_seen': seen,
+                        'last_seen': seen,
+                        'example': line.strip()[:MAX_TEMPLATE_LENGTH],
+                    }
+                    if len(templates) > self.max_templates:
+                        templates.popitem(last=False)
+                else:
+                    entry['count'] += 1
+                    entry['last_seen'] = seen
+                    templates.move_to_end(key)
+
+    def top(self, level: str, k: int = 10) -> List[Dict[str, Any]]:
+        """指定レベルの上位kテンプレートを件数の多い順に取得"""
+        with self._lock:
+            entries = [dict(e) for e in self._templates.get(level, {}).values()]
+        entries.sort(key=lambda e: e['count'], reverse=True)
+        return entries[:k]
+
+    def distinct(self, level: str) -> int:
+        """指定レベルのテンプレート種類数"""
+        return len(self._templates.get(level, {}))
+
+
+def format_template_summary(templates: List[Dict[str, Any]]) -> str:
+    """AIプロンプト用にテンプレート一覧を1行ずつの要約に整形"""
+    if not templates:
+        return 'なし'
+    return '\n'.join(
+        f"- [{t['count']}件] {t['template']}（初出: {t['first_seen']} / 最終: {t['last_seen']}）"
+        for t in templates
+    )
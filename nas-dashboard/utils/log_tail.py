@@ -0,0 +1,133 @@
+"""
+ログファイルの末尾読み取り・追従ユーティリティ
+ファイル全体を読み込まずに末尾から固定サイズのブロック単位で逆方向に読み取る
+"""
+import os
+import time
+import logging
+from typing import Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BLOCK_SIZE = 64 * 1024
+
+
+def tail_lines(path: str, n: int, block_size: int = DEFAULT_BLOCK_SIZE) -> List[str]:
+    """
+    ファイルの最後のn行を取得（末尾からシークして読み取る）
+
+    Returns:
+        改行を除いた行のリスト（古い順）
+    """
+    if n <= 0:
+        return []
+
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        data = _read_tail(f, f.tell(), n, block_size)
+
+    lines = data.decode('utf-8', errors='ignore').splitlines()
+    return lines[-n:]
+
+
+def tail_lines_with_offset(path: str, n: int, block_size: int = DEFAULT_BLOCK_SIZE) -> Tuple[List[str], int]:
+    """
+    ファイルの最後のn行と、その直後のバイト位置を取得
+
+    書き込み途中の最終行（改行で終わっていない行）は含めず、返す位置もその行の先頭とする。
+    返した位置から follow_lines で追従すれば、行の欠落・重複なく続きを読める。
+
+    Returns:
+        (改行を除いた行のリスト（古い順）, 最後の行の直後のバイト位置)
+    """
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        data = _read_tail(f, size, max(n, 0), block_size)
+
+    # 書き込み途中の行を除く
+    complete_end = data.rfind(b'\n') + 1
+    end_offset = size - (len(data) - complete_end)
+    if n <= 0:
+        return [], end_offset
+    lines = data[:complete_end].decode('utf-8', errors='ignore').splitlines()
+    return lines[-n:], end_offset
+
+
+def _read_tail(f, size: int, n: int, block_size: int) -> bytes:
+    """末尾からn行分（以上）のバイト列を読み取る"""
+    position = size
+    data = b''
+    # n行分の改行が見つかるまで末尾からブロックを読み足す
+    # （最終行が改行で終わっている場合を考慮して n + 1 個の改行を探す）
+    while position > 0 and data.count(b'\n') <= n:
+        read_size = min(block_size, position)
+        position -= read_size
+        f.seek(position)
+        data = f.read(read_size) + data
+    return data
+
+
+def follow_lines(path: str, offset: Optional[int] = None, poll_interval: float = 1.0,
+                 heartbeat_interval: Optional[float] = None,
+                 max_duration: Optional[float] = None) -> Iterator[Tuple[Optional[str], int]]:
+    """
+    ファイルへの追記を監視して新しい行を順に返す（`tail -f` 相当）
+
+    ログローテーション（inode変更）や切り詰めを検知した場合はファイルを開き直す。
+
+    Args:
+        path: 監視するファイル
+        offset: 読み始めるバイト位置（Noneなら現在の末尾）。ファイルサイズを超える場合は
+            ローテーション・切り詰め後とみなして先頭から読む
+        poll_interval: 追記チェックの間隔（秒）
+        heartbeat_interval: 新しい行が無い状態がこの秒数続いたらNoneを返す（接続維持用）
+        max_duration: 監視を打ち切るまでの秒数
+
+    Yields:
+        (追記された行（改行なし）またはハートビートとしてNone, その行の直後のバイト位置)
+    """
+    started = time.monotonic()
+    last_emit = started
+    f = open(path, 'rb')
+    try:
+        size = f.seek(0, os.SEEK_END)
+        if offset is None:
+            position = size
+        elif offset > size:
+            position = 0
+        else:
+            position = max(offset, 0)
+        f.seek(position)
+        inode = os.fstat(f.fileno()).st_ino
+        pending = b''
+        while max_duration is None or time.monotonic() - started < max_duration:
+            chunk = f.read()
+            if chunk:
+                pending += chunk
+                *complete, pending = pending.split(b'\n')
+                for line in complete:
+                    position += len(line) + 1
+                    yield line.decode('utf-8', errors='ignore').rstrip('\r'), position
+                last_emit = time.monotonic()
+                continue
+
+            # ローテーション・切り詰めの検知
+            try:
+                stat = os.stat(path)
+                if stat.st_ino != inode or stat.st_size < f.tell():
+                    f.close()
+                    f = open(path, 'rb')
+                    inode = os.fstat(f.fileno()).st_ino
+                    pending = b''
+                    position = 0
+                    continue
+            except FileNotFoundError:
+                pass
+
+            if heartbeat_interval and time.monotonic() - last_emit >= heartbeat_interval:
+                last_emit = time.monotonic()
+                yield None, position
+            time.sleep(poll_interval)
+    finally:
+        f.close()
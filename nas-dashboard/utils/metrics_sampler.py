@@ -0,0 +1,291 @@
+"""
+システムメトリクスのバックグラウンドサンプラー
+CPU・メモリ・ディスク・ネットワーク・コンテナ統計を一定間隔で収集してリングバッファに保持し、
+一定時間ごとのダウンサンプル値（平均・最大）をSQLiteに保存する
+"""
+import os
+import json
+import sqlite3
+import subprocess
+import threading
+import time
+import logging
+from collections import deque
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+# 平均・最大を集計するメトリクス
+AGGREGATED_METRICS = ('cpu_percent', 'memory_percent', 'disk_percent')
+
+
+def get_metrics_db_path() -> Path:
+    """メトリクス履歴データベースのパスを取得（環境に応じて）"""
+    env_path = os.getenv('METRICS_DB_PATH')
+    if env_path:
+        return Path(env_path)
+    if os.getenv('NAS_MODE'):
+        return Path('/nas-project-data/nas-dashboard/metrics.db')
+    return Path(__file__).parent.parent / 'data' / 'metrics.db'
+
+
+class MetricsSampler:
+    """
+    メトリクスサンプラー
+
+    Args:
+        interval: サンプリング間隔（秒）
+        buffer_size: リングバッファに保持するサンプル数
+        container_interval: コンテナ統計の収集間隔（秒、0で無効）
+        rollup_interval: ディスクに保存するダウンサンプルの間隔（秒、0で無効）
+        retention_days: ダウンサンプルの保持日数
+    """
+
+    def __init__(self, interval: int = 10, buffer_size: int = 360, container_interval: int = 60,
+                 rollup_interval: int = 300, retention_days: int = 400, db_path: Optional[Path] = None):
+        self.interval = interval
+        self.container_interval = container_interval
+        self.rollup_interval = rollup_interval
+        self.retention_days = retention_days
+        self.db_path = Path(db_path) if db_path else get_metrics_db_path()
+        self._buffer: deque = deque(maxlen=buffer_size)
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._container_stats: Dict[str, Dict[str, Any]] = {}
+        self._last_container_sample = 0.0
+        self._last_rollup_bucket: Optional[int] = None
+        self._db_writable = True
+        self.boot_time = datetime.fromtimestamp(psutil.boot_time())
+
+    # ------------------------------------------------------------------
+    # ライフサイクル
+    # ------------------------------------------------------------------
+    def start(self):
+        """サンプラースレッドを起動（起動済みなら何もしない）"""
+        if self._thread and self._thread.is_alive():
+            return
+        # cpu_percent(interval=None) の基準点を作る
+        psutil.cpu_percent(interval=None)
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='metrics-sampler', daemon=True)
+        self._thread.start()
+        logger.info(f"メトリクスサンプラーを起動しました（間隔: {self.interval}秒）")
+
+    def stop(self):
+        """サンプラースレッドを停止"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=self.interval + 1)
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                self._record(self._take_sample())
+            except Exception as e:
+                logger.warning(f"メトリクスサンプリングエラー: {e}")
+            self._stop_event.wait(self.interval)
+
+    # ------------------------------------------------------------------
+    # サンプリング
+    # ------------------------------------------------------------------
+    def _take_sample(self, include_containers: bool = True) -> Dict[str, Any]:
+        memory = psutil.virtual_memory()
+        disk = psutil.disk_usage('/')
+        network = psutil.net_io_counters()
+        now = time.time()
+
+        if (include_containers and self.container_interval
+                and now - self._last_container_sample >= self.container_interval):
+            self._container_stats = self._sample_container_stats()
+            self._last_container_sample = now
+
+        return {
+            'ts': now,
+            'cpu_percent': psutil.cpu_percent(interval=None),
+            'memory_percent': memory.percent,
+            'memory_used': memory.used,
+            'memory_total': memory.total,
+            'memory_available': memory.available,
+            'disk_percent': disk.percent,
+            'disk_used': disk.used,
+            'disk_total': disk.total,
+            'disk_free': disk.free,
+            'net_bytes_sent': network.bytes_sent,
+            'net_bytes_recv': network.bytes_recv,
+            'net_packets_sent': network.packets_sent,
+            'net_packets_recv': network.packets_recv,
+            'containers': self._container_stats,
+        }
+
+    @staticmethod
+    def _sample_container_stats() -> Dict[str, Dict[str, Any]]:
+        """コンテナごとのCPU・メモリ使用率を取得"""
+        try:
+            result = subprocess.run(
+                ['docker', 'stats', '--no-stream', '--format', '{{json .}}'],
+                capture_output=True, text=True, timeout=20
+            )
+            if result.returncode != 0:
+                return {}
+            stats = {}
+            for line in result.stdout.splitlines():
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                stats[item.get('Name', '')] = {
+                    'cpu_percent': float(item.get('CPUPerc', '0%').rstrip('%') or 0),
+                    'memory_percent': float(item.get('MemPerc', '0%').rstrip('%') or 0),
+                    'memory_usage': item.get('MemUsage', ''),
+                }
+            return stats
+        except (OSError, subprocess.SubprocessError, ValueError) as e:
+            logger.debug(f"コンテナ統計取得エラー: {e}")
+            return {}
+
+    def _record(self, sample: Dict[str, Any]):
+        with self._lock:
+            self._buffer.append(sample)
+        if self.rollup_interval:
+            bucket = int(sample['ts'] // self.rollup_interval)
+            if self._last_rollup_bucket is None:
+                self._last_rollup_bucket = bucket
+            elif bucket != self._last_rollup_bucket:
+                self._persist_rollup(self._last_rollup_bucket)
+                self._last_rollup_bucket = bucket
+
+    # ------------------------------------------------------------------
+    # ディスク保存（ダウンサンプル）
+    # ------------------------------------------------------------------
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _persist_rollup(self, bucket: int):
+        """完了したバケットの平均・最大を保存"""
+        if not self._db_writable:
+            return
+        start = bucket * self.rollup_interval
+        end = start + self.rollup_interval
+        samples = [s for s in self.get_samples() if start <= s['ts'] < end]
+        if not samples:
+            return
+
+        row = {'bucket_start': datetime.fromtimestamp(start).strftime('%Y-%m-%d %H:%M:%S'),
+               'sample_count': len(samples)}
+        for metric in AGGREGATED_METRICS:
+            values = [s[metric] for s in samples]
+            row[f'{metric}_avg'] = sum(values) / len(values)
+            row[f'{metric}_max'] = max(values)
+
+        try:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = self._connect()
+            try:
+                columns = ', '.join(f'{m}_avg REAL, {m}_max REAL' for m in AGGREGATED_METRICS)
+                conn.execute(f'''
+                    CREATE TABLE IF NOT EXISTS metrics_rollup (
+                        bucket_start TEXT PRIMARY KEY,
+                        sample_count INTEGER NOT NULL,
+                        {columns}
+                    )
+                ''')
+                # 複数ワーカーが同じバケットを書き込んでも最初の1件のみ保持
+                conn.execute(
+                    f"INSERT OR IGNORE INTO metrics_rollup ({', '.join(row)}) "
+                    f"VALUES ({', '.join('?' for _ in row)})",
+                    list(row.values())
+                )
+                cutoff = datetime.now() - timedelta(days=self.retention_days)
+                conn.execute('DELETE FROM metrics_rollup WHERE bucket_start < ?',
+                             (cutoff.strftime('%Y-%m-%d %H:%M:%S'),))
+                conn.commit()
+            finally:
+                conn.close()
+        except (sqlite3.Error, OSError) as e:
+            # 読み取り専用マウント等では保存を無効化してメモリ上のみで動作
+            logger.warning(f"メトリクス履歴の保存を無効化します: {e}")
+            self._db_writable = False
+
+    # ------------------------------------------------------------------
+    # 参照
+    # ------------------------------------------------------------------
+    def get_samples(self, since: Optional[float] = None, until: Optional[float] = None) -> List[Dict[str, Any]]:
+        """リングバッファ内のサンプルを取得（since 以上 until 未満）"""
+        with self._lock:
+            samples = list(self._buffer)
+        if since is not None:
+            samples = [s for s in samples if s['ts'] >= since]
+        if until is not None:
+            samples = [s for s in samples if s['ts'] < until]
+        return samples
+
+    def latest(self) -> Dict[str, Any]:
+        """最新サンプルを取得（まだ無い場合はその場で1件取得）"""
+        with self._lock:
+            if self._buffer:
+                return self._buffer[-1]
+        sample = self._take_sample(include_containers=False)
+        self._record(sample)
+        return sample
+
+    def summarize(self, since: datetime, until: Optional[datetime] = None) -> Dict[str, Dict[str, float]]:
+        """
+        指定期間（since 以上 until 未満、until省略時は現在まで）の平均・最大を集計
+
+        ディスク上のダウンサンプルとリングバッファの両方を使用する。
+        データが無い場合は最新サンプルの値を返す。
+
+        Returns:
+            {'cpu_percent': {'avg': float, 'max': float}, 'memory_percent': {...}, 'disk_percent': {...}}
+        """
+        totals = {m: 0.0 for m in AGGREGATED_METRICS}
+        peaks = {m: 0.0 for m in AGGREGATED_METRICS}
+        count = 0
+        covered_until = since.timestamp()
+
+        if self.rollup_interval and self.db_path.exists():
+            try:
+                conn = self._connect()
+                try:
+                    if until is None:
+                        rows = conn.execute(
+                            'SELECT * FROM metrics_rollup WHERE bucket_start >= ? ORDER BY bucket_start',
+                            (since.strftime('%Y-%m-%d %H:%M:%S'),)
+                        ).fetchall()
+                    else:
+                        rows = conn.execute(
+                            'SELECT * FROM metrics_rollup WHERE bucket_start >= ? AND bucket_start < ? '
+                            'ORDER BY bucket_start',
+                            (since.strftime('%Y-%m-%d %H:%M:%S'), until.strftime('%Y-%m-%d %H:%M:%S'))
+                        ).fetchall()
+                finally:
+                    conn.close()
+                for row in rows:
+                    n = row['sample_count']
+                    for metric in AGGREGATED_METRICS:
+                        totals[metric] += row[f'{metric}_avg'] * n
+                        peaks[metric] = max(peaks[metric], row[f'{metric}_max'])
+                    count += n
+                if rows:
+                    last_start = datetime.strptime(rows[-1]['bucket_start'], '%Y-%m-%d %H:%M:%S')
+                    covered_until = last_start.timestamp() + self.rollup_interval
+            except sqlite3.Error as e:
+                logger.warning(f"メトリクス履歴の読み込みエラー: {e}")
+
+        # ディスクに未保存の直近サンプルを加算
+        for sample in self.get_samples(since=covered_until, until=until.timestamp() if until else None):
+            for metric in AGGREGATED_METRICS:
+                totals[metric] += sample[metric]
+                peaks[metric] = max(peaks[metric], sample[metric])
+            count += 1
+
+        if count == 0:
+            sample = self.latest()
+            return {m: {'avg': sample[m], 'max': sample[m]} for m in AGGREGATED_METRICS}
+        return {m: {'avg': totals[m] / count, 'max': peaks[m]} for m in AGGREGATED_METRICS}
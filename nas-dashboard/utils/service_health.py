@@ -0,0 +1,110 @@
+"""
+サービス稼働状況の並列チェック
+全サービスをスレッドプールで同時にプローブし、結果を短いTTLでキャッシュして全リクエストで共有する
+"""
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# probe(service_id, service_config, session) -> ステータス辞書
+ProbeFunc = Callable[[str, Dict[str, Any], requests.Session], Dict[str, Any]]
+
+
+class ServiceHealthChecker:
+    """
+    サービスヘルスチェッカー
+
+    Args:
+        services: サービス設定（Config.SERVICES）
+        probe: 1サービス分の状態を返す関数
+        ttl: キャッシュの有効期間（秒）
+        refresh_interval: バックグラウンド更新の間隔（秒、0で無効）
+        max_workers: 同時プローブ数
+    """
+
+    def __init__(self, services: Dict[str, Dict[str, Any]], probe: ProbeFunc, ttl: float = 15,
+                 refresh_interval: float = 10, max_workers: int = 8):
+        self.services = services
+        self.probe = probe
+        self.ttl = ttl
+        self.refresh_interval = refresh_interval
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='service-probe')
+        # 接続を再利用するためのセッション（プール数は同時プローブ数に合わせる）
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._cache: Optional[Dict[str, Dict[str, Any]]] = None
+        self._cached_at = 0.0
+        self._refresh_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+    def start(self):
+        """バックグラウンド更新スレッドを起動"""
+        if not self.refresh_interval or (self._thread and self._thread.is_alive()):
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='service-health-refresher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """バックグラウンド更新スレッドを停止"""
+        self._stop_event.set()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning(f"サービス状態のバックグラウンド更新エラー: {e}")
+            self._stop_event.wait(self.refresh_interval)
+
+    def _probe_one(self, service_id: str, service_config: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            return self.probe(service_id, service_config, self.session)
+        except Exception as e:
+            logger.error(f"サービス {service_id} の状態確認エラー: {e}")
+            return {
+                'name': service_config['name'],
+                'status': 'error',
+                'url': service_config['url'],
+                'response_time': None
+            }
+
+    def refresh(self) -> Dict[str, Dict[str, Any]]:
+        """全サービスを並列にプローブしてキャッシュを更新"""
+        with self._refresh_lock:
+            futures = {
+                service_id: self._executor.submit(self._probe_one, service_id, service_config)
+                for service_id, service_config in self.services.items()
+            }
+            # 設定順を維持して結果を集める
+            results = {service_id: future.result() for service_id, future in futures.items()}
+            self._cache = results
+            self._cached_at = time.monotonic()
+            return results
+
+    def get_status(self, max_age: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        キャッシュされた状態を返す（期限切れの場合のみ再取得）
+
+        同時に複数のリクエストが来ても再取得は1回だけ行われ、他のリクエストはその結果を共有する。
+        """
+        max_age = self.ttl if max_age is None else max_age
+        if self._cache is not None and time.monotonic() - self._cached_at < max_age:
+            return self._cache
+
+        cached_at = self._cached_at
+        with self._refresh_lock:
+            # 待っている間に他のスレッドが更新済みならそれを使う
+            if self._cache is not None and self._cached_at != cached_at:
+                return self._cache
+        return self.refresh()